@@ -0,0 +1,125 @@
+"""
+已验证令牌缓存
+JWT每次验证都要重新计算HMAC签名并解析载荷，而同一个令牌在有效期内会被反复使用。
+验证通过的令牌按LRU缓存载荷，条目的过期时间取令牌自身的exp，过期后不再命中，
+因此缓存不会让过期令牌多活一秒；更换SECRET_KEY后需要调用clear()。
+auth_required装饰器验证Authorization请求头，并把user_id和user_type传给视图函数。
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+import jwt
+from flask import current_app, jsonify, request
+
+class TokenCache:
+    """进程内的令牌 -> 载荷缓存，线程安全，超过max_entries时淘汰最久未使用的令牌"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # token -> (exp, payload)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        """返回令牌的载荷；未缓存或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.time():
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token, payload):
+        """缓存验证通过的令牌；没有exp的令牌不缓存，避免永久有效"""
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+        with self._lock:
+            self._entries[token] = (exp, payload)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+def hash_password(password):
+    """对密码进行哈希处理"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def generate_token(user_id, user_type):
+    """生成JWT令牌"""
+    payload = {
+        'user_id': user_id,
+        'user_type': user_type,
+        'exp': datetime.utcnow() + timedelta(seconds=current_app.config['JWT_EXPIRATION_DELTA'])
+    }
+    token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+    # 某些版本的PyJWT返回bytes而不是字符串，确保返回字符串
+    if isinstance(token, bytes):
+        return token.decode('utf-8')
+    return token
+
+def get_token_cache():
+    """懒加载已验证令牌缓存，每个进程一个实例"""
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                _token_cache = TokenCache(current_app.config['TOKEN_CACHE_MAX_ENTRIES'])
+    return _token_cache
+
+def verify_token(token):
+    """验证JWT令牌，返回载荷；验证通过的令牌在exp之前直接从缓存返回"""
+    # 确保token是字符串类型
+    if isinstance(token, bytes):
+        token = token.decode('utf-8')
+    cache = get_token_cache()
+    payload = cache.get(token)
+    if payload is not None:
+        return payload
+    try:
+        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return None
+    cache.set(token, payload)
+    return payload
+
+def auth_required(func):
+    """认证装饰器：验证Authorization请求头中的令牌，并把user_id和user_type作为关键字参数传给视图函数"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get('Authorization')
+        if not token:
+            return jsonify({'message': '缺少认证令牌'}), 401
+        
+        # 移除Bearer前缀（如果有）
+        if token.startswith('Bearer '):
+            token = token[7:]
+        
+        payload = verify_token(token)
+        if not payload:
+            return jsonify({'message': '无效或过期的令牌'}), 401
+        
+        return func(*args, user_id=payload.get('user_id'), user_type=payload.get('user_type'), **kwargs)
+    return wrapper
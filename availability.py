@@ -0,0 +1,271 @@
+"""
+服务商可用性索引
+每个服务商每天在provider_availability表中保存一行，三个位图按5分钟一格记录一天的时间段：
+open_mask(可用)、closed_mask(明确不可用)、booked_mask(待确认和已确认预约占用)。
+时间段或预约发生变化时，在同一事务提交前重新计算受影响的(服务商, 日期)，
+客户查询可用时间时只需读取对应的行。
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect, and_, or_, select, bindparam
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, Booking, TimeSlot, ProviderAvailability
+
+# 位图的时间粒度(分钟)
+SLOT_MINUTES = 5
+
+# 占用时间段的预约状态
+ACTIVE_BOOKING_STATUSES = ('pending', 'confirmed')
+
+# 没有设置时间段时的默认营业时间：9:00-17:00，每半小时一段
+DEFAULT_TIMES = [f"{h:02d}:{m:02d}" for h in range(9, 17) for m in (0, 30)] + ["17:00"]
+
+# 多日查询允许的最大天数
+MAX_AVAILABILITY_DAYS = 62
+
+# session.info中记录待刷新(服务商, 日期)的键
+DIRTY_KEY = 'availability_dirty'
+
+def time_to_bit(time_str):
+    """将HH:MM或HH:MM-HH:MM格式的时间转换为位图中的位置，无法识别时返回None"""
+    try:
+        hour, minute = map(int, time_str.split('-')[0].strip().split(':')[:2])
+    except (AttributeError, ValueError):
+        return None
+    minutes = hour * 60 + minute
+    if not 0 <= minutes < 24 * 60 or minute % SLOT_MINUTES:
+        return None
+    return minutes // SLOT_MINUTES
+
+def bit_to_time(bit):
+    minutes = bit * SLOT_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def times_to_mask(times):
+    mask = 0
+    for time_str in times:
+        bit = time_to_bit(time_str)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+def mask_to_times(mask):
+    """按时间顺序列出位图中置位的时间"""
+    times = []
+    while mask:
+        low = mask & -mask
+        times.append(bit_to_time(low.bit_length() - 1))
+        mask ^= low
+    return times
+
+DEFAULT_MASK = times_to_mask(DEFAULT_TIMES)
+
+def parse_mask(value):
+    return int(value, 16) if value else 0
+
+def format_mask(mask):
+    return format(mask, 'x')
+
+def mark_dirty(session, provider_id, dates):
+    """记录需要在提交前刷新的(服务商, 日期)，供绕过ORM事件的批量写入调用"""
+    dirty = session.info.setdefault(DIRTY_KEY, set())
+    for date_obj in dates:
+        dirty.add((provider_id, date_obj))
+
+def _collect_dirty(session, flush_context, instances):
+    """flush前收集新增、修改、删除的预约和时间段所影响的日期"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, (Booking, TimeSlot)):
+            continue
+        keys = {(obj.provider_id, obj.date)}
+        # 改期或更换服务商时，原来的日期也需要刷新
+        state = inspect(obj)
+        for old_date in state.attrs.date.history.deleted or ():
+            keys.add((obj.provider_id, old_date))
+        for old_provider_id in state.attrs.provider_id.history.deleted or ():
+            keys.add((old_provider_id, obj.date))
+        dirty = session.info.setdefault(DIRTY_KEY, set())
+        dirty.update(key for key in keys if key[0] and key[1])
+
+def _refresh_dirty(session):
+    """提交前重新计算受影响的可用性行，与业务数据在同一事务中写入"""
+    # 先flush未写入的变更，由before_flush收集受影响的日期
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    dirty = session.info.pop(DIRTY_KEY, None)
+    if not dirty:
+        return
+    by_provider = {}
+    for provider_id, date_obj in dirty:
+        by_provider.setdefault(provider_id, set()).add(date_obj)
+    for provider_id, dates in by_provider.items():
+        refresh_availability(session, provider_id, dates)
+
+def _clear_dirty(session):
+    session.info.pop(DIRTY_KEY, None)
+
+def register_availability_listeners(session):
+    """在会话上注册维护可用性索引的事件"""
+    event.listen(session, 'before_flush', _collect_dirty)
+    event.listen(session, 'before_commit', _refresh_dirty)
+    event.listen(session, 'after_rollback', _clear_dirty)
+
+def _lock_rows(session, provider_id, dates):
+    """
+    插入尚不存在的可用性行(已存在的行不修改)并锁定所有行，首次写入的日期也能被锁住
+    两个事务同时首次写入同一天时，后一个的插入等待前一个提交后成为空操作，不会因主键冲突失败
+    MySQL的INSERT ... ON DUPLICATE KEY UPDATE对新插入和已存在的行都加排他锁，SQLite的写入独占数据库
+    """
+    table = ProviderAvailability.__table__
+    now = datetime.utcnow()
+    rows = [{'provider_id': provider_id, 'date': date_obj, 'open_mask': '0', 'closed_mask': '0',
+             'booked_mask': '0', 'updated_at': now} for date_obj in dates]
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_insert(table).values(rows)
+        session.execute(stmt.on_duplicate_key_update(provider_id=stmt.inserted.provider_id))
+    elif dialect == 'sqlite':
+        session.execute(sqlite_insert(table).values(rows).on_conflict_do_nothing(
+            index_elements=[table.c.provider_id, table.c.date]
+        ))
+    else:
+        existing = {date_obj for date_obj, in session.query(ProviderAvailability.date).filter(
+            ProviderAvailability.provider_id == provider_id,
+            ProviderAvailability.date.in_(dates)
+        )}
+        missing = [row for row in rows if row['date'] not in existing]
+        if missing:
+            session.execute(table.insert(), missing)
+        session.execute(select(table.c.date).where(
+            table.c.provider_id == provider_id,
+            table.c.date.in_(dates)
+        ).with_for_update())
+
+def refresh_availability(session, provider_id, dates):
+    """
+    根据时间段和预约重新计算服务商在指定日期的可用性行
+    先插入并锁定可用性行，再用加锁读取时间段和预约，并发修改同一天时依次计算，不会相互覆盖
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return
+
+    table = ProviderAvailability.__table__
+    _lock_rows(session, provider_id, dates)
+
+    masks = {date_obj: [0, 0, 0] for date_obj in dates}
+    slots = session.query(TimeSlot.date, TimeSlot.time, TimeSlot.is_available).filter(
+        TimeSlot.provider_id == provider_id,
+        TimeSlot.date.in_(dates)
+    ).with_for_update(read=True)
+    for date_obj, time_str, is_available in slots:
+        bit = time_to_bit(time_str)
+        if bit is not None:
+            masks[date_obj][0 if is_available else 1] |= 1 << bit
+
+    bookings = session.query(Booking.date, Booking.time).filter(
+        Booking.provider_id == provider_id,
+        Booking.date.in_(dates),
+        Booking.status.in_(ACTIVE_BOOKING_STATUSES)
+    ).with_for_update(read=True)
+    for date_obj, time_str in bookings:
+        bit = time_to_bit(time_str)
+        if bit is not None:
+            masks[date_obj][2] |= 1 << bit
+
+    # 所有日期的位图用一次executemany写入，语句数量不随日期数增长
+    now = datetime.utcnow()
+    session.execute(
+        table.update().where(and_(table.c.provider_id == bindparam('key_provider_id'),
+                                  table.c.date == bindparam('key_date'))),
+        [{'key_provider_id': provider_id, 'key_date': date_obj, 'open_mask': format_mask(open_mask),
+          'closed_mask': format_mask(closed_mask), 'booked_mask': format_mask(booked_mask), 'updated_at': now}
+         for date_obj, (open_mask, closed_mask, booked_mask) in masks.items()]
+    )
+
+def rebuild_all_availability(session, chunk_days=366):
+    """为所有已有的时间段和预约重建可用性索引(用于迁移和对账)"""
+    keys = set(session.query(TimeSlot.provider_id, TimeSlot.date).distinct())
+    keys |= set(session.query(Booking.provider_id, Booking.date).filter(
+        Booking.status.in_(ACTIVE_BOOKING_STATUSES)
+    ).distinct())
+    by_provider = {}
+    for provider_id, date_obj in keys:
+        by_provider.setdefault(provider_id, []).append(date_obj)
+    for provider_id, dates in by_provider.items():
+        dates.sort()
+        for start in range(0, len(dates), chunk_days):
+            refresh_availability(session, provider_id, dates[start:start + chunk_days])
+    return len(keys)
+
+def _available_mask(row, reference, now):
+    """计算一天的可用位图，reference为当前周按星期几索引的行，用于没有设置时间段的日期"""
+    open_mask = parse_mask(row.open_mask)
+    closed_mask = parse_mask(row.closed_mask)
+    today = now.date()
+
+    if open_mask or closed_mask:
+        # 使用当天设置的可用时间段，只过滤今天已过的时间
+        mask = open_mask
+        past_filter = row.date == today
+    elif row.date.weekday() in reference:
+        # 没有时间段的日期沿用当前周同一星期几的设置，限定在默认营业时间内
+        pattern = reference[row.date.weekday()]
+        pattern_open = parse_mask(pattern.open_mask)
+        mask = DEFAULT_MASK & (pattern_open or DEFAULT_MASK) & ~parse_mask(pattern.closed_mask)
+        past_filter = False
+    else:
+        # 都没有时使用默认营业时间，过滤掉已经过去的日期和时间
+        if row.date < today:
+            return 0
+        mask = DEFAULT_MASK
+        past_filter = row.date == today
+
+    # 移除已被预约占用的时间段
+    mask &= ~parse_mask(row.booked_mask)
+
+    if past_filter:
+        current_bit = (now.hour * 60 + now.minute) // SLOT_MINUTES
+        mask &= ~((1 << (current_bit + 1)) - 1)
+    return mask
+
+def get_available_times(provider_id, start_date, end_date=None, now=None):
+    """
+    读取服务商在日期范围内每天的可用时间
+    返回[(date, [HH:MM, ...]), ...]，请求范围和当前周(参考模式)由一次查询读出
+    """
+    end_date = end_date or start_date
+    now = now or datetime.now()
+    today = now.date()
+    start_of_week = today - timedelta(days=today.weekday())
+    end_of_week = start_of_week + timedelta(days=6)
+
+    rows = {
+        row.date: row
+        for row in ProviderAvailability.query.filter(
+            ProviderAvailability.provider_id == provider_id,
+            or_(
+                and_(ProviderAvailability.date >= start_date, ProviderAvailability.date <= end_date),
+                and_(ProviderAvailability.date >= start_of_week, ProviderAvailability.date <= end_of_week)
+            )
+        )
+    }
+
+    # 当前周有时间段设置的日期作为参考模式
+    reference = {
+        date_obj.weekday(): row
+        for date_obj, row in rows.items()
+        if start_of_week <= date_obj <= end_of_week and (parse_mask(row.open_mask) or parse_mask(row.closed_mask))
+    }
+
+    result = []
+    date_obj = start_date
+    while date_obj <= end_date:
+        row = rows.get(date_obj) or ProviderAvailability(provider_id=provider_id, date=date_obj, open_mask='0',
+                                                          closed_mask='0', booked_mask='0')
+        result.append((date_obj, mask_to_times(_available_mask(row, reference, now))))
+        date_obj += timedelta(days=1)
+    return result
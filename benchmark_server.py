@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Web服务器基准测试脚本
+在同一个SQLite文件数据库上分别启动开发服务器(Flask自带，单进程多线程)和serve.py(gunicorn pre-fork)，
+用多个保持连接的客户端线程请求核心预约接口，比较吞吐量和响应时间：
+- 公开服务列表 GET /api/services/public
+- 可用时间查询 GET /api/provider/<id>/available-timeslots
+- 用户预约列表 GET /api/bookings?limit=20 (游标分页的第一页)
+- 预约仪表盘 GET /api/bookings/dashboard
+只测只读接口：SQLite同一时间只允许一个写事务，写接口的对比结果反映的是SQLite而不是服务器。
+客户端和服务器在同一台机器上运行，会争用CPU，结果应在与生产相同核数的机器上测量。
+--reload在gunicorn测试进行到一半时依次执行serve.py reload(加载新代码)和restart(替换worker)，
+检查平滑重启期间没有失败的请求。
+
+使用方法:
+    python benchmark_server.py
+    python benchmark_server.py --duration 20 --clients 32 --workers 4 --threads 8
+    python benchmark_server.py --reload
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+from app import create_app
+from auth import generate_token, hash_password
+from models import db, User, Provider, Service, Booking
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEV_SERVER = ("from app import create_app; "
+              "create_app().run(host='127.0.0.1', port={port}, threaded=True, use_reloader=False)")
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def seed(app, bookings):
+    """建表并生成服务商、服务、时间段和预约，返回(请求路径列表, 用户令牌)"""
+    day = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench_user', email='bench_user@example.com', password=hash_password('123456'))
+        provider = Provider(username='bench_provider', email='bench_provider@example.com',
+                            password=hash_password('123456'), business_name='基准测试商家')
+        db.session.add_all([user, provider])
+        db.session.commit()
+        services = [Service(title=f'基准测试服务{i}', provider_id=provider.id, price=100 + i, price_unit='元/次',
+                            duration=60, status='active', description='基准测试') for i in range(20)]
+        db.session.add_all(services)
+        db.session.commit()
+
+        today = datetime.now().date()
+        statuses = ['pending', 'confirmed', 'completed', 'canceled']
+        db.session.add_all([
+            Booking(user_id=user.id, provider_id=provider.id, service_id=services[i % len(services)].id,
+                    date=today + timedelta(days=i % 30), time=f"{9 + i % 8:02d}:00", status=statuses[i % 4])
+            for i in range(bookings)
+        ])
+        db.session.commit()
+
+        user_token = generate_token(user.id, 'user')
+        provider_token = generate_token(provider.id, 'provider')
+        # 时间段通过接口创建，同时写入可用性索引
+        with app.test_client() as client:
+            slots = [{'date': day, 'time': f'{hour:02d}:{minute:02d}'} for hour in range(9, 18) for minute in (0, 30)]
+            client.post('/api/timeslots', json=slots, headers={'Authorization': f'Bearer {provider_token}'})
+        provider_id = provider.id
+        db.session.remove()
+
+    paths = [
+        '/api/services/public',
+        f'/api/provider/{provider_id}/available-timeslots?date={day}',
+        '/api/bookings?limit=20',
+        '/api/bookings/dashboard',
+    ]
+    return paths, user_token
+
+def wait_ready(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f'{base_url}/api/services/public', timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(0.2)
+    return False
+
+def drive(base_url, paths, token, clients, duration):
+    """clients个线程各用一个Session(保持连接)循环请求，返回(请求数, 错误数, 耗时列表)"""
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        session = requests.Session()
+        session.headers['Authorization'] = f'Bearer {token}'
+        own, failed, i = [], 0, index
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = session.get(base_url + paths[i % len(paths)], timeout=30)
+                if response.status_code != 200:
+                    failed += 1
+            except requests.RequestException:
+                failed += 1
+                session = requests.Session()
+                session.headers['Authorization'] = f'Bearer {token}'
+            own.append(time.perf_counter() - started)
+            i += 1
+        latencies.extend(own)
+        errors.append(failed)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies), sum(errors), latencies
+
+def restart_midway(env, delay):
+    """测试进行到一半时加载新代码，完成后再逐个替换worker"""
+    time.sleep(delay)
+    serve = [sys.executable, os.path.join(ROOT, 'serve.py')]
+    subprocess.run(serve + ['reload'], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    subprocess.run(serve + ['restart'], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+
+def run_server(name, command, env, base_url, paths, token, args, during=None):
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(base_url):
+            print(f"{name:<12} 启动失败")
+            return
+        drive(base_url, paths, token, args.clients, 1)  # 预热：建立连接池、加载代码
+        restarting = threading.Thread(target=during) if during else None
+        if restarting:
+            restarting.start()
+        count, errors, latencies = drive(base_url, paths, token, args.clients, args.duration)
+        if restarting:
+            restarting.join()
+        print(f"{name:<12} {count / args.duration:>8.0f} {percentile(latencies, 0.5) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>9.1f} {errors:>6}")
+    finally:
+        # reload后监听端口的是新主进程，按pid文件停止；开发服务器直接结束进程
+        subprocess.run([sys.executable, os.path.join(ROOT, 'serve.py'), 'stop'], cwd=ROOT, env=env,
+                       stdout=subprocess.DEVNULL)
+        process.terminate()
+        process.wait(30)
+
+def main():
+    parser = argparse.ArgumentParser(description='Web服务器基准测试')
+    parser.add_argument('--duration', type=float, default=10, help='每个服务器的测试秒数')
+    parser.add_argument('--clients', type=int, default=16, help='并发客户端线程数')
+    parser.add_argument('--bookings', type=int, default=500, help='生成的预约数')
+    parser.add_argument('--workers', type=int, help='gunicorn worker进程数，默认SERVER_WORKERS')
+    parser.add_argument('--threads', type=int, help='每个worker的线程数，默认SERVER_THREADS')
+    parser.add_argument('--reload', action='store_true', help='gunicorn测试中途执行reload和restart')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    settings = os.path.join(directory, 'settings.py')
+    with open(settings, 'w', encoding='utf-8') as f:
+        f.write(f"SQLALCHEMY_DATABASE_URI = 'sqlite:///{os.path.join(directory, 'bench.db')}'\n"
+                f"SERVER_PIDFILE = '{os.path.join(directory, 'gunicorn.pid')}'\n"
+                "SCHEDULER_ENABLED = False\n")
+    env = dict(os.environ, BOOKING_SETTINGS=settings)
+    os.environ['BOOKING_SETTINGS'] = settings
+    paths, token = seed(create_app(), args.bookings)
+
+    port = free_port()
+    gunicorn = [sys.executable, os.path.join(ROOT, 'serve.py'), '--bind', f'127.0.0.1:{port}']
+    if args.workers:
+        gunicorn += ['--workers', str(args.workers)]
+    if args.threads:
+        gunicorn += ['--threads', str(args.threads)]
+
+    print(f"客户端 {args.clients} 个，每个服务器 {args.duration:.0f} 秒，CPU核数 {os.cpu_count()}")
+    print(f"{'服务器':<12} {'请求/秒':>8} {'p50(ms)':>9} {'p99(ms)':>9} {'错误':>6}")
+    run_server('开发服务器', [sys.executable, '-c', DEV_SERVER.format(port=port)], env,
+               f'http://127.0.0.1:{port}', paths, token, args)
+    during = (lambda: restart_midway(env, args.duration / 2)) if args.reload else None
+    run_server('gunicorn', gunicorn, env, f'http://127.0.0.1:{port}', paths, token, args, during)
+
+if __name__ == '__main__':
+    main()
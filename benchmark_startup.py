@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+启动耗时基准测试脚本
+每次在新的Python进程中测量(冷启动，包含解释器启动)，取多次的中位数：
+- import app: 只导入应用模块，不创建应用
+- worker: create_app()注册全部路由，pre-fork部署时每个worker的启动开销
+- 命令行脚本: create_app(blueprints=())，迁移、检查脚本只访问数据库时的启动开销
+同时输出子进程内导入和创建应用各自的耗时，以及是否有后台线程被启动。
+创建应用不会连接数据库，测试不需要MySQL。
+
+使用方法:
+    python benchmark_startup.py
+    python benchmark_startup.py --repeat 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CASES = [
+    ('import app', 'pass'),
+    ('worker', "create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})"),
+    ('命令行脚本', "create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'}, blueprints=())"),
+]
+
+# 子进程中执行，分别计时导入和创建应用，并列出创建后主线程之外的线程
+CHILD = '''
+import json, threading, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+{code}
+created = time.perf_counter()
+print(json.dumps({{'import': imported - started, 'create': created - imported,
+                  'threads': sorted(t.name for t in threading.enumerate() if t is not threading.main_thread())}}))
+'''
+
+def run_case(code, cwd):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD.format(code=code)], cwd=cwd, check=True,
+                            capture_output=True, text=True).stdout
+    total = time.perf_counter() - started
+    return total, json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--repeat', type=int, default=10, help='每种情况启动的进程数')
+    args = parser.parse_args()
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    run_case('pass', cwd)  # 预热文件系统缓存和字节码
+    print(f"{'情况':<10} {'进程总耗时(ms)':>14} {'导入(ms)':>10} {'创建应用(ms)':>13}  后台线程")
+    for name, code in CASES:
+        totals, imports, creates = [], [], []
+        for _ in range(args.repeat):
+            total, data = run_case(code, cwd)
+            totals.append(total)
+            imports.append(data['import'])
+            creates.append(data['create'])
+        threads = ', '.join(data['threads']) or '无'
+        print(f"{name:<10} {statistics.median(totals) * 1000:>14.0f} {statistics.median(imports) * 1000:>10.0f} "
+              f"{statistics.median(creates) * 1000:>13.0f}  {threads}")
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,13 @@
-import app
+from app import create_app
 import models
 from datetime import datetime
 
+# 只访问数据库，不需要注册路由
+app = create_app(blueprints=())
+
 def check_timeslots():
     print("检查时间段表...")
-    with app.app.app_context():
+    with app.app_context():
         # 查询所有时间段
         slots = models.TimeSlot.query.all()
         print(f"时间段总数: {len(slots)}")
@@ -23,7 +26,7 @@ def check_timeslots():
 
 def create_test_timeslot():
     print("创建测试时间段...")
-    with app.app.app_context():
+    with app.app_context():
         # 获取一个服务提供商
         provider = models.Provider.query.first()
         if not provider:
@@ -5,10 +5,13 @@
 检查时间段数据的脚本
 """
 
-from app import app
+from app import create_app
 from models import TimeSlot
 import datetime
 
+# 只访问数据库，不需要注册路由
+app = create_app(blueprints=())
+
 def main():
     """主函数"""
     print("正在检查时间段数据...")
@@ -1,14 +1,17 @@
-import app
+from app import create_app
 import models
 from datetime import datetime, timedelta
 
+# 只访问数据库，不需要注册路由
+app = create_app(blueprints=())
+
 def check_provider_timeslots(provider_id=None):
     if provider_id:
         print(f"检查服务提供商 {provider_id} 的时间段数据...")
     else:
         print("检查所有服务提供商的时间段数据...")
     
-    with app.app.app_context():
+    with app.app_context():
         # 查询提供商
         if provider_id:
             providers = [models.Provider.query.get(provider_id)]
@@ -66,7 +69,7 @@ def check_provider_timeslots(provider_id=None):
 def list_all_timeslots():
     print("列出数据库中的所有时间段...")
     
-    with app.app.app_context():
+    with app.app_context():
         # 获取所有时间段
         all_slots = models.TimeSlot.query.all()
         print(f"数据库中共有 {len(all_slots)} 个时间段")
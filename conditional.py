@@ -0,0 +1,79 @@
+"""
+HTTP条件请求
+详情接口和轮询频繁的接口用conditional_get装饰：先用版本函数读取响应所依赖数据的版本
+(单个实体的updated_at等列，列表用数量+max(updated_at)之类的聚合)，据此生成ETag；
+请求头If-None-Match与之相同时直接返回304，不执行视图函数、不再查询其余数据、不序列化。
+浏览器对no-cache的响应会自动带上If-None-Match重新验证，前端的fetch不需要修改。
+
+- 版本函数与视图函数接收相同的参数，返回可比较的值(元组)；返回None时(如实体不存在、无权访问)照常执行视图
+- 版本只需覆盖响应中会变化的数据，数据来源应与视图一致(视图读实体缓存时版本也读实体缓存)
+- ETag还包含请求路径和查询参数、视图参数(含user_id)以及HTTP_CACHE_VERSION，响应格式变化时修改该配置
+- 完整响应比原来多一次版本查询；HTTP_CONDITIONAL_ENABLED为False时关闭
+- 没有版本函数时先执行视图，再按响应内容生成ETag，只节省传输，适合本身只有一次查询的接口
+- 只比较ETag，Last-Modified仅供参考：updated_at在MySQL中精度为秒，且部分代码写入的是本地时间
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+# 缓存策略：浏览器可以缓存，但每次使用前都要重新验证(304的响应很小)
+PUBLIC_REVALIDATE = 'public, no-cache'
+PRIVATE_REVALIDATE = 'private, no-cache'
+
+def make_etag(version, view_args):
+    """由版本、请求路径和视图参数生成ETag(不含引号)"""
+    key = repr((current_app.config['HTTP_CACHE_VERSION'], request.full_path, sorted(view_args.items()), version))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:32]
+
+def _last_modified(version):
+    times = [value for value in version if isinstance(value, datetime)]
+    return max(times).replace(tzinfo=timezone.utc) if times else None
+
+def _apply_headers(response, etag, last_modified, cache_control):
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control
+    if cache_control.startswith('private'):
+        # 响应因登录用户而不同
+        response.vary.add('Authorization')
+    return response
+
+def conditional_get(version_func=None, cache_control=PRIVATE_REVALIDATE):
+    """
+    为GET请求添加ETag和Cache-Control，If-None-Match匹配时返回304
+    version_func为版本函数，见模块说明；同一视图还处理其他方法时，其他方法不受影响
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or not current_app.config['HTTP_CONDITIONAL_ENABLED']:
+                return view(*args, **kwargs)
+
+            if version_func is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200:
+                    response.headers['Cache-Control'] = cache_control
+                    response.add_etag(weak=True)
+                    response.make_conditional(request)
+                return response
+
+            version = version_func(*args, **kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+            version = tuple(version)
+            etag = make_etag(version, kwargs)
+            last_modified = _last_modified(version)
+            if request.if_none_match.contains_weak(etag):
+                return _apply_headers(current_app.response_class(status=304), etag, last_modified, cache_control)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                # 版本在视图之前读取，期间数据有变化时下次请求的版本不同，不会把新版本的ETag配给旧数据
+                _apply_headers(response, etag, last_modified, cache_control)
+            return response
+        return wrapper
+    return decorator
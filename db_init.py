@@ -1,8 +1,11 @@
 import os
 import pymysql
-from app import app
+from app import create_app
 from models import db
 
+# 只访问数据库，不需要注册路由
+app = create_app(blueprints=())
+
 def init_database():
     """初始化MySQL数据库"""
     print("开始初始化数据库...")
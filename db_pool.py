@@ -0,0 +1,154 @@
+"""
+数据库连接池配置和指标
+所有数据库访问都通过db.session共享同一个引擎的连接池，池的大小、溢出连接数、连接回收时间和
+取用前检测(pre-ping)由DB_POOL_*配置项设置。SQLite测试库仍使用Flask-SQLAlchemy选择的连接池。
+pool_metrics记录取用连接的次数、等待时间、超时次数和当前借出的连接数。
+db.session使用RoutingSession：请求中设置了g.db_read_bind时查询发往该从库(见db_replicas.py)，写入和加锁读始终使用主库。
+"""
+
+import re
+import threading
+import time
+
+from flask import g, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import event, orm
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.elements import TextClause
+
+class PoolMetrics:
+    """连接池指标，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0  # 从池中取出连接的次数
+            self.checked_out = 0  # 当前借出的连接数
+            self.max_checked_out = 0
+            self.waits = 0  # 通过TimedQueuePool取连接的次数
+            self.wait_total = 0.0  # 等待连接的总秒数
+            self.wait_max = 0.0
+            self.timeouts = 0  # 等待超过pool_timeout的次数
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def on_checkout(self, *args):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def on_checkin(self, *args):
+        with self._lock:
+            self.checked_out -= 1
+
+    def snapshot(self, pool=None):
+        """返回指标字典；传入连接池时附带池的大小和空闲、溢出连接数"""
+        with self._lock:
+            data = {
+                'checkouts': self.checkouts,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'wait_avg_ms': round(self.wait_total / self.waits * 1000, 3) if self.waits else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'timeouts': self.timeouts,
+            }
+        if isinstance(pool, QueuePool):
+            data.update(pool_size=pool.size(), checked_in=pool.checkedin(), overflow=pool.overflow())
+        return data
+
+pool_metrics = PoolMetrics()
+
+class TimedQueuePool(QueuePool):
+    """记录取用连接等待时间的QueuePool，包括池已满时等待其他请求归还连接的时间"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+def pool_options(config):
+    """按DB_POOL_*配置生成create_engine的连接池参数"""
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+# 文本SQL中的加锁读
+LOCKING_READ = re.compile(r'\bFOR\s+(UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b', re.IGNORECASE)
+
+def needs_primary(clause):
+    """
+    INSERT/UPDATE/DELETE语句、SELECT ... FOR UPDATE/FOR SHARE(含with_for_update())、不以SELECT开头或带加锁子句的文本SQL，
+    以及用execution_options(use_primary=True)指定读主库的查询
+    """
+    if isinstance(clause, TextClause):
+        sql = clause.text.lstrip()
+        return sql[:6].upper() != 'SELECT' or bool(LOCKING_READ.search(sql))
+    if hasattr(clause, 'get_execution_options') and clause.get_execution_options().get('use_primary'):
+        return True
+    if getattr(clause, '_for_update_arg', None) is not None:
+        return True
+    return getattr(clause, 'is_dml', False)
+
+class RoutingSession(SignallingSession):
+    """
+    只读请求中的查询使用g.db_read_bind指定的从库；flush、needs_primary的语句和请求之外(定时任务、命令行脚本)使用主库。
+    会话一旦flush或执行过写语句、加锁读，在关闭之前的所有查询都使用主库，不会读到从库上还没有同步的旧数据
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._use_primary = False
+
+    def get_bind(self, mapper=None, clause=None):
+        if has_request_context() and not self._use_primary:
+            if self._flushing or needs_primary(clause):
+                self._use_primary = True
+            else:
+                bind_key = g.get('db_read_bind')
+                if bind_key:
+                    return get_state(self.app).db.get_engine(self.app, bind=bind_key)
+        return super().get_bind(mapper, clause)
+
+    def close(self):
+        super().close()
+        self._use_primary = False
+
+class PooledSQLAlchemy(SQLAlchemy):
+    """为非SQLite数据库应用连接池配置，在每个引擎上注册连接池指标事件，会话使用RoutingSession"""
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        rv = super().apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername.startswith('sqlite'):
+            return rv
+        options.update(pool_options(app.config))
+        return rv
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        event.listen(engine, 'checkout', pool_metrics.on_checkout)
+        event.listen(engine, 'checkin', pool_metrics.on_checkin)
+        return engine
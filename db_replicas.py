@@ -0,0 +1,161 @@
+"""
+读写分离
+只读请求(GET/HEAD)中的查询发往从库，写请求和写语句始终使用主库(路由由db_pool.RoutingSession完成)。
+- 从库是SQLALCHEMY_BINDS中的连接，名称列在DB_REPLICA_BINDS中，多个从库轮流使用
+- 延迟按心跳估算：主库上replica_heartbeat表的时间戳每DB_REPLICA_CHECK_INTERVAL秒更新一次，
+  从库上读到的时间戳比主库早多少即落后多少；落后超过DB_REPLICA_MAX_LAG秒或无法连接的从库暂不使用，
+  所有从库都不可用时读主库
+- 写请求成功后在响应中设置cookie，DB_READ_YOUR_WRITES秒内同一客户端的读请求仍然读主库，
+  刚创建的预约、评价不会因为从库还没同步而查不到；多个worker之间也有效
+没有配置DB_REPLICA_BINDS时只设置写请求的cookie(实体缓存也用它判断)。延迟检查在请求中进行，每个进程每个间隔最多一次，不启动后台线程。
+"""
+
+import itertools
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ReplicaHeartbeat
+
+READ_METHODS = ('GET', 'HEAD')
+RECENT_WRITE_COOKIE = 'db_recent_write'
+HEARTBEAT_ID = 1
+
+def now_ms():
+    return int(time.time() * 1000)
+
+def touch_heartbeat(engine, interval):
+    """距离上次更新超过interval秒时更新主库心跳，返回主库上的时间戳；多个进程同时检查时只有一个写入"""
+    table = ReplicaHeartbeat.__table__
+    now = now_ms()
+    with engine.begin() as connection:
+        connection.execute(
+            update(table)
+            .where(table.c.id == HEARTBEAT_ID, table.c.beat_at <= now - interval * 1000)
+            .values(beat_at=now)
+        )
+        beat_at = connection.execute(select(table.c.beat_at).where(table.c.id == HEARTBEAT_ID)).scalar()
+    if beat_at is None:
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(table).values(id=HEARTBEAT_ID, beat_at=now))
+        except IntegrityError:
+            pass
+        beat_at = now
+    return beat_at
+
+def read_heartbeat(engine):
+    table = ReplicaHeartbeat.__table__
+    with engine.connect() as connection:
+        return connection.execute(select(table.c.beat_at).where(table.c.id == HEARTBEAT_ID)).scalar()
+
+class ReplicaRouter:
+    """记录各从库的延迟并为只读请求选择从库，线程安全；stats为各种路由结果的次数"""
+
+    def __init__(self, binds, max_lag, interval):
+        self.binds = list(binds)
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lags = {bind: None for bind in self.binds}  # 秒，None表示不可用或还没有检查
+        self.errors = {}
+        self.checked_at = 0.0
+        self.stats = {'replica': 0, 'primary_write': 0, 'primary_recent_write': 0, 'primary_lag': 0}
+        self._check_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def check(self, app):
+        """更新主库心跳并读取各从库的心跳，计算延迟；主库心跳失败(如还没有建表)时所有从库都暂不使用"""
+        self.checked_at = time.time()
+        try:
+            primary = touch_heartbeat(db.get_engine(app), self.interval)
+        except Exception as e:
+            self.lags = dict.fromkeys(self.binds)
+            self.errors = {'primary': str(e)}
+            return
+        self.errors.pop('primary', None)
+        for bind in self.binds:
+            try:
+                beat_at = read_heartbeat(db.get_engine(app, bind=bind))
+                self.lags[bind] = None if beat_at is None else max(0.0, (primary - beat_at) / 1000)
+                self.errors.pop(bind, None)
+            except Exception as e:
+                self.lags[bind] = None
+                self.errors[bind] = str(e)
+
+    def maybe_check(self, app):
+        # 只让一个线程检查，其他线程使用上次的结果；主库不可用时请求本身也会失败，不在这里处理
+        if time.time() - self.checked_at < self.interval or not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            if time.time() - self.checked_at >= self.interval:
+                self.check(app)
+        finally:
+            self._check_lock.release()
+
+    def choose(self, app):
+        """返回本次只读请求使用的从库名，没有可用的从库时返回None(读主库)"""
+        self.maybe_check(app)
+        healthy = [bind for bind in self.binds if self.lags[bind] is not None and self.lags[bind] <= self.max_lag]
+        if not healthy:
+            self.count('primary_lag')
+            return None
+        self.count('replica')
+        return healthy[next(self._turn) % len(healthy)]
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            'replicas': {bind: {'lag': self.lags[bind], 'error': self.errors.get(bind)} for bind in self.binds},
+            'primary_error': self.errors.get('primary'),
+            'max_lag': self.max_lag,
+            'checked_at': self.checked_at,
+            'stats': stats,
+        }
+
+def recently_wrote():
+    """当前请求的客户端是否在DB_READ_YOUR_WRITES秒内有过成功的写请求，这期间应读取最新数据"""
+    return has_request_context() and bool(request.cookies.get(RECENT_WRITE_COOKIE))
+
+def get_replica_router(app=None):
+    """应用的从库路由器，没有配置从库时返回None"""
+    return (app or current_app).extensions.get('db_replicas')
+
+def _choose_read_bind():
+    router = get_replica_router()
+    if request.method not in READ_METHODS:
+        router.count('primary_write')
+    elif request.cookies.get(RECENT_WRITE_COOKIE):
+        router.count('primary_recent_write')
+    else:
+        g.db_read_bind = router.choose(current_app._get_current_object())
+
+def _mark_recent_write(response):
+    if request.method not in READ_METHODS and request.method != 'OPTIONS' and response.status_code < 400:
+        response.set_cookie(RECENT_WRITE_COOKIE, '1', max_age=current_app.config['DB_READ_YOUR_WRITES'],
+                            httponly=True, samesite='Lax')
+    return response
+
+def setup_replicas(app):
+    """按DB_REPLICA_BINDS创建从库路由器并注册请求钩子，返回路由器；没有配置从库时返回None"""
+    if app.config['DB_READ_YOUR_WRITES']:
+        # 实体缓存也据此判断是否读取最新数据，没有配置从库时同样标记
+        app.after_request(_mark_recent_write)
+    binds = app.config['DB_REPLICA_BINDS']
+    if not binds:
+        return None
+    missing = [bind for bind in binds if bind not in (app.config.get('SQLALCHEMY_BINDS') or {})]
+    if missing:
+        raise ValueError(f"DB_REPLICA_BINDS中的 {', '.join(missing)} 没有在SQLALCHEMY_BINDS中配置")
+    router = ReplicaRouter(binds, app.config['DB_REPLICA_MAX_LAG'], app.config['DB_REPLICA_CHECK_INTERVAL'])
+    app.extensions['db_replicas'] = router
+    app.before_request(_choose_read_bind)
+    return router
@@ -0,0 +1,353 @@
+"""
+服务和服务商实体缓存
+服务(Service)和服务商(Provider)读多写少，预约、评价、通知、搜索等只读接口通过load_entity/load_entities
+按ID读取，先查缓存，没有时一次IN查询加载并写入缓存。缓存分两层：
+- 进程内LRU：最多ENTITY_CACHE_MAX_ENTRIES条，每条最多使用ENTITY_CACHE_LOCAL_TTL秒
+- 共享层(ENTITY_CACHE_BACKEND = 'sqlite')：本机SQLite文件，多个worker共享，每条最多保留ENTITY_CACHE_TTL秒；
+  每个键有版本号，失效时版本号加一，加载期间键被失效时不写入，避免旧数据覆盖
+缓存的是列值，读取时合并到当前会话(不执行SQL)，得到的实体与查询结果一样可以访问关联关系。
+缓存未命中时从主库加载，不会把从库上的旧数据写入缓存。
+
+失效：会话flush时记下被修改、删除的服务和服务商，事务提交后(after_commit)使其失效；
+直接执行SQL修改这两张表的代码需要调用invalidate_on_commit。写入的进程立即失效进程内缓存和共享层，
+其他worker的进程内缓存最多滞后ENTITY_CACHE_LOCAL_TTL秒。当前会话中已有的实体、本事务中待失效的实体
+以及刚提交过写请求的客户端(见db_replicas.recently_wrote)直接读数据库。
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import attributes, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from db_replicas import recently_wrote
+from models import db, Provider, Service
+from pagination import batch_load_by_id
+
+CACHED_MODELS = (Service, Provider)
+PENDING_KEY = 'entity_cache_pending'  # session.info中本事务待失效的键
+
+def cache_key(model, entity_id):
+    return f'{model.__tablename__}:{entity_id}'
+
+class LocalEntityCache:
+    """进程内LRU缓存，线程安全；invalidations为失效次数，加载期间有失效时不写入"""
+
+    def __init__(self, ttl=5, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.invalidations = 0
+        self._entries = OrderedDict()  # key -> (expires_at, values)
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+        return found
+
+    def set_many(self, items, generation=None):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            if generation is not None and generation != self.invalidations:
+                return
+            for key, values in items.items():
+                self._entries[key] = (expires_at, values)
+                self._entries.move_to_end(key)
+            # 超过上限时淘汰最久未访问的条目
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        with self._lock:
+            self.invalidations += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += 1
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+class SQLiteEntityCache:
+    """
+    基于SQLite文件的共享层，多个进程打开同一文件即可共享，每个线程使用独立连接
+    entity_versions保存每个键的版本号，失效时加一并删除缓存的值；写入时带上加载前读到的版本号，
+    版本号已经变化(加载期间被其他进程失效)的不写入
+    """
+
+    def __init__(self, path, ttl=300):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entity_cache (
+                key TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                value BLOB NOT NULL
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS entity_versions (key TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connect().execute(
+            f"SELECT key, value FROM entity_cache WHERE key IN ({placeholders}) AND expires_at > ?",
+            keys + [time.time()]
+        ).fetchall()
+        return {key: pickle.loads(value) for key, value in rows}
+
+    def versions(self, keys):
+        """加载前读取各键的版本号，没有记录的为0"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connect().execute(
+            f"SELECT key, version FROM entity_versions WHERE key IN ({placeholders})", keys
+        ).fetchall()
+        versions = dict.fromkeys(keys, 0)
+        versions.update(rows)
+        return versions
+
+    def set_many(self, items, versions):
+        expires_at = time.time() + self.ttl
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            for key, values in items.items():
+                conn.execute("""
+                    INSERT OR REPLACE INTO entity_cache (key, version, expires_at, value)
+                    SELECT ?, ?, ?, ?
+                    WHERE COALESCE((SELECT version FROM entity_versions WHERE key = ?), 0) = ?
+                """, (key, versions[key], expires_at, pickle.dumps(values, pickle.HIGHEST_PROTOCOL), key, versions[key]))
+            # 顺便清理过期条目
+            conn.execute("DELETE FROM entity_cache WHERE expires_at <= ?", (time.time(),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def invalidate(self, keys):
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            for key in keys:
+                conn.execute("""
+                    INSERT INTO entity_versions (key, version) VALUES (?, 1)
+                    ON CONFLICT(key) DO UPDATE SET version = version + 1
+                """, (key,))
+                conn.execute("DELETE FROM entity_cache WHERE key = ?", (key,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("BEGIN")
+        conn.execute("UPDATE entity_versions SET version = version + 1")
+        conn.execute("DELETE FROM entity_cache")
+        conn.execute("COMMIT")
+
+class EntityCache:
+    """两层实体缓存，shared为None时只有进程内一层；stats记录各层命中、未命中和失效次数"""
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, delta in deltas.items():
+                self.stats[key] += delta
+
+    def get_many(self, keys):
+        """返回{键: 列值}，进程内没有的再查共享层，共享层命中的写回进程内"""
+        keys = list(keys)
+        found = self.local.get_many(keys)
+        shared_found = {}
+        if self.shared is not None and len(found) < len(keys):
+            shared_found = self.shared.get_many(key for key in keys if key not in found)
+            self.local.set_many(shared_found)
+            found.update(shared_found)
+        self._count(local_hits=len(found) - len(shared_found), shared_hits=len(shared_found),
+                    misses=len(keys) - len(found))
+        return found
+
+    def begin_fill(self, keys):
+        """加载前调用，返回传给fill的标记：进程内的失效计数和共享层的版本号"""
+        versions = self.shared.versions(keys) if self.shared is not None else None
+        return self.local.invalidations, versions
+
+    def fill(self, items, token):
+        generation, versions = token
+        self.local.set_many(items, generation)
+        if self.shared is not None and items:
+            self.shared.set_many(items, versions)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        self.local.invalidate(keys)
+        if self.shared is not None:
+            self.shared.invalidate(keys)
+        self._count(invalidations=len(keys))
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def snapshot(self):
+        with self._stats_lock:
+            data = dict(self.stats)
+        lookups = data['local_hits'] + data['shared_hits'] + data['misses']
+        data['hit_ratio'] = round((data['local_hits'] + data['shared_hits']) / lookups, 4) if lookups else 0.0
+        data['local_entries'] = len(self.local)
+        data['backend'] = 'sqlite' if self.shared is not None else 'memory'
+        return data
+
+def create_entity_cache(config):
+    """根据配置创建缓存：ENTITY_CACHE_BACKEND为memory或sqlite"""
+    backend = config.get('ENTITY_CACHE_BACKEND', 'memory')
+    local = LocalEntityCache(config.get('ENTITY_CACHE_LOCAL_TTL', 5), config.get('ENTITY_CACHE_MAX_ENTRIES', 10000))
+    if backend == 'memory':
+        return EntityCache(local)
+    if backend == 'sqlite':
+        shared = SQLiteEntityCache(config.get('ENTITY_CACHE_SQLITE_PATH', 'data/entity_cache.db'),
+                                   config.get('ENTITY_CACHE_TTL', 300))
+        return EntityCache(local, shared)
+    raise ValueError(f'不支持的实体缓存存储: {backend}')
+
+_entity_cache = None
+_entity_cache_lock = threading.Lock()
+
+def get_entity_cache():
+    """按当前配置懒加载实体缓存，每个进程一个实例；ENTITY_CACHE_ENABLED为False时返回None"""
+    global _entity_cache
+    if not current_app.config.get('ENTITY_CACHE_ENABLED', True):
+        return None
+    if _entity_cache is None:
+        with _entity_cache_lock:
+            if _entity_cache is None:
+                _entity_cache = create_entity_cache(current_app.config)
+    return _entity_cache
+
+def column_values(instance):
+    state = attributes.instance_state(instance)
+    # 延迟加载(deferred)还没有读取的列不缓存，合并后访问时再加载
+    return {prop.key: state.dict[prop.key] for prop in state.mapper.column_attrs if prop.key in state.dict}
+
+def _attach(session, model, values):
+    """用缓存的列值构造实体并合并到会话，不执行SQL"""
+    instance = model.__mapper__.class_manager.new_instance()
+    attributes.instance_dict(instance).update(values)
+    make_transient_to_detached(instance)
+    return session.merge(instance, load=False)
+
+def load_entities(model, ids):
+    """按ID批量读取服务或服务商，返回{id: 实体}，不存在的ID不在结果中"""
+    ids = {entity_id for entity_id in ids if entity_id}
+    if not ids:
+        return {}
+    cache = get_entity_cache()
+    if cache is None or recently_wrote():
+        return batch_load_by_id(model, ids)
+
+    session = db.session()
+    pending = session.info.get(PENDING_KEY, ())
+    found, wanted, direct = {}, {}, []
+    for entity_id in ids:
+        key = cache_key(model, entity_id)
+        instance = session.identity_map.get(identity_key(model, entity_id))
+        if instance is not None and not attributes.instance_state(instance).expired_attributes:
+            # 会话中已加载的实体直接使用；提交后过期的实体用缓存的列值刷新，避免逐个重新查询
+            found[entity_id] = instance
+        elif key in pending:
+            direct.append(entity_id)
+        else:
+            wanted[key] = entity_id
+
+    for key, values in cache.get_many(wanted).items():
+        found[wanted.pop(key)] = _attach(session, model, values)
+
+    missing = list(wanted.values()) + direct
+    if missing:
+        token = cache.begin_fill(wanted)
+        statement = select(model).where(model.id.in_(missing)).execution_options(use_primary=True)
+        loaded = session.execute(statement).scalars().all()
+        found.update((instance.id, instance) for instance in loaded)
+        cache.fill({cache_key(model, i.id): column_values(i) for i in loaded if i.id not in direct}, token)
+    return found
+
+def load_entity(model, entity_id):
+    """按ID读取一个服务或服务商，相当于model.query.get(entity_id)"""
+    return load_entities(model, [entity_id]).get(entity_id)
+
+def invalidate_on_commit(session, model, ids):
+    """直接执行SQL修改服务或服务商后调用，当前事务提交后使这些实体的缓存失效"""
+    session.info.setdefault(PENDING_KEY, set()).update(cache_key(model, entity_id) for entity_id in ids if entity_id)
+
+def _collect_changes(session, flush_context, instances):
+    for instance in session.dirty:
+        if isinstance(instance, CACHED_MODELS) and session.is_modified(instance, include_collections=False):
+            invalidate_on_commit(session, type(instance), [instance.id])
+    for instance in session.deleted:
+        if isinstance(instance, CACHED_MODELS):
+            invalidate_on_commit(session, type(instance), [instance.id])
+
+def _invalidate_after_commit(session):
+    keys = session.info.pop(PENDING_KEY, None)
+    if keys:
+        cache = get_entity_cache()
+        if cache is not None:
+            cache.invalidate(keys)
+
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+def register_entity_cache_listeners(session):
+    """在会话上注册失效缓存的事件"""
+    event.listen(session, 'before_flush', _collect_changes)
+    event.listen(session, 'after_commit', _invalidate_after_commit)
+    event.listen(session, 'after_rollback', _discard_pending)
@@ -0,0 +1,232 @@
+"""
+防重复请求存储
+prevent_duplicate_requests用它按请求哈希保存最近的响应，存储的是序列化后的响应字节而不是响应对象。
+提供两种后端：
+- MemoryIdempotencyStore: 进程内存储，适合单进程开发服务器
+- SQLiteIdempotencyStore: 基于本机SQLite文件(WAL模式)，同一台机器上的多个gunicorn worker共享
+两种后端都有固定TTL和条目数上限(LRU淘汰)，过期清理的均摊开销为O(1)。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import wraps
+
+from flask import current_app, request
+
+from request_logging import logger
+
+def serialize_response(response):
+    """将Flask响应序列化为字节：一行JSON格式的状态码和响应头，后接响应体"""
+    meta = {
+        'status': response.status_code,
+        'headers': [[name, value] for name, value in response.headers.items() if name.lower() != 'content-length']
+    }
+    return json.dumps(meta).encode('utf-8') + b'\n' + response.get_data()
+
+def deserialize_response(data):
+    """从字节还原(响应体, 状态码, 响应头)，可直接作为Flask视图的返回值"""
+    meta, body = data.split(b'\n', 1)
+    meta = json.loads(meta)
+    return body, meta['status'], meta['headers']
+
+class MemoryIdempotencyStore:
+    """
+    进程内存储，线程安全
+    entries按访问顺序排列用于LRU淘汰；TTL固定，写入顺序即过期顺序，
+    expiry队列只需从头部弹出过期的键
+    """
+
+    def __init__(self, ttl=5, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._expiry = deque()  # (expires_at, key)，按写入时间排列
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = self._expiry.popleft()
+            entry = self._entries.get(key)
+            # 键被重新写入过时，队列中的旧记录直接丢弃
+            if entry and entry[0] == expires_at:
+                del self._entries[key]
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._expire(now)
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            self._expiry.append((expires_at, key))
+            # 超过上限时淘汰最久未访问的条目
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.time())
+            return len(self._entries)
+
+class SQLiteIdempotencyStore:
+    """
+    基于SQLite文件的共享存储，多个进程打开同一文件即可共享
+    每个线程使用独立连接；过期条目按expires_at索引范围删除，
+    每秒最多清理一次，条目数每隔一段写入检查一次上限
+    """
+
+    CAPACITY_CHECK_INTERVAL = 100
+
+    def __init__(self, path, ttl=5, max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._last_expire = 0
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency (
+                    key TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    value BLOB NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_idempotency_expires ON idempotency (expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_idempotency_accessed ON idempotency (accessed_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expire(self, conn, now):
+        if now - self._last_expire < 1:
+            return
+        self._last_expire = now
+        conn.execute("DELETE FROM idempotency WHERE expires_at <= ?", (now,))
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value FROM idempotency WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE idempotency SET accessed_at = ? WHERE key = ?", (now, key))
+        return bytes(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO idempotency (key, expires_at, accessed_at, value) VALUES (?, ?, ?, ?)",
+            (key, now + self.ttl, now, sqlite3.Binary(value))
+        )
+        self._expire(conn, now)
+        self._writes += 1
+        if self._writes % self.CAPACITY_CHECK_INTERVAL == 0:
+            self._enforce_capacity(conn)
+
+    def _enforce_capacity(self, conn):
+        """超过上限时删除最久未访问的条目"""
+        (count,) = conn.execute("SELECT COUNT(*) FROM idempotency").fetchone()
+        if count > self.max_entries:
+            conn.execute("""
+                DELETE FROM idempotency WHERE key IN (
+                    SELECT key FROM idempotency ORDER BY accessed_at LIMIT ?
+                )
+            """, (count - self.max_entries,))
+
+    def __len__(self):
+        conn = self._connect()
+        (count,) = conn.execute(
+            "SELECT COUNT(*) FROM idempotency WHERE expires_at > ?", (time.time(),)
+        ).fetchone()
+        return count
+
+def create_idempotency_store(config):
+    """根据配置创建存储：IDEMPOTENCY_BACKEND为memory或sqlite"""
+    backend = config.get('IDEMPOTENCY_BACKEND', 'memory')
+    ttl = config.get('IDEMPOTENCY_TTL', 5)
+    max_entries = config.get('IDEMPOTENCY_MAX_ENTRIES', 10000)
+    if backend == 'memory':
+        return MemoryIdempotencyStore(ttl, max_entries)
+    if backend == 'sqlite':
+        return SQLiteIdempotencyStore(config.get('IDEMPOTENCY_SQLITE_PATH', 'data/idempotency.db'), ttl, max_entries)
+    raise ValueError(f'不支持的防重复请求存储: {backend}')
+
+_idempotency_store = None
+_idempotency_store_lock = threading.Lock()
+
+def get_idempotency_store():
+    """按当前配置懒加载防重复请求存储，每个进程一个实例"""
+    global _idempotency_store
+    if _idempotency_store is None:
+        with _idempotency_store_lock:
+            if _idempotency_store is None:
+                _idempotency_store = create_idempotency_store(current_app.config)
+    return _idempotency_store
+
+# 请求防重复装饰器
+def prevent_duplicate_requests(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # 获取请求特征值
+        request_method = request.method
+        request_path = request.path
+        auth_header = request.headers.get('Authorization', '')
+        
+        # 根据请求类型不同获取数据特征
+        request_data = {}
+        try:
+            if request_method in ['POST', 'PUT'] and request.is_json:
+                request_data = request.get_json() or {}
+        except Exception as e:
+            logger.error("解析请求数据失败: %s, 继续处理...", e)
+        
+        # 计算请求唯一标识
+        data_str = json.dumps(request_data, sort_keys=True) if request_data else ""
+        request_hash = hashlib.md5(f"{auth_header}:{request_path}:{request_method}:{data_str}".encode()).hexdigest()
+        
+        # 检查是否是重复请求
+        store = get_idempotency_store()
+        cached = store.get(request_hash)
+        if cached is not None:
+            logger.warning("检测到重复请求: %s %s，返回缓存响应", request_method, request_path)
+            return deserialize_response(cached)
+        
+        # 执行原始请求
+        response = current_app.make_response(func(*args, **kwargs))
+        
+        # 缓存序列化后的响应，流式响应不缓存
+        if not response.is_streamed:
+            store.set(request_hash, serialize_response(response))
+            
+        return response
+    
+    return wrapper
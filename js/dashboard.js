@@ -36,12 +36,18 @@ const lunarData = {
 const holidayData = ['2025-06-01', '2025-06-02'];
 
 // 全局变量，存储预约数据
-let allBookings = [];
+let allBookings = []; // 日历当月的待确认和已确认预约
 let pendingBookings = [];
 let upcomingBookings = [];
 let bookingStats = { pending: 0, upcoming: 0, completed: 0, canceled: 0 };
+let bookingCounts = null; // 仪表盘接口返回的各分组总数，列表只包含已加载的预约
+let sectionCursors = {}; // 各分组下一页的游标，点击"加载更多"时使用
+let firstPageBookings = []; // 仪表盘接口返回的第一页，轮询时与新的第一页比较
 let userInfo = {};
 
+// 点击"加载更多"时每次获取的预约数量
+const DASHBOARD_MORE_LIMIT = 20;
+
 // 添加轮询监控预约状态变化的功能
 let pollingInterval = null;
 const POLLING_INTERVAL_MS = 5000; // 5秒钟轮询一次
@@ -64,24 +70,22 @@ function startBookingStatusMonitor() {
             const dashboardData = await fetchDashboardBookings();
             const newPendingBookings = dashboardData.pending || [];
             const newUpcomingBookings = dashboardData.upcoming || [];
-            const newAllBookings = [...newPendingBookings, ...newUpcomingBookings];
             
-            // 检查是否有变化
-            const hasChanges = checkBookingsChanges(
-                [...pendingBookings, ...upcomingBookings], 
-                newAllBookings
-            );
+            // 检查是否有变化：各分组总数或第一页的预约
+            const hasChanges = JSON.stringify(dashboardData.counts || null) !== JSON.stringify(bookingCounts) ||
+                checkBookingsChanges(
+                    firstPageBookings, 
+                    [...newPendingBookings, ...newUpcomingBookings]
+                );
             
-            // 如果有变化，更新UI
+            // 如果有变化，更新UI（列表回到第一页）
             if (hasChanges) {
                 console.log('检测到预约状态变化，更新UI');
-                pendingBookings = newPendingBookings;
-                upcomingBookings = newUpcomingBookings;
-                allBookings = newAllBookings;
+                applyDashboardData(dashboardData);
                 
                 // 更新UI
-                generateCalendar(allBookings);
                 renderDashboardBookings();
+                await refreshCalendar();
                 
                 // 更新统计数据
                 const statsData = await fetchBookingStats();
@@ -102,13 +106,11 @@ function startBookingStatusMonitor() {
             console.log('页面可见，恢复轮询');
             // 立即执行一次轮询
             fetchDashboardBookings().then(dashboardData => {
-                pendingBookings = dashboardData.pending || [];
-                upcomingBookings = dashboardData.upcoming || [];
-                allBookings = [...pendingBookings, ...upcomingBookings];
+                applyDashboardData(dashboardData);
                 
                 // 更新UI
-                generateCalendar(allBookings);
                 renderDashboardBookings();
+                return refreshCalendar();
             }).catch(error => {
                 console.error('恢复轮询时出错:', error);
             });
@@ -177,16 +179,14 @@ document.addEventListener('DOMContentLoaded', async function() {
         const dashboardData = await fetchDashboardBookings();
         
         // 更新全局变量
-        pendingBookings = dashboardData.pending || [];
-        upcomingBookings = dashboardData.upcoming || [];
-        allBookings = [...pendingBookings, ...upcomingBookings];
-        
-        // 生成日历
-        generateCalendar(allBookings);
+        applyDashboardData(dashboardData);
         
         // 渲染预约列表
         renderDashboardBookings();
         
+        // 生成日历，日历中的预约按当月日期窗口单独获取
+        await refreshCalendar();
+        
         // 启动预约状态监控
         startBookingStatusMonitor();
     } catch (error) {
@@ -349,6 +349,80 @@ async function fetchDashboardBookings() {
     }
 }
 
+// 用仪表盘数据更新全局变量：每个分组只保存第一页，其余的由"加载更多"按游标获取
+function applyDashboardData(dashboardData) {
+    pendingBookings = dashboardData.pending || [];
+    upcomingBookings = dashboardData.upcoming || [];
+    bookingCounts = dashboardData.counts || null;
+    sectionCursors = dashboardData.next_cursors || {};
+    firstPageBookings = [...pendingBookings, ...upcomingBookings];
+}
+
+// 获取分组的下一页预约，追加到列表中
+async function loadMoreSectionBookings(section) {
+    const cursor = sectionCursors[section];
+    const token = localStorage.getItem('token');
+    if (!cursor || !token) return;
+    
+    const response = await fetch(`/api/bookings/dashboard?section=${section}&limit=${DASHBOARD_MORE_LIMIT}&cursor=${encodeURIComponent(cursor)}`, {
+        method: 'GET',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${token}`
+        }
+    });
+    
+    if (!response.ok) {
+        throw new Error(`API请求失败: ${response.status}`);
+    }
+    
+    const page = await response.json();
+    const more = page[section] || [];
+    if (section === 'pending') {
+        pendingBookings = [...pendingBookings, ...more];
+    } else {
+        upcomingBookings = [...upcomingBookings, ...more];
+    }
+    sectionCursors[section] = page.next_cursors ? page.next_cursors[section] : null;
+}
+
+// 获取日历当月的预约：日历接口按日期窗口返回，不需要翻页取完各分组
+async function fetchCalendarBookings() {
+    const token = localStorage.getItem('token');
+    if (!token) return [];
+    
+    // 日历显示当前月份，以今天为参考日期取整月的窗口
+    const today = getCurrentDate();
+    const dateStr = `${today.getFullYear()}-${(today.getMonth() + 1).toString().padStart(2, '0')}-${today.getDate().toString().padStart(2, '0')}`;
+    const response = await fetch(`/api/bookings/calendar?view=month&date=${dateStr}`, {
+        method: 'GET',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${token}`
+        }
+    });
+    
+    if (!response.ok) {
+        throw new Error(`API请求失败: ${response.status}`);
+    }
+    
+    // 接口按日期分组返回，日历只标记待确认和已确认的预约
+    const bookingsByDate = await response.json();
+    return Object.values(bookingsByDate).flat()
+        .filter(booking => booking.status === 'pending' || booking.status === 'confirmed');
+}
+
+// 重新获取当月预约并生成日历，获取失败时只标记列表中已加载的预约
+async function refreshCalendar() {
+    try {
+        allBookings = await fetchCalendarBookings();
+    } catch (error) {
+        console.error('获取日历预约失败，日历只显示已加载的预约:', error);
+        allBookings = [...pendingBookings, ...upcomingBookings];
+    }
+    generateCalendar(allBookings);
+}
+
 // 更新预约统计信息
 function updateBookingStats() {
     // 使用从API获取的统计数据更新UI
@@ -463,6 +537,29 @@ function renderDashboardBookings() {
     
     // 渲染即将到来的预约
     renderUpcomingBookings();
+    
+    // 分组标题显示总数
+    updateSectionCounts();
+}
+
+// 分组标题显示接口返回的总数，总数多于列表中的预约时注明已加载的数量
+function updateSectionCounts() {
+    if (!bookingCounts) return;
+    
+    const sections = [
+        { containerId: 'pendingBookings', section: 'pending', shown: pendingBookings, label: '待确认的预约' },
+        { containerId: 'upcomingBookings', section: 'upcoming', shown: upcomingBookings, label: '即将到来的预约' }
+    ];
+    sections.forEach(({ containerId, section, shown, label }) => {
+        const container = document.getElementById(containerId);
+        const title = container && container.parentElement.querySelector('.subsection-title');
+        if (!title) return;
+        
+        const total = bookingCounts[section] || 0;
+        title.textContent = total > shown.length
+            ? `${label} (${total}，已显示${shown.length}条)`
+            : `${label} (${total})`;
+    });
 }
 
 // 渲染待确认的预约
@@ -491,6 +588,8 @@ function renderPendingBookings() {
         const bookingItem = createBookingItem(booking);
         pendingContainer.appendChild(bookingItem);
     });
+    
+    appendLoadMoreButton(pendingContainer, 'pending', renderPendingBookings);
 }
 
 // 渲染即将到来的预约
@@ -519,6 +618,32 @@ function renderUpcomingBookings() {
         const bookingItem = createBookingItem(booking);
         upcomingContainer.appendChild(bookingItem);
     });
+    
+    appendLoadMoreButton(upcomingContainer, 'upcoming', renderUpcomingBookings);
+}
+
+// 分组还有下一页时在列表末尾添加"加载更多"按钮，每次点击只获取一页
+function appendLoadMoreButton(container, section, render) {
+    if (!sectionCursors[section]) return;
+    
+    const button = document.createElement('button');
+    button.className = 'load-more-btn';
+    button.textContent = '加载更多';
+    button.addEventListener('click', async () => {
+        button.disabled = true;
+        button.textContent = '加载中...';
+        try {
+            await loadMoreSectionBookings(section);
+            render();
+            updateSectionCounts();
+        } catch (error) {
+            console.error('加载更多预约失败:', error);
+            showError('加载更多预约失败，请稍后重试');
+            button.disabled = false;
+            button.textContent = '加载更多';
+        }
+    });
+    container.appendChild(button);
 }
 
 // 创建预约项
@@ -864,13 +989,11 @@ async function cancelBooking(bookingId) {
         updateBookingStats();
         
         const dashboardData = await fetchDashboardBookings();
-        pendingBookings = dashboardData.pending || [];
-        upcomingBookings = dashboardData.upcoming || [];
-        allBookings = [...pendingBookings, ...upcomingBookings];
+        applyDashboardData(dashboardData);
         
                 // 更新UI
-        generateCalendar(allBookings);
         renderDashboardBookings();
+        await refreshCalendar();
         
         // 显示成功消息
                 showSuccessMessage('预约已成功取消');
@@ -59,7 +59,8 @@ class NotificationManager {
             
             // 从API获取通知
             const token = localStorage.getItem('token');
-            const response = await fetch('/api/user/notifications', {
+            // 下拉菜单只显示最新的几条，只请求第一页
+            const response = await fetch('/api/user/notifications?limit=20', {
                 headers: {
                     'Authorization': `Bearer ${token}`
                 }
@@ -73,7 +74,19 @@ class NotificationManager {
             
             if (Array.isArray(data)) {
                 this.notifications = data;
-                this.unreadCount = data.filter(notif => !notif.is_read).length;
+            }
+            
+            // 未读数由服务端计数，不依赖已加载的通知条数
+            const countResponse = await fetch('/api/user/notifications/unread-count', {
+                headers: {
+                    'Authorization': `Bearer ${token}`
+                }
+            });
+            if (countResponse.ok) {
+                const countData = await countResponse.json();
+                this.unreadCount = countData.unread_count;
+            } else {
+                this.unreadCount = this.notifications.filter(notif => !notif.is_read).length;
             }
         } catch (error) {
             console.error('加载通知失败:', error);
@@ -203,9 +203,8 @@ async function updateBookingStats(stats) {
     // 更新顶部导航栏中的通知数字
     const notificationBadge = document.querySelector('.notification-btn .badge');
     if (notificationBadge) {
-        // 计算未读通知数量
-        const notifications = await fetchNotifications();
-        const unreadCount = notifications.filter(notif => !notif.is_read).length;
+        // 未读数由服务端计数，通知列表只返回第一页
+        const unreadCount = await fetchUnreadCount();
         
         notificationBadge.textContent = unreadCount;
         
@@ -230,7 +229,8 @@ async function fetchNotifications() {
             return [];
         }
         
-        const response = await fetch('/api/user/notifications', {
+        // 通知列表分页返回，这里只显示最新的一页
+        const response = await fetch('/api/user/notifications?limit=50', {
             headers: {
                 'Authorization': `Bearer ${token}`
             }
@@ -248,6 +248,35 @@ async function fetchNotifications() {
     }
 }
 
+/**
+ * 获取未读通知数量
+ * @returns {number} 未读通知数量
+ */
+async function fetchUnreadCount() {
+    try {
+        const token = localStorage.getItem('token');
+        if (!token) {
+            return 0;
+        }
+        
+        const response = await fetch('/api/user/notifications/unread-count', {
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+        
+        if (!response.ok) {
+            throw new Error(`获取未读通知数量失败: ${response.status}`);
+        }
+        
+        const data = await response.json();
+        return data.unread_count || 0;
+    } catch (error) {
+        console.error('获取未读通知数量失败:', error);
+        return 0;
+    }
+}
+
 /**
  * 更新通知计数
  * @param {Array} notifications 通知列表
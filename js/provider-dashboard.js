@@ -8,6 +8,7 @@ class ProviderDashboard {
         this.currentFilter = 'all';
         this.selectedDate = new Date();
         this.calendarNavBound = false; // 防止日历按钮重复绑定
+        this.sectionCursors = {}; // 各分组下一页的游标，点击"加载更多"时使用
         
         // DOM元素
         this.viewButtons = document.querySelectorAll('.view-btn');
@@ -201,6 +202,9 @@ class ProviderDashboard {
             const data = await response.json();
             console.log('成功从数据库获取到预约数据:', data);
             
+            // 每个分组只返回第一页，其余的由"加载更多"按钮按游标获取；日历视图按日期窗口单独获取
+            this.sectionCursors = data.next_cursors || {};
+            
             // 使用预约数据渲染不同视图
             if (this.currentView === 'calendar') {
                 // 日历视图
@@ -239,6 +243,68 @@ class ProviderDashboard {
         this.testLoadServices();
     }
     
+    /**
+     * 获取分组的下一页预约并追加到列表中，每次点击只请求一页
+     */
+    async loadMoreSection(section) {
+        const cursor = this.sectionCursors[section];
+        const token = localStorage.getItem('token');
+        if (!cursor || !token) return;
+        
+        const response = await fetch(`/api/bookings/dashboard?section=${section}&limit=20&cursor=${encodeURIComponent(cursor)}`, {
+            method: 'GET',
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+        
+        if (!response.ok) {
+            throw new Error(`获取预约数据失败: ${response.status}`);
+        }
+        
+        const page = await response.json();
+        (page[section] || []).forEach(booking => {
+            this.bookingList.appendChild(this.createBookingItem(booking));
+        });
+        this.sectionCursors[section] = page.next_cursors ? page.next_cursors[section] : null;
+        
+        this.renderLoadMoreButtons();
+        this.filterBookings(this.currentFilter);
+    }
+    
+    /**
+     * 在列表末尾为还有下一页的分组添加"加载更多"按钮
+     */
+    renderLoadMoreButtons() {
+        this.bookingList.querySelectorAll('.load-more-container').forEach(el => el.remove());
+        
+        const labels = { pending: '待确认', upcoming: '即将到来', completed: '已完成' };
+        Object.keys(this.sectionCursors).forEach(section => {
+            if (!this.sectionCursors[section]) return;
+            
+            const container = document.createElement('div');
+            container.className = 'load-more-container';
+            container.dataset.section = section;
+            container.style.cssText = 'grid-column: 1/-1; text-align: center; padding: 10px 0;';
+            container.innerHTML = `
+                <button class="btn-load-more" style="padding: 8px 16px;">加载更多${labels[section] || ''}预约</button>
+            `;
+            const button = container.querySelector('.btn-load-more');
+            button.addEventListener('click', async () => {
+                button.disabled = true;
+                button.textContent = '加载中...';
+                try {
+                    await this.loadMoreSection(section);
+                } catch (error) {
+                    console.error('加载更多预约失败:', error);
+                    button.disabled = false;
+                    button.textContent = `加载更多${labels[section] || ''}预约`;
+                }
+            });
+            this.bookingList.appendChild(container);
+        });
+    }
+    
     /**
      * 测试从MySQL数据库加载服务数据
      */
@@ -320,6 +386,8 @@ class ProviderDashboard {
             const bookingItem = this.createBookingItem(booking);
             this.bookingList.appendChild(bookingItem);
         });
+        
+        this.renderLoadMoreButtons();
     }
     
     /**
@@ -526,6 +594,11 @@ class ProviderDashboard {
                 item.style.display = 'none';
             }
         });
+        
+        // 加载更多按钮只在全部或对应分组的筛选下显示
+        this.bookingList.querySelectorAll('.load-more-container').forEach(container => {
+            container.style.display = (status === 'all' || status === container.dataset.section) ? 'block' : 'none';
+        });
     }
     
     /**
@@ -104,7 +104,7 @@ async function loadSearchResults(query, category, sortBy) {
                 if (loadMoreBtn) {
                     if (data.has_more) {
                         loadMoreBtn.style.display = 'inline-block';
-                        loadMoreBtn.setAttribute('data-offset', data.offset + data.services.length);
+                        loadMoreBtn.setAttribute('data-cursor', data.next_cursor);
                     } else {
                         loadMoreBtn.style.display = 'none';
                     }
@@ -537,8 +537,8 @@ function setupLoadMoreButton() {
         const category = urlParams.get('category') || '';
         const sortBy = urlParams.get('sort_by') || '';
         
-        // 获取当前偏移量
-        const offset = parseInt(this.getAttribute('data-offset') || '0');
+        // 获取上一页返回的分页游标
+        const cursor = this.getAttribute('data-cursor') || '';
         
         // 显示加载状态
         this.disabled = true;
@@ -550,7 +550,7 @@ function setupLoadMoreButton() {
             if (query) params.append('query', query);
             if (category && category !== '全部') params.append('category', category);
             if (sortBy) params.append('sort_by', sortBy);
-            params.append('offset', offset);
+            if (cursor) params.append('cursor', cursor);
             
             // 从API获取更多结果
             const response = await fetch(`/api/services/public?${params.toString()}`, {
@@ -574,7 +574,7 @@ function setupLoadMoreButton() {
                 if (data.has_more) {
                     this.disabled = false;
                     this.innerHTML = '加载更多';
-                    this.setAttribute('data-offset', offset + data.services.length);
+                    this.setAttribute('data-cursor', data.next_cursor);
                 } else {
                     this.style.display = 'none';
                 }
@@ -238,19 +238,18 @@ async function updateNotificationBadgeUI() {
             let unreadCount = 0;
             
             try {
-                // 从API获取通知
+                // 从API获取未读通知数量
                 const token = localStorage.getItem('token');
                 if (token) {
-                    const response = await fetch('/api/user/notifications', {
+                    const response = await fetch('/api/user/notifications/unread-count', {
                         headers: {
                             'Authorization': `Bearer ${token}`
                         }
                     });
                     
                     if (response.ok) {
-                        const notifications = await response.json();
-                        // 计算未读通知数量
-                        unreadCount = notifications.filter(notif => !notif.is_read).length;
+                        const data = await response.json();
+                        unreadCount = data.unread_count;
                         console.log('未读通知数量:', unreadCount);
                     }
                 }
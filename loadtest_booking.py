@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+热门时间段并发预约压力测试脚本
+注册一个服务商和若干用户，对同一个时间段同时发起大量预约请求，
+检查只有一个请求成功(201)，其余请求都被快速拒绝(409)，并统计响应时间。
+
+使用方法:
+    python loadtest_booking.py
+    python loadtest_booking.py --requests 5000 --concurrency 200 --url http://localhost:5000
+"""
+
+import argparse
+import sys
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def register_and_login(base_url, user_type):
+    """注册并登录一个账号，返回令牌"""
+    suffix = uuid.uuid4().hex[:10]
+    register_data = {
+        "username": f"{user_type}_{suffix}",
+        "email": f"{user_type}_{suffix}@example.com",
+        "password": "password123",
+        "confirm_password": "password123",
+        "userType": user_type
+    }
+    if user_type == "provider":
+        register_data["business_name"] = f"压测服务商_{suffix}"
+
+    response = requests.post(f"{base_url}/api/register", json=register_data, timeout=10)
+    assert response.status_code == 201, f"注册失败: {response.status_code} {response.text[:200]}"
+
+    response = requests.post(f"{base_url}/api/login", json={
+        "email": register_data["email"],
+        "password": "password123"
+    }, timeout=10)
+    assert response.status_code == 200, f"登录失败: {response.status_code} {response.text[:200]}"
+    return response.json()["token"]
+
+def prepare_hot_slot(base_url, user_count):
+    """创建服务和时间段，返回(服务ID, 日期, 时间, 用户令牌列表)"""
+    provider_token = register_and_login(base_url, "provider")
+    headers = {"Authorization": f"Bearer {provider_token}"}
+
+    response = requests.post(f"{base_url}/api/services", json={
+        "title": f"压测服务-{uuid.uuid4().hex[:6]}",
+        "description": "并发预约压测",
+        "price": 100,
+        "duration": 60,
+        "categories": ["测试类别"],
+        "status": "active"
+    }, headers=headers, timeout=10)
+    assert response.status_code == 201, f"创建服务失败: {response.status_code} {response.text[:200]}"
+    service_id = response.json()["service"]["id"]
+
+    date = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
+    response = requests.put(f"{base_url}/api/timeslots/batch", json={
+        "timeslots": [{"date": date, "time": "10:00"}],
+        "is_available": True
+    }, headers=headers, timeout=10)
+    assert response.status_code == 200, f"创建时间段失败: {response.status_code} {response.text[:200]}"
+
+    user_tokens = [register_and_login(base_url, "user") for _ in range(user_count)]
+    return service_id, date, "10:00", user_tokens
+
+def attempt_booking(base_url, token, service_id, date, slot_time):
+    """发起一次预约请求，返回(状态码, 耗时毫秒)"""
+    started = time.perf_counter()
+    try:
+        response = requests.post(f"{base_url}/api/bookings", json={
+            "service_id": service_id,
+            "date": date,
+            "time": slot_time
+        }, headers={
+            "Authorization": f"Bearer {token}",
+            "Idempotency-Key": uuid.uuid4().hex
+        }, timeout=30)
+        status = response.status_code
+    except requests.RequestException:
+        status = 'error'
+    return status, (time.perf_counter() - started) * 1000
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0
+
+def main():
+    parser = argparse.ArgumentParser(description='热门时间段并发预约压力测试')
+    parser.add_argument('--url', default='http://localhost:5000', help='服务器地址')
+    parser.add_argument('--requests', type=int, default=2000, help='预约请求总数')
+    parser.add_argument('--concurrency', type=int, default=100, help='并发线程数')
+    parser.add_argument('--users', type=int, default=20, help='参与抢占的用户数')
+    args = parser.parse_args()
+
+    print_colored("准备测试数据...", Colors.BLUE)
+    service_id, date, slot_time, user_tokens = prepare_hot_slot(args.url, args.users)
+
+    print_colored(f"对 {date} {slot_time} 发起 {args.requests} 次并发预约(并发数 {args.concurrency})...", Colors.BLUE)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(
+            lambda i: attempt_booking(args.url, user_tokens[i % len(user_tokens)], service_id, date, slot_time),
+            range(args.requests)
+        ))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(status for status, _ in results)
+    rejected = [ms for status, ms in results if status == 409]
+    print(f"总耗时: {elapsed:.2f}s, 吞吐量: {args.requests / elapsed:.0f} 请求/秒")
+    print(f"状态码分布: {dict(statuses)}")
+    print(f"409响应时间: p50 {percentile(rejected, 0.5):.1f}ms, p99 {percentile(rejected, 0.99):.1f}ms")
+
+    if statuses.get(201) == 1 and statuses.get(409) == args.requests - 1:
+        print_colored("✓ 只有一个预约成功，其余请求均返回409", Colors.GREEN)
+        return True
+    print_colored("✗ 并发预约结果不符合预期", Colors.RED)
+    return False
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
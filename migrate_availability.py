@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+服务商可用性索引迁移脚本
+此脚本创建provider_availability表，并根据已有的时间段和预约重建可用性索引。
+可重复执行，也可以在索引与数据不一致时用于对账重建。
+"""
+
+import sys
+from datetime import datetime
+
+from app import create_app
+from models import db, ProviderAvailability
+from availability import rebuild_all_availability
+
+# 只访问数据库，不需要注册路由
+app = create_app(blueprints=())
+
+def migrate_availability():
+    """创建可用性索引表并回填数据"""
+    print(f"[{datetime.now()}] 开始迁移可用性索引...")
+
+    try:
+        with app.app_context():
+            # 只创建缺失的表，已有的表不受影响
+            ProviderAvailability.__table__.create(db.engine, checkfirst=True)
+            print(f"[{datetime.now()}] provider_availability表已就绪")
+
+            day_count = rebuild_all_availability(db.session)
+            db.session.commit()
+            print(f"[{datetime.now()}] 可用性索引重建成功，共 {day_count} 个(服务商, 日期)")
+            return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 迁移失败: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    print(f"[{datetime.now()}] 开始执行可用性索引迁移脚本")
+
+    if migrate_availability():
+        print(f"[{datetime.now()}] 可用性索引迁移脚本执行完成")
+    else:
+        print(f"[{datetime.now()}] 可用性索引迁移脚本执行失败")
+        sys.exit(1)
@@ -2,7 +2,10 @@ import json
 import os
 from datetime import datetime
 from models import db, User, Provider, Service, Booking, Review, Notification, TimeSlot, Address, Favorite
-from app import app
+from app import create_app
+
+# 只访问数据库，不需要注册路由
+app = create_app(blueprints=())
 
 # 数据文件路径
 DATA_DIR = 'data'
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+热点查询索引数据库迁移脚本
+此脚本为预约、时间段、通知、评价、收藏表添加复合索引，
+并为时间段表添加(provider_id, date, time)唯一约束。
+服务表的价格、评分排序索引使用COALESCE表达式(需要MySQL 8.0.13及以上)，替换旧的普通列索引。
+索引使用 ALGORITHM=INPLACE, LOCK=NONE 在线创建，可重复执行。
+"""
+
+import pymysql
+import pymysql.cursors
+import sys
+from datetime import datetime
+
+# 数据库连接配置
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',
+    'db': 'service_booking',
+    'charset': 'utf8mb4',
+    'cursorclass': pymysql.cursors.DictCursor
+}
+
+# 需要创建的索引：(表名, 索引名, 字段列表, 是否唯一)，与models.py中的声明保持一致
+# 以括号开头的字段是表达式，原样写入索引定义
+INDEXES = [
+    ('bookings', 'ix_bookings_provider_date_status', ['provider_id', 'date', 'status'], False),
+    ('bookings', 'ix_bookings_user_status_date', ['user_id', 'status', 'date', 'time'], False),
+    ('bookings', 'ix_bookings_status_date_time', ['status', 'date', 'time'], False),
+    ('timeslots', 'uq_timeslots_provider_date_time', ['provider_id', 'date', 'time'], True),
+    ('notifications', 'ix_notifications_user_created', ['user_id', 'created_at'], False),
+    ('reviews', 'ix_reviews_service_created', ['service_id', 'created_at'], False),
+    ('reviews', 'ix_reviews_provider_created', ['provider_id', 'created_at'], False),
+    ('reviews', 'ix_reviews_booking_id', ['booking_id'], False),
+    ('favorites', 'ix_favorites_user_service', ['user_id', 'service_id'], False),
+    ('services', 'ix_services_status_created', ['status', 'created_at', 'id'], False),
+    ('services', 'ix_services_status_price_value', ['status', '(COALESCE(`price`, 0))', 'id'], False),
+    ('services', 'ix_services_status_rating_value', ['status', '(COALESCE(`rating`, 0))', 'id'], False),
+]
+
+# 已被上面的索引取代、需要删除的索引：(表名, 索引名)
+OBSOLETE_INDEXES = [
+    ('services', 'ix_services_status_price'),
+    ('services', 'ix_services_status_rating'),
+]
+
+def index_exists(cursor, table, index_name):
+    """检查表上是否已存在指定名称的索引"""
+    cursor.execute(f"SHOW INDEX FROM `{table}` WHERE Key_name = %s", (index_name,))
+    return cursor.fetchone() is not None
+
+def remove_duplicate_timeslots(cursor):
+    """删除重复的时间段，每个(provider_id, date, time)只保留最近更新的一条"""
+    cursor.execute("""
+        DELETE t1 FROM timeslots t1
+        JOIN timeslots t2
+          ON t1.provider_id = t2.provider_id
+         AND t1.date = t2.date
+         AND t1.time = t2.time
+         AND (COALESCE(t1.updated_at, t1.created_at) < COALESCE(t2.updated_at, t2.created_at)
+              OR (COALESCE(t1.updated_at, t1.created_at) = COALESCE(t2.updated_at, t2.created_at)
+                  AND t1.id < t2.id))
+    """)
+    return cursor.rowcount
+
+def migrate_indexes():
+    """为热点查询路径创建索引"""
+    print(f"[{datetime.now()}] 开始迁移索引...")
+
+    try:
+        # 连接数据库
+        connection = pymysql.connect(**DB_CONFIG)
+        print(f"[{datetime.now()}] 数据库连接成功")
+
+        with connection.cursor() as cursor:
+            created_count = 0
+
+            for table, index_name, columns, unique in INDEXES:
+                # 检查表是否存在
+                cursor.execute("SHOW TABLES LIKE %s", (table,))
+                if not cursor.fetchone():
+                    print(f"[{datetime.now()}] 警告: {table}表不存在，跳过索引 {index_name}")
+                    continue
+
+                # 已存在的索引直接跳过，保证脚本可重复执行
+                if index_exists(cursor, table, index_name):
+                    print(f"[{datetime.now()}] 索引 {table}.{index_name} 已存在，无需更改")
+                    continue
+
+                # 唯一约束创建前先清理重复数据
+                if unique and table == 'timeslots':
+                    removed = remove_duplicate_timeslots(cursor)
+                    connection.commit()
+                    print(f"[{datetime.now()}] 清理了 {removed} 条重复的时间段")
+
+                column_list = ', '.join(column if column.startswith('(') else f"`{column}`" for column in columns)
+                alter_query = (
+                    f"ALTER TABLE `{table}` ADD {'UNIQUE ' if unique else ''}INDEX `{index_name}` ({column_list}), "
+                    f"ALGORITHM=INPLACE, LOCK=NONE"
+                )
+                print(f"[{datetime.now()}] 执行SQL: {alter_query}")
+                cursor.execute(alter_query)
+                connection.commit()
+                created_count += 1
+
+            for table, index_name in OBSOLETE_INDEXES:
+                cursor.execute("SHOW TABLES LIKE %s", (table,))
+                if not cursor.fetchone() or not index_exists(cursor, table, index_name):
+                    continue
+                alter_query = f"ALTER TABLE `{table}` DROP INDEX `{index_name}`, ALGORITHM=INPLACE, LOCK=NONE"
+                print(f"[{datetime.now()}] 执行SQL: {alter_query}")
+                cursor.execute(alter_query)
+                connection.commit()
+
+            if created_count:
+                print(f"[{datetime.now()}] 索引迁移成功，创建了 {created_count} 个索引")
+            else:
+                print(f"[{datetime.now()}] 索引已经是最新的，无需更改")
+
+            return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 迁移失败: {str(e)}")
+        return False
+
+    finally:
+        if 'connection' in locals() and connection:
+            connection.close()
+            print(f"[{datetime.now()}] 数据库连接已关闭")
+
+if __name__ == "__main__":
+    print(f"[{datetime.now()}] 开始执行索引数据库迁移脚本")
+
+    if migrate_indexes():
+        print(f"[{datetime.now()}] 索引数据库迁移脚本执行完成")
+    else:
+        print(f"[{datetime.now()}] 索引数据库迁移脚本执行失败")
+        sys.exit(1)
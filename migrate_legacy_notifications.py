@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+旧版通知文件导入脚本
+create_service_notification以前把通知写入data/notifications.json，此脚本将文件中的通知
+按批导入notifications表并同步未读计数。ID已存在的通知会被跳过，可重复执行；
+接收者不在users表中的通知(如发给服务商的通知)无法导入，会被跳过并计数。
+
+使用方法:
+    python migrate_legacy_notifications.py
+    python migrate_legacy_notifications.py --file data/notifications.json
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+
+IMPORT_BATCH_SIZE = 500
+
+def parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value) if value else datetime.now()
+    except (TypeError, ValueError):
+        return datetime.now()
+
+def legacy_to_row(item):
+    """将旧文件中的一条通知转换为notifications表的一行"""
+    from notifications import notification_row
+
+    data = item.get('data') or {}
+    row = notification_row(
+        item.get('user_id'),
+        item.get('type') or 'system',
+        item.get('title') or '',
+        item.get('content', item.get('message')),
+        subtype=item.get('subtype'),
+        related_id=item.get('related_id') or data.get('related_id') or data.get('service_id'),
+        is_read=bool(item.get('read', item.get('is_read', False))),
+        created_at=parse_datetime(item.get('created_at'))
+    )
+    if item.get('id'):
+        row['id'] = item['id']
+    return row
+
+def import_notifications(path, app=None):
+    """读取旧通知文件并分批写入数据库"""
+    from app import create_app
+    from models import db
+    from notifications import write_notifications
+
+    # 只访问数据库，不需要注册路由
+    app = app or create_app(blueprints=())
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+    except FileNotFoundError:
+        print(f"[{datetime.now()}] 未找到 {path}，无需导入")
+        return True
+    except Exception as e:
+        print(f"[{datetime.now()}] 读取通知文件失败: {str(e)}")
+        return False
+
+    print(f"[{datetime.now()}] 读取到 {len(items)} 条旧通知")
+    imported = 0
+    try:
+        with app.app_context():
+            for start in range(0, len(items), IMPORT_BATCH_SIZE):
+                rows = [legacy_to_row(item) for item in items[start:start + IMPORT_BATCH_SIZE]]
+                imported += write_notifications(rows, skip_existing=True)
+                db.session.commit()
+        print(f"[{datetime.now()}] 导入 {imported} 条，跳过 {len(items) - imported} 条(已导入或接收者不存在)")
+        return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 导入通知失败: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='导入旧版通知文件')
+    parser.add_argument('--file', default='data/notifications.json', help='旧通知文件路径')
+    args = parser.parse_args()
+
+    print(f"[{datetime.now()}] 开始执行旧版通知导入脚本")
+
+    if import_notifications(args.file):
+        print(f"[{datetime.now()}] 旧版通知导入脚本执行完成")
+    else:
+        print(f"[{datetime.now()}] 旧版通知导入脚本执行失败")
+        sys.exit(1)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+通知未读计数数据库迁移脚本
+此脚本创建notification_counters表，然后从notifications表重建每个用户的未读数。
+可重复执行，计数与通知不一致时也可以用于对账修复。
+"""
+
+import pymysql
+import pymysql.cursors
+import sys
+from datetime import datetime
+
+# 数据库连接配置
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',
+    'db': 'service_booking',
+    'charset': 'utf8mb4',
+    'cursorclass': pymysql.cursors.DictCursor
+}
+
+CREATE_NOTIFICATION_COUNTERS = """
+    CREATE TABLE IF NOT EXISTS notification_counters (
+        user_id VARCHAR(36) NOT NULL,
+        unread_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id),
+        CONSTRAINT notification_counters_ibfk_1 FOREIGN KEY (user_id) REFERENCES users (id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+def create_table():
+    """创建未读计数表"""
+    try:
+        connection = pymysql.connect(**DB_CONFIG)
+        print(f"[{datetime.now()}] 数据库连接成功")
+
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_NOTIFICATION_COUNTERS)
+            print(f"[{datetime.now()}] notification_counters表已就绪")
+
+        connection.commit()
+        return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 创建表失败: {str(e)}")
+        return False
+
+    finally:
+        if 'connection' in locals() and connection:
+            connection.close()
+            print(f"[{datetime.now()}] 数据库连接已关闭")
+
+def rebuild_counters(app=None):
+    """从通知表重建未读计数"""
+    from app import create_app
+    from models import db
+    from notifications import reconcile_unread_counts
+
+    # 只访问数据库，不需要注册路由
+    app = app or create_app(blueprints=())
+
+    try:
+        with app.app_context():
+            fixes = reconcile_unread_counts()
+            db.session.commit()
+            print(f"[{datetime.now()}] 未读计数重建完成，修正了 {fixes} 个用户")
+            return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 重建未读计数失败: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    print(f"[{datetime.now()}] 开始执行通知未读计数数据库迁移脚本")
+
+    if create_table() and rebuild_counters():
+        print(f"[{datetime.now()}] 通知未读计数数据库迁移脚本执行完成")
+    else:
+        print(f"[{datetime.now()}] 通知未读计数数据库迁移脚本执行失败")
+        sys.exit(1)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+评分计数数据库迁移脚本
+此脚本为services和providers表添加rating_sum、rating_count和rating_1 ~ rating_5字段，
+并将services表的平均分rating改为DECIMAL(4,3)(保留三位小数，公开服务列表按评分分页时精确比较)，
+然后从reviews表重建计数。可重复执行，计数与评价不一致时也可以用于对账修复。
+"""
+
+import pymysql
+import pymysql.cursors
+import sys
+from datetime import datetime
+
+# 数据库连接配置
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',
+    'db': 'service_booking',
+    'charset': 'utf8mb4',
+    'cursorclass': pymysql.cursors.DictCursor
+}
+
+AGGREGATE_COLUMNS = ['rating_sum', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+def add_columns():
+    """为服务表和服务商表添加缺失的评分计数字段"""
+    try:
+        connection = pymysql.connect(**DB_CONFIG)
+        print(f"[{datetime.now()}] 数据库连接成功")
+
+        with connection.cursor() as cursor:
+            for table in ('services', 'providers'):
+                cursor.execute(f"SHOW COLUMNS FROM `{table}`")
+                columns = cursor.fetchall()
+                existing_columns = {column['Field'] for column in columns}
+                if table == 'services':
+                    convert_rating_column(cursor, columns)
+                missing = [column for column in AGGREGATE_COLUMNS if column not in existing_columns]
+                if not missing:
+                    print(f"[{datetime.now()}] {table}表的评分计数字段已存在，无需更改")
+                    continue
+
+                alter_query = f"ALTER TABLE `{table}` " + ", ".join(
+                    f"ADD COLUMN `{column}` INT NOT NULL DEFAULT 0" for column in missing
+                )
+                print(f"[{datetime.now()}] 执行SQL: {alter_query}")
+                cursor.execute(alter_query)
+
+        connection.commit()
+        return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 添加字段失败: {str(e)}")
+        return False
+
+    finally:
+        if 'connection' in locals() and connection:
+            connection.close()
+            print(f"[{datetime.now()}] 数据库连接已关闭")
+
+def convert_rating_column(cursor, columns):
+    """将服务表的rating改为DECIMAL(4,3)，原有的空值置为0"""
+    rating_type = next((column['Type'] for column in columns if column['Field'] == 'rating'), None)
+    if rating_type is None or rating_type.lower().startswith('decimal(4,3)'):
+        print(f"[{datetime.now()}] services表的rating字段无需更改")
+        return
+    cursor.execute("UPDATE `services` SET `rating` = 0 WHERE `rating` IS NULL")
+    alter_query = "ALTER TABLE `services` MODIFY COLUMN `rating` DECIMAL(4,3) DEFAULT 0"
+    print(f"[{datetime.now()}] 执行SQL: {alter_query}")
+    cursor.execute(alter_query)
+
+def rebuild_aggregates(app=None):
+    """从评价表重建评分计数"""
+    from app import create_app
+    from models import db
+    from ratings import reconcile_all_ratings
+
+    # 只访问数据库，不需要注册路由
+    app = app or create_app(blueprints=())
+
+    try:
+        with app.app_context():
+            service_fixes, provider_fixes = reconcile_all_ratings()
+            db.session.commit()
+            print(f"[{datetime.now()}] 评分计数重建完成，修正了 {service_fixes} 个服务、{provider_fixes} 个服务商")
+            return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 重建评分计数失败: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    print(f"[{datetime.now()}] 开始执行评分计数数据库迁移脚本")
+
+    if add_columns() and rebuild_aggregates():
+        print(f"[{datetime.now()}] 评分计数数据库迁移脚本执行完成")
+    else:
+        print(f"[{datetime.now()}] 评分计数数据库迁移脚本执行失败")
+        sys.exit(1)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+从库心跳表迁移脚本
+此脚本在主库上创建replica_heartbeat表并写入第一条心跳，表和数据通过复制同步到从库。可重复执行。
+"""
+
+import pymysql
+import pymysql.cursors
+import sys
+import time
+from datetime import datetime
+
+# 数据库连接配置
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',
+    'db': 'service_booking',
+    'charset': 'utf8mb4',
+    'cursorclass': pymysql.cursors.DictCursor
+}
+
+CREATE_REPLICA_HEARTBEAT = """
+    CREATE TABLE IF NOT EXISTS replica_heartbeat (
+        id INT NOT NULL,
+        beat_at BIGINT NOT NULL,
+        PRIMARY KEY (id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+def migrate_replica_heartbeat():
+    """创建心跳表并写入心跳"""
+    print(f"[{datetime.now()}] 开始迁移从库心跳表...")
+
+    try:
+        # 连接数据库
+        connection = pymysql.connect(**DB_CONFIG)
+        print(f"[{datetime.now()}] 数据库连接成功")
+
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_REPLICA_HEARTBEAT)
+            print(f"[{datetime.now()}] replica_heartbeat表已就绪")
+
+            cursor.execute(
+                "INSERT INTO replica_heartbeat (id, beat_at) VALUES (1, %s) ON DUPLICATE KEY UPDATE beat_at = VALUES(beat_at)",
+                (int(time.time() * 1000),)
+            )
+            connection.commit()
+            print(f"[{datetime.now()}] 已写入心跳")
+            return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 迁移失败: {str(e)}")
+        return False
+
+    finally:
+        if 'connection' in locals() and connection:
+            connection.close()
+            print(f"[{datetime.now()}] 数据库连接已关闭")
+
+if __name__ == "__main__":
+    print(f"[{datetime.now()}] 开始执行从库心跳表迁移脚本")
+
+    if migrate_replica_heartbeat():
+        print(f"[{datetime.now()}] 从库心跳表迁移脚本执行完成")
+    else:
+        print(f"[{datetime.now()}] 从库心跳表迁移脚本执行失败")
+        sys.exit(1)
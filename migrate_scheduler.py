@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+定时任务数据库迁移脚本
+此脚本为通知表添加dedup_key字段和唯一索引，为已有的提醒/未出席通知回填去重键，
+为预约表添加(status, date, time)索引，并创建scheduler_leases租约表。可重复执行。
+"""
+
+import pymysql
+import pymysql.cursors
+import sys
+from datetime import datetime
+
+# 数据库连接配置
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',
+    'db': 'service_booking',
+    'charset': 'utf8mb4',
+    'cursorclass': pymysql.cursors.DictCursor
+}
+
+CREATE_SCHEDULER_LEASES = """
+    CREATE TABLE IF NOT EXISTS scheduler_leases (
+        name VARCHAR(50) NOT NULL,
+        owner VARCHAR(100) NOT NULL,
+        expires_at DATETIME NOT NULL,
+        PRIMARY KEY (name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+def add_index(cursor, table, name, definition):
+    cursor.execute(f"SHOW INDEX FROM `{table}` WHERE Key_name = %s", (name,))
+    if cursor.fetchone():
+        print(f"[{datetime.now()}] 索引 {name} 已存在，无需更改")
+        return
+    alter_query = f"ALTER TABLE `{table}` ADD {definition}, ALGORITHM=INPLACE, LOCK=NONE"
+    print(f"[{datetime.now()}] 执行SQL: {alter_query}")
+    cursor.execute(alter_query)
+
+def migrate_scheduler():
+    """添加通知去重键、预约时间窗口索引和租约表"""
+    print(f"[{datetime.now()}] 开始迁移定时任务相关表...")
+
+    try:
+        # 连接数据库
+        connection = pymysql.connect(**DB_CONFIG)
+        print(f"[{datetime.now()}] 数据库连接成功")
+
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_SCHEDULER_LEASES)
+            print(f"[{datetime.now()}] scheduler_leases表已就绪")
+
+            # 检查通知表是否已有dedup_key字段
+            cursor.execute("SHOW COLUMNS FROM notifications LIKE 'dedup_key'")
+            if not cursor.fetchone():
+                alter_query = "ALTER TABLE notifications ADD COLUMN dedup_key VARCHAR(100) NULL"
+                print(f"[{datetime.now()}] 执行SQL: {alter_query}")
+                cursor.execute(alter_query)
+            else:
+                print(f"[{datetime.now()}] dedup_key字段已存在，无需更改")
+
+            add_index(cursor, 'notifications', 'dedup_key', 'UNIQUE INDEX dedup_key (dedup_key)')
+            add_index(cursor, 'bookings', 'ix_bookings_status_date_time',
+                      'INDEX ix_bookings_status_date_time (status, date, time)')
+
+            # 已有的提醒和未出席通知回填去重键，同一预约的重复通知只有一条获得去重键
+            cursor.execute("""
+                UPDATE IGNORE notifications
+                SET dedup_key = CONCAT(subtype, ':', related_id)
+                WHERE type = 'booking'
+                  AND subtype IN ('reminder', 'no-show')
+                  AND related_id IS NOT NULL
+                  AND dedup_key IS NULL
+            """)
+            print(f"[{datetime.now()}] 回填了 {cursor.rowcount} 个通知去重键")
+
+            connection.commit()
+            return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 迁移失败: {str(e)}")
+        return False
+
+    finally:
+        if 'connection' in locals() and connection:
+            connection.close()
+            print(f"[{datetime.now()}] 数据库连接已关闭")
+
+if __name__ == "__main__":
+    print(f"[{datetime.now()}] 开始执行定时任务数据库迁移脚本")
+
+    if migrate_scheduler():
+        print(f"[{datetime.now()}] 定时任务数据库迁移脚本执行完成")
+    else:
+        print(f"[{datetime.now()}] 定时任务数据库迁移脚本执行失败")
+        sys.exit(1)
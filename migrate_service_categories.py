@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+服务分类关联表数据库迁移脚本
+此脚本创建service_categories表，并从services.categories的JSON数组回填(服务, 分类)行。
+可重复执行，已有的行会被忽略。
+"""
+
+import pymysql
+import pymysql.cursors
+import sys
+from datetime import datetime
+
+from search_index import parse_categories
+
+# 数据库连接配置
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',
+    'db': 'service_booking',
+    'charset': 'utf8mb4',
+    'cursorclass': pymysql.cursors.DictCursor
+}
+
+CREATE_SERVICE_CATEGORIES = """
+    CREATE TABLE IF NOT EXISTS service_categories (
+        service_id VARCHAR(36) NOT NULL,
+        category VARCHAR(50) NOT NULL,
+        PRIMARY KEY (service_id, category),
+        KEY ix_service_categories_category (category, service_id),
+        CONSTRAINT service_categories_ibfk_1 FOREIGN KEY (service_id) REFERENCES services (id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+BATCH_SIZE = 1000
+
+def migrate_service_categories():
+    """创建分类关联表并回填数据"""
+    print(f"[{datetime.now()}] 开始迁移服务分类...")
+
+    try:
+        # 连接数据库
+        connection = pymysql.connect(**DB_CONFIG)
+        print(f"[{datetime.now()}] 数据库连接成功")
+
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_SERVICE_CATEGORIES)
+            print(f"[{datetime.now()}] service_categories表已就绪")
+
+            cursor.execute("SELECT id, categories FROM services")
+            rows = [
+                (service['id'], category)
+                for service in cursor.fetchall()
+                for category in parse_categories(service['categories'])
+            ]
+            inserted = 0
+            for start in range(0, len(rows), BATCH_SIZE):
+                inserted += cursor.executemany(
+                    "INSERT IGNORE INTO service_categories (service_id, category) VALUES (%s, %s)",
+                    rows[start:start + BATCH_SIZE]
+                ) or 0
+            print(f"[{datetime.now()}] 回填了 {inserted} 个服务分类")
+
+        connection.commit()
+        return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 迁移失败: {str(e)}")
+        return False
+
+    finally:
+        if 'connection' in locals() and connection:
+            connection.close()
+            print(f"[{datetime.now()}] 数据库连接已关闭")
+
+if __name__ == "__main__":
+    print(f"[{datetime.now()}] 开始执行服务分类数据库迁移脚本")
+
+    if migrate_service_categories():
+        print(f"[{datetime.now()}] 服务分类数据库迁移脚本执行完成")
+    else:
+        print(f"[{datetime.now()}] 服务分类数据库迁移脚本执行失败")
+        sys.exit(1)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+服务变更日志数据库迁移脚本
+此脚本创建service_changes表。服务搜索索引在各进程启动后第一次搜索时从services表全量构建，
+之后通过此表增量同步，因此不需要回填数据。可重复执行。
+"""
+
+import pymysql
+import pymysql.cursors
+import sys
+from datetime import datetime
+
+# 数据库连接配置
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',
+    'db': 'service_booking',
+    'charset': 'utf8mb4',
+    'cursorclass': pymysql.cursors.DictCursor
+}
+
+CREATE_SERVICE_CHANGES = """
+    CREATE TABLE IF NOT EXISTS service_changes (
+        id INT NOT NULL AUTO_INCREMENT,
+        service_id VARCHAR(36) NOT NULL,
+        changed_at DATETIME NULL,
+        PRIMARY KEY (id),
+        KEY ix_service_changes_changed_at (changed_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+def migrate_service_changes():
+    """创建服务变更日志表"""
+    print(f"[{datetime.now()}] 开始迁移服务变更日志...")
+
+    try:
+        # 连接数据库
+        connection = pymysql.connect(**DB_CONFIG)
+        print(f"[{datetime.now()}] 数据库连接成功")
+
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_SERVICE_CHANGES)
+            print(f"[{datetime.now()}] service_changes表已就绪")
+
+        connection.commit()
+        return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 迁移失败: {str(e)}")
+        return False
+
+    finally:
+        if 'connection' in locals() and connection:
+            connection.close()
+            print(f"[{datetime.now()}] 数据库连接已关闭")
+
+if __name__ == "__main__":
+    print(f"[{datetime.now()}] 开始执行服务变更日志数据库迁移脚本")
+
+    if migrate_service_changes():
+        print(f"[{datetime.now()}] 服务变更日志数据库迁移脚本执行完成")
+    else:
+        print(f"[{datetime.now()}] 服务变更日志数据库迁移脚本执行失败")
+        sys.exit(1)
@@ -9,9 +9,12 @@
 import json
 import os
 from datetime import datetime
-from app import app
+from app import create_app
 from models import db, Service, Provider
 
+# 只访问数据库，不需要注册路由
+app = create_app(blueprints=())
+
 # JSON文件路径
 SERVICES_FILE = 'data/services.json'
 PROVIDERS_FILE = 'data/providers.json'
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+时间段占用数据库迁移脚本
+此脚本创建slot_claims表，为预约表添加idempotency_key字段和(user_id, idempotency_key)唯一约束，
+并为已有的待确认/已确认预约回填占用行。可重复执行。
+"""
+
+import pymysql
+import pymysql.cursors
+import sys
+from datetime import datetime
+
+# 数据库连接配置
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',
+    'password': '123456',
+    'db': 'service_booking',
+    'charset': 'utf8mb4',
+    'cursorclass': pymysql.cursors.DictCursor
+}
+
+CREATE_SLOT_CLAIMS = """
+    CREATE TABLE IF NOT EXISTS slot_claims (
+        provider_id VARCHAR(36) NOT NULL,
+        date DATE NOT NULL,
+        time VARCHAR(20) NOT NULL,
+        user_id VARCHAR(36) NOT NULL,
+        booking_id VARCHAR(36) NULL,
+        hold_token VARCHAR(36) NULL,
+        expires_at DATETIME NULL,
+        created_at DATETIME NULL,
+        PRIMARY KEY (provider_id, date, time),
+        UNIQUE KEY hold_token (hold_token),
+        KEY ix_slot_claims_booking_id (booking_id),
+        CONSTRAINT slot_claims_ibfk_1 FOREIGN KEY (provider_id) REFERENCES providers (id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+def migrate_slot_claims():
+    """创建时间段占用表并回填数据"""
+    print(f"[{datetime.now()}] 开始迁移时间段占用...")
+
+    try:
+        # 连接数据库
+        connection = pymysql.connect(**DB_CONFIG)
+        print(f"[{datetime.now()}] 数据库连接成功")
+
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_SLOT_CLAIMS)
+            print(f"[{datetime.now()}] slot_claims表已就绪")
+
+            # 检查预约表是否已有idempotency_key字段
+            cursor.execute("SHOW COLUMNS FROM bookings LIKE 'idempotency_key'")
+            if not cursor.fetchone():
+                alter_query = "ALTER TABLE bookings ADD COLUMN idempotency_key VARCHAR(64) NULL"
+                print(f"[{datetime.now()}] 执行SQL: {alter_query}")
+                cursor.execute(alter_query)
+            else:
+                print(f"[{datetime.now()}] idempotency_key字段已存在，无需更改")
+
+            cursor.execute("SHOW INDEX FROM bookings WHERE Key_name = 'uq_bookings_user_idempotency'")
+            if not cursor.fetchone():
+                alter_query = (
+                    "ALTER TABLE bookings ADD UNIQUE INDEX uq_bookings_user_idempotency (user_id, idempotency_key), "
+                    "ALGORITHM=INPLACE, LOCK=NONE"
+                )
+                print(f"[{datetime.now()}] 执行SQL: {alter_query}")
+                cursor.execute(alter_query)
+            else:
+                print(f"[{datetime.now()}] 索引 uq_bookings_user_idempotency 已存在，无需更改")
+
+            # 已有的有效预约回填占用行，同一时间段有多个预约时保留最早创建的一个
+            cursor.execute("""
+                INSERT IGNORE INTO slot_claims (provider_id, date, time, user_id, booking_id, created_at)
+                SELECT provider_id, date, time, user_id, id, created_at
+                FROM bookings
+                WHERE status IN ('pending', 'confirmed')
+                ORDER BY created_at, id
+            """)
+            print(f"[{datetime.now()}] 回填了 {cursor.rowcount} 个时间段占用")
+
+            connection.commit()
+            return True
+
+    except Exception as e:
+        print(f"[{datetime.now()}] 迁移失败: {str(e)}")
+        return False
+
+    finally:
+        if 'connection' in locals() and connection:
+            connection.close()
+            print(f"[{datetime.now()}] 数据库连接已关闭")
+
+if __name__ == "__main__":
+    print(f"[{datetime.now()}] 开始执行时间段占用数据库迁移脚本")
+
+    if migrate_slot_claims():
+        print(f"[{datetime.now()}] 时间段占用数据库迁移脚本执行完成")
+    else:
+        print(f"[{datetime.now()}] 时间段占用数据库迁移脚本执行失败")
+        sys.exit(1)
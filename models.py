@@ -1,9 +1,9 @@
-from flask_sqlalchemy import SQLAlchemy
+from db_pool import PooledSQLAlchemy
 from datetime import datetime
 import uuid
 import json
 
-db = SQLAlchemy()
+db = PooledSQLAlchemy()
 
 # 用户地址表
 class Address(db.Model):
@@ -121,6 +121,14 @@ class Provider(db.Model):
     email = db.Column(db.String(100), unique=True, nullable=False)
     password = db.Column(db.String(100), nullable=False)
     rating = db.Column(db.Float, default=0)
+    # 评分计数，评价变化时增量维护，可用ratings.py对账重建
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     verified = db.Column(db.Boolean, default=False)
     # 个人信息字段
     nickname = db.Column(db.String(100))
@@ -182,6 +190,9 @@ class Provider(db.Model):
 # 收藏表
 class Favorite(db.Model):
     __tablename__ = 'favorites'
+    __table_args__ = (
+        db.Index('ix_favorites_user_service', 'user_id', 'service_id'),
+    )
     
     id = db.Column(db.String(36), primary_key=True)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -196,6 +207,11 @@ class Favorite(db.Model):
 # 服务表
 class Service(db.Model):
     __tablename__ = 'services'
+    __table_args__ = (
+        # 公开服务列表按各排序方式做键集分页: 状态 + 排序字段 + id
+        # 价格和评分按COALESCE后的值排序，对应的表达式索引在类定义之后声明
+        db.Index('ix_services_status_created', 'status', 'created_at', 'id'),
+    )
     
     id = db.Column(db.String(36), primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -203,8 +219,17 @@ class Service(db.Model):
     price = db.Column(db.Float, nullable=False)
     price_unit = db.Column(db.String(20), nullable=False)
     duration = db.Column(db.Integer, nullable=False)  # 单位：分钟
-    rating = db.Column(db.Float, default=0.0)
+    # 平均分保留三位小数，用DECIMAL精确存储，键集分页按评分比较时不受浮点误差影响
+    rating = db.Column(db.Numeric(4, 3, asdecimal=False), default=0)
     reviews_count = db.Column(db.Integer, default=0)
+    # 评分计数，评价变化时增量维护，可用ratings.py对账重建
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     image = db.Column(db.String(255))
     categories = db.Column(db.Text)  # 存储为JSON数组字符串
     description = db.Column(db.Text)
@@ -242,9 +267,23 @@ class Service(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+# 公开服务列表按价格、评分排序时空值按0参与排序，索引使用与查询相同的COALESCE表达式
+db.Index('ix_services_status_price_value', Service.status, db.func.coalesce(Service.price, 0), Service.id)
+db.Index('ix_services_status_rating_value', Service.status, db.func.coalesce(Service.rating, 0), Service.id)
+
 # 预约表
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        # 服务商日历、可用时间段: provider_id + 日期范围 + 状态
+        db.Index('ix_bookings_provider_date_status', 'provider_id', 'date', 'status'),
+        # 用户预约列表、仪表盘: user_id + 状态，按日期时间排序
+        db.Index('ix_bookings_user_status_date', 'user_id', 'status', 'date', 'time'),
+        # 定时任务按状态和时间窗口查询
+        db.Index('ix_bookings_status_date_time', 'status', 'date', 'time'),
+        # 同一用户的幂等键只能对应一个预约
+        db.UniqueConstraint('user_id', 'idempotency_key', name='uq_bookings_user_idempotency'),
+    )
     
     id = db.Column(db.String(36), primary_key=True)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -254,6 +293,7 @@ class Booking(db.Model):
     time = db.Column(db.String(5), nullable=False)  # 格式：HH:MM
     status = db.Column(db.String(20), default='pending')  # pending, confirmed, cancelled, completed
     review_needed = db.Column(db.Boolean, default=False)
+    idempotency_key = db.Column(db.String(64))  # 客户端提供的Idempotency-Key，重试时返回同一预约
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -282,6 +322,11 @@ class Booking(db.Model):
 # 评论表
 class Review(db.Model):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        db.Index('ix_reviews_service_created', 'service_id', 'created_at'),
+        db.Index('ix_reviews_provider_created', 'provider_id', 'created_at'),
+        db.Index('ix_reviews_booking_id', 'booking_id'),
+    )
     
     id = db.Column(db.String(36), primary_key=True)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -322,6 +367,9 @@ class Review(db.Model):
 # 通知表
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.String(36), primary_key=True)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -331,6 +379,7 @@ class Notification(db.Model):
     content = db.Column(db.Text)
     is_read = db.Column(db.Boolean, default=False)
     related_id = db.Column(db.String(36))  # 相关的ID，如预约ID、评论ID等
+    dedup_key = db.Column(db.String(100), unique=True)  # 去重键，如reminder:<预约ID>，同一键只会插入一次
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -359,6 +408,10 @@ class Notification(db.Model):
 # 时间槽表
 class TimeSlot(db.Model):
     __tablename__ = 'timeslots'
+    __table_args__ = (
+        # 同一服务商同一时间只能有一个时间段
+        db.UniqueConstraint('provider_id', 'date', 'time', name='uq_timeslots_provider_date_time'),
+    )
     
     id = db.Column(db.String(36), primary_key=True)
     provider_id = db.Column(db.String(36), db.ForeignKey('providers.id'), nullable=False)
@@ -385,4 +438,71 @@ class TimeSlot(db.Model):
             'is_available': self.is_available,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        } 
\ No newline at end of file
+        }
+
+# 服务商可用性索引表：每个服务商每天一行，用位图记录按5分钟划分的时间段状态
+class ProviderAvailability(db.Model):
+    __tablename__ = 'provider_availability'
+    
+    provider_id = db.Column(db.String(36), db.ForeignKey('providers.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    open_mask = db.Column(db.String(72), nullable=False, default='0')  # 可用时间段位图(十六进制)
+    closed_mask = db.Column(db.String(72), nullable=False, default='0')  # 明确不可用的时间段位图
+    booked_mask = db.Column(db.String(72), nullable=False, default='0')  # 待确认和已确认预约占用的位图
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# 时间段占用表：每个(服务商, 日期, 时间)最多一行，主键保证同一时间段只能被一个有效预约或保留占用
+class SlotClaim(db.Model):
+    __tablename__ = 'slot_claims'
+    
+    provider_id = db.Column(db.String(36), db.ForeignKey('providers.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    time = db.Column(db.String(20), primary_key=True)
+    user_id = db.Column(db.String(36), nullable=False)
+    booking_id = db.Column(db.String(36), index=True)  # 已生成预约时为预约ID
+    hold_token = db.Column(db.String(36), unique=True)  # 下单前的临时保留令牌
+    expires_at = db.Column(db.DateTime)  # 保留的过期时间，已生成预约时为空
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# 服务分类关联表：由Service.categories的JSON数组同步生成，用于按分类精确筛选
+class ServiceCategory(db.Model):
+    __tablename__ = 'service_categories'
+    __table_args__ = (
+        db.Index('ix_service_categories_category', 'category', 'service_id'),
+    )
+    
+    service_id = db.Column(db.String(36), db.ForeignKey('services.id', ondelete='CASCADE'), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+
+# 服务变更日志：服务的创建、修改、删除和评分变化在同一事务中追加一行，
+# 各进程的搜索索引据此增量同步(见search_index.py)
+class ServiceChange(db.Model):
+    __tablename__ = 'service_changes'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    service_id = db.Column(db.String(36), nullable=False)  # 不设外键，删除的服务也需要记录
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+# 通知未读计数表：每个用户一行，随通知的创建、已读、删除在同一事务中更新
+class NotificationCounter(db.Model):
+    __tablename__ = 'notification_counters'
+    
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+# 定时任务租约表：多个进程中只有持有未过期租约的一个执行定时任务
+class SchedulerLease(db.Model):
+    __tablename__ = 'scheduler_leases'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)  # 主机名:进程ID:随机后缀
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+# 从库延迟心跳表：只有一行，主库上定期更新时间戳，从库上读到的时间戳与主库相差多少即落后多少
+class ReplicaHeartbeat(db.Model):
+    __tablename__ = 'replica_heartbeat'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    beat_at = db.Column(db.BigInteger, nullable=False)  # 主库写入时的毫秒时间戳
@@ -0,0 +1,309 @@
+"""
+通知未读计数
+notification_counters表为每个用户保存一行未读通知数，未读数接口只需读取这一行。
+通过ORM创建、标记已读、删除通知时，before_flush事件在同一事务中增减计数；
+直接执行的SQL(批量插入、全部标记已读)调用adjust_unread_counts。
+reconcile_unread_counts用一次GROUP BY查询从通知表对账重建。
+
+NotificationFlusher在后台线程中把排队的通知按批写入，调用方不再等待数据库写入；
+create_service_notification通过每个进程一个的写入器(get_notification_flusher)排队。
+队列只在进程内存中，排队的通知是尽力而为的：worker崩溃、被SIGKILL时队列中的通知丢失，
+正常退出时close()最多等待timeout秒，仍未写入的计入dropped并记录警告日志。
+不能丢失的通知用create_service_notification(..., critical=True)或write_notifications在请求的事务中写入，随事务一起提交。
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, inspect, update, case, func, insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, User, Notification, NotificationCounter
+
+# booking的子日志器，与请求日志一起由request_logging输出为JSON行
+logger = logging.getLogger(f'booking.{__name__}')
+
+def adjust_unread_counts(session, deltas):
+    """
+    按{用户ID: 变化量}增减未读计数，计数不会小于0
+    增加的部分用一条多行upsert完成(没有计数行时插入)，减少的部分逐个用户UPDATE
+    """
+    table = NotificationCounter.__table__
+    increments = [{'user_id': user_id, 'unread_count': delta} for user_id, delta in deltas.items() if user_id and delta > 0]
+    decrements = [(user_id, -delta) for user_id, delta in deltas.items() if user_id and delta < 0]
+
+    if increments:
+        dialect = db.engine.dialect.name
+        if dialect == 'mysql':
+            stmt = mysql_insert(table).values(increments)
+            session.execute(stmt.on_duplicate_key_update(unread_count=table.c.unread_count + stmt.inserted.unread_count))
+        elif dialect == 'sqlite':
+            stmt = sqlite_insert(table).values(increments)
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id],
+                set_={'unread_count': table.c.unread_count + stmt.excluded.unread_count}
+            ))
+        else:
+            for row in increments:
+                result = session.execute(
+                    update(table).where(table.c.user_id == row['user_id'])
+                    .values(unread_count=table.c.unread_count + row['unread_count'])
+                )
+                if result.rowcount == 0:
+                    session.execute(table.insert().values(**row))
+
+    for user_id, amount in decrements:
+        session.execute(
+            update(table).where(table.c.user_id == user_id)
+            .values(unread_count=case((table.c.unread_count > amount, table.c.unread_count - amount), else_=0))
+        )
+
+def _collect_unread_deltas(session, flush_context, instances):
+    """统计本次flush中新增、删除和已读状态变化的通知，在同一事务中更新计数"""
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Notification) and not obj.is_read:
+            deltas[obj.user_id] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Notification) and not obj.is_read:
+            deltas[obj.user_id] -= 1
+    for obj in session.dirty:
+        if not isinstance(obj, Notification):
+            continue
+        history = inspect(obj).attrs.is_read.history
+        if not history.has_changes():
+            continue
+        was_read = bool(history.deleted[0]) if history.deleted else False
+        is_read = bool(obj.is_read)
+        if was_read != is_read:
+            deltas[obj.user_id] += -1 if is_read else 1
+    if deltas:
+        adjust_unread_counts(session, deltas)
+
+def register_notification_listeners(session):
+    """在会话上注册维护未读计数的事件"""
+    event.listen(session, 'before_flush', _collect_unread_deltas)
+
+def get_unread_count(user_id):
+    """读取用户的未读通知数"""
+    count = db.session.query(NotificationCounter.unread_count).filter(
+        NotificationCounter.user_id == user_id
+    ).scalar()
+    return count or 0
+
+def mark_all_read(user_id):
+    """用一条UPDATE将用户的未读通知全部标记为已读，不加载通知对象；返回标记的数量"""
+    table = Notification.__table__
+    result = db.session.execute(
+        update(table)
+        .where(table.c.user_id == user_id, table.c.is_read == False)
+        .values(is_read=True, updated_at=datetime.now())
+    )
+    if result.rowcount:
+        adjust_unread_counts(db.session, {user_id: -result.rowcount})
+    return result.rowcount
+
+def reconcile_unread_counts():
+    """
+    对账：用一次GROUP BY查询从通知表计算每个用户的未读数，只改写与之不一致的计数行
+    返回修正的用户数
+    """
+    actual = dict(
+        db.session.query(Notification.user_id, func.count(Notification.id))
+        .filter(Notification.is_read == False)
+        .group_by(Notification.user_id)
+    )
+    stored = dict(db.session.query(NotificationCounter.user_id, NotificationCounter.unread_count))
+
+    updates = [
+        {'user_id': user_id, 'unread_count': actual.get(user_id, 0)}
+        for user_id, count in stored.items() if count != actual.get(user_id, 0)
+    ]
+    inserts = [
+        {'user_id': user_id, 'unread_count': count}
+        for user_id, count in actual.items() if user_id not in stored
+    ]
+    if updates:
+        db.session.bulk_update_mappings(NotificationCounter, updates)
+    if inserts:
+        db.session.bulk_insert_mappings(NotificationCounter, inserts)
+    return len(updates) + len(inserts)
+
+def notification_row(user_id, type, title, content, subtype=None, related_id=None, is_read=False, created_at=None):
+    """构造一行通知数据，所有行的键相同，可以合并为一次批量INSERT"""
+    created_at = created_at or datetime.now()
+    return {
+        'id': str(uuid.uuid4()),
+        'user_id': user_id,
+        'type': type,
+        'subtype': subtype,
+        'title': title,
+        'content': content,
+        'is_read': is_read,
+        'related_id': related_id,
+        'created_at': created_at,
+        'updated_at': created_at
+    }
+
+def write_notifications(rows, skip_existing=False):
+    """
+    批量写入通知并增加未读计数，不提交事务
+    用executemany执行同一条INSERT，pymysql会将其改写为多行INSERT
+    接收者不在users表中的行被跳过(服务商不是users表中的用户)；skip_existing为True时跳过ID已存在的行
+    返回写入的行数
+    """
+    if not rows:
+        return 0
+    valid_users = {
+        user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_({row['user_id'] for row in rows}))
+    }
+    rows = [row for row in rows if row['user_id'] in valid_users]
+    if skip_existing and rows:
+        existing = {
+            notification_id for (notification_id,) in
+            db.session.query(Notification.id).filter(Notification.id.in_([row['id'] for row in rows]))
+        }
+        rows = [row for row in rows if row['id'] not in existing]
+    if not rows:
+        return 0
+
+    db.session.execute(insert(Notification.__table__), rows)
+    adjust_unread_counts(db.session, Counter(row['user_id'] for row in rows if not row['is_read']))
+    return len(rows)
+
+class NotificationFlusher:
+    """
+    通知后台批量写入
+    enqueue把通知放入队列后立即返回；后台线程每次取出最多batch_size条，
+    队列为空时最多等待interval秒，每批在一个事务中批量写入
+    """
+
+    def __init__(self, app, batch_size=500, interval=0.5):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self.written = 0  # 已写入的通知数
+        self.skipped = 0  # 接收者不存在而跳过的通知数
+        self.failed = 0  # 写入失败的通知数
+        self.dropped = 0  # 关闭时仍在队列中、没有写入的通知数
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def enqueue(self, row):
+        """放入一行notification_row构造的通知，第一次调用时启动后台线程"""
+        if self._thread is None:
+            self.start()
+        self._queue.put(row)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='notification-flusher')
+            self._thread.daemon = True
+            self._thread.start()
+            # 进程正常退出前写完队列中剩余的通知
+            atexit.register(self.close)
+
+    def flush(self):
+        """阻塞直到已放入队列的通知全部处理完"""
+        self._queue.join()
+
+    def close(self, timeout=10):
+        """写完剩余通知后停止后台线程；timeout秒内没有写完时，队列中剩余的通知计入dropped"""
+        if self._thread is None or self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        remaining = self._queue.qsize()
+        if remaining:
+            self.dropped += remaining
+            logger.warning("关闭通知写入器时仍有 %s 条通知没有写入，已丢弃", remaining)
+
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        with self.app.app_context():
+            while not (self._stopping.is_set() and self._queue.empty()):
+                batch = self._take_batch()
+                if batch:
+                    self._write(batch)
+
+    def _write(self, batch):
+        try:
+            written = write_notifications(batch)
+            db.session.commit()
+            self.written += written
+            self.skipped += len(batch) - written
+        except Exception:
+            db.session.rollback()
+            self.failed += len(batch)
+            logger.exception("批量写入 %s 条通知失败", len(batch))
+        finally:
+            db.session.remove()
+            for _ in batch:
+                self._queue.task_done()
+
+_notification_flusher = None
+_notification_flusher_lock = threading.Lock()
+
+def get_notification_flusher():
+    """懒加载通知后台写入器，每个进程一个实例"""
+    global _notification_flusher
+    if _notification_flusher is None:
+        with _notification_flusher_lock:
+            if _notification_flusher is None:
+                _notification_flusher = NotificationFlusher(
+                    current_app._get_current_object(),
+                    batch_size=current_app.config['NOTIFICATION_FLUSH_BATCH_SIZE'],
+                    interval=current_app.config['NOTIFICATION_FLUSH_INTERVAL']
+                )
+    return _notification_flusher
+
+# 辅助函数：为服务管理功能创建通知
+def create_service_notification(user_id, title, message, type, subtype=None, sender_id=None, sender_type=None, data=None,
+                                critical=False):
+    """
+    创建系统通知：默认放入后台写入队列，由NotificationFlusher批量写入notifications表，进程异常退出时可能丢失；
+    critical为True时在当前会话的事务中写入，由调用方提交
+    """
+    data = data or {}
+    row = notification_row(user_id, type, title, message, subtype=subtype,
+                           related_id=data.get('related_id') or data.get('service_id'))
+    if critical:
+        write_notifications([row])
+    else:
+        get_notification_flusher().enqueue(row)
+    
+    return {
+        'id': row['id'],
+        'user_id': user_id,
+        'sender_id': sender_id or 'system',
+        'sender_type': sender_type or 'system',
+        'type': type,
+        'subtype': subtype,
+        'title': title,
+        'content': message,
+        'data': data,
+        'read': False,
+        'created_at': row['created_at'].isoformat()
+    }
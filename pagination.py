@@ -0,0 +1,73 @@
+"""
+列表分页
+键集分页的游标编解码和WHERE条件、limit参数解析、按ID批量加载关联实体，
+以及公开列表总数的短时缓存(翻页时复用，不再每页COUNT)。
+"""
+
+import base64
+import json
+import threading
+import time
+
+from flask import current_app, request
+from sqlalchemy import or_
+
+from models import db
+
+MAX_PAGE_SIZE = 200  # 单页最多返回的记录数
+
+_listing_counts = {}
+_listing_counts_lock = threading.Lock()
+LISTING_COUNTS_MAX_ENTRIES = 1000
+
+def encode_cursor(values):
+    """将排序键编码为不透明的分页游标"""
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """解析分页游标，返回排序键列表；游标无效时返回None"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return values if isinstance(values, list) else None
+    except Exception:
+        return None
+
+def keyset_after(columns, values, descending=False):
+    """构造键集分页条件：(columns) 严格位于 (values) 之后
+
+    展开为 OR/AND 形式而不是行值比较，MySQL和SQLite都能走复合索引
+    """
+    column, value = columns[0], values[0]
+    beyond = column < value if descending else column > value
+    if len(columns) == 1:
+        return beyond
+    return or_(beyond, db.and_(column == value, keyset_after(columns[1:], values[1:], descending)))
+
+def batch_load_by_id(model, ids, *options):
+    """用一次IN查询按ID批量加载实体，返回{id: 实体}；options为查询选项，如只加载部分列"""
+    ids = {entity_id for entity_id in ids if entity_id}
+    if not ids:
+        return {}
+    return {entity.id: entity for entity in model.query.options(*options).filter(model.id.in_(ids)).all()}
+
+def parse_page_limit(default=None):
+    """读取limit查询参数并限制在MAX_PAGE_SIZE以内，未提供时返回default"""
+    limit = request.args.get('limit', default, type=int)
+    if limit is None:
+        return None
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def cached_listing_count(key, compute):
+    """返回缓存的列表计数，过期或不存在时调用compute()重新计算；结果最多滞后PUBLIC_LISTING_COUNT_TTL秒"""
+    now = time.time()
+    with _listing_counts_lock:
+        cached = _listing_counts.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+    value = compute()
+    with _listing_counts_lock:
+        if len(_listing_counts) >= LISTING_COUNTS_MAX_ENTRIES:
+            _listing_counts.clear()
+        _listing_counts[key] = (now + current_app.config['PUBLIC_LISTING_COUNT_TTL'], value)
+    return value
@@ -0,0 +1,109 @@
+"""
+评分聚合
+Service和Provider上保存rating_sum、rating_count和1-5星的计数(rating_1 ~ rating_5)，
+评价的创建、修改、删除通过一条原子UPDATE增量维护这些计数以及平均分rating(服务还有reviews_count)，
+不再读取全部评价重新计算。rebuild_rating_aggregates用一次GROUP BY查询从Review表对账重建。
+"""
+
+from sqlalchemy import update, case, func
+
+from models import db, Service, Provider, Review
+from search_index import record_service_changes
+from entity_cache import invalidate_on_commit
+
+RATING_VALUES = range(1, 6)
+# 平均分保留的小数位数，与Service.rating的DECIMAL(4,3)一致
+RATING_PRECISION = 3
+
+def rating_deltas(added=(), removed=()):
+    """根据新增和移除的评分计算(总分变化, 数量变化, {星级: 数量变化})"""
+    histogram = {}
+    for rating in added:
+        histogram[rating] = histogram.get(rating, 0) + 1
+    for rating in removed:
+        histogram[rating] = histogram.get(rating, 0) - 1
+    return sum(added) - sum(removed), len(added) - len(removed), histogram
+
+def apply_rating_change(model, entity_id, added=(), removed=()):
+    """
+    原子地更新服务或服务商的评分计数，added/removed为新增和移除的评分列表
+    修改评分时传入added=[新评分], removed=[旧评分]
+    """
+    sum_delta, count_delta, histogram = rating_deltas(list(added), list(removed))
+    if not sum_delta and not count_delta and not any(histogram.values()):
+        return
+
+    table = model.__table__
+    new_sum = table.c.rating_sum + sum_delta
+    new_count = table.c.rating_count + count_delta
+    # 平均分和评价数放在最前面赋值：MySQL按顺序使用已更新的列值，这样两种语义下都基于旧值计算
+    assignments = [
+        (table.c.rating, case((new_count > 0, func.round(new_sum * 1.0 / new_count, RATING_PRECISION)), else_=0)),
+    ]
+    if 'reviews_count' in table.c:
+        assignments.append((table.c.reviews_count, new_count))
+    assignments.extend([
+        (table.c.rating_sum, new_sum),
+        (table.c.rating_count, new_count),
+    ])
+    for rating, delta in histogram.items():
+        if delta:
+            column = table.c[f'rating_{rating}']
+            assignments.append((column, column + delta))
+
+    db.session.execute(update(table).where(table.c.id == entity_id).ordered_values(*assignments))
+    invalidate_on_commit(db.session, model, [entity_id])
+    if model is Service:
+        # 评分排序使用搜索索引中的评分
+        record_service_changes(db.session, [entity_id])
+
+def apply_review_change(service_id, provider_id, added=(), removed=()):
+    """评价变化时同时更新服务和服务商的评分计数"""
+    if service_id:
+        apply_rating_change(Service, service_id, added, removed)
+    if provider_id:
+        apply_rating_change(Provider, provider_id, added, removed)
+
+def rating_aggregate_columns():
+    return [func.sum(Review.rating), func.count(Review.id)] + [
+        func.sum(case((Review.rating == rating, 1), else_=0)) for rating in RATING_VALUES
+    ]
+
+def rebuild_rating_aggregates(model, group_column):
+    """
+    对账：用一次GROUP BY查询从Review表计算每个服务或服务商的评分计数，只改写与之不一致的行
+    返回修正的行数
+    """
+    actual = {
+        row[0]: tuple(int(value or 0) for value in row[1:])
+        for row in db.session.query(group_column, *rating_aggregate_columns()).group_by(group_column)
+    }
+
+    table = model.__table__
+    histogram_columns = [table.c[f'rating_{rating}'] for rating in RATING_VALUES]
+    fixes = []
+    for row in db.session.query(table.c.id, table.c.rating_sum, table.c.rating_count, *histogram_columns):
+        stored = tuple(int(value or 0) for value in row[1:])
+        expected = actual.get(row[0], (0,) * (2 + len(RATING_VALUES)))
+        if stored == expected:
+            continue
+        rating_sum, rating_count = expected[0], expected[1]
+        fix = {
+            'id': row[0],
+            'rating_sum': rating_sum,
+            'rating_count': rating_count,
+            'rating': round(rating_sum / rating_count, RATING_PRECISION) if rating_count else 0
+        }
+        fix.update({f'rating_{rating}': count for rating, count in zip(RATING_VALUES, expected[2:])})
+        if 'reviews_count' in table.c:
+            fix['reviews_count'] = rating_count
+        fixes.append(fix)
+
+    if fixes:
+        db.session.bulk_update_mappings(model, fixes)
+        invalidate_on_commit(db.session, model, [fix['id'] for fix in fixes])
+    return len(fixes)
+
+def reconcile_all_ratings():
+    """重建所有服务和服务商的评分计数，返回(修正的服务数, 修正的服务商数)"""
+    return rebuild_rating_aggregates(Service, Review.service_id), rebuild_rating_aggregates(Provider, Review.provider_id)
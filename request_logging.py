@@ -0,0 +1,132 @@
+"""
+结构化异步日志
+请求线程中的日志由QueueHandler放入有界队列后立即返回，后台线程格式化为JSON行写入标准输出，
+请求处理的吞吐不受终端或日志收集器读取速度的影响；队列满时丢弃并计数，不会阻塞请求。
+每行带有请求ID(取请求头X-Request-ID，没有时自动生成，并在响应头中返回)和端点名。
+DEBUG日志按端点采样：每个请求开始时决定是否采样，同一请求的调试日志要么全部输出要么全部跳过。
+fork出的子进程(如gunicorn的worker)会重新创建队列和写日志的线程。
+每个进程只有一个写日志的线程：再次调用setup_logging(多次create_app)时先写完并停止上一个，退出和fork的钩子只注册一次。
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import current_app, g, has_request_context, request
+
+logger = logging.getLogger('booking')
+
+# 本进程当前的队列处理器和写日志的线程，由setup_logging替换
+_handler = None
+_listener = None
+_hooks_registered = False
+
+class RequestContextFilter(logging.Filter):
+    """在请求线程中为日志记录加上请求ID和端点，并丢弃本请求未被采样的DEBUG日志"""
+
+    def filter(self, record):
+        if not has_request_context():
+            record.request_id = '-'
+            record.endpoint = None
+            return True
+        record.request_id = g.get('request_id', '-')
+        record.endpoint = request.endpoint
+        return record.levelno > logging.DEBUG or g.get('log_debug', False)
+
+class DroppingQueueHandler(QueueHandler):
+    """队列满时丢弃日志而不是阻塞或报错，dropped记录丢弃的条数"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class DrainingQueueListener(QueueListener):
+    """停止时等待队列有空位再放入结束标记，队列满时也能写完已排队的日志后退出"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def format(self, record):
+        return json.dumps({
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'request_id': getattr(record, 'request_id', '-'),
+            'endpoint': getattr(record, 'endpoint', None),
+            'message': record.getMessage(),
+        }, ensure_ascii=False)
+
+def _start_request():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    if logger.isEnabledFor(logging.DEBUG):
+        rates = current_app.config['LOG_DEBUG_SAMPLING']
+        rate = rates.get(request.endpoint, current_app.config['LOG_DEBUG_SAMPLE_RATE'])
+        g.log_debug = random.random() < rate
+
+def _finish_request(response):
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    return response
+
+def _stop_listener():
+    """写完队列中的日志并停止当前的写日志线程"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+def _restart_in_child():
+    # fork只复制调用fork的线程：预加载应用的多进程服务器中，worker需要新的队列和写日志线程
+    if _listener is None:
+        return
+    _handler.queue = _listener.queue = queue.Queue(_listener.queue.maxsize)
+    _listener._thread = None
+    _listener.start()
+
+def setup_logging(app, stream=None):
+    """
+    按应用配置初始化日志：LOG_LEVEL为级别，LOG_QUEUE_SIZE为队列容量，
+    LOG_DEBUG_SAMPLE_RATE为DEBUG日志的默认采样率，LOG_DEBUG_SAMPLING可按端点名覆盖采样率
+    返回队列处理器，其dropped属性为丢弃的日志条数
+    """
+    global _handler, _listener, _hooks_registered
+    # 先摘下旧的处理器再停止旧线程，停止时旧队列中的日志会全部写完
+    for old_handler in list(logger.handlers):
+        logger.removeHandler(old_handler)
+    _stop_listener()
+
+    log_queue = queue.Queue(app.config['LOG_QUEUE_SIZE'])
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+    listener = DrainingQueueListener(log_queue, output)
+    listener.start()
+    _handler, _listener = handler, listener
+
+    if not _hooks_registered:
+        _hooks_registered = True
+        atexit.register(_stop_listener)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_in_child)
+
+    logger.addHandler(handler)
+    logger.setLevel(app.config['LOG_LEVEL'])
+    logger.propagate = False
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    return handler
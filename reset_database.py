@@ -1,7 +1,10 @@
 import pymysql
-from app import app
+from app import create_app
 from models import db
 
+# 只访问数据库，不需要注册路由
+app = create_app(blueprints=())
+
 def reset_database():
     """重置数据库，删除所有表并重新创建"""
     print("开始重置数据库...")
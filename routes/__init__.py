@@ -0,0 +1,4 @@
+"""
+接口路由
+每个模块提供一个蓝图bp，由app.create_app按BLUEPRINTS导入并注册。
+"""
@@ -0,0 +1,1059 @@
+"""
+预约的创建、修改、取消、列表、日历和统计
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify
+from sqlalchemy import select, case
+from sqlalchemy.orm import joinedload, aliased
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User, Provider, Service, Booking, Review, Notification
+from availability import get_available_times, ACTIVE_BOOKING_STATUSES
+from ratings import apply_review_change
+from entity_cache import load_entity, load_entities
+from conditional import conditional_get
+from auth import auth_required
+from pagination import encode_cursor, decode_cursor, keyset_after, batch_load_by_id, parse_page_limit
+from request_logging import logger
+from slot_claims import is_claimed, claim_slot, convert_hold, release_hold, is_slot_conflict, is_duplicate_insert, \
+    HOLD_SECONDS
+
+bp = Blueprint('bookings', __name__)
+
+CALENDAR_CHUNK_SIZE = 500  # 日历视图每批从数据库读取的预约数
+
+# 预约读模型：仪表盘、统计等接口共用
+DASHBOARD_LIST_LIMIT = 20  # 仪表盘每个分组默认返回的预约数
+
+# 仪表盘分组 -> (预约状态, 是否倒序)；已完成的预约优先展示最近的
+DASHBOARD_SECTIONS = {
+    'pending': ('pending', False),
+    'upcoming': ('confirmed', False),
+    'completed': ('completed', True)
+}
+
+# 预约列表版本中分别计数的状态
+BOOKING_STATUSES = ('pending', 'confirmed', 'completed', 'canceled', 'cancelled', 'rejected', 'no-show')
+
+def booking_sort_columns():
+    """预约列表的排序键，同时也是游标分页的键"""
+    return [Booking.date, Booking.time, Booking.id]
+
+def encode_booking_cursor(booking):
+    """根据预约生成分页游标"""
+    return encode_cursor([booking.date, booking.time, booking.id])
+
+def decode_booking_cursor(cursor):
+    """解析预约分页游标，返回[date, time, id]；游标无效时返回None"""
+    values = decode_cursor(cursor)
+    if not values or len(values) != 3:
+        return None
+    try:
+        values[0] = datetime.strptime(values[0], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+    return values
+
+def booking_owner_filter(user_id, user_type):
+    """按用户类型返回预约归属条件"""
+    if user_type == 'user':
+        return Booking.user_id == user_id
+    return Booking.provider_id == user_id
+
+def get_booking_status_counts(user_id, user_type):
+    """一次GROUP BY查询统计各状态的预约数量"""
+    rows = db.session.query(Booking.status, db.func.count(Booking.id)).filter(
+        booking_owner_filter(user_id, user_type)
+    ).group_by(Booking.status).all()
+    return {status: count for status, count in rows}
+
+def booking_list_version(user_id, user_type, related=True):
+    """
+    当前用户全部预约的版本：数量、最后修改时间和各状态的数量(同一秒内的状态变化也能区分)，一次聚合查询
+    related为True时还包括关联的服务、服务的服务商以及对方(用户看服务商，服务商看用户)的最后修改时间
+    """
+    columns = [db.func.count(Booking.id), db.func.max(Booking.updated_at)]
+    columns += [db.func.sum(case((Booking.status == status, 1), else_=0)) for status in BOOKING_STATUSES]
+    query = select(*columns).select_from(Booking)
+    if related:
+        service_provider = aliased(Provider)
+        if user_type == 'provider':
+            counterpart = aliased(User)
+            counterpart_id = Booking.user_id
+        else:
+            counterpart = aliased(Provider)
+            counterpart_id = Booking.provider_id
+        query = query.add_columns(
+            db.func.max(Service.updated_at), db.func.max(service_provider.updated_at), db.func.max(counterpart.updated_at)
+        ).outerjoin(Service, Service.id == Booking.service_id) \
+            .outerjoin(service_provider, service_provider.id == Service.provider_id) \
+            .outerjoin(counterpart, counterpart.id == counterpart_id)
+    return tuple(db.session.execute(query.where(booking_owner_filter(user_id, user_type))).one())
+
+def dashboard_version(user_id, user_type):
+    return booking_list_version(user_id, user_type)
+
+def booking_stats_version(user_id, user_type):
+    """统计的版本：各状态数量和用户信息的updated_at，服务商信息与统计接口一样读实体缓存"""
+    if user_type == 'user':
+        owner = db.session.execute(select(User.updated_at).where(User.id == user_id)).scalar()
+    else:
+        provider = load_entity(Provider, user_id)
+        owner = provider.updated_at if provider else None
+    return booking_list_version(user_id, user_type, related=False) + (owner,)
+
+def load_dashboard_section(user_id, user_type, section, limit=DASHBOARD_LIST_LIMIT, cursor_values=None):
+    """加载仪表盘的一个预约分组，返回(预约列表, 下一页游标)"""
+    status, descending = DASHBOARD_SECTIONS[section]
+    counterpart = joinedload(Booking.user) if user_type == 'provider' else joinedload(Booking.provider)
+    
+    section_query = Booking.query.filter(
+        booking_owner_filter(user_id, user_type),
+        Booking.status == status
+    ).options(
+        joinedload(Booking.service).joinedload(Service.provider),
+        counterpart
+    )
+    
+    sort_columns = booking_sort_columns()
+    if cursor_values:
+        section_query = section_query.filter(keyset_after(sort_columns, cursor_values, descending))
+    if descending:
+        section_query = section_query.order_by(*[column.desc() for column in sort_columns])
+    else:
+        section_query = section_query.order_by(*sort_columns)
+    
+    bookings = section_query.limit(limit + 1).all()
+    next_cursor = encode_booking_cursor(bookings[limit - 1]) if len(bookings) > limit else None
+    return bookings[:limit], next_cursor
+
+def dashboard_booking_to_dict(booking, user_type):
+    """仪表盘中单个预约的数据结构"""
+    booking_data = booking.to_dict()
+    
+    # 获取服务详情
+    if booking.service:
+        booking_data['service'] = booking.service.to_dict()
+    
+    # 获取用户和服务商详情
+    if user_type == 'provider':
+        user = booking.user
+        if user:
+            booking_data['user'] = {
+                'id': user.id,
+                'username': user.username,
+                'email': user.email,
+                'avatar': user.avatar
+            }
+    else:
+        provider = booking.provider
+        if provider:
+            booking_data['provider'] = {
+                'id': provider.id,
+                'username': provider.username,
+                'business_name': provider.business_name,
+                'verified': provider.verified
+            }
+    
+    return booking_data
+
+# API路由：获取用户预约列表
+@bp.route('/api/bookings', methods=['GET'])
+@auth_required
+def get_bookings(user_id, user_type):
+    # 获取参数，判断是否只获取已完成的预约
+    completed_only = request.args.get('completed_only', 'false').lower() == 'true'
+    
+    # 分页参数：未提供limit时返回全部预约，提供时按(date, time, id)游标分页
+    limit = parse_page_limit()
+    cursor = request.args.get('cursor')
+    
+    # 是否已评价通过EXISTS子查询随预约一起取出，避免逐条查询评价表
+    has_reviewed = db.session.query(Review.id).filter(Review.booking_id == Booking.id).exists()
+    
+    # 根据用户类型查询预约，服务、服务商、用户信息在同一条语句中连接加载
+    counterpart = joinedload(Booking.user) if user_type == 'provider' else joinedload(Booking.provider)
+    bookings_query = db.session.query(Booking, has_reviewed).filter(
+        booking_owner_filter(user_id, user_type)
+    ).options(
+        joinedload(Booking.service).joinedload(Service.provider),
+        counterpart
+    )
+    
+    if completed_only:
+        bookings_query = bookings_query.filter(Booking.status == 'completed')
+    
+    sort_columns = booking_sort_columns()
+    if cursor:
+        cursor_values = decode_booking_cursor(cursor)
+        if not cursor_values:
+            return jsonify({'message': '无效的分页游标'}), 400
+        bookings_query = bookings_query.filter(keyset_after(sort_columns, cursor_values))
+    
+    bookings_query = bookings_query.order_by(*sort_columns)
+    if limit:
+        rows = bookings_query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        rows = bookings_query.all()
+        has_more = False
+    
+    result = []
+    for booking, reviewed in rows:
+        booking_data = booking.to_dict()
+        
+        # 获取服务详情
+        if booking.service:
+            booking_data['service'] = booking.service.to_dict()
+        
+        # 获取用户和服务商详情
+        if user_type == 'provider':
+            user = booking.user
+            if user:
+                booking_data['user'] = {
+                    'id': user.id,
+                    'username': user.username,
+                    'email': user.email
+                }
+        else:
+            provider = booking.provider
+            if provider:
+                booking_data['provider'] = {
+                    'id': provider.id,
+                    'username': provider.username,
+                    'business_name': provider.business_name
+                }
+        
+        # 检查是否已评价
+        booking_data['has_reviewed'] = bool(reviewed)
+        
+        result.append(booking_data)
+    
+    response = jsonify(result)
+    if limit:
+        response.headers['X-Has-More'] = 'true' if has_more else 'false'
+        if has_more:
+            response.headers['X-Next-Cursor'] = encode_booking_cursor(rows[-1][0])
+    return response, 200
+
+# API路由：获取仪表盘预约数据（待确认和即将到来的预约）
+@bp.route('/api/bookings/dashboard', methods=['GET'])
+@auth_required
+@conditional_get(dashboard_version)
+def get_dashboard_bookings(user_id, user_type):
+    # 分页参数：section指定只翻页某一个分组，cursor为该分组的下一页游标
+    limit = parse_page_limit(DASHBOARD_LIST_LIMIT)
+    section = request.args.get('section')
+    cursor = request.args.get('cursor')
+    
+    if section and section not in DASHBOARD_SECTIONS:
+        return jsonify({'message': f'无效的分组: {section}'}), 400
+    
+    cursor_values = None
+    if cursor:
+        if not section:
+            return jsonify({'message': '使用分页游标时必须指定section'}), 400
+        cursor_values = decode_booking_cursor(cursor)
+        if not cursor_values:
+            return jsonify({'message': '无效的分页游标'}), 400
+    
+    # 各分组分别做有上限的索引范围查询，关联数据连接加载
+    sections = [section] if section else list(DASHBOARD_SECTIONS)
+    result = {'next_cursors': {}}
+    for name in sections:
+        bookings, next_cursor = load_dashboard_section(user_id, user_type, name, limit, cursor_values)
+        result[name] = [dashboard_booking_to_dict(booking, user_type) for booking in bookings]
+        result['next_cursors'][name] = next_cursor
+    
+    # 各状态总数由一次GROUP BY查询得到；按游标翻页时客户端已有第一页返回的总数，不再重复统计
+    if not cursor_values:
+        status_counts = get_booking_status_counts(user_id, user_type)
+        result['counts'] = {name: status_counts.get(status, 0) for name, (status, _) in DASHBOARD_SECTIONS.items()}
+    
+    return jsonify(result), 200
+
+def check_slot_open(provider_id, date_obj, time_str):
+    """
+    下单和保留前的快速检查，只读取可用性索引和占用表的主键，不加锁
+    返回错误信息，时间段可以抢占时返回None
+    """
+    [(_, available_times)] = get_available_times(provider_id, date_obj)
+    if time_str not in available_times:
+        return '该时间段不可预约'
+    if is_claimed(db.session, provider_id, date_obj, time_str):
+        return '该时间段已被预约'
+    return None
+
+def parse_booking_slot(data):
+    """解析预约请求中的服务和时间，返回(service, date, time, 错误响应)"""
+    service_id = data.get('service_id')
+    date = data.get('date')
+    time = data.get('time')
+    
+    if not all([service_id, date, time]):
+        return None, None, None, (jsonify({'message': '服务ID、日期和时间都是必填的'}), 400)
+    
+    try:
+        date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+    except ValueError:
+        return None, None, None, (jsonify({'message': '日期格式无效，应为YYYY-MM-DD'}), 400)
+    
+    # 获取服务信息
+    service = load_entity(Service, service_id)
+    if not service:
+        return None, None, None, (jsonify({'message': '服务不存在'}), 404)
+    
+    return service, date_obj, time, None
+
+def replay_booking(user_id, idempotency_key):
+    """同一幂等键已创建过预约时返回原响应"""
+    booking = Booking.query.filter_by(user_id=user_id, idempotency_key=idempotency_key).first()
+    if not booking:
+        return None
+    response = jsonify({
+        'message': '预约创建成功',
+        'booking': booking.to_dict()
+    })
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response, 201
+
+# API路由：保留时间段，下单前的短期占用
+@bp.route('/api/bookings/holds', methods=['POST'])
+@auth_required
+def create_booking_hold(user_id, user_type):
+    if user_type != 'user':
+        return jsonify({'message': '只有用户才能保留时间段'}), 403
+    
+    service, date_obj, time, error = parse_booking_slot(request.json or {})
+    if error:
+        return error
+    
+    message = check_slot_open(service.provider_id, date_obj, time)
+    if message:
+        return jsonify({'message': message}), 409
+    
+    try:
+        hold_token = claim_slot(db.session, service.provider_id, date_obj, time, user_id, hold_seconds=HOLD_SECONDS)
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if is_slot_conflict(e):
+            return jsonify({'message': '该时间段已被预约'}), 409
+        logger.exception("保留时间段失败")
+        return jsonify({'message': '保留时间段失败'}), 500
+    
+    return jsonify({
+        'message': '时间段保留成功',
+        'hold_token': hold_token,
+        'service_id': service.id,
+        'date': date_obj.isoformat(),
+        'time': time,
+        'expires_in': HOLD_SECONDS
+    }), 201
+
+# API路由：释放保留的时间段
+@bp.route('/api/bookings/holds/<hold_token>', methods=['DELETE'])
+@auth_required
+def release_booking_hold(hold_token, user_id, user_type):
+    if not release_hold(db.session, hold_token, user_id):
+        db.session.rollback()
+        return jsonify({'message': '保留不存在或已下单'}), 404
+    
+    db.session.commit()
+    return jsonify({'message': '保留已释放'}), 200
+
+# API路由：创建预约
+@bp.route('/api/bookings', methods=['POST'])
+@auth_required
+def create_booking(user_id, user_type):
+    """
+    创建预约，时间段通过slot_claims主键原子抢占，并发请求只有一个成功，其余返回409。
+    请求体可带hold_token使用之前保留的时间段；请求头Idempotency-Key用于安全重试
+    """
+    if user_type != 'user':
+        return jsonify({'message': '只有用户才能创建预约'}), 403
+    
+    # 重试请求直接返回第一次创建的预约
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key:
+        if len(idempotency_key) > 64:
+            return jsonify({'message': 'Idempotency-Key不能超过64个字符'}), 400
+        replayed = replay_booking(user_id, idempotency_key)
+        if replayed:
+            return replayed
+    
+    data = request.json or {}
+    service, date_obj, time, error = parse_booking_slot(data)
+    if error:
+        return error
+    
+    provider_id = service.provider_id
+    hold_token = data.get('hold_token')
+    
+    # 创建新预约
+    new_booking = Booking(
+        user_id=user_id,
+        provider_id=provider_id,
+        service_id=service.id,
+        date=date_obj,
+        time=time,
+        status='pending',
+        idempotency_key=idempotency_key,
+        created_at=datetime.now()
+    )
+    
+    try:
+        if hold_token:
+            # 使用自己的保留下单
+            if not convert_hold(db.session, hold_token, user_id, provider_id, date_obj, time, new_booking.id):
+                db.session.rollback()
+                return jsonify({'message': '时间段保留无效或已过期'}), 409
+        else:
+            # 已被占用的时间段在抢占前快速拒绝
+            message = check_slot_open(provider_id, date_obj, time)
+            if message:
+                return jsonify({'message': message}), 409
+            claim_slot(db.session, provider_id, date_obj, time, user_id, booking_id=new_booking.id)
+        
+        db.session.add(new_booking)
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        # 只有时间段占用和幂等键的冲突是预期的，其他完整性错误不能报告为时间段已被预约
+        idempotency_conflict = idempotency_key and is_duplicate_insert(e, Booking.__table__)
+        if not (is_slot_conflict(e) or idempotency_conflict):
+            logger.exception("创建预约失败")
+            return jsonify({'message': '创建预约失败'}), 500
+        # 并发的同一幂等键请求已经成功
+        if idempotency_key:
+            replayed = replay_booking(user_id, idempotency_key)
+            if replayed:
+                return replayed
+        return jsonify({'message': '该时间段已被预约'}), 409
+    
+    return jsonify({
+        'message': '预约创建成功',
+        'booking': new_booking.to_dict()
+    }), 201
+
+# API路由：更新预约状态
+@bp.route('/api/bookings/<booking_id>', methods=['PUT'])
+@auth_required
+def update_booking(booking_id, user_id, user_type):
+    # 获取预约信息
+    booking = Booking.query.get(booking_id)
+    if not booking:
+        return jsonify({'message': '预约不存在'}), 404
+    
+    # 验证用户权限
+    if (user_type == 'user' and booking.user_id != user_id) or \
+       (user_type == 'provider' and booking.provider_id != user_id):
+        return jsonify({'message': '无权操作此预约'}), 403
+    
+    data = request.json or {}
+    status = data.get('status')
+    
+    if not status:
+        return jsonify({'message': '状态是必填的'}), 400
+    
+    # 记录原始状态，用于判断状态是否变更
+    original_status = booking.status
+    
+    # 无效预约重新变为有效时需要重新占用时间段
+    if status in ACTIVE_BOOKING_STATUSES and original_status not in ACTIVE_BOOKING_STATUSES:
+        try:
+            claim_slot(db.session, booking.provider_id, booking.date, booking.time, booking.user_id,
+                       booking_id=booking.id)
+            db.session.flush()
+        except IntegrityError as e:
+            db.session.rollback()
+            if is_slot_conflict(e):
+                return jsonify({'message': '该时间段已被预约'}), 409
+            logger.exception("重新占用时间段失败: %s", booking_id)
+            return jsonify({'message': '更新预约失败'}), 500
+    
+    # 更新预约状态
+    booking.status = status
+    
+    # 如果是完成状态，设置需要评价标记
+    if status == 'completed':
+        booking.review_needed = True
+    
+    booking.updated_at = datetime.now()
+    
+    try:
+        db.session.commit()
+        
+        # 获取服务和提供商信息，用于通知内容
+        service = load_entity(Service, booking.service_id)
+        provider = load_entity(Provider, booking.provider_id)
+        
+        service_title = service.title if service else "预约服务"
+        provider_name = provider.business_name if provider and provider.business_name else "服务提供商"
+        
+        # 根据状态变更发送不同的通知
+        if original_status != status:
+            # 当状态变为confirmed（已确认）时，发送确认通知
+            if status == 'confirmed' and user_type == 'provider':
+                # 创建用户通知
+                confirmation_notification = Notification(
+                    user_id=booking.user_id,
+                    type='booking',
+                    subtype='confirmation',
+                    title='预约已确认',
+                    content=f"您预约的 {service_title} 服务已被 {provider_name} 确认。预约时间：{booking.date.strftime('%Y-%m-%d')} {booking.time}",
+                    related_id=booking.id,
+                    created_at=datetime.now()
+                )
+                db.session.add(confirmation_notification)
+                db.session.commit()
+            
+            # 当状态变为completed（已完成）时，发送完成通知
+            elif status == 'completed' and user_type == 'provider':
+                # 创建用户通知
+                completion_notification = Notification(
+                    user_id=booking.user_id,
+                    type='booking',
+                    subtype='completion',
+                    title='预约已完成',
+                    content=f"您与 {provider_name} 的 {service_title} 服务预约已完成。请对本次服务进行评价。",
+                    related_id=booking.id,
+                    created_at=datetime.now()
+                )
+                db.session.add(completion_notification)
+                db.session.commit()
+            
+            # 当状态变为cancelled（已取消）时，发送取消通知
+            elif status == 'cancelled':
+                # 确定通知接收者（如果是用户取消，通知提供商；如果是提供商取消，通知用户）
+                recipient_id = booking.provider_id if user_type == 'user' else booking.user_id
+                
+                # 创建通知
+                cancellation_notification = Notification(
+                    user_id=recipient_id,
+                    type='booking',
+                    subtype='cancellation',
+                    title='预约已取消',
+                    content=f"{service_title} 服务预约已被取消。原定时间：{booking.date.strftime('%Y-%m-%d') if booking.date else ''} {booking.time}",
+                    related_id=booking.id,
+                    created_at=datetime.now()
+                )
+                db.session.add(cancellation_notification)
+                db.session.commit()
+        
+        return jsonify({
+            'message': '预约状态更新成功',
+            'booking': booking.to_dict()
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'更新预约失败: {str(e)}'}), 500
+
+# API路由：取消预约
+@bp.route('/api/bookings/<booking_id>', methods=['DELETE'])
+@auth_required
+def cancel_booking(booking_id, user_id, user_type):
+    logger.debug("开始处理取消预约请求: %s", booking_id)
+    
+    logger.debug("用户ID: %s, 类型: %s", user_id, user_type)
+    
+    try:
+        # 开始数据库事务
+        logger.debug("查询预约信息: %s", booking_id)
+        # 获取预约信息
+        booking = Booking.query.get(booking_id)
+        if not booking:
+            logger.warning("预约不存在: %s", booking_id)
+            return jsonify({'message': '预约不存在'}), 404
+        
+        logger.debug("找到预约: %s, 状态: %s, 用户: %s, 服务商: %s", booking_id, booking.status, booking.user_id, booking.provider_id)
+        
+        # 验证用户权限
+        if (user_type == 'user' and booking.user_id != user_id) or \
+           (user_type == 'provider' and booking.provider_id != user_id):
+            logger.warning("用户无权操作此预约: %s 尝试取消预约 %s", user_id, booking_id)
+            return jsonify({'message': '无权操作此预约'}), 403
+        
+        # 检查预约状态是否可取消
+        if booking.status in ['canceled', 'completed', 'no-show']:
+            logger.warning("预约状态不允许取消: %s", booking.status)
+            return jsonify({'message': f'当前状态({booking.status})的预约无法取消'}), 400
+            
+        # 记录原始状态
+        original_status = booking.status
+        
+        # 将预约状态改为已取消
+        logger.debug("更新预约状态: %s -> canceled", original_status)
+        booking.status = 'canceled'
+        booking.updated_at = datetime.now()
+        
+        try:
+            db.session.commit()
+            logger.debug("预约已成功取消")
+            
+            # 为用户和提供商创建取消通知
+            try:
+                # 获取服务和提供商信息，用于通知内容
+                service = load_entity(Service, booking.service_id)
+                provider = load_entity(Provider, booking.provider_id)
+                
+                service_title = service.title if service else "预约服务"
+                provider_name = provider.business_name if provider and provider.business_name else "服务提供商"
+                
+                # 如果是用户取消，通知提供商
+                if user_type == 'user':
+                    cancellation_notification = Notification(
+                        user_id=booking.provider_id,
+                        type='booking',
+                        subtype='cancellation',
+                        title='预约已取消',
+                        content=f"用户已取消 {service_title} 服务预约。原定时间：{booking.date.strftime('%Y-%m-%d') if booking.date else ''} {booking.time}",
+                        related_id=booking.id,
+                        created_at=datetime.now()
+                    )
+                    db.session.add(cancellation_notification)
+                
+                # 如果是提供商取消，通知用户
+                else:
+                    cancellation_notification = Notification(
+                        user_id=booking.user_id,
+                        type='booking',
+                        subtype='cancellation',
+                        title='预约已取消',
+                        content=f"{provider_name} 已取消您的 {service_title} 服务预约。原定时间：{booking.date.strftime('%Y-%m-%d') if booking.date else ''} {booking.time}",
+                        related_id=booking.id,
+                        created_at=datetime.now()
+                    )
+                    db.session.add(cancellation_notification)
+                
+                db.session.commit()
+                logger.debug("已创建取消通知")
+            except Exception as e:
+                logger.error("创建取消通知失败，但不影响主流程: %s", e)
+                db.session.rollback()
+                # 通知创建失败不影响主流程，继续返回成功
+            
+            return jsonify({'message': '预约已取消', 'booking_id': booking_id}), 200
+            
+        except Exception as e:
+            db.session.rollback()
+            logger.error("提交数据库事务失败: %s", e)
+            return jsonify({'message': f'取消预约失败: {str(e)}'}), 500
+            
+    except Exception as e:
+        logger.error("取消预约过程中发生错误: %s", e)
+        db.session.rollback()
+        return jsonify({'message': f'取消预约失败: {str(e)}'}), 500
+
+def booking_detail_version(booking_id, user_id, user_type):
+    """预约详情的版本：预约和用户的updated_at(一次查询)，服务和服务商的updated_at(实体缓存)；无权查看时返回None"""
+    row = db.session.execute(
+        select(Booking.user_id, Booking.provider_id, Booking.service_id, Booking.updated_at, Booking.status,
+               User.updated_at)
+        .outerjoin(User, User.id == Booking.user_id)
+        .where(Booking.id == booking_id)
+    ).first()
+    if not row or user_id not in (row[0], row[1]):
+        return None
+    service = load_entity(Service, row[2])
+    provider = load_entity(Provider, row[1])
+    return tuple(row[3:]) + (service.updated_at if service else None, provider.updated_at if provider else None)
+
+# API路由：获取单个预约详情
+@bp.route('/api/bookings/<booking_id>', methods=['GET'])
+@auth_required
+@conditional_get(booking_detail_version)
+def get_booking_detail(booking_id, user_id, user_type):
+    # 获取预约信息
+    booking = Booking.query.get(booking_id)
+    if not booking:
+        return jsonify({'message': '预约不存在'}), 404
+    
+    # 验证用户权限
+    if (user_type == 'user' and booking.user_id != user_id) or \
+       (user_type == 'provider' and booking.provider_id != user_id):
+        return jsonify({'message': '无权查看此预约'}), 403
+    
+    # 获取预约详情
+    booking_data = booking.to_dict()
+    
+    # 获取服务详情
+    service = load_entity(Service, booking.service_id)
+    if service:
+        booking_data['service'] = service.to_dict()
+    
+    # 获取服务提供商详情
+    provider = load_entity(Provider, booking.provider_id)
+    if provider:
+        booking_data['provider'] = {
+            'id': provider.id,
+            'username': provider.username,
+            'business_name': provider.business_name,
+            'rating': provider.rating,
+            'verified': provider.verified
+        }
+    
+    # 获取用户详情
+    user = User.query.get(booking.user_id)
+    if user:
+        booking_data['user'] = {
+            'id': user.id,
+            'username': user.username,
+            'avatar': user.avatar
+        }
+    
+    return jsonify(booking_data), 200
+
+# API路由：永久删除预约历史
+@bp.route('/api/bookings/<booking_id>/permanent', methods=['DELETE'])
+@auth_required
+def delete_booking_permanently(booking_id, user_id, user_type):
+    # 获取预约信息
+    booking = Booking.query.get(booking_id)
+    if not booking:
+                        return jsonify({'message': '预约不存在'}), 404
+    
+    # 验证用户权限
+    if (user_type == 'user' and booking.user_id != user_id) or \
+       (user_type == 'provider' and booking.provider_id != user_id):
+                        return jsonify({'message': '无权操作此预约'}), 403
+    
+    # 验证预约状态，只能删除已完成的预约
+    if booking.status != 'completed':
+                        return jsonify({'message': '只能删除已完成的预约'}), 400
+    
+    try:
+        # 先删除关联的评价（如果有），并从评分计数中扣除
+        for review in Review.query.filter_by(booking_id=booking_id).all():
+            apply_review_change(review.service_id, review.provider_id, removed=[review.rating])
+            db.session.delete(review)
+        
+        # 删除预约
+        db.session.delete(booking)
+        db.session.commit()
+        
+        return jsonify({'message': '预约历史已永久删除'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'删除预约历史失败: {str(e)}'}), 500
+
+# API路由：获取仪表板统计数据
+@bp.route('/api/bookings/stats', methods=['GET'])
+@auth_required
+@conditional_get(booking_stats_version)
+def get_booking_stats(user_id, user_type):
+    # 创建统计数据结构
+    stats = {
+        'pending': 0,     # 待确认
+        'upcoming': 0,    # 即将到来
+        'completed': 0,   # 已完成
+        'canceled': 0     # 已取消
+    }
+    
+    try:
+        # 一次GROUP BY查询得到各状态的预约数量
+        status_counts = get_booking_status_counts(user_id, user_type)
+        stats['pending'] = status_counts.get('pending', 0)
+        stats['upcoming'] = status_counts.get('confirmed', 0)
+        stats['completed'] = status_counts.get('completed', 0)
+        stats['canceled'] = status_counts.get('canceled', 0)
+        
+        # 获取用户信息
+        user_info = None
+        if user_type == 'user':
+            user = User.query.get(user_id)
+            if user:
+                user_info = {
+                    'id': user.id,
+                    'username': user.username,
+                    'name': user.nickname or user.username,
+                    'role': '普通用户'
+                }
+        else:  # provider
+            provider = load_entity(Provider, user_id)
+            if provider:
+                user_info = {
+                    'id': provider.id,
+                    'username': provider.username,
+                    'name': provider.business_name or provider.username,
+                    'role': '服务商'
+                }
+        
+        # 返回统计数据和用户信息
+        return jsonify({
+            'stats': stats,
+            'user': user_info
+        }), 200
+    
+    except Exception as e:
+                        return jsonify({'message': f'获取统计数据失败: {str(e)}'}), 500
+
+def provider_booking_to_dict(booking, users, services):
+    """服务商日历和预约列表中单个预约的数据结构，users/services为批量加载的{id: 实体}"""
+    booking_data = booking.to_dict()
+    # 补充用户信息
+    user = users.get(booking.user_id)
+    booking_data['user'] = {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email
+    } if user else None
+    # 补充服务信息
+    service = services.get(booking.service_id)
+    booking_data['service'] = {
+        'id': service.id,
+        'title': service.title,
+        'price': service.price,
+        'duration': service.duration
+    } if service else None
+    return booking_data
+
+def calendar_window(view, anchor):
+    """根据视图类型(week/month)和参考日期计算日历窗口的起止日期"""
+    if view == 'week':
+        start = anchor - timedelta(days=anchor.weekday())
+        return start, start + timedelta(days=6)
+    if view == 'month':
+        start = anchor.replace(day=1)
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    raise ValueError(f'无效的视图类型: {view}')
+
+# API路由：日历视图，获取某时间段内的预约，按日期分组；服务商看到自己收到的预约，普通用户看到自己的预约
+@bp.route('/api/bookings/calendar', methods=['GET'])
+@auth_required
+def get_bookings_calendar(user_id, user_type):
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    view = request.args.get('view')
+    service_id = request.args.get('service_id')
+    status = request.args.get('status')
+
+    # 起止日期可直接给出，也可以用 view=week|month 加参考日期 date 计算
+    try:
+        if start_date and end_date:
+            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+        elif view:
+            anchor = request.args.get('date')
+            anchor_obj = datetime.strptime(anchor, '%Y-%m-%d').date() if anchor else datetime.now().date()
+            start_date_obj, end_date_obj = calendar_window(view, anchor_obj)
+        else:
+                            return jsonify({'message': '起止日期(start_date, end_date)为必填'}), 400
+    except ValueError as e:
+        return jsonify({'message': f'日期参数无效: {str(e)}'}), 400
+
+    # 服务商+日期范围走(provider_id, date)索引，状态和服务筛选在SQL中完成
+    calendar_query = Booking.query.filter(
+        booking_owner_filter(user_id, user_type),
+        Booking.date >= start_date_obj,
+        Booking.date <= end_date_obj
+    )
+    if service_id:
+        calendar_query = calendar_query.filter(Booking.service_id == service_id)
+    if status:
+        calendar_query = calendar_query.filter(Booking.status == status)
+
+    # 按日期顺序分批读取，每批的IN查询有上限；结果按日期分组 {"YYYY-MM-DD": [...], ...}
+    # 整个窗口组装完成后再序列化，出错时返回错误而不是截断的JSON
+    sort_columns = booking_sort_columns()
+    result = {}
+    users, services = {}, {}
+    last_values = None
+    while True:
+        chunk_query = calendar_query
+        if last_values:
+            chunk_query = chunk_query.filter(keyset_after(sort_columns, last_values))
+        chunk = chunk_query.order_by(*sort_columns).limit(CALENDAR_CHUNK_SIZE).all()
+        if not chunk:
+            break
+
+        # 每批只对尚未加载过的用户做一次IN查询，服务优先读实体缓存
+        users.update(batch_load_by_id(User, {b.user_id for b in chunk if b.user_id not in users}))
+        services.update(load_entities(Service, {b.service_id for b in chunk if b.service_id not in services}))
+
+        for booking in chunk:
+            result.setdefault(booking.date.isoformat(), []).append(provider_booking_to_dict(booking, users, services))
+
+        if len(chunk) < CALENDAR_CHUNK_SIZE:
+            break
+        last_values = [chunk[-1].date, chunk[-1].time, chunk[-1].id]
+
+    return jsonify(result), 200
+
+# API路由：服务商预约管理列表视图，获取预约列表
+@bp.route('/api/bookings/provider', methods=['GET'])
+@auth_required
+def get_provider_bookings(user_id, user_type):
+    if user_type != 'provider':
+                        return jsonify({'message': '只有服务商可以查看预约列表'}), 403
+
+    status = request.args.get('status')
+    service_id = request.args.get('service_id')
+    date = request.args.get('date')
+    limit = parse_page_limit()
+    cursor = request.args.get('cursor')
+
+    # 筛选条件全部下推到SQL
+    bookings_query = Booking.query.filter(Booking.provider_id == user_id)
+    if status:
+        bookings_query = bookings_query.filter(Booking.status == status)
+    if service_id:
+        bookings_query = bookings_query.filter(Booking.service_id == service_id)
+    if date:
+        try:
+            date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'message': '日期格式无效，应为YYYY-MM-DD'}), 400
+        bookings_query = bookings_query.filter(Booking.date == date_obj)
+
+    # 按预约时间倒序排序，可选游标分页
+    sort_columns = booking_sort_columns()
+    if cursor:
+        cursor_values = decode_booking_cursor(cursor)
+        if not cursor_values:
+            return jsonify({'message': '无效的分页游标'}), 400
+        bookings_query = bookings_query.filter(keyset_after(sort_columns, cursor_values, descending=True))
+    bookings_query = bookings_query.order_by(*[column.desc() for column in sort_columns])
+
+    if limit:
+        provider_bookings = bookings_query.limit(limit + 1).all()
+        next_cursor = encode_booking_cursor(provider_bookings[limit - 1]) if len(provider_bookings) > limit else None
+        provider_bookings = provider_bookings[:limit]
+    else:
+        provider_bookings = bookings_query.all()
+        next_cursor = None
+
+    # 用户信息用一次IN查询补充，服务优先读实体缓存
+    users = batch_load_by_id(User, {b.user_id for b in provider_bookings})
+    services = load_entities(Service, {b.service_id for b in provider_bookings})
+
+    result = {'bookings': [provider_booking_to_dict(b, users, services) for b in provider_bookings]}
+    if limit:
+        result['next_cursor'] = next_cursor
+    return jsonify(result), 200
+
+# API路由：服务商确认预约
+@bp.route('/api/bookings/<booking_id>/accept', methods=['PUT'])
+@auth_required
+def accept_booking(booking_id, user_id, user_type):
+    # 确保是服务商
+    if user_type != 'provider':
+        return jsonify({'message': '只有服务商可以确认预约'}), 403
+    
+    try:
+        # 查询预约
+        booking = Booking.query.get(booking_id)
+        if not booking:
+            return jsonify({'message': '找不到预约'}), 404
+        
+        # 检查权限
+        if booking.provider_id != user_id:
+            return jsonify({'message': '无权操作此预约'}), 403
+        
+        # 检查预约状态
+        if booking.status != 'pending':
+            return jsonify({'message': '只有待确认预约才能被确认'}), 400
+        
+        # 更新预约状态
+        booking.status = 'confirmed'
+        booking.updated_at = datetime.now()
+        
+        # 创建通知
+        try:
+            notification = Notification(
+                user_id=booking.user_id,
+                title='预约已确认',
+                message=f'您的预约 {booking.date} {booking.time} 已被服务商确认',
+                type='booking',
+                subtype='confirmed',
+                data=json.dumps({
+                    'booking_id': booking_id,
+                    'service_id': booking.service_id,
+                    'provider_id': booking.provider_id
+                })
+            )
+            db.session.add(notification)
+        except Exception as e:
+            logger.error("创建通知失败: %s", e)
+        
+        # 保存更改
+        db.session.commit()
+        
+        # 返回更新后的预约
+        return jsonify({
+            'message': '预约已确认',
+            'booking': booking.to_dict()
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'确认预约失败: {str(e)}'}), 500
+
+# API路由：服务商拒绝预约
+@bp.route('/api/bookings/<booking_id>/reject', methods=['PUT'])
+@auth_required
+def reject_booking(booking_id, user_id, user_type):
+    # 确保是服务商
+    if user_type != 'provider':
+        return jsonify({'message': '只有服务商可以拒绝预约'}), 403
+    
+    try:
+        # 查询预约
+        booking = Booking.query.get(booking_id)
+        if not booking:
+            return jsonify({'message': '找不到预约'}), 404
+        
+        # 检查权限
+        if booking.provider_id != user_id:
+            return jsonify({'message': '无权操作此预约'}), 403
+        
+        # 检查预约状态
+        if booking.status != 'pending':
+            return jsonify({'message': '只有待确认预约才能被拒绝'}), 400
+        
+        # 获取拒绝原因
+        data = request.json or {}
+        
+        # 更新预约状态
+        booking.status = 'rejected'
+        booking.reject_reason = data.get('reason', '')
+        booking.reject_message = data.get('message', '')
+        booking.updated_at = datetime.now()
+        
+        # 创建通知
+        try:
+            notification = Notification(
+                user_id=booking.user_id,
+                title='预约已拒绝',
+                message=f'您的预约 {booking.date} {booking.time} 已被服务商拒绝',
+                type='booking',
+                subtype='rejected',
+                data=json.dumps({
+                    'booking_id': booking_id,
+                    'service_id': booking.service_id,
+                    'provider_id': booking.provider_id,
+                    'reason': booking.reject_reason,
+                    'message': booking.reject_message
+                })
+            )
+            db.session.add(notification)
+        except Exception as e:
+            logger.error("创建通知失败: %s", e)
+        
+        # 保存更改
+        db.session.commit()
+        
+        # 返回更新后的预约
+        return jsonify({
+            'message': '预约已拒绝',
+            'booking': booking.to_dict()
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'拒绝预约失败: {str(e)}'}), 500
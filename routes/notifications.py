@@ -0,0 +1,242 @@
+"""
+用户通知列表、未读数和已读状态
+"""
+
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify
+
+from models import db, Provider, Service, Booking, Review, Notification
+from notifications import get_unread_count, mark_all_read
+from entity_cache import load_entities
+from conditional import conditional_get
+from auth import auth_required
+from pagination import encode_cursor, decode_cursor, keyset_after, batch_load_by_id, parse_page_limit
+
+bp = Blueprint('notifications', __name__)
+
+NOTIFICATION_PAGE_SIZE = 20  # 未提供limit时每页返回的通知数
+
+def decode_notification_cursor(cursor):
+    """解析通知分页游标，返回[created_at, id]；游标无效时返回None"""
+    values = decode_cursor(cursor)
+    if not values or len(values) != 2:
+        return None
+    try:
+        values[0] = datetime.fromisoformat(values[0])
+    except (TypeError, ValueError):
+        return None
+    return values
+
+def attach_notification_entities(notifications):
+    """
+    将通知转换为字典列表并添加相关实体信息(related_entity)
+    预约、评价各用一次IN查询批量加载，服务、服务商读实体缓存，查询次数与通知数量无关
+    """
+    booking_ids = [n.related_id for n in notifications if n.type == 'booking' and n.related_id]
+    review_ids = [n.related_id for n in notifications if n.type == 'review' and n.related_id]
+    bookings = batch_load_by_id(Booking, booking_ids)
+    reviews = batch_load_by_id(Review, review_ids)
+    services = load_entities(
+        Service,
+        [b.service_id for b in bookings.values()] + [r.service_id for r in reviews.values()]
+    )
+    providers = load_entities(Provider, [b.provider_id for b in bookings.values()])
+
+    notifications_data = []
+    for notification in notifications:
+        notification_data = notification.to_dict()
+        
+        # 如果通知与预约相关
+        if notification.type == 'booking' and notification.related_id in bookings:
+            booking = bookings[notification.related_id]
+            related_entity = {
+                'booking_id': booking.id,
+                'service_id': booking.service_id,
+                'provider_id': booking.provider_id,
+                'date': booking.date.isoformat(),
+                'time': booking.time,
+                'status': booking.status
+            }
+            
+            # 添加服务信息
+            service = services.get(booking.service_id)
+            if service:
+                related_entity['service'] = {
+                    'title': service.title,
+                    'image': service.image
+                }
+            
+            # 添加提供商信息
+            provider = providers.get(booking.provider_id)
+            if provider:
+                related_entity['provider'] = {
+                    'business_name': provider.business_name
+                }
+            notification_data['related_entity'] = related_entity
+        
+        # 如果通知与评价相关
+        elif notification.type == 'review' and notification.related_id in reviews:
+            review = reviews[notification.related_id]
+            related_entity = {
+                'review_id': review.id,
+                'service_id': review.service_id,
+                'provider_id': review.provider_id,
+                'booking_id': review.booking_id,
+                'rating': review.rating,
+                'content': review.content,
+                'reply': review.reply,
+                'created_at': review.created_at.isoformat()
+            }
+            
+            # 添加服务信息
+            service = services.get(review.service_id)
+            if service:
+                related_entity['service'] = {
+                    'title': service.title,
+                    'image': service.image
+                }
+            notification_data['related_entity'] = related_entity
+        
+        notifications_data.append(notification_data)
+    return notifications_data
+
+# API路由：获取用户通知
+@bp.route('/api/user/notifications', methods=['GET'])
+@auth_required
+def get_user_notifications(user_id, user_type):
+    # 总是分页，未提供limit的客户端也只拿到第一页
+    limit = parse_page_limit(NOTIFICATION_PAGE_SIZE)
+    cursor = request.args.get('cursor')
+    
+    try:
+        # 按(created_at, id)倒序的键集分页，走(user_id, created_at)索引
+        sort_columns = [Notification.created_at, Notification.id]
+        notifications_query = Notification.query.filter_by(user_id=user_id)
+        if cursor:
+            cursor_values = decode_notification_cursor(cursor)
+            if not cursor_values:
+                return jsonify({'message': '无效的分页游标'}), 400
+            notifications_query = notifications_query.filter(keyset_after(sort_columns, cursor_values, descending=True))
+        
+        notifications_query = notifications_query.order_by(Notification.created_at.desc(), Notification.id.desc())
+        notifications = notifications_query.limit(limit + 1).all()
+        has_more = len(notifications) > limit
+        notifications = notifications[:limit]
+        
+        # 相关实体按类型各用一次IN查询加载
+        notifications_data = attach_notification_entities(notifications)
+        
+        response = jsonify(notifications_data)
+        response.headers['X-Has-More'] = 'true' if has_more else 'false'
+        if has_more:
+            response.headers['X-Next-Cursor'] = encode_cursor([notifications[-1].created_at, notifications[-1].id])
+        return response, 200
+    except Exception as e:
+                        return jsonify({'message': f'获取通知失败: {str(e)}'}), 500
+
+# API路由：获取未读通知数量
+@bp.route('/api/user/notifications/unread-count', methods=['GET'])
+@auth_required
+@conditional_get()
+def get_unread_notification_count(user_id, user_type):
+    try:
+        # 只读取计数表中的一行
+        return jsonify({'unread_count': get_unread_count(user_id)}), 200
+    except Exception as e:
+                        return jsonify({'message': f'获取未读通知数量失败: {str(e)}'}), 500
+
+# API路由：标记通知为已读
+@bp.route('/api/user/notifications/<notification_id>/read', methods=['PUT'])
+@auth_required
+def mark_notification_as_read(notification_id, user_id, user_type):
+    try:
+        # 查询通知
+        notification = Notification.query.filter_by(id=notification_id, user_id=user_id).first()
+        if not notification:
+                            return jsonify({'message': '通知不存在或无权访问'}), 404
+        
+        # 标记为已读
+        notification.is_read = True
+        notification.updated_at = datetime.now()
+        
+        db.session.commit()
+        
+        return jsonify({'message': '通知已标记为已读'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'标记通知失败: {str(e)}'}), 500
+
+# API路由：标记所有通知为已读
+@bp.route('/api/user/notifications/read-all', methods=['PUT'])
+@auth_required
+def mark_all_notifications_as_read(user_id, user_type):
+    try:
+        # 一条UPDATE标记所有未读通知，并扣减未读计数
+        count = mark_all_read(user_id)
+        db.session.commit()
+        
+        return jsonify({'message': '所有通知已标记为已读', 'count': count}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'标记所有通知失败: {str(e)}'}), 500
+
+# API路由：删除通知
+@bp.route('/api/user/notifications/<notification_id>', methods=['DELETE'])
+@auth_required
+def delete_notification(notification_id, user_id, user_type):
+    try:
+        # 查询通知
+        notification = Notification.query.filter_by(id=notification_id, user_id=user_id).first()
+        if not notification:
+                            return jsonify({'message': '通知不存在或无权访问'}), 404
+        
+        # 删除通知
+        db.session.delete(notification)
+        db.session.commit()
+        
+        return jsonify({'message': '通知已删除'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'删除通知失败: {str(e)}'}), 500
+
+# API路由：创建通知
+@bp.route('/api/notifications', methods=['POST'])
+@auth_required
+def create_notification(user_id, user_type):
+    # 只有服务提供商可以创建通知
+    if user_type != 'provider':
+                        return jsonify({'message': '无权创建通知'}), 403
+    
+    data = request.json or {}
+    user_id = data.get('user_id')
+    type = data.get('type')
+    subtype = data.get('subtype')
+    title = data.get('title')
+    content = data.get('content')
+    related_id = data.get('related_id')
+    
+    # 验证必填字段
+    if not all([user_id, type, title, content]):
+                        return jsonify({'message': '缺少必要的通知信息'}), 400
+    
+    try:
+        # 创建新通知
+        new_notification = Notification(
+            user_id=user_id,
+            type=type,
+            subtype=subtype,
+            title=title,
+            content=content,
+            related_id=related_id,
+            is_read=False,
+            created_at=datetime.now()
+        )
+        
+        db.session.add(new_notification)
+        db.session.commit()
+        
+        return jsonify({'message': '通知创建成功', 'notification': new_notification.to_dict()}), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'创建通知失败: {str(e)}'}), 500
@@ -0,0 +1,671 @@
+"""
+服务商的业务信息、设置、营业时间、资质、统计和可用时间
+"""
+
+import json
+import os
+import uuid
+import urllib.parse
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.utils import secure_filename
+from sqlalchemy import select
+
+from models import db, User, Provider, Service, Booking, Review
+from availability import get_available_times, MAX_AVAILABILITY_DAYS
+from ratings import RATING_VALUES
+from entity_cache import load_entity
+from conditional import conditional_get
+from auth import auth_required
+from request_logging import logger
+from uploads import allowed_file
+from routes.bookings import calendar_window
+
+bp = Blueprint('provider', __name__)
+
+# API路由：获取所有服务提供商
+@bp.route('/api/providers', methods=['GET'])
+@auth_required
+def get_all_providers(user_id, user_type):
+    # 查询所有服务提供商
+    providers = Provider.query.all()
+    
+    # 转换为JSON格式
+    result = []
+    for provider in providers:
+        provider_data = provider.to_dict()
+        result.append(provider_data)
+    
+    return jsonify(result), 200
+
+def provider_business_version(user_id, user_type):
+    """业务信息的版本：服务商的updated_at"""
+    if user_type != 'provider':
+        return None
+    return db.session.execute(select(Provider.updated_at).where(Provider.id == user_id)).first()
+
+# API路由：获取/更新服务商业务信息
+@bp.route('/api/provider/business', methods=['GET', 'PUT'])
+@auth_required
+@conditional_get(provider_business_version)
+def provider_business(user_id, user_type):
+    """获取或更新当前服务商的业务信息"""
+    logger.debug("API被调用: /api/provider/business [%s]", request.method)
+    
+    try:
+        logger.debug("认证用户: %s %s", user_type, user_id)
+        
+        # 确保是服务商
+        if user_type != 'provider':
+            logger.warning("用户类型错误: %s", user_type)
+            return jsonify({'message': '权限不足，仅服务商可访问此接口'}), 403
+        
+        try:
+            # 从数据库获取服务商信息
+            provider = Provider.query.get(user_id)
+            if not provider:
+                                return jsonify({'message': '服务商不存在'}), 404
+            
+            # 处理GET请求 - 获取业务信息
+            if request.method == 'GET':
+                try:
+                    logger.debug("正在为服务商 %s 读取业务信息...", user_id)
+                    
+                    # 返回业务信息
+                    business_info = {
+                        'business_name': provider.business_name or '',
+                        'business_description': provider.business_description or '',
+                        'business_type': provider.business_type or '',
+                        'license_no': provider.license_no or '',
+                        'province': provider.province or '',
+                        'city': provider.city or '',
+                        'district': provider.district or '',
+                        'detail_address': provider.detail_address or '',
+                        'open_time': provider.open_time or '08:00',
+                        'close_time': provider.close_time or '21:00',
+                        'holiday_desc': provider.holiday_desc or '',
+                        'phone': provider.phone or '',
+                        'service_phone': provider.service_phone or ''
+                    }
+                    
+                    logger.debug("成功读取服务商业务信息")
+                    response = jsonify({'business_info': business_info, 'message': '业务信息获取成功'})
+                    return response
+                
+                except Exception as e:
+                    logger.error("获取服务商业务信息失败: %s", e)
+                    return jsonify({'message': f'获取业务信息失败: {str(e)}'}), 500
+            
+            # 处理PUT请求 - 更新业务信息
+            elif request.method == 'PUT':
+                try:
+                    logger.debug("正在为服务商 %s 更新业务信息...", user_id)
+                    
+                    # 获取请求体内容
+                    data = None
+                    if request.is_json:
+                        try:
+                            data = request.get_json() or {}
+                        except Exception as e:
+                            logger.error("解析JSON请求体失败: %s", e)
+                            return jsonify({'message': f'无效的JSON格式: {str(e)}'}), 400
+                    else:
+                        # 尝试手动解析请求体
+                        try:
+                            data = json.loads(request.data.decode('utf-8')) or {}
+                        except Exception as e:
+                            logger.error("解析请求体失败: %s", e)
+                            logger.debug("请求体内容: %.1000r", request.data)
+                            return jsonify({'message': f'无效的JSON格式: {str(e)}'}), 400
+                    
+                    if not data:
+                        logger.warning("请求数据为空")
+                        return jsonify({'message': '请求数据为空或格式错误'}), 400
+                    
+                    # 输出接收到的数据以便调试
+                    logger.debug("接收到的数据: %s", data)
+                    
+                    # 验证必填字段
+                    if 'business_name' in data and not data['business_name'].strip():
+                        logger.warning("商家名称为空")
+                        return jsonify({'message': '商家名称不能为空'}), 400
+                    
+                    # 验证营业时间格式和逻辑
+                    if 'open_time' in data and 'close_time' in data:
+                        try:
+                            open_parts = data['open_time'].split(':')
+                            close_parts = data['close_time'].split(':')
+                            
+                            if len(open_parts) != 2 or len(close_parts) != 2:
+                                                return jsonify({'message': '时间格式必须为HH:MM'}), 400
+                            
+                            open_hour, open_min = int(open_parts[0]), int(open_parts[1])
+                            close_hour, close_min = int(close_parts[0]), int(close_parts[1])
+                            
+                            if open_hour < 0 or open_hour > 23 or open_min < 0 or open_min > 59:
+                                                return jsonify({'message': '开始时间格式无效'}), 400
+                            
+                            if close_hour < 0 or close_hour > 23 or close_min < 0 or close_min > 59:
+                                                return jsonify({'message': '结束时间格式无效'}), 400
+                            
+                            if (open_hour > close_hour) or (open_hour == close_hour and open_min >= close_min):
+                                                return jsonify({'message': '结束时间必须晚于开始时间'}), 400
+                        except ValueError:
+                                            return jsonify({'message': '时间格式必须为HH:MM'}), 400
+                        except Exception as e:
+                            logger.error("验证时间格式失败: %s", e)
+                            return jsonify({'message': f'验证时间格式失败: {str(e)}'}), 400
+                    
+                    # 更新服务商业务信息
+                    if 'business_name' in data:
+                        provider.business_name = data['business_name']
+                    if 'business_description' in data:
+                        provider.business_description = data['business_description']
+                    if 'business_type' in data:
+                        provider.business_type = data['business_type']
+                    if 'license_no' in data:
+                        provider.license_no = data['license_no']
+                    if 'province' in data:
+                        provider.province = data['province']
+                    if 'city' in data:
+                        provider.city = data['city']
+                    if 'district' in data:
+                        provider.district = data['district']
+                    if 'detail_address' in data:
+                        provider.detail_address = data['detail_address']
+                    if 'open_time' in data:
+                        provider.open_time = data['open_time']
+                    if 'close_time' in data:
+                        provider.close_time = data['close_time']
+                    if 'holiday_desc' in data:
+                        provider.holiday_desc = data['holiday_desc']
+                    if 'phone' in data:
+                        provider.phone = data['phone']
+                    if 'service_phone' in data:
+                        provider.service_phone = data['service_phone']
+                    
+                    # 更新修改时间
+                    provider.updated_at = datetime.now()
+                    
+                    # 提交更改到数据库
+                    db.session.commit()
+                    
+                    # 返回成功信息和更新后的数据
+                    result = {
+                        'message': '业务信息已更新',
+                        'business_info': {
+                            'business_name': provider.business_name or '',
+                            'business_description': provider.business_description or '',
+                            'business_type': provider.business_type or '',
+                            'license_no': provider.license_no or '',
+                            'province': provider.province or '',
+                            'city': provider.city or '',
+                            'district': provider.district or '',
+                            'detail_address': provider.detail_address or '',
+                            'open_time': provider.open_time or '08:00',
+                            'close_time': provider.close_time or '21:00',
+                            'holiday_desc': provider.holiday_desc or '',
+                            'phone': provider.phone or '',
+                            'service_phone': provider.service_phone or ''
+                        }
+                    }
+                    
+                    logger.debug("服务商业务信息已更新")
+                    logger.debug("返回数据: %s", result)
+                    
+                    # 确保返回的是有效的JSON
+                    response = jsonify(result)
+                    return response, 200
+                    
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error("更新服务商业务信息失败: %s", e)
+                    return jsonify({'message': f'更新业务信息失败: {str(e)}'}), 500
+        except Exception as e:
+            logger.error("数据库操作失败: %s", e)
+            return jsonify({'message': f'数据库操作失败: {str(e)}'}), 500
+    
+    except Exception as e:
+        logger.error("处理请求时发生错误: %s", e)
+        return jsonify({'message': f'系统错误: {str(e)}'}), 500
+
+@bp.route('/api/provider/<provider_id>/available-timeslots', methods=['GET'])
+def get_provider_available_timeslots(provider_id):
+    """获取服务提供商特定日期的可用时间段（客户预约使用），直接读取可用性索引"""
+    # 解码provider_id
+    provider_id = urllib.parse.unquote(provider_id)
+    date = request.args.get('date')
+    
+    if not date:
+        return jsonify({'message': '缺少日期参数'}), 400
+    
+    try:
+        # 解析日期字符串
+        date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+        
+        [(_, available_times)] = get_available_times(provider_id, date_obj)
+        
+        return jsonify({
+            'date': date,
+            'available_times': available_times
+        }), 200
+        
+    except ValueError:
+        return jsonify({'message': '日期格式无效，应为YYYY-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'message': f'获取可用时间段失败: {str(e)}'}), 500
+
+@bp.route('/api/provider/<provider_id>/availability', methods=['GET'])
+def get_provider_availability(provider_id):
+    """
+    获取服务提供商多天的可用时间段（客户预约使用）
+    参数为start_date/end_date，或view(week/month)加参考日期date
+    """
+    provider_id = urllib.parse.unquote(provider_id)
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    view = request.args.get('view')
+    
+    try:
+        if start_date and end_date:
+            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+        elif view:
+            anchor = request.args.get('date')
+            anchor_obj = datetime.strptime(anchor, '%Y-%m-%d').date() if anchor else datetime.now().date()
+            start_date_obj, end_date_obj = calendar_window(view, anchor_obj)
+        else:
+            return jsonify({'message': '需要提供start_date和end_date，或view参数'}), 400
+    except ValueError:
+        return jsonify({'message': '日期格式无效，应为YYYY-MM-DD，view应为week或month'}), 400
+    
+    if end_date_obj < start_date_obj:
+        return jsonify({'message': '结束日期不能早于开始日期'}), 400
+    if (end_date_obj - start_date_obj).days >= MAX_AVAILABILITY_DAYS:
+        return jsonify({'message': f'查询范围不能超过{MAX_AVAILABILITY_DAYS}天'}), 400
+    
+    try:
+        days = get_available_times(provider_id, start_date_obj, end_date_obj)
+        return jsonify({
+            'provider_id': provider_id,
+            'start_date': start_date_obj.isoformat(),
+            'end_date': end_date_obj.isoformat(),
+            'days': [
+                {'date': date_obj.isoformat(), 'available_times': available_times}
+                for date_obj, available_times in days
+            ]
+        }), 200
+    except Exception as e:
+        return jsonify({'message': f'获取可用时间段失败: {str(e)}'}), 500
+
+# API路由：提供商设置
+@bp.route('/api/provider/settings', methods=['GET', 'PUT'])
+@auth_required
+def provider_settings(user_id, user_type):
+    logger.debug("API被调用: /api/provider/settings [%s]", request.method)
+    
+    # 确保是服务提供商
+    if user_type != 'provider':
+        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    # 获取提供商
+    provider = Provider.query.get(user_id)
+    if not provider:
+        return jsonify({'message': '提供商不存在'}), 404
+    
+    # 处理GET请求 - 获取设置
+    if request.method == 'GET':
+        # 从provider表中获取设置，如果不存在则返回默认值
+        settings = {
+            'booking_notice_time': provider.booking_notice_time if hasattr(provider, 'booking_notice_time') else 24,
+            'max_booking_per_day': provider.max_booking_per_day if hasattr(provider, 'max_booking_per_day') else 10,
+            'allow_instant_booking': provider.allow_instant_booking if hasattr(provider, 'allow_instant_booking') else True,
+            'auto_confirm_booking': provider.auto_confirm_booking if hasattr(provider, 'auto_confirm_booking') else False
+        }
+        return jsonify(settings), 200
+    
+    # 处理PUT请求 - 更新设置
+    elif request.method == 'PUT':
+        data = request.json or {}
+        
+        # 更新设置
+        if 'booking_notice_time' in data:
+            provider.booking_notice_time = data['booking_notice_time']
+        if 'max_booking_per_day' in data:
+            provider.max_booking_per_day = data['max_booking_per_day']
+        if 'allow_instant_booking' in data:
+            provider.allow_instant_booking = data['allow_instant_booking']
+        if 'auto_confirm_booking' in data:
+            provider.auto_confirm_booking = data['auto_confirm_booking']
+        
+        provider.updated_at = datetime.now()
+        
+        try:
+            db.session.commit()
+            
+            # 返回更新后的设置
+            settings = {
+                'booking_notice_time': provider.booking_notice_time if hasattr(provider, 'booking_notice_time') else 24,
+                'max_booking_per_day': provider.max_booking_per_day if hasattr(provider, 'max_booking_per_day') else 10,
+                'allow_instant_booking': provider.allow_instant_booking if hasattr(provider, 'allow_instant_booking') else True,
+                'auto_confirm_booking': provider.auto_confirm_booking if hasattr(provider, 'auto_confirm_booking') else False
+            }
+            return jsonify({'message': '设置更新成功', 'settings': settings}), 200
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'message': f'设置更新失败: {str(e)}'}), 500
+
+# API路由：提供商营业时间
+@bp.route('/api/provider/business-hours', methods=['GET', 'PUT'])
+@auth_required
+def provider_business_hours(user_id, user_type):
+    logger.debug("API被调用: /api/provider/business-hours [%s]", request.method)
+    
+    # 确保是服务提供商
+    if user_type != 'provider':
+        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    # 获取提供商
+    provider = Provider.query.get(user_id)
+    if not provider:
+        return jsonify({'message': '提供商不存在'}), 404
+    
+    # 处理GET请求 - 获取营业时间
+    if request.method == 'GET':
+        # 从provider表中获取营业时间，如果不存在则返回默认值
+        business_hours_json = provider.business_hours if hasattr(provider, 'business_hours') and provider.business_hours else None
+        
+        if business_hours_json:
+            try:
+                business_hours = json.loads(business_hours_json)
+            except:
+                business_hours = get_default_business_hours()
+        else:
+            business_hours = get_default_business_hours()
+        
+        return jsonify(business_hours), 200
+    
+    # 处理PUT请求 - 更新营业时间
+    elif request.method == 'PUT':
+        data = request.json or {}
+        
+        # 验证数据格式
+        required_days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+        for day in required_days:
+            if day not in data:
+                return jsonify({'message': f'缺少必要的日期: {day}'}), 400
+            
+            day_data = data[day]
+            if not isinstance(day_data, dict) or 'start' not in day_data or 'end' not in day_data or 'is_open' not in day_data:
+                return jsonify({'message': f'{day}的数据格式无效，必须包含start、end和is_open字段'}), 400
+        
+        # 更新营业时间
+        provider.business_hours = json.dumps(data)
+        provider.updated_at = datetime.now()
+        
+        try:
+            db.session.commit()
+            return jsonify({'message': '营业时间更新成功', 'business_hours': data}), 200
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'message': f'营业时间更新失败: {str(e)}'}), 500
+
+# 辅助函数：获取默认营业时间
+def get_default_business_hours():
+    return {
+        'monday': {'start': '09:00', 'end': '17:00', 'is_open': True},
+        'tuesday': {'start': '09:00', 'end': '17:00', 'is_open': True},
+        'wednesday': {'start': '09:00', 'end': '17:00', 'is_open': True},
+        'thursday': {'start': '09:00', 'end': '17:00', 'is_open': True},
+        'friday': {'start': '09:00', 'end': '17:00', 'is_open': True},
+        'saturday': {'start': '10:00', 'end': '15:00', 'is_open': True},
+        'sunday': {'start': '00:00', 'end': '00:00', 'is_open': False}
+    }
+
+# API路由：提供商资质
+@bp.route('/api/provider/qualifications', methods=['GET', 'POST'])
+@auth_required
+def provider_qualifications(user_id, user_type):
+    logger.debug("API被调用: /api/provider/qualifications [%s]", request.method)
+    
+    # 确保是服务提供商
+    if user_type != 'provider':
+        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    # 获取提供商
+    provider = Provider.query.get(user_id)
+    if not provider:
+        return jsonify({'message': '提供商不存在'}), 404
+    
+    # 处理GET请求 - 获取资质列表
+    if request.method == 'GET':
+        # 从provider表中获取资质，如果不存在则返回空列表
+        qualifications_json = provider.qualifications if hasattr(provider, 'qualifications') and provider.qualifications else None
+        
+        if qualifications_json:
+            try:
+                qualifications = json.loads(qualifications_json)
+            except:
+                qualifications = []
+        else:
+            qualifications = []
+        
+        return jsonify(qualifications), 200
+    
+    # 处理POST请求 - 添加新资质
+    elif request.method == 'POST':
+        data = request.json or {}
+        
+        # 验证必填字段
+        required_fields = ['title', 'issuing_organization', 'issue_date']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({'message': f'缺少必填字段: {field}'}), 400
+        
+        # 获取现有资质
+        qualifications_json = provider.qualifications if hasattr(provider, 'qualifications') and provider.qualifications else None
+        
+        if qualifications_json:
+            try:
+                qualifications = json.loads(qualifications_json)
+            except:
+                qualifications = []
+        else:
+            qualifications = []
+        
+        # 添加新资质
+        new_qualification = {
+            'id': str(uuid.uuid4()),
+            'title': data['title'],
+            'issuing_organization': data['issuing_organization'],
+            'issue_date': data['issue_date'],
+            'expiration_date': data.get('expiration_date'),
+            'credential_id': data.get('credential_id'),
+            'created_at': datetime.now().isoformat()
+        }
+        
+        qualifications.append(new_qualification)
+        
+        # 更新提供商资质
+        provider.qualifications = json.dumps(qualifications)
+        provider.updated_at = datetime.now()
+        
+        try:
+            db.session.commit()
+            return jsonify({'message': '资质添加成功', 'qualification': new_qualification}), 201
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'message': f'资质添加失败: {str(e)}'}), 500
+
+# API路由：提供商统计数据
+@bp.route('/api/provider/stats', methods=['GET'])
+@auth_required
+def provider_stats(user_id, user_type):
+    logger.debug("API被调用: /api/provider/stats")
+    
+    # 确保是服务提供商
+    if user_type != 'provider':
+        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    try:
+        # 获取服务数量
+        service_count = Service.query.filter_by(provider_id=user_id).count()
+        
+        # 获取预约数量
+        booking_count = Booking.query.filter_by(provider_id=user_id).count()
+        
+        # 获取已完成预约数量
+        completed_booking_count = Booking.query.filter_by(provider_id=user_id, status='completed').count()
+        
+        # 评价数量、平均评分和星级分布读取服务商上增量维护的计数
+        provider = load_entity(Provider, user_id)
+        review_count = provider.rating_count if provider else 0
+        avg_rating = provider.rating_sum / review_count if review_count > 0 else 0
+        rating_histogram = {
+            str(rating): getattr(provider, f'rating_{rating}') if provider else 0 for rating in RATING_VALUES
+        }
+        
+        # 获取活跃服务数量
+        active_service_count = Service.query.filter_by(provider_id=user_id, status='active').count()
+        
+        # 获取本月预约数量
+        current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        next_month = (current_month + timedelta(days=32)).replace(day=1)
+        bookings_this_month = Booking.query.filter(
+            Booking.provider_id == user_id,
+            Booking.created_at >= current_month,
+            Booking.created_at < next_month
+        ).count()
+        
+        # 获取本周预约数量
+        today = datetime.now().date()
+        start_of_week = today - timedelta(days=today.weekday())
+        end_of_week = start_of_week + timedelta(days=7)
+        bookings_this_week = Booking.query.filter(
+            Booking.provider_id == user_id,
+            Booking.date >= start_of_week,
+            Booking.date < end_of_week
+        ).count()
+        
+        # 返回统计数据
+        stats = {
+            'service_count': service_count,
+            'active_service_count': active_service_count,
+            'booking_count': booking_count,
+            'completed_booking_count': completed_booking_count,
+            'review_count': review_count,
+            'avg_rating': round(avg_rating, 1),
+            'rating_histogram': rating_histogram,
+            'bookings_this_month': bookings_this_month,
+            'bookings_this_week': bookings_this_week
+        }
+        
+        return jsonify(stats), 200
+    
+    except Exception as e:
+        return jsonify({'message': f'获取统计数据失败: {str(e)}'}), 500
+
+# API路由：提供商评价
+@bp.route('/api/provider/reviews', methods=['GET'])
+@auth_required
+def provider_reviews(user_id, user_type):
+    logger.debug("API被调用: /api/provider/reviews")
+    
+    # 确保是服务提供商
+    if user_type != 'provider':
+        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    try:
+        # 获取提供商的评价
+        reviews = Review.query.filter_by(provider_id=user_id).order_by(Review.created_at.desc()).all()
+        
+        # 转换为JSON格式
+        result = []
+        for review in reviews:
+            review_data = review.to_dict()
+            
+            # 获取用户信息
+            user = User.query.get(review.user_id)
+            if user:
+                review_data['user'] = {
+                    'id': user.id,
+                    'username': user.username,
+                    'avatar': user.avatar
+                }
+            
+            # 获取服务信息
+            service = load_entity(Service, review.service_id)
+            if service:
+                review_data['service'] = {
+                    'id': service.id,
+                    'title': service.title,
+                    'image': service.image
+                }
+            
+            result.append(review_data)
+        
+        return jsonify(result), 200
+    
+    except Exception as e:
+        return jsonify({'message': f'获取评价失败: {str(e)}'}), 500
+
+# API路由：提供商头像上传
+@bp.route('/api/provider/avatar', methods=['POST'])
+@auth_required
+def upload_provider_avatar(user_id, user_type):
+    logger.debug("API被调用: /api/provider/avatar")
+    
+    # 确保是服务提供商
+    if user_type != 'provider':
+        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    # 检查是否有文件上传
+    if 'avatar' not in request.files:
+        return jsonify({'message': '没有找到上传的文件'}), 400
+    
+    file = request.files['avatar']
+    
+    # 如果用户没有选择文件，浏览器也会发送一个空的文件
+    if file.filename == '':
+        return jsonify({'message': '没有选择文件'}), 400
+    
+    # 检查文件类型
+    allowed_extensions = {'png', 'jpg', 'jpeg', 'gif'}
+    if not allowed_file(file.filename, allowed_extensions):
+        return jsonify({'message': '不支持的文件类型，仅支持PNG、JPG、JPEG和GIF'}), 400
+    
+    try:
+        # 生成安全的文件名
+        filename = secure_filename(file.filename)
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        new_filename = f"provider_{user_id}_{timestamp}_{filename}"
+        
+        # 确保上传目录存在
+        avatar_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'avatars')
+        if not os.path.exists(avatar_folder):
+            os.makedirs(avatar_folder)
+        
+        # 保存文件
+        filepath = os.path.join(avatar_folder, new_filename)
+        file.save(filepath)
+        
+        # 更新提供商头像
+        provider = Provider.query.get(user_id)
+        if provider:
+            # 获取相对路径
+            relative_path = f"/static/uploads/avatars/{new_filename}"
+            provider.avatar = relative_path
+            provider.updated_at = datetime.now()
+            db.session.commit()
+            
+            return jsonify({
+                'message': '头像上传成功',
+                'avatar_url': relative_path
+            }), 200
+        else:
+            return jsonify({'message': '提供商不存在'}), 404
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'头像上传失败: {str(e)}'}), 500
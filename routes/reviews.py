@@ -0,0 +1,300 @@
+"""
+评价的创建、修改、删除和列表
+"""
+
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify
+
+from models import db, User, Provider, Service, Booking, Review, Notification
+from ratings import apply_review_change
+from entity_cache import load_entity, load_entities
+from auth import auth_required
+from pagination import batch_load_by_id
+from request_logging import logger
+from serializers import SERVICE_SCHEMA, PROVIDER_SCHEMA, USER_SCHEMA, SERVICE_SUMMARY_FIELDS, \
+    PROVIDER_SUMMARY_FIELDS, USER_SUMMARY_FIELDS, json_response
+
+bp = Blueprint('reviews', __name__)
+
+# API路由：获取评价列表
+@bp.route('/api/reviews', methods=['GET'])
+@auth_required
+def get_reviews(user_id, user_type):
+    try:
+        if user_type == 'user':
+            # 用户查看自己的评价
+            reviews = Review.query.filter_by(user_id=user_id).all()
+        else:
+            # 服务商查看自己收到的评价
+            reviews = Review.query.filter_by(provider_id=user_id).all()
+        
+        # 扩展评价信息，包含服务和提供商的摘要；服务、服务商读实体缓存，用户用一次IN查询批量加载
+        services = load_entities(Service, [review.service_id for review in reviews])
+        providers = load_entities(Provider, [review.provider_id for review in reviews])
+        # 添加用户信息（对于服务商查看评价时）
+        users = {}
+        if user_type == 'provider':
+            users = batch_load_by_id(User, [review.user_id for review in reviews],
+                                     USER_SCHEMA.load_options(USER_SUMMARY_FIELDS))
+        
+        serialize_service = SERVICE_SCHEMA.serializer(SERVICE_SUMMARY_FIELDS)
+        serialize_provider = PROVIDER_SCHEMA.serializer(PROVIDER_SUMMARY_FIELDS)
+        serialize_user = USER_SCHEMA.serializer(USER_SUMMARY_FIELDS)
+        reviews_data = []
+        for review in reviews:
+            review_dict = review.to_dict()
+            if review.service_id in services:
+                review_dict['service'] = serialize_service(services[review.service_id])
+            if review.provider_id in providers:
+                review_dict['provider'] = serialize_provider(providers[review.provider_id])
+            if review.user_id in users:
+                review_dict['user'] = serialize_user(users[review.user_id])
+            reviews_data.append(review_dict)
+        
+        return json_response(reviews_data)
+    except Exception as e:
+                        return jsonify({'message': f'获取评价失败: {str(e)}'}), 500
+
+# API路由：提交评价
+@bp.route('/api/reviews', methods=['POST'])
+@auth_required
+def create_review(user_id, user_type):
+    # 只有普通用户可以提交评价
+    if user_type != 'user':
+                        return jsonify({'message': '只有普通用户可以提交评价'}), 403
+    
+    data = request.json or {}
+    service_id = data.get('service_id')
+    provider_id = data.get('provider_id')
+    booking_id = data.get('booking_id')
+    rating = data.get('rating')
+    content = data.get('content')
+    
+    # 验证必填字段
+    if not all([service_id, provider_id, booking_id, rating]):
+                        return jsonify({'message': '缺少必要的评价信息'}), 400
+    
+    # 验证评分范围
+    if not isinstance(rating, int) or rating < 1 or rating > 5:
+                        return jsonify({'message': '评分必须是1到5之间的整数'}), 400
+    
+    try:
+        # 检查预约是否存在且属于当前用户
+        booking = Booking.query.filter_by(id=booking_id, user_id=user_id).first()
+        if not booking:
+                            return jsonify({'message': '未找到相关预约或无权评价此预约'}), 404
+        
+        # 检查预约状态是否为已完成
+        if booking.status != 'completed':
+                            return jsonify({'message': '只能评价已完成的预约'}), 400
+        
+        # 检查是否已经评价过
+        existing_review = Review.query.filter_by(booking_id=booking_id).first()
+        if existing_review:
+                            return jsonify({'message': '此预约已经评价过了'}), 400
+        
+        # 创建新评价
+        new_review = Review(
+            user_id=user_id,
+            provider_id=provider_id,
+            service_id=service_id,
+            booking_id=booking_id,
+            rating=rating,
+            content=content,
+            created_at=datetime.now()
+        )
+        
+        db.session.add(new_review)
+        
+        # 更新预约的评价状态
+        booking.review_needed = False
+        
+        # 增量更新服务和提供商的评分计数
+        apply_review_change(service_id, provider_id, added=[rating])
+        
+        # 为服务提供商创建一个系统通知而不是直接的用户通知
+        # 因为provider_id不是users表中的ID，所以不能直接用作user_id
+        # 在这里，我们可以选择跳过通知创建，或者改为创建系统记录
+        # 系统通知可以在提供商登录时查看
+        
+        # 记录服务商收到新评价
+        try:
+            # 这里我们可以在评价表中添加一个标记，表示这个评价需要被提供商查看
+            # 或者可以在服务商登录时检查新评价
+            pass
+        except Exception as e:
+            logger.error("记录提供商通知失败: %s", e)
+        db.session.commit()
+        
+        service = Service.query.get(service_id)
+        provider = Provider.query.get(provider_id)
+        
+        # 返回新创建的评价
+        review_dict = new_review.to_dict()
+        review_dict['service'] = service.to_dict() if service else None
+        review_dict['provider'] = provider.to_dict() if provider else None
+        
+        return jsonify({'message': '评价提交成功', 'review': review_dict}), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'评价提交失败: {str(e)}'}), 500
+
+# API路由：更新评价
+@bp.route('/api/reviews/<review_id>', methods=['PUT'])
+@auth_required
+def update_review(review_id, user_id, user_type):
+    # 获取评价数据
+    data = request.json or {}
+    rating = data.get('rating')
+    content = data.get('content')
+    
+    # 验证评分范围
+    if rating is not None and (not isinstance(rating, int) or rating < 1 or rating > 5):
+                        return jsonify({'message': '评分必须是1到5之间的整数'}), 400
+    
+    try:
+        # 查找评价
+        review = Review.query.get(review_id)
+        if not review:
+                            return jsonify({'message': '未找到评价'}), 404
+        
+        # 验证权限
+        if user_type == 'user':
+            # 用户只能修改自己的评价
+            if review.user_id != user_id:
+                                return jsonify({'message': '无权修改此评价'}), 403
+            
+            # 更新评价内容
+            if rating is not None:
+                old_rating = review.rating
+                review.rating = rating
+                
+                # 增量更新服务和提供商的评分计数
+                apply_review_change(review.service_id, review.provider_id, added=[rating], removed=[old_rating])
+            
+            if content is not None:
+                review.content = content
+            
+            review.updated_at = datetime.now()
+            
+            # 评价更新，但不为提供商创建通知
+            # 因为provider_id不是users表中的ID，所以不能直接用作user_id
+            # 在这里，我们可以选择跳过通知创建
+            
+            # 记录服务商有评价被更新
+            try:
+                # 这里我们可以在评价表中添加一个标记，表示这个评价被更新
+                # 或者可以在服务商登录时检查更新的评价
+                pass
+            except Exception as e:
+                logger.error("记录提供商评价更新通知失败: %s", e)
+            
+        elif user_type == 'provider':
+            # 服务商只能回复自己收到的评价
+            if review.provider_id != user_id:
+                                return jsonify({'message': '无权回复此评价'}), 403
+            
+            # 更新回复
+            reply = data.get('reply')
+            if reply is not None:
+                review.reply = reply
+                review.reply_at = datetime.now()
+                
+                # 创建通知
+                notification = Notification(
+                    user_id=review.user_id,
+                    type='review',
+                    subtype='reply',
+                    title='您的评价收到回复',
+                    content=f'您对"{review.service.title if review.service else "未知服务"}"的评价收到了回复。',
+                    related_id=review.id
+                )
+                
+                db.session.add(notification)
+        
+        db.session.commit()
+        
+        # 返回更新后的评价
+        review_dict = review.to_dict()
+        review_dict['service'] = review.service.to_dict() if review.service else None
+        review_dict['provider'] = review.provider.to_dict() if review.provider else None
+        
+        return jsonify({'message': '评价更新成功', 'review': review_dict}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'评价更新失败: {str(e)}'}), 500
+
+# API路由：删除评价
+@bp.route('/api/reviews/<review_id>', methods=['DELETE'])
+@auth_required
+def delete_review(review_id, user_id, user_type):
+    try:
+        # 查找评价
+        review = Review.query.get(review_id)
+        if not review:
+                            return jsonify({'message': '未找到评价'}), 404
+        
+        # 验证权限（只有用户可以删除自己的评价）
+        if user_type != 'user' or review.user_id != user_id:
+                            return jsonify({'message': '无权删除此评价'}), 403
+        
+        # 保存评价相关信息，用于更新服务和提供商评分
+        service_id = review.service_id
+        provider_id = review.provider_id
+        old_rating = review.rating
+        
+        # 删除评价
+        db.session.delete(review)
+        
+        # 增量更新服务和提供商的评分计数
+        apply_review_change(service_id, provider_id, removed=[old_rating])
+        
+        db.session.commit()
+        
+        return jsonify({'message': '评价已删除'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'删除评价失败: {str(e)}'}), 500
+
+# API路由：获取特定服务的评论
+@bp.route('/api/reviews/service/<service_id>', methods=['GET'])
+def get_service_reviews(service_id):
+    """获取特定服务的所有评论"""
+    try:
+        # 查询服务
+        service = load_entity(Service, service_id)
+        if not service:
+            return jsonify({'message': '服务不存在'}), 404
+        
+        # 获取该服务的所有评论
+        reviews = Review.query.filter_by(service_id=service_id).all()
+        
+        # 格式化评论数据
+        reviews_data = []
+        for review in reviews:
+            review_dict = review.to_dict()
+            
+            # 添加用户信息
+            user = User.query.get(review.user_id)
+            if user:
+                review_dict['user'] = {
+                    'id': user.id,
+                    'username': user.username,
+                    'avatar': user.avatar
+                }
+            
+            # 添加提供商信息
+            provider = load_entity(Provider, review.provider_id)
+            if provider:
+                review_dict['provider'] = {
+                    'id': provider.id,
+                    'username': provider.username,
+                    'business_name': provider.business_name
+                }
+            
+            reviews_data.append(review_dict)
+        
+        return jsonify(reviews_data), 200
+    except Exception as e:
+        return jsonify({'message': f'获取服务评论失败: {str(e)}'}), 500
@@ -0,0 +1,723 @@
+"""
+服务商的服务管理和公开服务列表
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify
+from werkzeug.utils import secure_filename
+from sqlalchemy import select, true
+
+from models import db, User, Provider, Service, Booking, Review, TimeSlot, Favorite, ServiceCategory
+from idempotency import prevent_duplicate_requests
+from notifications import notification_row, write_notifications
+from ratings import apply_rating_change
+from entity_cache import load_entity, load_entities, invalidate_on_commit
+from conditional import conditional_get, PUBLIC_REVALIDATE
+from search_index import search_services, category_facets, count_active_services, record_service_changes
+from service_categories import parse_category_filter, category_filter
+from auth import auth_required
+from pagination import encode_cursor, decode_cursor, keyset_after, parse_page_limit, \
+    cached_listing_count
+from request_logging import logger
+from serializers import SERVICE_SCHEMA, SERVICE_LIST_FIELDS, json_response
+from uploads import allowed_file
+
+bp = Blueprint('services', __name__)
+
+# 服务图片上传时仍从旧的JSON文件校验服务归属
+SERVICES_FILE = 'data/services.json'
+
+# API路由：服务管理接口
+@bp.route('/api/services/provider', methods=['GET'])
+@auth_required
+def get_provider_services(user_id, user_type):
+    """获取当前服务商的所有服务（从MySQL数据库）"""
+    logger.debug("API被调用: /api/services/provider")
+    
+    # 确保是服务商
+    if user_type != 'provider':
+        logger.warning("用户类型错误: %s", user_type)
+        return jsonify({'message': '权限不足，仅服务商可访问此接口'}), 403
+    
+    try:
+        # 从MySQL数据库获取服务列表
+        logger.debug("正在为服务商 %s 读取服务数据(MySQL)...", user_id)
+        provider_services_db = Service.query.filter_by(provider_id=user_id).all()
+        
+        # 转换成字典列表
+        provider_services = []
+        for service in provider_services_db:
+            # 获取该服务的预约数量
+            booking_count = Booking.query.filter_by(service_id=service.id).count()
+            
+            # 构建服务数据
+            service_data = service.to_dict()
+            # 添加额外统计信息
+            service_data['booking_count'] = booking_count
+            # 浏览统计数可以从前端收集，这里先模拟一个数值
+            service_data['view_count'] = booking_count * 5 + 50
+            provider_services.append(service_data)
+        
+        logger.debug("从数据库读取到 %s 个服务", len(provider_services))
+        return jsonify(provider_services)
+    
+    except Exception as e:
+        logger.error("获取服务数据失败: %s", e)
+        return jsonify({'message': f'获取服务列表失败: {str(e)}'}), 500
+
+@bp.route('/api/services', methods=['POST'])
+@prevent_duplicate_requests
+@auth_required
+def create_service(user_id, user_type):
+    """创建新服务（MySQL版本）"""
+    user_agent = request.headers.get('User-Agent', 'Unknown')
+    client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
+    
+    logger.debug("创建服务请求开始, 来源: %s, 用户代理: %.30s", client_ip, user_agent)
+    
+    # 确保是服务商
+    if user_type != 'provider':
+        logger.warning("用户类型错误: %s", user_type)
+        return jsonify({'message': '权限不足，仅服务商可访问此接口'}), 403
+    
+    # 获取请求数据
+    if not request.is_json:
+        logger.warning("无效的请求格式，需要JSON")
+        return jsonify({'message': '无效的请求格式，需要JSON数据'}), 400
+    
+    data = request.get_json()
+    if not data:
+        logger.warning("请求数据为空")
+        return jsonify({'message': '无效的请求数据'}), 400
+        
+    logger.debug("接收到的数据: %.200s", data)
+    
+    # 验证必填字段
+    required_fields = ['title', 'price', 'duration', 'categories', 'description']
+    for field in required_fields:
+        if field not in data:
+            logger.warning("缺少必填字段: %s", field)
+            return jsonify({'message': f'缺少必填字段: {field}'}), 400
+    
+    try:
+        # 创建新服务记录
+        new_service = Service(
+            title=data['title'],
+            provider_id=user_id,
+            price=float(data['price']),
+            price_unit=data.get('price_unit', '元/次'),
+            duration=int(data['duration']),
+            image=data.get('image', 'img/service-placeholder.jpg'),
+            description=data['description'],
+            status=data.get('status', 'draft'),
+            categories=json.dumps(data.get('categories', []))
+        )
+        
+        # 保存到数据库
+        db.session.add(new_service)
+        db.session.commit()
+        
+        logger.debug("服务创建成功: %s", new_service.id)
+        
+        # 创建通知：服务商不在users表中时write_notifications会跳过；通知失败不影响服务创建
+        try:
+            status_label = '已上线' if new_service.status == 'active' else '草稿'
+            written = write_notifications([notification_row(
+                user_id, 'service', '服务创建成功',
+                f"您的服务「{new_service.title}」已创建成功，当前状态为：{status_label}。",
+                subtype='created', related_id=new_service.id
+            )])
+            db.session.commit()
+            if written:
+                logger.debug("创建服务通知成功")
+            else:
+                logger.warning("跳过通知创建：提供商ID不在users表中")
+            
+        except Exception as e:
+            db.session.rollback()
+            logger.error("创建服务通知失败: %s", e)
+            # 不影响主流程
+        
+        # 返回创建的服务
+        return jsonify({
+            'message': '服务创建成功',
+            'service': new_service.to_dict()
+        }), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error("服务创建失败: %s", e)
+        return jsonify({'message': f'服务创建失败: {str(e)}'}), 500
+
+@bp.route('/api/services/<service_id>/status', methods=['PUT'])
+@prevent_duplicate_requests
+@auth_required
+def update_service_status(service_id, user_id, user_type):
+    """更新服务状态（发布、下线）"""
+    logger.debug("API被调用: /api/services/%s/status PUT", service_id)
+    
+    # 确保是服务商
+    if user_type != 'provider':
+        logger.warning("用户类型错误: %s", user_type)
+        return jsonify({'message': '权限不足，仅服务商可更新服务状态'}), 403
+    
+    # 获取请求数据
+    data = request.get_json()
+    if not data:
+        logger.warning("请求数据为空")
+        return jsonify({'message': '无效的请求数据'}), 400
+        
+    status = data.get('status')
+    
+    # 验证状态值
+    if status not in ['active', 'inactive', 'draft']:
+        logger.warning("无效的状态值: %s", status)
+        return jsonify({'message': '无效的状态值，必须是active、inactive或draft之一'}), 400
+    
+    # 使用Core语句，通过db.session使用共享的连接池
+    services = Service.__table__
+    try:
+        # 1. 先检查服务是否存在
+        service_data = db.session.execute(
+            select(services.c.provider_id, services.c.title, services.c.status).where(services.c.id == service_id)
+        ).mappings().first()
+        
+        if not service_data:
+            logger.warning("服务不存在: %s", service_id)
+            return jsonify({'message': '服务不存在'}), 404
+        
+        # 2. 检查权限
+        if service_data['provider_id'] != user_id:
+            logger.warning("无权修改其他服务商的服务: %s", service_id)
+            return jsonify({'message': '无权修改其他服务商的服务'}), 403
+        
+        # 记录原始状态
+        current_status = service_data['status']
+        service_title = service_data['title'] or '未知服务'
+        
+        # 3. 更新服务状态
+        db.session.execute(
+            services.update().where(services.c.id == service_id).values(status=status, updated_at=datetime.utcnow())
+        )
+        # Core语句不触发会话事件，同一事务中记录变更，各进程的搜索索引据此同步，提交后实体缓存失效
+        record_service_changes(db.session, [service_id])
+        invalidate_on_commit(db.session, Service, [service_id])
+        db.session.commit()
+        
+        # 4. 创建通知（如果状态改变）
+        status_text = '上线' if status == 'active' else '下线' if status == 'inactive' else '草稿'
+        if current_status != status:
+            try:
+                write_notifications([notification_row(
+                    user_id, 'service', f'服务{status_text}通知', f'您的服务「{service_title}」已{status_text}',
+                    subtype='status_change', related_id=service_id
+                )])
+                db.session.commit()
+                logger.debug("创建状态变更通知成功")
+            except Exception as e:
+                db.session.rollback()
+                logger.error("创建状态变更通知失败（非阻断性错误）: %s", e)
+                # 通知创建失败不影响主流程
+        
+        # 5. 获取更新后的完整服务数据，日期时间转为字符串
+        service = dict(db.session.execute(select(services).where(services.c.id == service_id)).mappings().first())
+        for key, value in service.items():
+            if isinstance(value, datetime):
+                service[key] = value.isoformat()
+        
+        logger.debug("服务状态更新成功: %s -> %s", current_status, status)
+        
+        return jsonify({
+            'message': f'服务已成功{status_text}',
+            'service': service
+                        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error("更新服务状态失败: %s", e)
+        return jsonify({'message': f'更新服务状态失败: {str(e)}'}), 500
+
+@bp.route('/api/services/<service_id>/update_status', methods=['PUT'])
+def alternative_update_service_status(service_id):
+    """替代方案：更新服务状态"""
+    logger.debug("API被调用: /api/services/%s/update_status PUT", service_id)
+    return update_service_status(service_id)
+
+@bp.route('/api/services/<service_id>', methods=['DELETE'])
+@prevent_duplicate_requests
+@auth_required
+def delete_service(service_id, user_id, user_type):
+    """删除服务（MySQL版本）"""
+    
+    logger.debug("API被调用: /api/services/%s DELETE", service_id)
+    
+    # 确保是服务商
+    if user_type != 'provider':
+        logger.warning("用户类型错误: %s", user_type)
+        return jsonify({'message': '权限不足，仅服务商可删除服务'}), 403
+    
+    try:
+        # 从数据库查找服务
+        service = Service.query.get(service_id)
+        
+        if not service:
+            logger.warning("服务不存在: %s", service_id)
+            return jsonify({'message': '服务不存在'}), 404
+        
+        # 验证是否是此服务商的服务
+        if service.provider_id != user_id:
+            logger.warning("无权删除其他服务商的服务: %s", service_id)
+            return jsonify({'message': '无权删除其他服务商的服务'}), 403
+        
+        # 记录要删除的服务信息，用于后续通知
+        service_title = service.title
+        
+        # 保存服务信息以便返回
+        service_dict = service.to_dict()
+        
+        # 先删除与服务相关的收藏记录
+        favorites = Favorite.query.filter_by(service_id=service_id).all()
+        for favorite in favorites:
+            db.session.delete(favorite)
+        
+        # 先删除与服务相关的评论，并从服务商的评分计数中扣除
+        reviews = Review.query.filter_by(service_id=service_id).all()
+        for review in reviews:
+            db.session.delete(review)
+        apply_rating_change(Provider, service.provider_id, removed=[review.rating for review in reviews])
+        
+        # 删除与服务相关的预约
+        bookings = Booking.query.filter_by(service_id=service_id).all()
+        for booking in bookings:
+            db.session.delete(booking)
+        
+        # 删除服务
+        db.session.delete(service)
+        db.session.commit()
+        
+        logger.debug("服务从数据库中删除成功: %s", service_title)
+        
+        # 创建通知：服务商不在users表中时write_notifications会跳过；通知失败不影响删除结果
+        try:
+            written = write_notifications([notification_row(
+                user_id, 'service_delete', '服务删除通知', f"您的服务「{service_title}」已成功删除。",
+                subtype='deletion_success', related_id=service_id
+            )])
+            db.session.commit()
+            if written:
+                logger.debug("创建服务删除通知成功")
+            else:
+                logger.warning("跳过通知创建：提供商ID不在users表中")
+            
+        except Exception as e:
+            db.session.rollback()
+            logger.error("创建服务删除通知失败: %s", e)
+            # 继续执行，不影响主流程
+        
+        logger.debug("服务删除处理完成")
+        return jsonify({'message': '服务删除成功', 'service': service_dict}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error("服务删除失败: %s", e)
+        return jsonify({'message': f'服务删除失败: {str(e)}'}), 500
+
+# API路由：获取所有服务
+@bp.route('/api/services', methods=['GET'])
+@auth_required
+def get_all_services(user_id, user_type):
+    # 查询所有服务
+    services = Service.query.all()
+    
+    # 转换为JSON格式
+    result = []
+    for service in services:
+        service_data = service.to_dict()
+        result.append(service_data)
+    
+    return jsonify(result), 200
+
+# 公开服务列表在数据库中的排序：排序方式 -> (排序字段, 是否降序)，都以id作为第二排序键
+PUBLIC_SERVICE_SORTS = {
+    'price_asc': (Service.price, False),
+    'price_desc': (Service.price, True),
+    'rating': (Service.rating, True),
+    'created_at': (Service.created_at, True),
+}
+
+# 数值排序字段的空值按0排序：排序和游标条件都使用COALESCE后的值，空值的服务不会在翻页时被跳过
+# 评分是DECIMAL(4,3)，游标中的评分与数据库中的值可以精确比较
+NUMERIC_SORT_DEFAULTS = {'price': 0, 'rating': 0}
+
+def public_service_sort_key(sort_column):
+    """排序字段在ORDER BY和游标条件中使用的表达式，与models.py中的索引表达式一致"""
+    if sort_column.key in NUMERIC_SORT_DEFAULTS:
+        return db.func.coalesce(sort_column, NUMERIC_SORT_DEFAULTS[sort_column.key])
+    return sort_column
+
+def public_service_sort_value(service, sort_column):
+    """服务在排序字段上的值，写入下一页的游标"""
+    value = getattr(service, sort_column.key)
+    if value is None and sort_column.key in NUMERIC_SORT_DEFAULTS:
+        return NUMERIC_SORT_DEFAULTS[sort_column.key]
+    return value
+
+def decode_public_service_cursor(cursor, sort_by):
+    """解析公开服务列表的分页游标，返回[排序值, id]；游标无效或与当前排序方式不符时返回None"""
+    values = decode_cursor(cursor)
+    if not values or len(values) != 3 or values[0] != sort_by:
+        return None
+    values = values[1:]
+    if sort_by == 'created_at':
+        try:
+            values[0] = datetime.fromisoformat(values[0])
+        except (TypeError, ValueError):
+            return None
+    elif isinstance(values[0], bool) or not isinstance(values[0], (int, float)):
+        return None
+    return values
+
+# API路由：获取公开服务（无需认证）
+@bp.route('/api/services/public', methods=['GET'])
+def get_public_services():
+    """
+    公开服务列表，支持两种分页方式：
+    - cursor: 传入上一页返回的next_cursor，从上一页最后一个服务之后继续，第几页开销都与第一页相同
+    - offset: 兼容旧客户端的偏移分页，越往后越慢
+    total在没有关键词时来自索引或短时缓存，最多滞后PUBLIC_LISTING_COUNT_TTL秒，仅供显示；
+    是否还有下一页以has_more为准
+    """
+    # 获取查询参数
+    query = request.args.get('query', '')
+    # 分类可多选：重复传入category或用逗号分隔，服务属于任意一个所选分类即可
+    categories = parse_category_filter(request.args.getlist('category'))
+    sort_by = request.args.get('sort_by', '')
+    limit = parse_page_limit(50)
+    offset = request.args.get('offset', 0, type=int)
+    cursor = request.args.get('cursor')
+    # fields参数可在列表字段中选择需要返回的字段，只读取这些字段依赖的列
+    fields = SERVICE_SCHEMA.parse_fields(request.args.get('fields'), SERVICE_LIST_FIELDS)
+    if fields is None:
+        return jsonify({'message': '无效的fields参数'}), 400
+    
+    # 有搜索关键词时使用全文索引，默认按相关度排序
+    search_result = None
+    if query:
+        search_sort = sort_by or 'relevance'
+        after = None
+        if cursor:
+            after = decode_cursor(cursor)
+            if not after or len(after) != 3 or after[0] != search_sort:
+                return jsonify({'message': '无效的分页游标'}), 400
+            after, offset = after[1:], 0
+        search_result = search_services(query, categories, search_sort, offset, limit, after)
+    
+    if search_result is not None:
+        # 分类计数来自索引中匹配关键词的服务
+        service_ids, total_count, facets, next_after = search_result
+        loaded = load_entities(Service, service_ids)
+        services = [loaded[service_id] for service_id in service_ids if service_id in loaded]
+        has_more = next_after is not None
+        next_cursor = encode_cursor([search_sort] + next_after) if has_more else None
+    else:
+        # 查询活跃状态的服务
+        services_query = Service.query.filter_by(status='active')
+        
+        # 查询中没有可检索的词(如只有标点)时按原样模糊匹配
+        if query:
+            services_query = services_query.filter(
+                db.or_(
+                    Service.title.ilike(f'%{query}%'),
+                    Service.description.ilike(f'%{query}%'),
+                    Service.categories.ilike(f'%{query}%')
+                )
+            )
+        
+        # 分类计数不受分类筛选影响：没有关键词时直接读取索引中的计数，否则对匹配的服务分组统计并缓存
+        if query:
+            matched_ids = services_query.with_entities(Service.id)
+            facets = cached_listing_count(('facets', query), lambda: dict(
+                db.session.query(ServiceCategory.category, db.func.count(ServiceCategory.service_id))
+                .filter(ServiceCategory.service_id.in_(matched_ids))
+                .group_by(ServiceCategory.category)
+                .order_by(db.func.count(ServiceCategory.service_id).desc())
+            ))
+        else:
+            facets = category_facets()
+        
+        # 如果有分类筛选，通过分类关联表精确匹配
+        if categories:
+            services_query = services_query.filter(category_filter(categories))
+        
+        # 总数：没有筛选条件时就是索引中的上线服务数，否则使用缓存的COUNT
+        if query or categories:
+            filtered_query = services_query
+            total_count = cached_listing_count(('total', query, tuple(categories)), lambda: filtered_query.count())
+        else:
+            total_count = count_active_services()
+        
+        # 排序，默认按创建时间降序；id作为第二排序键保证顺序稳定，游标分页走(status, 排序字段, id)索引
+        sort_key = sort_by if sort_by in PUBLIC_SERVICE_SORTS else 'created_at'
+        sort_column, descending = PUBLIC_SERVICE_SORTS[sort_key]
+        sort_expression = public_service_sort_key(sort_column)
+        sort_columns = [sort_expression, Service.id]
+        if cursor:
+            cursor_values = decode_public_service_cursor(cursor, sort_key)
+            if not cursor_values:
+                return jsonify({'message': '无效的分页游标'}), 400
+            services_query = services_query.filter(keyset_after(sort_columns, cursor_values, descending))
+            offset = 0
+        if descending:
+            services_query = services_query.order_by(sort_expression.desc(), Service.id.desc())
+        else:
+            services_query = services_query.order_by(sort_expression.asc(), Service.id.asc())
+        
+        # 多取一条判断是否还有下一页
+        services_query = services_query.options(SERVICE_SCHEMA.load_options(fields, sort_column.key))
+        services = services_query.limit(limit + 1).offset(offset).all()
+        has_more = len(services) > limit
+        services = services[:limit]
+        next_cursor = None
+        if has_more:
+            last = services[-1]
+            next_cursor = encode_cursor([sort_key, public_service_sort_value(last, sort_column), last.id])
+    
+    # 服务商名称读实体缓存，未命中的用一次IN查询批量加载
+    providers = {}
+    if 'provider' in fields:
+        providers = load_entities(Provider, [service.provider_id for service in services])
+    
+    def provider_name(service):
+        provider = providers.get(service.provider_id)
+        return (provider.business_name or provider.username) if provider else None
+    
+    # 返回结果，包含分页信息
+    return json_response({
+        'services': SERVICE_SCHEMA.dump(services, fields, provider=provider_name),
+        'total': total_count,
+        'offset': offset,
+        'limit': limit,
+        'has_more': has_more,
+        'next_cursor': next_cursor,
+        'facets': facets
+    })
+
+def public_service_version(service_id):
+    """
+    服务详情的版本：服务和服务商的updated_at(读实体缓存，与详情一致)，评价及评价者、可预约时间段的数量和最后修改时间
+    评价和时间段的聚合合并为一次查询；服务不存在或不可用时返回None
+    """
+    service = load_entity(Service, service_id)
+    if not service or service.status != 'active':
+        return None
+    provider = load_entity(Provider, service.provider_id)
+    today = datetime.now().date()
+    reviews = select(db.func.count(Review.id), db.func.max(Review.updated_at), db.func.max(User.updated_at)) \
+        .outerjoin(User, User.id == Review.user_id).where(Review.service_id == service_id).subquery()
+    timeslots = select(db.func.count(TimeSlot.id), db.func.max(TimeSlot.updated_at)).where(
+        TimeSlot.provider_id == service.provider_id,
+        TimeSlot.date >= today,
+        TimeSlot.is_available == True
+    ).subquery()
+    row = db.session.execute(select(reviews, timeslots).select_from(reviews).join(timeslots, true())).one()
+    return (service.updated_at, provider.updated_at if provider else None, today) + tuple(row)
+
+# API路由：获取单个服务详情（无需认证）
+@bp.route('/api/services/public/<service_id>', methods=['GET'])
+@conditional_get(public_service_version, PUBLIC_REVALIDATE)
+def get_public_service_detail(service_id):
+    # 查询服务
+    service = load_entity(Service, service_id)
+    
+    # 如果服务不存在，返回404
+    if not service:
+                        return jsonify({'message': '服务不存在'}), 404
+    
+    # 如果服务不是活跃状态，返回403
+    if service.status != 'active':
+                        return jsonify({'message': '该服务当前不可用'}), 403
+    
+    # 先读取服务提供商(实体缓存)，to_dict中的service.provider直接从会话中取得
+    provider = load_entity(Provider, service.provider_id)
+    
+    # 获取服务详情
+    service_data = service.to_dict()
+    
+    # 获取服务提供商信息
+    if provider:
+        service_data['provider'] = {
+            'id': provider.id,
+            'username': provider.username,
+            'business_name': provider.business_name,
+            'business_description': provider.business_description,
+            'rating': provider.rating,
+            'verified': provider.verified
+        }
+    
+    # 获取服务评论
+    reviews = Review.query.filter_by(service_id=service_id).order_by(Review.created_at.desc()).limit(5).all()
+    service_data['reviews'] = []
+    
+    for review in reviews:
+        review_data = review.to_dict()
+
+        # 获取用户信息
+        user = User.query.get(review.user_id)
+        if user:
+            review_data['user'] = {
+                'id': user.id,
+                'username': user.username,
+                'avatar': user.avatar
+            }
+        
+        service_data['reviews'].append(review_data)
+    
+    # 获取可用时间槽
+    current_date = datetime.now().date()
+    timeslots = TimeSlot.query.filter(
+        TimeSlot.provider_id == service.provider_id,
+        TimeSlot.date >= current_date,
+        TimeSlot.is_available == True
+    ).order_by(TimeSlot.date, TimeSlot.time).limit(20).all()
+    
+    service_data['available_timeslots'] = [timeslot.to_dict() for timeslot in timeslots]
+    
+    return jsonify(service_data), 200
+
+# 服务管理API
+@bp.route('/api/services/<service_id>', methods=['PUT'])
+@prevent_duplicate_requests
+@auth_required
+def update_service(service_id, user_id, user_type):
+    """更新服务信息（MySQL版本）"""
+    
+    # 确保是服务商
+    if user_type != 'provider':
+        logger.warning("用户类型错误: %s", user_type)
+        return jsonify({'message': '权限不足，仅服务商可更新服务'}), 403
+    
+    try:
+        # 从数据库中查询服务
+        service = Service.query.get(service_id)
+        if not service:
+            logger.warning("服务不存在: %s", service_id)
+            return jsonify({'message': '服务不存在'}), 404
+        
+        # 验证是否是此服务商的服务
+        if service.provider_id != user_id:
+            logger.warning("无权修改其他服务商的服务")
+            return jsonify({'message': '无权修改其他服务商的服务'}), 403
+        
+        # 获取请求数据
+        data = request.get_json()
+        if not data:
+            logger.warning("请求数据为空")
+            return jsonify({'message': '无效的请求数据'}), 400
+        
+        # 更新服务信息
+        if 'title' in data:
+            service.title = data['title']
+        
+        if 'price' in data:
+            try:
+                service.price = float(data['price'])
+            except:
+                logger.debug("价格必须是数字")
+                return jsonify({'message': '价格必须是数字'}), 400
+        
+        if 'price_unit' in data:
+            service.price_unit = data['price_unit']
+        
+        if 'duration' in data:
+            service.duration = int(data['duration'])
+        
+        if 'categories' in data:
+            service.categories = json.dumps(data['categories'])
+        
+        if 'description' in data:
+            service.description = data['description']
+        
+        if 'image' in data:
+            service.image = data['image']
+        
+        if 'status' in data:
+            service.status = data['status']
+        
+        # 更新修改时间
+        service.updated_at = datetime.now()
+        
+        # 保存更改到数据库
+        db.session.commit()
+        
+        logger.debug("服务更新成功: %s", service_id)
+        return jsonify({'message': '服务更新成功', 'service': service.to_dict()}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error("服务更新失败: %s", e)
+        return jsonify({'message': f'服务更新失败: {str(e)}'}), 500
+
+@bp.route('/api/services/<service_id>/upload', methods=['POST'])
+@auth_required
+def upload_service_image(service_id, user_id, user_type):
+    """上传服务图片"""
+    # 确保是服务商
+    if user_type != 'provider':
+                        return jsonify({'message': '权限不足，仅服务商可上传服务图片'}), 403
+    
+    # 验证服务所有权（如果提供了service_id）
+    if service_id != 'new':  # 'new'表示正在创建新服务
+        # 读取服务数据
+        try:
+            with open(SERVICES_FILE, 'r', encoding='utf-8') as f:
+                services = json.load(f)
+        except:
+                            return jsonify({'message': '读取服务数据失败'}), 500
+        
+        # 查找服务并验证所有权
+        service = next((s for s in services if s.get('id') == service_id), None)
+        if not service:
+                            return jsonify({'message': '服务不存在'}), 404
+        
+        if service.get('provider_id') != user_id:
+                            return jsonify({'message': '无权操作其他服务商的服务'}), 403
+    
+    # 检查是否有文件
+    if 'image' not in request.files:
+                        return jsonify({'message': '未提供文件'}), 400
+    
+    file = request.files['image']
+    
+    # 检查文件名
+    if file.filename == '':
+                        return jsonify({'message': '未选择文件'}), 400
+    
+    # 检查文件类型
+    if file and file.filename and allowed_file(file.filename):
+        # 确保上传目录存在
+        upload_dir = os.path.join('static', 'uploads', 'services')
+        if not os.path.exists(upload_dir):
+            os.makedirs(upload_dir)
+        
+        # 生成安全的文件名
+        filename = secure_filename(str(file.filename))
+        timestamp = int(time.time())
+        new_filename = f"{timestamp}_{filename}"
+        
+        # 保存文件
+        filepath = os.path.join(upload_dir, new_filename)
+        file.save(filepath)
+        
+        # 生成访问URL
+        file_url = f"/static/uploads/services/{new_filename}"
+        
+        return jsonify({
+            'message': '图片上传成功',
+            'file_url': file_url
+        }), 200
+    
+    return jsonify({'message': '不允许的文件类型'}), 400
@@ -0,0 +1,69 @@
+"""
+首页、静态文件和调试端点
+调试端点返回本进程的运行状态，只在DEBUG_ENDPOINTS_ENABLED开启时可用，并且需要登录
+"""
+
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, send_from_directory
+
+from auth import auth_required
+from models import db
+from db_pool import pool_metrics
+from db_replicas import get_replica_router
+from entity_cache import get_entity_cache
+import scheduler
+
+bp = Blueprint('site', __name__)
+
+# 路由：提供静态文件
+@bp.route('/')
+def index():
+    return send_from_directory('.', 'index.html')
+
+@bp.route('/<path:path>')
+def serve_static(path):
+    return send_from_directory('.', path)
+
+def debug_endpoint(func):
+    """调试端点装饰器：DEBUG_ENDPOINTS_ENABLED关闭时返回404，开启时需要登录"""
+    view = auth_required(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get('DEBUG_ENDPOINTS_ENABLED', False):
+            return jsonify({'message': '接口不存在'}), 404
+        return view(*args, **kwargs)
+    return wrapper
+
+@bp.route('/api/debug/scheduler', methods=['GET'])
+@debug_endpoint
+def debug_scheduler(user_id, user_type):
+    """调试端点：查看本进程定时任务的执行次数、耗时和是否持有租约"""
+    return jsonify({
+        'metrics': scheduler.metrics
+    }), 200
+
+@bp.route('/api/debug/db-pool', methods=['GET'])
+@debug_endpoint
+def debug_db_pool(user_id, user_type):
+    """调试端点：查看本进程连接池的借出连接数和取用连接的等待时间"""
+    return jsonify(pool_metrics.snapshot(db.engine.pool)), 200
+
+@bp.route('/api/debug/db-replicas', methods=['GET'])
+@debug_endpoint
+def debug_db_replicas(user_id, user_type):
+    """调试端点：查看本进程各从库的延迟和读请求的路由次数"""
+    router = get_replica_router()
+    if router is None:
+        return jsonify({'message': '没有配置从库'}), 404
+    return jsonify(router.snapshot()), 200
+
+@bp.route('/api/debug/entity-cache', methods=['GET'])
+@debug_endpoint
+def debug_entity_cache(user_id, user_type):
+    """调试端点：查看本进程实体缓存的命中率和条目数"""
+    cache = get_entity_cache()
+    if cache is None:
+        return jsonify({'message': '实体缓存已关闭'}), 404
+    return jsonify(cache.snapshot()), 200
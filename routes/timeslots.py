@@ -0,0 +1,601 @@
+"""
+服务商时间段的查询、创建、修改和批量更新
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from models import db, User, Service, Booking, TimeSlot
+from availability import mark_dirty
+from entity_cache import load_entity
+from auth import auth_required
+
+bp = Blueprint('timeslots', __name__)
+
+# API路由：获取服务提供商的可用时间段
+@bp.route('/api/timeslots', methods=['GET'])
+@auth_required
+def get_timeslots(user_id, user_type):
+    """获取服务提供商的时间段，支持按日期或按周查询"""
+    # 确保是服务提供商
+    if user_type != 'provider':
+        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    # 获取查询参数
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    if not start_date or not end_date:
+        return jsonify({'message': '开始日期和结束日期是必需的'}), 400
+    
+    try:
+        # 解析日期字符串
+        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+        
+        # 查询数据库中的时间段
+        timeslots = TimeSlot.query.filter_by(provider_id=user_id).filter(
+            TimeSlot.date >= start_date_obj,
+            TimeSlot.date <= end_date_obj
+        ).all()
+        
+        # 转换为字典列表
+        result = []
+        for slot in timeslots:
+            result.append(slot.to_dict())
+        
+        return jsonify(result), 200
+    
+    except ValueError:
+        return jsonify({'message': '日期格式无效，应为YYYY-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'message': f'获取时间段失败: {str(e)}'}), 500
+
+# 批量写入时间段时每条语句包含的行数
+TIMESLOT_WRITE_CHUNK_SIZE = 1000
+
+def timeslot_row_to_dict(row):
+    """批量写入结果中单个时间段的数据结构，与TimeSlot.to_dict()一致"""
+    return {
+        'id': row['id'],
+        'provider_id': row['provider_id'],
+        'date': row['date'].isoformat(),
+        'time': row['time'],
+        'is_available': row['is_available'],
+        'created_at': row['created_at'].isoformat(),
+        'updated_at': row['updated_at'].isoformat() if row['updated_at'] else None
+    }
+
+def upsert_timeslots(provider_id, desired):
+    """
+    批量创建或更新服务商的时间段
+    desired为{(date, time): is_available}，同一键出现多次时以最后一次为准。
+    一次查询预取日期范围内已有的时间段并在内存中比对，只写入新增和状态变化的行：
+    MySQL使用分批的 INSERT ... ON DUPLICATE KEY UPDATE，其他数据库使用bulk_insert/update_mappings。
+    不提交事务，返回{'created': [行], 'updated': [行]}，行为包含TimeSlot全部字段的字典
+    """
+    result = {'created': [], 'updated': []}
+    if not desired:
+        return result
+
+    dates = [key[0] for key in desired]
+    times = {key[1] for key in desired}
+    existing = {
+        (row.date, row.time): row
+        for row in db.session.query(
+            TimeSlot.id, TimeSlot.date, TimeSlot.time, TimeSlot.is_available,
+            TimeSlot.created_at, TimeSlot.updated_at
+        ).filter(
+            TimeSlot.provider_id == provider_id,
+            TimeSlot.date >= min(dates),
+            TimeSlot.date <= max(dates),
+            TimeSlot.time.in_(times)
+        )
+    }
+
+    now = datetime.utcnow()
+    changed = []
+    for (date_obj, time_str), is_available in desired.items():
+        slot = existing.get((date_obj, time_str))
+        if slot is None:
+            row = {
+                'id': str(uuid.uuid4()),
+                'provider_id': provider_id,
+                'date': date_obj,
+                'time': time_str,
+                'is_available': is_available,
+                'created_at': now,
+                'updated_at': now
+            }
+            result['created'].append(row)
+            continue
+
+        row = {
+            'id': slot.id,
+            'provider_id': provider_id,
+            'date': date_obj,
+            'time': time_str,
+            'is_available': is_available,
+            'created_at': slot.created_at,
+            'updated_at': slot.updated_at
+        }
+        # 状态未变化的时间段不需要写入
+        if slot.is_available != is_available:
+            row['updated_at'] = now
+            changed.append(row)
+        result['updated'].append(row)
+
+    # 批量写入绕过ORM事件，需要手动标记可用性索引中受影响的日期
+    mark_dirty(db.session, provider_id, {row['date'] for row in result['created'] + changed})
+
+    if db.engine.dialect.name == 'mysql':
+        # 新增和变化的行合并为一条语句，并发创建同一时间段时由唯一约束转为更新
+        rows = result['created'] + changed
+        for start in range(0, len(rows), TIMESLOT_WRITE_CHUNK_SIZE):
+            stmt = mysql_insert(TimeSlot.__table__).values(rows[start:start + TIMESLOT_WRITE_CHUNK_SIZE])
+            stmt = stmt.on_duplicate_key_update(
+                is_available=stmt.inserted.is_available,
+                updated_at=stmt.inserted.updated_at
+            )
+            db.session.execute(stmt)
+    else:
+        for start in range(0, len(result['created']), TIMESLOT_WRITE_CHUNK_SIZE):
+            db.session.bulk_insert_mappings(TimeSlot, result['created'][start:start + TIMESLOT_WRITE_CHUNK_SIZE])
+        for start in range(0, len(changed), TIMESLOT_WRITE_CHUNK_SIZE):
+            db.session.bulk_update_mappings(TimeSlot, [
+                {'id': row['id'], 'is_available': row['is_available'], 'updated_at': row['updated_at']}
+                for row in changed[start:start + TIMESLOT_WRITE_CHUNK_SIZE]
+            ])
+
+    return result
+
+# API路由：创建或更新时间段
+@bp.route('/api/timeslots', methods=['POST'])
+@auth_required
+def create_timeslots(user_id, user_type):
+    """批量创建或更新时间段"""
+    # 确保是服务提供商
+    if user_type != 'provider':
+        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    # 获取请求数据
+    data = request.get_json()
+    if not data or not isinstance(data, list):
+        return jsonify({'message': '请求数据格式无效，应为时间段对象数组'}), 400
+    
+    try:
+        desired = {}
+        
+        for slot_data in data:
+            # 验证必要字段
+            if 'date' not in slot_data or 'time' not in slot_data:
+                 return jsonify({'message': '每个时间段必须包含日期和时间'}), 400
+            
+            # 解析日期
+            try:
+                date_obj = datetime.strptime(slot_data['date'], '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({'message': f'日期格式无效: {slot_data["date"]}，应为YYYY-MM-DD'}), 400
+            
+            desired[(date_obj, slot_data['time'])] = slot_data.get('is_available', True)
+        
+        # 批量创建或更新
+        result = upsert_timeslots(user_id, desired)
+        db.session.commit()
+        
+        created_slots = [timeslot_row_to_dict(row) for row in result['created']]
+        updated_slots = [timeslot_row_to_dict(row) for row in result['updated']]
+        
+        return jsonify({
+            'message': f'成功创建 {len(created_slots)} 个时间段，更新 {len(updated_slots)} 个时间段',
+            'created': created_slots,
+            'updated': updated_slots
+                        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'创建或更新时间段失败: {str(e)}'}), 500
+
+# API路由：更新单个时间段
+@bp.route('/api/timeslots/<date>/<time>', methods=['PUT'])
+@auth_required
+def update_timeslot(date, time, user_id, user_type):
+    """更新单个时间段的可用状态"""
+    # 确保是服务提供商
+    if user_type != 'provider':
+                        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    # 获取请求数据
+    data = request.get_json()
+    if not data or 'is_available' not in data:
+                        return jsonify({'message': '请求数据必须包含is_available字段'}), 400
+    
+    try:
+        # 解析日期
+        try:
+            date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+        except ValueError:
+                            return jsonify({'message': f'日期格式无效: {date}，应为YYYY-MM-DD'}), 400
+        
+        # 查找时间段
+        slot = TimeSlot.query.filter_by(
+            provider_id=user_id,
+            date=date_obj,
+            time=time
+        ).first()
+        
+        if not slot:
+            # 如果时间段不存在，创建新的
+            slot = TimeSlot(
+                provider_id=user_id,
+                date=date_obj,
+                time=time,
+                is_available=data['is_available']
+            )
+            db.session.add(slot)
+            db.session.commit()
+            return jsonify({
+                'message': '成功创建时间段',
+                'timeslot': slot.to_dict()
+            }), 201
+        else:
+            # 更新现有时间段
+            slot.is_available = data['is_available']
+            slot.updated_at = datetime.utcnow()
+            db.session.commit()
+        return jsonify({
+                'message': '成功更新时间段',
+                'timeslot': slot.to_dict()
+                            }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'更新时间段失败: {str(e)}'}), 500
+
+# API路由：批量应用工作模式
+@bp.route('/api/timeslots/pattern', methods=['POST'])
+@auth_required
+def apply_working_pattern(user_id, user_type):
+    """应用工作模式，批量创建时间段"""
+    # 确保是服务提供商
+    if user_type != 'provider':
+                        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    # 获取请求数据
+    data = request.get_json()
+    if not data:
+                        return jsonify({'message': '请求数据无效'}), 400
+    
+    pattern = data.get('pattern')
+    start_date = data.get('start_date')
+    end_date = data.get('end_date')
+    time_slots = data.get('time_slots')
+    non_working_time_slots = data.get('non_working_time_slots', [])
+    
+    if not pattern or not start_date or not end_date or not time_slots:
+                        return jsonify({'message': '工作模式、开始日期、结束日期和时间段是必需的'}), 400
+    
+    try:
+        # 解析日期
+        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+        
+        # 生成日期范围
+        all_dates = []
+        included_dates = []
+        excluded_dates = []
+        
+        current_date = start_date_obj
+        while current_date <= end_date_obj:
+            all_dates.append(current_date)
+            
+            # 根据工作模式筛选日期
+            weekday = current_date.weekday()  # 0-6，0是周一
+            
+            include_date = False
+            if pattern == 'everyday':
+                include_date = True
+            elif pattern == 'weekdays' and weekday < 5:  # 周一至周五
+                include_date = True
+            elif pattern == 'weekends' and weekday >= 5:  # 周六、周日
+                include_date = True
+            elif pattern == 'custom' and 'days' in data:
+                # 自定义日期，例如 ['monday', 'wednesday', 'friday']
+                day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+                if day_names[weekday] in data['days']:
+                    include_date = True
+            
+            if include_date:
+                included_dates.append(current_date)
+            else:
+                excluded_dates.append(current_date)
+            
+            current_date += timedelta(days=1)
+        
+        # 计算每个时间段的目标状态
+        desired = {}
+        for date_obj in included_dates:
+            # 工作时间内的时间段设置为可用，工作时间外的设置为不可用
+            for time_slot in time_slots:
+                desired[(date_obj, time_slot)] = True
+            for time_slot in non_working_time_slots:
+                desired[(date_obj, time_slot)] = False
+        
+        # 不包含在工作模式中的日期，所有时间段都设置为不可用
+        for date_obj in excluded_dates:
+            for time_slot in time_slots + non_working_time_slots:
+                desired[(date_obj, time_slot)] = False
+        
+        # 批量创建或更新时间段
+        result = upsert_timeslots(user_id, desired)
+        created_count = len(result['created'])
+        updated_count = sum(1 for row in result['updated'] if row['is_available'])
+        disabled_count = sum(1 for is_available in desired.values() if not is_available)
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': f'成功应用工作模式，创建 {created_count} 个时间段，更新 {updated_count} 个时间段，禁用 {disabled_count} 个时间段',
+            'pattern': pattern,
+            'included_dates': [date.isoformat() for date in included_dates],
+            'excluded_dates': [date.isoformat() for date in excluded_dates]
+                        }), 200
+    
+    except ValueError:
+                        return jsonify({'message': '日期格式无效，应为YYYY-MM-DD'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'应用工作模式失败: {str(e)}'}), 500
+
+# API路由：删除时间段
+@bp.route('/api/timeslots/<date>/<time>', methods=['DELETE'])
+@auth_required
+def delete_timeslot(date, time, user_id, user_type):
+    """删除单个时间段"""
+    # 确保是服务提供商
+    if user_type != 'provider':
+                        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    try:
+        # 解析日期
+        try:
+            date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+        except ValueError:
+                            return jsonify({'message': f'日期格式无效: {date}，应为YYYY-MM-DD'}), 400
+        
+        # 查找时间段
+        slot = TimeSlot.query.filter_by(
+            provider_id=user_id,
+            date=date_obj,
+            time=time
+        ).first()
+        
+        if not slot:
+                            return jsonify({'message': '时间段不存在'}), 404
+        
+        # 检查是否有关联的预约
+        booking = Booking.query.filter_by(
+            provider_id=user_id,
+            date=date_obj,
+            time=time
+        ).first()
+        
+        if booking and booking.status in ['pending', 'confirmed']:
+                            return jsonify({'message': '无法删除已有预约的时间段'}), 400
+        
+        # 删除时间段
+        db.session.delete(slot)
+        db.session.commit()
+        
+        return jsonify({'message': '成功删除时间段'}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'删除时间段失败: {str(e)}'}), 500
+
+# API路由：获取时间段的预约详情
+@bp.route('/api/timeslots/<date>/<time>/booking', methods=['GET'])
+@auth_required
+def get_timeslot_booking(date, time, user_id, user_type):
+    """获取时间段的预约详情"""
+    # 确保是服务提供商
+    if user_type != 'provider':
+                        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    try:
+        # 解析日期
+        try:
+            date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+        except ValueError:
+                            return jsonify({'message': f'日期格式无效: {date}，应为YYYY-MM-DD'}), 400
+        
+        # 查找预约
+        booking = Booking.query.filter_by(
+            provider_id=user_id,
+            date=date_obj,
+            time=time
+        ).first()
+        
+        if not booking:
+                            return jsonify({'message': '该时间段没有预约'}), 404
+        
+        # 获取预约详情
+        booking_data = booking.to_dict()
+        
+        # 获取服务详情
+        service = load_entity(Service, booking.service_id)
+        if service:
+            booking_data['service'] = {
+                'id': service.id,
+                'title': service.title,
+                'price': service.price,
+                'price_unit': service.price_unit,
+                'duration': service.duration
+            }
+        
+        # 获取用户详情
+        user = User.query.get(booking.user_id)
+        if user:
+            booking_data['user'] = {
+                'id': user.id,
+                'username': user.username,
+                'nickname': user.nickname,
+                'avatar': user.avatar,
+                'phone': user.phone
+            }
+        
+        return jsonify(booking_data), 200
+    
+    except Exception as e:
+                        return jsonify({'message': f'获取预约详情失败: {str(e)}'}), 500
+
+# API路由：批量更新时间段
+@bp.route('/api/timeslots/batch', methods=['PUT'])
+@auth_required
+def batch_update_timeslots(user_id, user_type):
+    """批量更新时间段状态"""
+    # 确保是服务提供商
+    if user_type != 'provider':
+                        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    # 获取请求数据
+    data = request.get_json()
+    if not data:
+                        return jsonify({'message': '请求数据无效'}), 400
+    
+    timeslots = data.get('timeslots')
+    is_available = data.get('is_available')
+    
+    if not timeslots or is_available is None:
+                        return jsonify({'message': '时间段列表和可用状态是必需的'}), 400
+    
+    try:
+        failed_count = 0
+        desired = {}
+        
+        for slot_data in timeslots:
+            date_str = slot_data.get('date')
+            time_str = slot_data.get('time')
+            
+            if not date_str or not time_str:
+                failed_count += 1
+                continue
+            
+            try:
+                # 解析日期
+                date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+            except ValueError:
+                failed_count += 1
+                continue
+            
+            desired[(date_obj, time_str)] = is_available
+        
+        # 批量创建或更新时间段
+        result = upsert_timeslots(user_id, desired)
+        created_count = len(result['created'])
+        updated_count = len(result['updated'])
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': f'批量更新时间段成功，更新 {updated_count} 个，创建 {created_count} 个，失败 {failed_count} 个',
+            'updated': updated_count,
+            'created': created_count,
+            'failed': failed_count
+                        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'批量更新时间段失败: {str(e)}'}), 500
+
+# 测试路由：检查时间段表状态
+@bp.route('/api/test/timeslots', methods=['GET'])
+def test_timeslots():
+    """测试路由，检查时间段表状态"""
+    try:
+        # 获取所有时间段
+        all_slots = TimeSlot.query.all()
+        
+        # 转换为字典列表
+        result = []
+        for slot in all_slots:
+            result.append(slot.to_dict())
+        
+        # 获取数据库表信息
+        table_info = {
+            'total_slots': len(result),
+            'table_name': TimeSlot.__tablename__,
+            'columns': [column.name for column in TimeSlot.__table__.columns],
+            'database_uri': current_app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1]  # 隐藏敏感信息
+        }
+        
+        return jsonify({
+            'status': 'success',
+            'table_info': table_info,
+            'slots_sample': result[:10] if result else []  # 只返回前10条数据作为样本
+                        }), 200
+    
+    except Exception as e:
+                        return jsonify({
+            'status': 'error',
+            'message': f'检查时间段表失败: {str(e)}'
+        }), 500
+
+@bp.route('/api/debug/timeslots', methods=['GET'])
+@auth_required
+def debug_timeslots(user_id, user_type):
+    """调试端点：获取特定日期范围内的所有时间段状态"""
+    # 确保是服务提供商
+    if user_type != 'provider':
+                        return jsonify({'message': '权限不足，仅服务提供商可访问此接口'}), 403
+    
+    # 获取查询参数
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    if not start_date or not end_date:
+                        return jsonify({'message': '开始日期和结束日期是必需的'}), 400
+    
+    try:
+        # 解析日期字符串
+        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+        
+        # 查询数据库中的时间段
+        timeslots = TimeSlot.query.filter_by(provider_id=user_id).filter(
+            TimeSlot.date >= start_date_obj,
+            TimeSlot.date <= end_date_obj
+        ).all()
+        
+        # 按日期分组
+        result = {}
+        for slot in timeslots:
+            date_str = slot.date.isoformat()
+            if date_str not in result:
+                result[date_str] = []
+            
+            result[date_str].append({
+                'id': slot.id,
+                'time': slot.time,
+                'is_available': slot.is_available,
+                'created_at': slot.created_at.isoformat() if slot.created_at else None,
+                'updated_at': slot.updated_at.isoformat() if slot.updated_at else None
+            })
+        
+        return jsonify({
+            'provider_id': user_id,
+            'date_range': {
+                'start': start_date,
+                'end': end_date
+            },
+            'timeslots_by_date': result,
+            'total_count': len(timeslots)
+                        }), 200
+    
+    except ValueError:
+                        return jsonify({'message': '日期格式无效，应为YYYY-MM-DD'}), 400
+    except Exception as e:
+                        return jsonify({'message': f'获取时间段失败: {str(e)}'}), 500
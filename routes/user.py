@@ -0,0 +1,877 @@
+"""
+用户注册登录、个人信息、地址、偏好设置、头像和收藏
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.utils import secure_filename
+from sqlalchemy import select, true
+
+from models import db, User, Provider, Service, Address, Favorite
+from auth import hash_password, generate_token, auth_required
+from entity_cache import load_entity, load_entities
+from conditional import conditional_get
+from request_logging import logger
+from serializers import SERVICE_SCHEMA, PROVIDER_SCHEMA, SERVICE_LIST_FIELDS, PROVIDER_SUMMARY_FIELDS, json_response
+from uploads import allowed_file
+
+bp = Blueprint('user', __name__)
+
+# API路由：用户注册
+@bp.route('/api/register', methods=['POST'])
+def register():
+    data = request.json or {}
+    username = data.get('username')
+    email = data.get('email')
+    password = data.get('password')
+    user_type = data.get('userType')
+
+    if not all([username, email, password, user_type]):
+                        return jsonify({'message': '所有字段都是必填的'}), 400
+    
+    # 检查邮箱是否已被注册
+    if user_type == 'user':
+        existing_user = User.query.filter_by(email=email).first()
+    else:
+        existing_user = Provider.query.filter_by(email=email).first()
+    
+    if existing_user:
+        return jsonify({'message': '该邮箱已被注册'}), 400
+    
+    # 创建新用户
+    if user_type == 'user':
+        new_user = User(
+            username=username,
+            email=email,
+            password=hash_password(password),
+            created_at=datetime.now()
+        )
+    else:  # 服务提供商
+        new_user = Provider(
+            username=username,
+            email=email,
+            password=hash_password(password),
+            business_name='',
+            business_description='',
+            rating=0,
+            verified=False,
+            created_at=datetime.now()
+        )
+    
+    try:
+        db.session.add(new_user)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'注册失败: {str(e)}'}), 500
+    
+    return jsonify({'message': '注册成功', 'userId': new_user.id}), 201
+
+# API路由：用户登录
+@bp.route('/api/login', methods=['POST'])
+def login():
+    data = request.json or {}
+    email = data.get('email')
+    password = data.get('password')
+    
+    if not all([email, password]):
+        return jsonify({'message': '邮箱和密码都是必填的'}), 400
+    
+    # 在用户和服务商表中查找匹配的用户
+    user_found = False
+    user_data = None
+    user_type = None
+    
+    # 首先在用户表中查找
+    user = User.query.filter_by(email=email).first()
+    if user and user.password == hash_password(password):
+        user_found = True
+        user_data = user
+        user_type = 'user'
+    else:
+        # 如果在用户表中未找到，则在服务商表中查找
+        provider = Provider.query.filter_by(email=email).first()
+        if provider and provider.password == hash_password(password):
+            user_found = True
+            user_data = provider
+            user_type = 'provider'
+    
+    if not user_found or not user_data:
+        return jsonify({'message': '邮箱或密码不正确'}), 401
+    
+    # 生成令牌
+    token = generate_token(user_data.id, user_type)
+    
+    # 根据用户类型返回不同的重定向路径
+    redirect_path = 'provider-dashboard.html' if user_type == 'provider' else 'dashboard.html'
+    
+    return jsonify({
+        'message': '登录成功',
+        'token': token,
+        'userType': user_type,
+        'userId': user_data.id,
+        'username': user_data.username,
+        'email': user_data.email,
+        'redirect': redirect_path
+                    }), 200
+
+def user_info_version(user_id, user_type):
+    """用户信息的版本：用户的updated_at和地址的数量、最后添加时间(修改地址时更新用户的updated_at)；服务商只有updated_at"""
+    if user_type == 'user':
+        addresses = select(db.func.count(Address.id), db.func.max(Address.created_at)) \
+            .where(Address.user_id == user_id).subquery()
+        return db.session.execute(
+            select(User.updated_at, addresses).join(addresses, true()).where(User.id == user_id)
+        ).first()
+    return db.session.execute(select(Provider.updated_at).where(Provider.id == user_id)).first()
+
+# API路由：获取用户信息
+@bp.route('/api/user', methods=['GET'])
+@auth_required
+@conditional_get(user_info_version)
+def get_user_info(user_id, user_type):
+    # 根据用户类型获取用户信息
+    if user_type == 'user':
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'message': '用户不存在'}), 404
+        
+        # 返回用户信息
+        user_data = user.to_dict()
+        # 添加头像URL字段，确保前端能正确显示头像
+        if user.avatar:
+            user_data['avatar_url'] = user.avatar
+        else:
+            user_data['avatar_url'] = '/img/avatar-placeholder.jpg'
+        
+        return jsonify({'user': user_data}), 200
+    else:  # provider
+        provider = Provider.query.get(user_id)
+        if not provider:
+            return jsonify({'message': '服务商不存在'}), 404
+        
+        # 返回服务商信息
+        provider_data = provider.to_dict()
+        # 添加头像URL字段，确保前端能正确显示头像
+        if provider.avatar:
+            provider_data['avatar_url'] = provider.avatar
+        else:
+            provider_data['avatar_url'] = '/img/avatar-placeholder.jpg'
+        
+            return jsonify({'user': provider_data}), 200
+
+# API路由：更新用户信息
+@bp.route('/api/user', methods=['PUT'])
+@auth_required
+def update_user_info(user_id, user_type):
+    # 获取请求数据
+    data = request.json or {}
+    
+    try:
+        # 根据用户类型更新用户信息
+        if user_type == 'user':
+            user = User.query.get(user_id)
+            if not user:
+                return jsonify({'message': '用户不存在'}), 404
+            
+            # 如果要更新邮箱，先检查新邮箱是否已被使用
+            if 'email' in data and data['email'] != user.email:
+                # 检查新邮箱是否已被其他用户使用
+                existing_user = User.query.filter(User.email == data['email'], User.id != user_id).first()
+                if existing_user:
+                    return jsonify({'message': '该邮箱已被其他用户使用'}), 400
+                
+                # 检查新邮箱是否已被服务商使用
+                existing_provider = Provider.query.filter_by(email=data['email']).first()
+                if existing_provider:
+                    return jsonify({'message': '该邮箱已被服务商使用'}), 400
+                
+                # 更新邮箱
+                user.email = data['email']
+            
+            # 更新用户信息
+            if 'username' in data:
+                user.username = data['username']
+            if 'nickname' in data:
+                user.nickname = data['nickname']
+            if 'phone' in data:
+                user.phone = data['phone']
+            if 'gender' in data:
+                user.gender = data['gender']
+            if 'birthday' in data and data['birthday']:
+                try:
+                    user.birthday = datetime.strptime(str(data['birthday']), '%Y-%m-%d').date()
+                except ValueError:
+                                    return jsonify({'message': '生日格式不正确，应为YYYY-MM-DD'}), 400
+            if 'bio' in data:
+                user.bio = data['bio']
+            if 'avatar' in data:
+                user.avatar = data['avatar']
+            if 'notification_settings' in data:
+                user.notification_settings = json.dumps(data['notification_settings'])
+            if 'privacy_settings' in data:
+                user.privacy_settings = json.dumps(data['privacy_settings'])
+            if 'blacklist' in data:
+                user.blacklist = json.dumps(data['blacklist'])
+            
+            user.updated_at = datetime.now()
+            
+        else:  # provider
+            provider = Provider.query.get(user_id)
+            if not provider:
+                return jsonify({'message': '服务商不存在'}), 404
+            
+            # 如果要更新邮箱，先检查新邮箱是否已被使用
+            if 'email' in data and data['email'] != provider.email:
+                # 检查新邮箱是否已被其他服务商使用
+                existing_provider = Provider.query.filter(Provider.email == data['email'], Provider.id != user_id).first()
+                if existing_provider:
+                    return jsonify({'message': '该邮箱已被其他服务商使用'}), 400
+                
+                # 检查新邮箱是否已被用户使用
+                existing_user = User.query.filter_by(email=data['email']).first()
+                if existing_user:
+                    return jsonify({'message': '该邮箱已被用户使用'}), 400
+                
+                # 更新邮箱
+                provider.email = data['email']
+            
+            # 更新服务商信息
+            if 'username' in data:
+                provider.username = data['username']
+            if 'nickname' in data:
+                provider.nickname = data.get('nickname')
+            if 'gender' in data:
+                provider.gender = data.get('gender')
+            if 'bio' in data:
+                provider.bio = data.get('bio')
+            if 'phone' in data:
+                provider.phone = data.get('phone')
+            if 'service_phone' in data:
+                provider.service_phone = data.get('service_phone')
+            if 'business_name' in data:
+                provider.business_name = data['business_name']
+            if 'business_description' in data:
+                provider.business_description = data['business_description']
+            
+            provider.updated_at = datetime.now()
+        
+        # 保存更新
+        db.session.commit()
+        
+        return jsonify({'message': '用户信息更新成功'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'更新失败: {str(e)}'}), 500
+
+# API路由：更新用户密码
+@bp.route('/api/user/password', methods=['PUT'])
+@auth_required
+def update_user_password(user_id, user_type):
+    # 获取请求数据
+    data = request.json or {}
+    current_password = data.get('current_password')
+    new_password = data.get('new_password')
+    
+    if not all([current_password, new_password]):
+        return jsonify({'message': '当前密码和新密码都是必填的'}), 400
+    
+    try:
+        # 根据用户类型验证当前密码并更新
+        if user_type == 'user':
+            user = User.query.get(user_id)
+            if not user:
+                return jsonify({'message': '用户不存在'}), 404
+            
+            # 验证当前密码
+            if user.password != hash_password(current_password):
+                return jsonify({'message': '当前密码不正确'}), 401
+            
+            # 更新密码
+            user.password = hash_password(new_password)
+            user.updated_at = datetime.now()
+            
+        else:  # provider
+            provider = Provider.query.get(user_id)
+            if not provider:
+                return jsonify({'message': '服务商不存在'}), 404
+            
+            # 验证当前密码
+            if provider.password != hash_password(current_password):
+                return jsonify({'message': '当前密码不正确'}), 401
+            
+            # 更新密码
+            provider.password = hash_password(new_password)
+            provider.updated_at = datetime.now()
+        
+        # 保存更新
+        db.session.commit()
+        
+        return jsonify({'message': '密码更新成功'}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'更新密码失败: {str(e)}'}), 500
+
+# API路由：获取用户收藏列表
+@bp.route('/api/favorites', methods=['GET'])
+@auth_required
+def get_favorites(user_id, user_type):
+    if user_type != 'user':
+        return jsonify({'message': '只有用户才能查看收藏'}), 403
+    
+    fields = SERVICE_SCHEMA.parse_fields(request.args.get('fields'), SERVICE_LIST_FIELDS)
+    if fields is None:
+        return jsonify({'message': '无效的fields参数'}), 400
+    
+    # 获取用户收藏，服务和服务商读实体缓存，未命中的各用一次IN查询批量加载
+    favorites = Favorite.query.filter_by(user_id=user_id).all()
+    loaded = load_entities(Service, [favorite.service_id for favorite in favorites])
+    services = [loaded[favorite.service_id] for favorite in favorites if favorite.service_id in loaded]
+    
+    # provider为服务商摘要
+    serialize_provider = PROVIDER_SCHEMA.serializer(PROVIDER_SUMMARY_FIELDS)
+    providers = {}
+    if 'provider' in fields:
+        providers = {
+            provider_id: serialize_provider(provider)
+            for provider_id, provider in load_entities(Provider, [service.provider_id for service in services]).items()
+        }
+    
+    return json_response(SERVICE_SCHEMA.dump(services, fields, provider=lambda service: providers.get(service.provider_id)))
+
+# API路由：添加收藏
+@bp.route('/api/favorites', methods=['POST'])
+@auth_required
+def add_favorite(user_id, user_type):
+    if user_type != 'user':
+        return jsonify({'message': '只有用户才能添加收藏'}), 403
+    
+    data = request.json or {}
+    service_id = data.get('service_id')
+    
+    if not service_id:
+        return jsonify({'message': '服务ID是必填的'}), 400
+    
+    # 检查服务是否存在
+    service = Service.query.get(service_id)
+    if not service:
+        return jsonify({'message': '服务不存在'}), 404
+    
+    # 检查是否已收藏
+    existing_favorite = Favorite.query.filter_by(user_id=user_id, service_id=service_id).first()
+    if existing_favorite:
+        return jsonify({'message': '已经收藏过该服务'}), 400
+    
+    # 创建新收藏
+    new_favorite = Favorite(
+        user_id=user_id,
+        service_id=service_id,
+        created_at=datetime.now()
+    )
+    
+    db.session.add(new_favorite)
+    db.session.commit()
+    
+    return jsonify({
+        'message': '收藏添加成功',
+        'service': service.to_dict()
+    }), 201
+
+# API路由：删除收藏
+@bp.route('/api/favorites/<service_id>', methods=['DELETE'])
+@auth_required
+def remove_favorite(service_id, user_id, user_type):
+    if user_type != 'user':
+        return jsonify({'message': '只有用户才能删除收藏'}), 403
+    
+    # 查找并删除收藏
+    favorite = Favorite.query.filter_by(user_id=user_id, service_id=service_id).first()
+    if not favorite:
+        return jsonify({'message': '未找到该收藏'}), 404
+    
+    db.session.delete(favorite)
+    db.session.commit()
+    
+    return jsonify({'message': '收藏删除成功'}), 200
+
+# API路由：获取用户地址
+@bp.route('/api/user/addresses', methods=['GET'])
+@auth_required
+def get_user_addresses(user_id, user_type):
+    # 只有普通用户可以使用此API
+    if user_type != 'user':
+                        return jsonify({'message': '权限不足'}), 403
+    
+    # 查询用户地址
+    addresses = Address.query.filter_by(user_id=user_id).all()
+    
+    # 返回地址列表
+    return jsonify([address.to_dict() for address in addresses]), 200
+
+# API路由：添加用户地址
+@bp.route('/api/user/addresses', methods=['POST'])
+@auth_required
+def add_user_address(user_id, user_type):
+    # 只有普通用户可以使用此API
+    if user_type != 'user':
+                        return jsonify({'message': '权限不足'}), 403
+    
+    # 获取请求数据
+    data = request.json or {}
+    
+    # 验证必填字段
+    if not data.get('label') or not data.get('address'):
+                        return jsonify({'message': '标签和地址都是必填的'}), 400
+    
+    # 创建新地址
+    new_address = Address(
+        user_id=user_id,
+        label=data.get('label'),
+        address=data.get('address')
+    )
+    
+    try:
+        db.session.add(new_address)
+        db.session.commit()
+        return jsonify({'message': '地址添加成功', 'address': new_address.to_dict()}), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'地址添加失败: {str(e)}'}), 500
+
+#API路由：更新用户地址
+@bp.route('/api/user/addresses/<address_id>', methods=['PUT'])
+@auth_required
+def update_user_address_alt(address_id, user_id, user_type):
+    # 只有普通用户可以使用此API
+    if user_type != 'user':
+                        return jsonify({'message': '权限不足'}), 403
+    
+    # 查询地址
+    address = Address.query.filter_by(id=address_id, user_id=user_id).first()
+    if not address:
+                        return jsonify({'message': '地址不存在或无权限修改'}), 404
+    
+    # 获取请求数据
+    data = request.json or {}
+    
+    # 更新地址信息
+    if 'label' in data:
+        address.label = data['label']
+    if 'address' in data:
+        address.address = data['address']
+    # 地址随用户信息返回，地址没有updated_at，更新用户的updated_at使用户信息的版本变化
+    users = User.__table__
+    db.session.execute(users.update().where(users.c.id == user_id).values(updated_at=datetime.utcnow()))
+    
+    try:
+        db.session.commit()
+        return jsonify({'message': '地址更新成功', 'address': address.to_dict()}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'地址更新失败: {str(e)}'}), 500
+
+# API路由：删除用户地址
+@bp.route('/api/user/addresses/<address_id>', methods=['DELETE'])
+@auth_required
+def delete_user_address_alt(address_id, user_id, user_type):
+    # 只有普通用户可以使用此API
+    if user_type != 'user':
+                        return jsonify({'message': '权限不足'}), 403
+    
+    # 查询地址
+    address = Address.query.filter_by(id=address_id, user_id=user_id).first()
+    if not address:
+                        return jsonify({'message': '地址不存在或无权限删除'}), 404
+    
+    try:
+        db.session.delete(address)
+        db.session.commit()
+        return jsonify({'message': '地址删除成功'}), 200
+    except Exception as e:
+        db.session.rollback()
+        logger.error("删除地址失败: %s", e)
+        return jsonify({'message': f'删除地址失败: {str(e)}'}), 500
+
+@bp.route('/api/user/notification-settings', methods=['PUT'])
+@auth_required
+def update_notification_settings(user_id, user_type):
+    """更新用户的通知设置"""
+    logger.debug("API被调用: /api/user/notification-settings [PUT]")
+    
+    # 获取请求数据
+    data = request.json or {}
+    if not data or 'notification_settings' not in data:
+                        return jsonify({'message': '缺少必要参数'}), 400
+    
+    try:
+        notification_settings = data['notification_settings']
+        
+        # 查找用户或服务商
+        if user_type == 'user':
+            user = User.query.get(user_id)
+            if not user:
+                                return jsonify({'message': '用户不存在'}), 404
+            
+            # 更新通知设置
+            user.notification_settings = json.dumps(notification_settings)
+            user.updated_at = datetime.now()
+            
+        else:  # provider
+            provider = Provider.query.get(user_id)
+            if not provider:
+                                return jsonify({'message': '服务商不存在'}), 404
+            
+            # 如果Provider模型没有notification_settings字段，则可以在这里添加自定义逻辑
+            # 例如，将设置存储在另一个表中
+            # 由于目前Provider模型中没有notification_settings字段，这里仅返回成功
+            pass
+        
+        # 保存更改
+        db.session.commit()
+        
+        return jsonify({'message': '通知设置已更新'}), 200
+    except Exception as e:
+        db.session.rollback()
+        logger.error("更新通知设置失败: %s", e)
+        return jsonify({'message': f'更新通知设置失败: {str(e)}'}), 500
+
+# API路由：更新用户隐私设置
+@bp.route('/api/user/privacy-settings', methods=['PUT'])
+@auth_required
+def update_privacy_settings(user_id, user_type):
+    """更新用户隐私设置"""
+    # 确保是普通用户
+    if user_type != 'user':
+                        return jsonify({'message': '只有普通用户可以更新隐私设置'}), 403
+    
+    # 获取请求数据
+    data = request.json or {}
+    privacy_settings = data.get('privacy_settings')
+    
+    if not privacy_settings:
+                        return jsonify({'message': '隐私设置不能为空'}), 400
+    
+    try:
+        # 查找用户
+        user = User.query.get(user_id)
+        if not user:
+                            return jsonify({'message': '用户不存在'}), 404
+        
+        # 更新隐私设置
+        user.privacy_settings = json.dumps(privacy_settings)
+        user.updated_at = datetime.now()
+        
+        # 保存到数据库
+        db.session.commit()
+        
+        return jsonify({'message': '隐私设置更新成功'}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error("更新隐私设置失败: %s", e)
+        return jsonify({'message': f'更新隐私设置失败: {str(e)}'}), 500
+
+@bp.route('/api/user/blacklist', methods=['PUT'])
+@auth_required
+def update_user_blacklist(user_id, user_type):
+    try:
+        # 获取请求数据
+        data = request.get_json()
+        if not data or 'blacklist' not in data:
+                            return jsonify({'message': '请求数据为空或格式错误'}), 400
+        
+        # 获取用户
+        user = User.query.get(user_id)
+        if not user:
+                            return jsonify({'message': '用户不存在'}), 404
+        
+        # 更新黑名单
+        user.blacklist = data['blacklist']
+        
+        # 更新修改时间
+        user.updated_at = datetime.now()
+        
+        # 保存到数据库
+        db.session.commit()
+        
+        return jsonify({'message': '黑名单更新成功'}), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error("更新黑名单失败: %s", e)
+        return jsonify({'message': f'更新黑名单失败: {str(e)}'}), 500
+
+# API路由：更新用户头像
+@bp.route('/api/user/avatar', methods=['POST'])
+@auth_required
+def update_user_avatar(user_id, user_type):
+    """更新用户或服务商头像"""
+    try:
+        # 获取上传的文件
+        if 'avatar' not in request.files:
+                            return jsonify({'message': '没有上传文件'}), 400
+        
+        avatar_file = request.files['avatar']
+        if avatar_file.filename == '':
+                            return jsonify({'message': '没有选择文件'}), 400
+        
+        if avatar_file and allowed_file(avatar_file.filename, ['jpg', 'jpeg', 'png', 'gif']):
+            # 生成安全的文件名
+            filename = secure_filename(f"avatar_{user_type}_{user_id}_{int(time.time())}{os.path.splitext(avatar_file.filename)[1]}")
+            
+            # 确保上传目录存在
+            avatar_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'avatars')
+            if not os.path.exists(avatar_folder):
+                os.makedirs(avatar_folder)
+            
+            # 保存文件
+            filepath = os.path.join(avatar_folder, filename)
+            avatar_file.save(filepath)
+            
+            # 更新用户或服务商头像URL
+            avatar_url = f"/static/uploads/avatars/{filename}"
+            
+            if user_type == 'user':
+                user = User.query.get(user_id)
+                if not user:
+                                    return jsonify({'message': '用户不存在'}), 404
+                
+                # 设置头像URL
+                user.avatar = avatar_url
+                user.updated_at = datetime.now()
+            else:  # provider
+                provider = Provider.query.get(user_id)
+                if not provider:
+                                    return jsonify({'message': '服务商不存在'}), 404
+                
+                # 设置头像URL
+                provider.avatar = avatar_url
+                provider.updated_at = datetime.now()
+            
+            # 保存到数据库
+            db.session.commit()
+            
+            return jsonify({
+                'message': '头像上传成功',
+                'avatar_url': avatar_url
+                            }), 200
+        
+        return jsonify({'message': '不允许的文件类型'}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error("头像上传失败: %s", e)
+        return jsonify({'message': f'头像上传失败: {str(e)}'}), 500
+
+# API路由：获取用户地址 (重复定义，已被注释)
+# @bp.route('/api/user/addresses', methods=['GET'])
+# def get_user_addresses_alt():
+#     """获取用户地址列表(重复定义)"""
+#     # 从请求头获取令牌
+#     token = request.headers.get('Authorization')
+#     if not token:
+#                         return jsonify({'message': '缺少认证令牌'}), 401
+    
+#     # 移除Bearer前缀（如果有）
+#     if token.startswith('Bearer '):
+#         token = token[7:]
+    
+#     # 验证令牌
+#     payload = verify_token(token)
+#     if not payload:
+#                         return jsonify({'message': '无效或过期的令牌'}), 401
+    
+#     user_id = payload.get('user_id')
+#     user_type = payload.get('user_type')
+    
+#     # 确保是普通用户
+#     if user_type != 'user':
+#                         return jsonify({'message': '只有普通用户可以查看地址'}), 403
+    
+#     try:
+#         # 查询用户地址
+#         addresses = Address.query.filter_by(user_id=user_id).all()
+        
+#         # 转换为字典列表
+#         address_list = [address.to_dict() for address in addresses]
+        
+#         return jsonify(address_list), 200
+    
+#     except Exception as e:
+#         print(f"获取地址列表失败: {str(e)}")
+#         return jsonify({'message': f'获取地址列表失败: {str(e)}'}), 500
+
+# API路由：添加用户地址
+# 注释掉重复的路由定义 - 已在前面定义过
+# @bp.route('/api/user/addresses', methods=['POST'])
+# def add_user_address_duplicate():
+#     """添加用户地址 (重复定义，已被注释)"""
+#     # 从请求头获取令牌
+#     token = request.headers.get('Authorization')
+#     if not token:
+#                         return jsonify({'message': '缺少认证令牌'}), 401
+    
+#     # 移除Bearer前缀（如果有）
+#     if token.startswith('Bearer '):
+#         token = token[7:]
+    
+#     # 验证令牌
+#     payload = verify_token(token)
+#     if not payload:
+#                         return jsonify({'message': '无效或过期的令牌'}), 401
+    
+#     user_id = payload.get('user_id')
+#     user_type = payload.get('user_type')
+    
+#     # 确保是普通用户
+#     if user_type != 'user':
+#                         return jsonify({'message': '只有普通用户可以添加地址'}), 403
+    
+#     # 获取请求数据
+#     data = request.json or {}
+#     label = data.get('label')
+#     address = data.get('address')
+    
+#     if not all([label, address]):
+#                         return jsonify({'message': '标签和地址都是必填的'}), 400
+    
+#     try:
+#         # 创建新地址
+#         new_address = Address(
+#             user_id=user_id,
+#             label=label,
+#             address=address
+#         )
+        
+#         # 保存到数据库
+#         db.session.add(new_address)
+#         db.session.commit()
+        
+#         return jsonify({
+#             'message': '地址添加成功',
+#             'address': new_address.to_dict()
+#         }), 201
+    
+#     except Exception as e:
+#         db.session.rollback()
+#         print(f"添加地址失败: {str(e)}")
+#         return jsonify({'message': f'添加地址失败: {str(e)}'}), 500
+
+# API路由：更新用户地址
+# @bp.route('/api/user/addresses/<address_id>', methods=['PUT'])
+# def update_user_address(address_id):
+#     """更新用户地址"""
+#     # 从请求头获取令牌
+#     token = request.headers.get('Authorization')
+#     if not token:
+#                         return jsonify({'message': '缺少认证令牌'}), 401
+    
+#     # 移除Bearer前缀（如果有）
+#     if token.startswith('Bearer '):
+#         token = token[7:]
+    
+#     # 验证令牌
+#     payload = verify_token(token)
+#     if not payload:
+#                         return jsonify({'message': '无效或过期的令牌'}), 401
+    
+#     user_id = payload.get('user_id')
+#     user_type = payload.get('user_type')
+    
+#     # 确保是普通用户
+#     if user_type != 'user':
+#                         return jsonify({'message': '只有普通用户可以更新地址'}), 403
+    
+#     # 获取请求数据
+#     data = request.json or {}
+#     label = data.get('label')
+#     address = data.get('address')
+    
+#     if not all([label, address]):
+#                         return jsonify({'message': '标签和地址都是必填的'}), 400
+    
+#     try:
+#         # 查找地址
+#         addr = Address.query.filter_by(id=address_id, user_id=user_id).first()
+#         if not addr:
+#                             return jsonify({'message': '地址不存在或无权限修改'}), 404
+        
+#         # 更新地址
+#         addr.label = label
+#         addr.address = address
+        
+#         # 保存到数据库
+#         db.session.commit()
+        
+#         return jsonify({
+#             'message': '地址更新成功',
+#             'address': addr.to_dict()
+#                         }), 200
+    
+#     except Exception as e:
+#         db.session.rollback()
+#         print(f"更新地址失败: {str(e)}")
+#         return jsonify({'message': f'更新地址失败: {str(e)}'}), 500
+
+# API路由：删除用户地址
+# @bp.route('/api/user/addresses/<address_id>', methods=['DELETE'])
+# def delete_user_address(address_id):
+#     """删除用户地址"""
+#     # 从请求头获取令牌
+#     token = request.headers.get('Authorization')
+#     if not token:
+#                         return jsonify({'message': '缺少认证令牌'}), 401
+    
+#     # 移除Bearer前缀（如果有）
+#     if token.startswith('Bearer '):
+#         token = token[7:]
+    
+#     # 验证令牌
+#     payload = verify_token(token)
+#     if not payload:
+#                         return jsonify({'message': '无效或过期的令牌'}), 401
+    
+#     user_id = payload.get('user_id')
+#     user_type = payload.get('user_type')
+    
+#     # 只有普通用户可以使用此API
+#     if user_type != 'user':
+#                         return jsonify({'message': '权限不足'}), 403
+    
+#     # 查询地址
+#     address = Address.query.filter_by(id=address_id, user_id=user_id).first()
+#     if not address:
+#                         return jsonify({'message': '地址不存在或无权限删除'}), 404
+    
+#     try:
+#         db.session.delete(address)
+#         db.session.commit()
+#         return jsonify({'message': '地址删除成功'}), 200
+#     except Exception as e:
+#         db.session.rollback()
+#         print(f"删除地址失败: {str(e)}")
+#         return jsonify({'message': f'删除地址失败: {str(e)}'}), 500
+
+# API路由：检查服务是否已收藏
+@bp.route('/api/favorites/check/<service_id>', methods=['GET'])
+@auth_required
+def check_favorite(service_id, user_id, user_type):
+    """检查用户是否已收藏指定服务"""
+    try:
+        # 查询服务
+        service = load_entity(Service, service_id)
+        if not service:
+            return jsonify({'message': '服务不存在'}), 404
+        
+        # 检查是否已收藏
+        favorite = Favorite.query.filter_by(user_id=user_id, service_id=service_id).first()
+        
+        return jsonify({
+            'is_favorite': favorite is not None,
+            'favorite_id': favorite.id if favorite else None
+        }), 200
+    except Exception as e:
+        return jsonify({'message': f'检查收藏状态失败: {str(e)}'}), 500
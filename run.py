@@ -1,8 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from app import app
-import urllib.parse
+from app import create_app, start_background_jobs
 
 if __name__ == "__main__":
+    app = create_app()
+    start_background_jobs(app)
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
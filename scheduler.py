@@ -0,0 +1,329 @@
+"""
+预约定时任务
+每轮只查询时间窗口内的预约：未来一小时内开始的已确认预约发送提醒，超过开始时间一小时仍为已确认的预约标记为未出席。
+- 未出席按批次用一条UPDATE ... WHERE id IN (...)修改状态，并释放时间段占用、刷新可用性索引
+- 通知批量插入，重复由notifications.dedup_key唯一键保证(INSERT IGNORE)，多次执行或多个进程同时执行都不会重复通知，
+  同一事务中增加用户的未读计数
+- 多个worker/进程中只有持有scheduler_leases租约的一个执行任务，租约过期后由其他进程接管
+- metrics记录执行次数和耗时，可通过/api/debug/scheduler查看
+- 每个进程的定时任务线程(无论是否持有租约)每轮同步本进程的搜索索引，并定期全量重建，请求中不需要重建
+
+在Web进程中调用start_scheduler(app)启动后台线程，也可以单独运行: python scheduler.py
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, update, delete, insert
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Booking, Service, Provider, Notification, SlotClaim, SchedulerLease
+from availability import mark_dirty
+from notifications import adjust_unread_counts
+from search_index import prune_service_changes, service_index
+
+# booking的子日志器，与请求日志一起由request_logging输出为JSON行
+logger = logging.getLogger(f'booking.{__name__}')
+
+LEASE_NAME = 'booking_scheduler'
+DEFAULT_INTERVAL = 300  # 默认每5分钟执行一次，单位：秒
+REMINDER_WINDOW = timedelta(hours=1)  # 提前多久提醒
+NO_SHOW_GRACE = timedelta(hours=1)  # 超过开始时间多久标记为未出席
+BATCH_SIZE = 500  # 每批处理的预约数
+
+def new_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# 本进程的租约持有者标识；预加载应用后fork出的worker各自重新生成，否则所有worker共用主进程的标识，都会认为自己持有租约
+OWNER = new_owner()
+
+def _reset_owner():
+    global OWNER
+    OWNER = new_owner()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_owner)
+
+metrics = {
+    'runs': 0,
+    'failures': 0,
+    'is_leader': False,
+    'last_run_at': None,
+    'last_duration': None,  # 单位：秒
+    'max_duration': 0,
+    'last_no_shows': 0,
+    'last_reminders': 0,
+    'total_no_shows': 0,
+    'total_reminders': 0
+}
+
+_scheduler_thread = None
+_stop_event = threading.Event()
+
+def booking_before(moment):
+    """预约开始时间早于moment的SQL条件；time为补零的HH:MM，可以直接按字符串比较"""
+    moment_date, moment_time = moment.date(), moment.strftime('%H:%M')
+    return or_(Booking.date < moment_date, and_(Booking.date == moment_date, Booking.time < moment_time))
+
+def booking_between(start, end):
+    """预约开始时间位于[start, end]内的SQL条件，窗口可以跨过零点"""
+    start_date, start_time = start.date(), start.strftime('%H:%M')
+    end_date, end_time = end.date(), end.strftime('%H:%M')
+    if start_date == end_date:
+        return and_(Booking.date == start_date, Booking.time >= start_time, Booking.time <= end_time)
+    return or_(
+        and_(Booking.date == start_date, Booking.time >= start_time),
+        and_(Booking.date > start_date, Booking.date < end_date),
+        and_(Booking.date == end_date, Booking.time <= end_time)
+    )
+
+def booking_datetime(booking_date, booking_time):
+    hour, minute = map(int, booking_time.split(':'))
+    return datetime.combine(booking_date, datetime.min.time()).replace(hour=hour, minute=minute)
+
+def insert_notifications(rows):
+    """批量插入通知，dedup_key已存在的行被忽略，并增加用户的未读计数；返回插入的行数"""
+    if not rows:
+        return 0
+    # 先用一次IN查询排除已发送过的通知，未读计数只为新通知增加
+    existing = {
+        key for (key,) in db.session.query(Notification.dedup_key).filter(
+            Notification.dedup_key.in_([row['dedup_key'] for row in rows])
+        )
+    }
+    rows = [row for row in rows if row['dedup_key'] not in existing]
+    if not rows:
+        return 0
+    now = datetime.now()
+    for row in rows:
+        row.setdefault('id', str(uuid.uuid4()))
+        row.setdefault('type', 'booking')
+        row.setdefault('is_read', False)
+        row.setdefault('created_at', now)
+        row.setdefault('updated_at', now)
+    stmt = insert(Notification.__table__).prefix_with('IGNORE', dialect='mysql').prefix_with('OR IGNORE', dialect='sqlite')
+    db.session.execute(stmt, rows)
+    adjust_unread_counts(db.session, Counter(row['user_id'] for row in rows))
+    return len(rows)
+
+def mark_no_shows(now):
+    """将超过开始时间一小时仍为已确认的预约标记为未出席，返回标记的数量"""
+    cutoff = now - NO_SHOW_GRACE
+    query = db.session.query(
+        Booking.id, Booking.user_id, Booking.provider_id, Booking.date, Service.title
+    ).outerjoin(Service, Service.id == Booking.service_id).filter(
+        Booking.status == 'confirmed',
+        booking_before(cutoff)
+    ).order_by(Booking.id).limit(BATCH_SIZE)
+
+    marked = 0
+    while True:
+        rows = query.all()
+        if not rows:
+            break
+        batch_size = len(rows)
+        booking_ids = [row.id for row in rows]
+
+        # 条件中再次检查状态，避免覆盖并发完成或取消的预约
+        result = db.session.execute(
+            update(Booking.__table__)
+            .where(Booking.__table__.c.id.in_(booking_ids), Booking.__table__.c.status == 'confirmed')
+            .values(status='no-show', updated_at=now)
+        )
+        if result.rowcount != len(booking_ids):
+            # 部分预约在查询之后被完成或取消，只处理本次UPDATE改为未出席的
+            # (MySQL和SQLAlchemy 1.4的SQLite不支持UPDATE ... RETURNING，重新查询一次)
+            updated = {
+                booking_id for (booking_id,) in db.session.query(Booking.id).filter(
+                    Booking.id.in_(booking_ids), Booking.status == 'no-show'
+                )
+            }
+            rows = [row for row in rows if row.id in updated]
+            booking_ids = [row.id for row in rows]
+        if booking_ids:
+            db.session.execute(delete(SlotClaim.__table__).where(SlotClaim.__table__.c.booking_id.in_(booking_ids)))
+        for row in rows:
+            mark_dirty(db.session, row.provider_id, [row.date])
+
+        insert_notifications([{
+            'user_id': row.user_id,
+            'subtype': 'no-show',
+            'title': '预约未出席',
+            'content': f"您的 {row.title or '预约服务'} 服务预约已被标记为未出席。",
+            'related_id': row.id,
+            'dedup_key': f'no-show:{row.id}'
+        } for row in rows])
+        db.session.commit()
+        marked += len(rows)
+
+        if batch_size < BATCH_SIZE:
+            break
+    return marked
+
+def send_reminders(now):
+    """为一小时内开始的已确认预约发送提醒，返回新插入的提醒数量"""
+    query = db.session.query(
+        Booking.id, Booking.user_id, Booking.date, Booking.time, Service.title, Provider.business_name
+    ).outerjoin(Service, Service.id == Booking.service_id).outerjoin(
+        Provider, Provider.id == Booking.provider_id
+    ).filter(
+        Booking.status == 'confirmed',
+        booking_between(now, now + REMINDER_WINDOW)
+    ).order_by(Booking.id)
+
+    sent = 0
+    last_id = None
+    while True:
+        batch_query = query if last_id is None else query.filter(Booking.id > last_id)
+        rows = batch_query.limit(BATCH_SIZE).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        notifications = []
+        for row in rows:
+            minutes = int((booking_datetime(row.date, row.time) - now).total_seconds() / 60)
+            notifications.append({
+                'user_id': row.user_id,
+                'subtype': 'reminder',
+                'title': '预约即将开始',
+                'content': f"您与 {row.business_name or '服务提供商'} 的 {row.title or '预约服务'} 服务预约将在 {max(minutes, 0)} 分钟后开始。",
+                'related_id': row.id,
+                'dedup_key': f'reminder:{row.id}'
+            })
+        sent += insert_notifications(notifications)
+        db.session.commit()
+
+        if len(rows) < BATCH_SIZE:
+            break
+    return sent
+
+def acquire_lease(ttl, owner=None):
+    """
+    获取或续期定时任务租约，成功返回True
+    先用条件UPDATE接管自己持有的或已过期的租约，没有租约行时再INSERT，主键冲突说明其他进程已抢到
+    """
+    owner = owner or OWNER
+    now = datetime.utcnow()
+    table = SchedulerLease.__table__
+    try:
+        result = db.session.execute(
+            update(table)
+            .where(table.c.name == LEASE_NAME, or_(table.c.owner == owner, table.c.expires_at < now))
+            .values(owner=owner, expires_at=now + timedelta(seconds=ttl))
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(table).values(name=LEASE_NAME, owner=owner, expires_at=now + timedelta(seconds=ttl)))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def release_lease(owner=None):
+    """进程退出时释放租约，其他进程无需等待过期即可接管"""
+    owner = owner or OWNER
+    table = SchedulerLease.__table__
+    db.session.execute(delete(table).where(table.c.name == LEASE_NAME, table.c.owner == owner))
+    db.session.commit()
+
+def run_once(now=None):
+    """执行一轮定时任务，返回(未出席数, 提醒数)"""
+    now = now or datetime.now()
+    started = time.perf_counter()
+    no_shows = reminders = 0
+    try:
+        no_shows = mark_no_shows(now)
+        reminders = send_reminders(now)
+        prune_service_changes()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        metrics['failures'] += 1
+        logger.exception("定时任务执行出错")
+    finally:
+        duration = time.perf_counter() - started
+        metrics['runs'] += 1
+        metrics['last_run_at'] = now.isoformat()
+        metrics['last_duration'] = round(duration, 4)
+        metrics['max_duration'] = max(metrics['max_duration'], round(duration, 4))
+        metrics['last_no_shows'] = no_shows
+        metrics['last_reminders'] = reminders
+        metrics['total_no_shows'] += no_shows
+        metrics['total_reminders'] += reminders
+        logger.info("定时任务完成: 未出席 %s 个，提醒 %s 个，耗时 %.3f 秒", no_shows, reminders, duration)
+    return no_shows, reminders
+
+def scheduler_loop(app, interval):
+    """按间隔循环执行，每轮开始前续期租约，只有租约持有者执行任务"""
+    # 租约在两轮之间不会过期；持有者异常退出后最多等待一个TTL由其他进程接管
+    ttl = interval * 2 + 60
+    with app.app_context():
+        while not _stop_event.is_set():
+            try:
+                metrics['is_leader'] = acquire_lease(ttl)
+                if metrics['is_leader']:
+                    run_once()
+            except Exception:
+                db.session.rollback()
+                metrics['is_leader'] = False
+                logger.exception("定时任务租约检查失败")
+            finally:
+                db.session.remove()
+            try:
+                service_index.refresh()
+            except Exception:
+                logger.exception("刷新搜索索引失败")
+            finally:
+                db.session.remove()
+            _stop_event.wait(interval)
+
+        if metrics['is_leader']:
+            try:
+                release_lease()
+            except Exception:
+                db.session.rollback()
+                logger.exception("释放定时任务租约失败")
+
+def start_scheduler(app):
+    """
+    启动定时任务后台线程，同一进程只启动一次
+    SCHEDULER_ENABLED为False时不启动，SCHEDULER_INTERVAL为执行间隔(秒)
+    """
+    global _scheduler_thread
+    if not app.config.get('SCHEDULER_ENABLED', True):
+        return None
+    if _scheduler_thread is not None and _scheduler_thread.is_alive():
+        return _scheduler_thread
+
+    _stop_event.clear()
+    interval = app.config.get('SCHEDULER_INTERVAL', DEFAULT_INTERVAL)
+    _scheduler_thread = threading.Thread(target=scheduler_loop, args=(app, interval), name='booking-scheduler')
+    _scheduler_thread.daemon = True
+    _scheduler_thread.start()
+    logger.info("定时任务已启动，间隔 %s 秒，进程 %s", interval, OWNER)
+    return _scheduler_thread
+
+def stop_scheduler(timeout=None):
+    """停止后台线程并释放租约"""
+    _stop_event.set()
+    if _scheduler_thread is not None:
+        _scheduler_thread.join(timeout)
+
+if __name__ == '__main__':
+    # 单独运行一个定时任务进程，Web进程可以设置SCHEDULER_ENABLED=False
+    from app import create_app
+
+    app = create_app(blueprints=())
+    try:
+        scheduler_loop(app, app.config.get('SCHEDULER_INTERVAL', DEFAULT_INTERVAL))
+    except KeyboardInterrupt:
+        _stop_event.set()
+        with app.app_context():
+            release_lease()
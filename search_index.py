@@ -0,0 +1,444 @@
+"""
+服务全文搜索索引
+进程内倒排索引：中文按相邻两字(bigram)切分，英文和数字按单词切分并转为小写，
+标题、分类、描述分别加权后按BM25计算相关度。只索引上线(active)的服务。
+
+每个进程各自维护一份索引。服务的创建、修改、删除和评分变化在同一事务中写入service_changes表，
+搜索前用一次主键范围查询读取本进程还没处理的变更并增量更新，因此所有worker的结果都与数据库一致。
+第一次搜索时从数据库全量构建索引。读取数据库和构建新索引都不持有索引锁，只在应用变更或替换索引时加锁，
+重建期间其他线程继续用旧索引搜索；定时重建由定时任务线程调用refresh完成，不在请求中进行。
+"""
+
+import bisect
+import heapq
+import json
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert, delete, func
+
+from models import db, Service, ServiceChange
+
+# 字段权重
+FIELD_WEIGHTS = (('title', 3.0), ('categories', 2.0), ('description', 1.0))
+
+# BM25参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 分类名称的最大长度，与service_categories.category一致
+MAX_CATEGORY_LENGTH = 50
+
+# 支持的排序方式
+SEARCH_SORTS = ('relevance', 'price_asc', 'price_desc', 'rating', 'created_at')
+
+# 每次同步时回看的变更数：自增ID按分配顺序而不是提交顺序递增，较早分配的ID可能稍后才提交
+CHANGE_LOOKBACK = 100
+
+# 定时任务每隔这段时间全量重建一次索引；超过这段时间没有同步的进程(变更日志可能已清理)搜索前也会重建，
+# 变更日志只需保留更长一点的时间
+REBUILD_AFTER = timedelta(hours=12)
+CHANGE_RETENTION = timedelta(days=1)
+
+TOKEN_RE = re.compile(r'[一-鿿]+|[a-z0-9]+')
+
+def is_cjk(char):
+    return '一' <= char <= '鿿'
+
+def tokenize(text):
+    """切分文本：连续的中文按两字一组切分(单字保留原样)，英文和数字按单词切分"""
+    tokens = []
+    for match in TOKEN_RE.finditer((text or '').lower()):
+        word = match.group()
+        if is_cjk(word[0]) and len(word) > 1:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+def parse_categories(categories):
+    """将JSON数组字符串解析为分类元组，去掉空白、重复和超长的分类并保持原有顺序"""
+    try:
+        value = json.loads(categories) if categories else []
+    except (TypeError, ValueError):
+        return ()
+    if not isinstance(value, list):
+        return ()
+    result = []
+    for item in value:
+        category = str(item).strip()
+        if category and len(category) <= MAX_CATEGORY_LENGTH and category not in result:
+            result.append(category)
+    return tuple(result)
+
+def timestamp(value):
+    return value.timestamp() if value else 0.0
+
+class ServiceSearchIndex:
+    """
+    服务倒排索引，线程安全
+    文档按加入顺序编号，postings中每个词的文档编号数组天然有序；服务修改时旧编号作废、分配新编号，
+    作废的编号过多时压缩重建编号
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()  # 保护索引数据，搜索和应用变更时持有
+        self._sync_lock = threading.Lock()  # 同一时间只有一个线程读取变更或重建，不阻塞搜索
+        self._reset()
+
+    def _reset(self):
+        self.built = False
+        self.watermark = 0  # 已处理的最大变更ID
+        self._seen_changes = set()  # 回看窗口内已处理的变更ID
+        self._synced_at = None
+        self._built_at = None
+        self._doc_ids = []  # 文档编号 -> 服务ID，作废的编号为None
+        self._doc_numbers = {}  # 服务ID -> 文档编号
+        self._doc_lengths = array('f')
+        self._prices = array('d')
+        self._ratings = array('d')
+        self._created = array('d')
+        self._categories = []
+        self._category_counts = Counter()  # 分类 -> 上线服务数
+        self._postings = {}  # 词 -> (文档编号数组, 加权词频数组)
+        self._char_terms = {}  # 汉字 -> 包含该字的词，用于单字查询
+        self._live = 0
+        self._total_length = 0.0
+
+    def __len__(self):
+        return self._live
+
+    # 索引维护
+
+    def add(self, service_id, title, description, categories, price, rating, created_at):
+        """加入或替换一个服务，categories为分类元组"""
+        with self._lock:
+            self.remove(service_id)
+            weights = {}
+            length = 0.0
+            fields = {'title': title, 'categories': ' '.join(categories), 'description': description}
+            for field, weight in FIELD_WEIGHTS:
+                for token in tokenize(fields[field]):
+                    weights[token] = weights.get(token, 0.0) + weight
+                    length += weight
+
+            doc = len(self._doc_ids)
+            self._doc_ids.append(service_id)
+            self._doc_numbers[service_id] = doc
+            self._doc_lengths.append(length)
+            self._prices.append(price or 0.0)
+            self._ratings.append(rating or 0.0)
+            self._created.append(timestamp(created_at))
+            self._categories.append(categories)
+            self._category_counts.update(categories)
+            self._live += 1
+            self._total_length += length
+
+            for term, weight in weights.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = (array('I'), array('f'))
+                    for char in term:
+                        if is_cjk(char):
+                            self._char_terms.setdefault(char, set()).add(term)
+                posting[0].append(doc)
+                posting[1].append(weight)
+
+    def remove(self, service_id):
+        """移除服务，倒排表中的旧编号在查询时跳过，压缩时清除"""
+        with self._lock:
+            doc = self._doc_numbers.pop(service_id, None)
+            if doc is None:
+                return
+            self._doc_ids[doc] = None
+            self._category_counts.subtract(self._categories[doc])
+            self._live -= 1
+            self._total_length -= self._doc_lengths[doc]
+            if len(self._doc_ids) > 1000 and len(self._doc_ids) > 2 * self._live:
+                self._compact()
+
+    def _compact(self):
+        """去掉作废的文档编号并重新编号"""
+        remap = {}
+        doc_ids, lengths, prices, ratings, created, categories = [], array('f'), array('d'), array('d'), array('d'), []
+        for doc, service_id in enumerate(self._doc_ids):
+            if service_id is None:
+                continue
+            remap[doc] = len(doc_ids)
+            doc_ids.append(service_id)
+            lengths.append(self._doc_lengths[doc])
+            prices.append(self._prices[doc])
+            ratings.append(self._ratings[doc])
+            created.append(self._created[doc])
+            categories.append(self._categories[doc])
+
+        postings = {}
+        for term, (docs, weights) in self._postings.items():
+            new_docs, new_weights = array('I'), array('f')
+            for doc, weight in zip(docs, weights):
+                new_doc = remap.get(doc)
+                if new_doc is not None:
+                    new_docs.append(new_doc)
+                    new_weights.append(weight)
+            if new_docs:
+                postings[term] = (new_docs, new_weights)
+            else:
+                for char in term:
+                    terms = self._char_terms.get(char)
+                    if terms:
+                        terms.discard(term)
+
+        self._doc_ids, self._doc_lengths, self._prices = doc_ids, lengths, prices
+        self._ratings, self._created, self._categories = ratings, created, categories
+        self._doc_numbers = {service_id: doc for doc, service_id in enumerate(doc_ids)}
+        self._postings = postings
+
+    # 查询
+
+    def _term_matches(self, term):
+        """返回{文档编号: 加权词频}；单个汉字匹配所有包含该字的词"""
+        if len(term) == 1 and is_cjk(term):
+            terms = self._char_terms.get(term, ())
+        else:
+            terms = (term,)
+        matches = {}
+        for expanded in terms:
+            posting = self._postings.get(expanded)
+            if posting is None:
+                continue
+            for doc, weight in zip(*posting):
+                matches[doc] = matches.get(doc, 0.0) + weight
+        return matches
+
+    def _postings_for(self, term):
+        """单个词直接返回有序的倒排数组，避免构造字典"""
+        if len(term) == 1 and is_cjk(term):
+            matches = self._term_matches(term)
+            docs = sorted(matches)
+            return array('I', docs), array('f', (matches[doc] for doc in docs))
+        return self._postings.get(term, (array('I'), array('f')))
+
+    def match(self, query):
+        """返回包含查询中所有词的文档{文档编号: BM25得分}；查询中没有可检索的词时返回None"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return None
+
+        with self._lock:
+            count = max(self._live, 1)
+            avg_length = self._total_length / count if self._live else 1.0
+            lengths = self._doc_lengths
+            postings = sorted((self._postings_for(term) for term in terms), key=lambda p: len(p[0]))
+
+            def term_score(weight, doc, idf):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc] / avg_length)
+                return idf * weight * (BM25_K1 + 1) / (weight + norm)
+
+            def idf_of(posting):
+                df = len(posting[0])
+                return math.log(1 + (count - df + 0.5) / (df + 0.5))
+
+            # 从最短的倒排表开始求交集
+            docs, weights = postings[0]
+            idf = idf_of(postings[0])
+            scores = {
+                doc: term_score(weight, doc, idf)
+                for doc, weight in zip(docs, weights) if self._doc_ids[doc] is not None
+            }
+            for docs, weights in postings[1:]:
+                if not scores:
+                    break
+                idf = idf_of((docs, weights))
+                next_scores = {}
+                if len(scores) * 20 < len(docs):
+                    # 候选很少时在有序数组上二分查找
+                    for doc, score in scores.items():
+                        position = bisect.bisect_left(docs, doc)
+                        if position < len(docs) and docs[position] == doc:
+                            next_scores[doc] = score + term_score(weights[position], doc, idf)
+                else:
+                    for doc, weight in zip(docs, weights):
+                        score = scores.get(doc)
+                        if score is not None:
+                            next_scores[doc] = score + term_score(weight, doc, idf)
+                scores = next_scores
+            return scores
+
+    def category_facets(self):
+        """所有上线服务的分类计数，按数量从多到少排列"""
+        with self._lock:
+            return {category: count for category, count in self._category_counts.most_common() if count > 0}
+
+    def search(self, query, categories=None, sort_by='relevance', offset=0, limit=50, after=None):
+        """
+        搜索上线的服务，categories为分类列表，服务属于其中任意一个即可
+        返回(当前页服务ID列表, 匹配总数, 分类计数, 下一页位置)；分类计数按关键词匹配的服务统计，不受分类筛选影响，
+        便于前端显示其他分类的数量
+        下一页位置是当前页最后一个服务的排序键[排序值, 服务ID]，作为after传回即可从其后继续，
+        没有更多结果时为None；每页都只对匹配的服务做一次堆选择，翻到第几页开销都相同
+        查询中没有可检索的词时返回None，由调用方回退到数据库查询
+        """
+        # 匹配和排序在同一次加锁内完成，中间的删除和压缩会重新编号文档，匹配得到的编号随之失效
+        with self._lock:
+            scores = self.match(query)
+            if scores is None:
+                return None
+
+            doc_categories = self._categories
+            facets = Counter()
+            for doc in scores:
+                facets.update(doc_categories[doc])
+            if categories:
+                selected = set(categories)
+                scores = {doc: score for doc, score in scores.items() if selected.intersection(doc_categories[doc])}
+
+            doc_ids = self._doc_ids
+            if sort_by == 'price_asc':
+                key = lambda doc: (self._prices[doc], doc_ids[doc])
+            elif sort_by == 'price_desc':
+                key = lambda doc: (-self._prices[doc], doc_ids[doc])
+            elif sort_by == 'rating':
+                key = lambda doc: (-self._ratings[doc], doc_ids[doc])
+            elif sort_by == 'created_at':
+                key = lambda doc: (-self._created[doc], doc_ids[doc])
+            else:
+                key = lambda doc: (-scores[doc], doc_ids[doc])
+
+            candidates = scores
+            if after is not None:
+                after = tuple(after)
+                candidates = [doc for doc in scores if key(doc) > after]
+            page = heapq.nsmallest(offset + limit + 1, candidates, key=key)[offset:]
+            next_after = list(key(page[limit - 1])) if len(page) > limit else None
+            return [doc_ids[doc] for doc in page[:limit]], len(scores), dict(facets.most_common()), next_after
+
+    # 与数据库同步
+
+    def _query_services(self, service_ids=None):
+        """查询上线服务的索引字段；service_ids为None时查询全部"""
+        query = db.session.query(
+            Service.id, Service.title, Service.description, Service.categories,
+            Service.price, Service.rating, Service.created_at
+        ).filter(Service.status == 'active')
+        if service_ids is not None:
+            query = query.filter(Service.id.in_(service_ids))
+        return query
+
+    def _add_row(self, row):
+        self.add(row.id, row.title, row.description, parse_categories(row.categories),
+                 row.price, row.rating, row.created_at)
+
+    def _rebuild(self):
+        """在一个新的索引对象中全量构建(不持有本索引的锁)，构建完成后加锁替换；调用方需持有_sync_lock"""
+        fresh = ServiceSearchIndex()
+        fresh.watermark = db.session.query(func.max(ServiceChange.id)).scalar() or 0
+        fresh._seen_changes = {
+            change_id for (change_id,) in
+            db.session.query(ServiceChange.id).filter(ServiceChange.id > fresh.watermark - CHANGE_LOOKBACK)
+        }
+        for row in self._query_services().yield_per(5000):
+            fresh._add_row(row)
+        fresh.built = True
+        fresh._synced_at = fresh._built_at = datetime.utcnow()
+
+        state = {name: value for name, value in vars(fresh).items() if name not in ('_lock', '_sync_lock')}
+        with self._lock:
+            self.__dict__.update(state)
+
+    def rebuild(self):
+        """全量重建索引，重建期间其他线程继续使用旧索引搜索"""
+        with self._sync_lock:
+            self._rebuild()
+
+    def sync(self):
+        """
+        读取本进程还没处理的变更并增量更新索引；第一次调用或长时间未同步时全量重建
+        其他线程正在同步或重建时，已构建的索引直接返回，搜索使用当前的索引，不等待
+        """
+        if not self._sync_lock.acquire(blocking=not self.built):
+            return
+        try:
+            if not self.built or datetime.utcnow() - self._synced_at > REBUILD_AFTER:
+                self._rebuild()
+                return
+
+            changes = db.session.query(ServiceChange.id, ServiceChange.service_id).filter(
+                ServiceChange.id > self.watermark - CHANGE_LOOKBACK
+            ).all()
+            self._synced_at = datetime.utcnow()
+            pending = {service_id for change_id, service_id in changes if change_id not in self._seen_changes}
+            if not pending:
+                return
+
+            # 在锁外读取变化的服务，只在修改索引时加锁
+            rows = self._query_services(pending).all()
+            with self._lock:
+                for row in rows:
+                    self._add_row(row)
+                for service_id in pending - {row.id for row in rows}:
+                    self.remove(service_id)
+                self.watermark = max(change_id for change_id, _ in changes)
+                self._seen_changes = {
+                    change_id for change_id, _ in changes if change_id > self.watermark - CHANGE_LOOKBACK
+                }
+        finally:
+            self._sync_lock.release()
+
+    def refresh(self):
+        """
+        定时任务线程调用：距上次全量构建超过REBUILD_AFTER时重建，否则同步变更，使请求中不需要重建
+        本进程还没有构建索引(没有搜索过，如单独运行的定时任务进程)时不做任何事
+        """
+        if not self.built:
+            return
+        if datetime.utcnow() - self._built_at > REBUILD_AFTER:
+            self.rebuild()
+        else:
+            self.sync()
+
+service_index = ServiceSearchIndex()
+
+def search_services(query, categories=None, sort_by='relevance', offset=0, limit=50, after=None):
+    """同步索引后搜索，参数和返回值见ServiceSearchIndex.search"""
+    service_index.sync()
+    return service_index.search(query, categories, sort_by, offset, limit, after)
+
+def count_active_services():
+    """同步索引后返回上线服务总数"""
+    service_index.sync()
+    return len(service_index)
+
+def category_facets():
+    """同步索引后返回所有上线服务的分类计数"""
+    service_index.sync()
+    return service_index.category_facets()
+
+def record_service_changes(session, service_ids):
+    """在当前事务中记录服务变更，直接执行SQL修改服务的代码需要调用"""
+    rows = [{'service_id': service_id, 'changed_at': datetime.utcnow()} for service_id in set(service_ids) if service_id]
+    if rows:
+        session.execute(insert(ServiceChange.__table__), rows)
+
+def _collect_service_changes(session, flush_context, instances):
+    service_ids = [obj.id for obj in session.new if isinstance(obj, Service)]
+    service_ids += [obj.id for obj in session.deleted if isinstance(obj, Service)]
+    service_ids += [
+        obj.id for obj in session.dirty
+        if isinstance(obj, Service) and session.is_modified(obj, include_collections=False)
+    ]
+    record_service_changes(session, service_ids)
+
+def register_search_listeners(session):
+    """在会话上注册记录服务变更的事件"""
+    event.listen(session, 'before_flush', _collect_service_changes)
+
+def prune_service_changes(now=None):
+    """删除超过保留期的变更日志，返回删除的行数"""
+    cutoff = (now or datetime.utcnow()) - CHANGE_RETENTION
+    table = ServiceChange.__table__
+    result = db.session.execute(delete(table).where(table.c.changed_at < cutoff))
+    return result.rowcount
@@ -0,0 +1,120 @@
+"""
+列表接口的序列化
+按字段表把模型转换为字典：每个列表接口声明自己需要的字段，客户端可以用fields参数在其中进一步裁剪，
+只序列化、也只从数据库读取需要的列。Model.to_dict()仍用于单个实体的详情接口。
+"""
+
+import json
+from operator import attrgetter
+
+from flask import current_app
+from sqlalchemy.orm import load_only
+
+from models import User, Provider, Service
+
+def _isoformat(name):
+    get = attrgetter(name)
+    def isoformat(obj):
+        value = get(obj)
+        return value.isoformat() if value else None
+    return isoformat
+
+def _json_text(name, empty):
+    get = attrgetter(name)
+    def loads(obj):
+        value = get(obj)
+        return json.loads(value) if value else empty()
+    return loads
+
+def _columns(*names):
+    """普通列字段：字段名与列名相同，直接取属性值"""
+    return {name: ((name,), attrgetter(name)) for name in names}
+
+class Schema:
+    """模型的字段表：字段名 -> (依赖的列, 取值函数)"""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+
+    def parse_fields(self, value, allowed):
+        """
+        解析逗号分隔的fields参数，返回字段元组；未传入时返回allowed
+        只能在接口声明的allowed范围内裁剪，出现其他字段时返回None
+        """
+        if not value:
+            return allowed
+        fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        if not fields or any(name not in allowed for name in fields):
+            return None
+        return fields
+
+    def load_options(self, fields, *extra_columns):
+        """只加载fields依赖的列(以及调用方额外需要的列)的查询选项，主键总会加载"""
+        columns = dict.fromkeys(extra_columns)
+        for name in fields:
+            columns.update(dict.fromkeys(self.fields[name][0]))
+        return load_only(*[getattr(self.model, column) for column in columns])
+
+    def serializer(self, fields, **getters):
+        """
+        生成把单个实体转换为字典的函数；getters可以替换或补充字段的取值函数，
+        例如用批量加载的服务商代替逐行访问关联关系
+        字段查找在这里完成一次，逐行转换时只剩取值
+        """
+        pairs = [(name, getters.get(name) or self.fields[name][1]) for name in fields]
+        def serialize(obj):
+            return {name: get(obj) for name, get in pairs}
+        return serialize
+
+    def dump(self, objs, fields, **getters):
+        """批量转换实体列表"""
+        serialize = self.serializer(fields, **getters)
+        return [serialize(obj) for obj in objs]
+
+USER_SCHEMA = Schema(User, {
+    **_columns('id', 'username', 'nickname', 'email', 'phone', 'gender', 'bio', 'avatar'),
+    'birthday': (('birthday',), _isoformat('birthday')),
+    'notification_settings': (('notification_settings',), _json_text('notification_settings', dict)),
+    'privacy_settings': (('privacy_settings',), _json_text('privacy_settings', dict)),
+    'blacklist': (('blacklist',), _json_text('blacklist', list)),
+    'created_at': (('created_at',), _isoformat('created_at')),
+    'updated_at': (('updated_at',), _isoformat('updated_at')),
+})
+
+PROVIDER_SCHEMA = Schema(Provider, {
+    **_columns('id', 'username', 'nickname', 'gender', 'bio', 'avatar', 'business_name', 'business_description',
+               'email', 'rating', 'verified', 'province', 'city', 'district', 'detail_address', 'open_time',
+               'close_time', 'holiday_desc', 'phone', 'service_phone', 'business_type', 'license_no'),
+    'created_at': (('created_at',), _isoformat('created_at')),
+    'updated_at': (('updated_at',), _isoformat('updated_at')),
+})
+
+SERVICE_SCHEMA = Schema(Service, {
+    **_columns('id', 'title', 'provider_id', 'price', 'price_unit', 'duration', 'rating', 'reviews_count',
+               'image', 'description', 'status'),
+    # 默认逐行访问关联关系，列表接口应传入批量加载的取值函数
+    'provider': (('provider_id',), lambda service: service.provider.to_dict() if service.provider else None),
+    'categories': (('categories',), _json_text('categories', list)),
+    'created_at': (('created_at',), _isoformat('created_at')),
+    'updated_at': (('updated_at',), _isoformat('updated_at')),
+})
+
+# 各接口的字段集
+# 服务列表(公开服务、收藏)：provider由接口填充，公开列表为服务商名称，收藏为服务商摘要
+SERVICE_LIST_FIELDS = ('id', 'title', 'provider_id', 'provider', 'price', 'price_unit', 'duration', 'rating',
+                       'reviews_count', 'image', 'categories', 'description', 'status', 'created_at', 'updated_at')
+# 嵌套在评价等其他实体中的服务摘要
+SERVICE_SUMMARY_FIELDS = ('id', 'title', 'provider_id', 'price', 'price_unit', 'duration', 'rating', 'image',
+                          'categories', 'status')
+PROVIDER_SUMMARY_FIELDS = ('id', 'username', 'nickname', 'business_name', 'avatar', 'rating', 'verified')
+USER_SUMMARY_FIELDS = ('id', 'username', 'nickname', 'avatar')
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), check_circular=False)
+
+def json_response(payload, status=200):
+    """
+    直接编码为JSON响应：不排序键、不转义中文、不检查循环引用，比jsonify少做一轮工作
+    payload中只能有JSON原生类型，日期等需要先由字段表转换为字符串
+    """
+    return current_app.response_class(_encoder.encode(payload), status=status, mimetype='application/json')
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+生产环境启动脚本
+用gunicorn的pre-fork模型运行应用：主进程预加载应用(create_app)后fork出多个worker进程，
+每个worker用线程池(gthread)处理请求并保持keep-alive连接；主进程只负责管理worker，
+worker异常退出或处理完SERVER_MAX_REQUESTS个请求后由主进程补上新的。
+配置取自Config中的SERVER_*项(可以用BOOKING_SETTINGS配置文件覆盖)，命令行参数优先。
+run.py是单进程的开发服务器，只用于开发；gunicorn依赖fork，不支持Windows。
+
+使用方法:
+    python serve.py                                  # 前台启动
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:8000
+    python serve.py reload                           # 加载新代码，不中断服务
+    python serve.py restart                          # 逐个替换worker(代码不变，例如重新读取配置文件)
+    python serve.py stop                             # 等待进行中的请求完成后停止
+
+也可以直接向主进程发送信号(PID见SERVER_PIDFILE)：
+    HUP   启动新的worker并平滑关闭旧worker；预加载模式下不会重新加载代码
+    USR2  启动新的主进程并加载新代码，与旧主进程共用监听端口；新worker就绪后再向旧主进程发送TERM
+    TERM  平滑停止：不再接受新连接，进行中的请求最多等待SERVER_GRACEFUL_TIMEOUT秒
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from gunicorn.app.base import BaseApplication
+
+from app import create_app, start_background_jobs
+from models import db
+from scheduler import stop_scheduler
+
+class BookingServer(BaseApplication):
+    """用gunicorn运行已经创建好的应用，主进程中预加载，fork后各worker共享已导入的代码"""
+
+    def __init__(self, app, options):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+def server_options(app, args):
+    """由应用配置和命令行参数生成gunicorn配置"""
+    config = app.config
+    workers = args.workers or config['SERVER_WORKERS'] or multiprocessing.cpu_count() * 2 + 1
+    max_requests = config['SERVER_MAX_REQUESTS']
+
+    def pre_fork(server, worker):
+        # 主进程中如果已经建立了数据库连接，fork前关闭，避免worker与主进程共用同一个连接
+        with app.app_context():
+            db.engine.dispose()
+
+    def post_worker_init(worker):
+        # 每个worker都启动定时任务线程，通过租约只有一个执行，执行任务的worker被替换时由其他worker接管
+        start_background_jobs(app)
+
+    def worker_exit(server, worker):
+        # worker被替换或停止时释放租约，新worker不必等租约过期就能接管定时任务
+        stop_scheduler(timeout=5)
+
+    return {
+        'bind': args.bind or config['SERVER_BIND'],
+        'workers': workers,
+        'worker_class': 'gthread',
+        'threads': args.threads or config['SERVER_THREADS'],
+        'keepalive': args.keepalive if args.keepalive is not None else config['SERVER_KEEPALIVE'],
+        'timeout': config['SERVER_TIMEOUT'],
+        'graceful_timeout': config['SERVER_GRACEFUL_TIMEOUT'],
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests // 10,  # 错开各worker的重启时间
+        'preload_app': True,
+        'pidfile': config['SERVER_PIDFILE'],
+        'pre_fork': pre_fork,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+
+def read_pid(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def child_pids(pid):
+    """主进程的worker进程ID；读取/proc，其他系统返回None"""
+    if not os.path.isdir('/proc'):
+        return None
+    children = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                # 第4个字段是父进程ID，进程名可能带空格，从最后一个')'之后开始数
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            children.append(int(name))
+    return children
+
+def reload_code(pidfile, timeout):
+    """
+    不中断服务地加载新代码：USR2让旧主进程启动新的主进程(重新执行本脚本)，新主进程把pid写入<pid文件>.2，
+    fork出worker后向旧主进程发送TERM平滑退出；旧主进程退出后新主进程把pid文件改回原名，此时返回
+    """
+    old_pid = read_pid(pidfile)
+    if old_pid is None:
+        print(f"未找到主进程(pid文件 {pidfile})")
+        return False
+    os.kill(old_pid, signal.SIGUSR2)
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        new_pid = read_pid(pidfile + '.2')
+        if new_pid:
+            workers = child_pids(new_pid)
+            if workers is None:
+                time.sleep(5)  # 无法查看子进程时等待worker启动
+                break
+            if workers:
+                break
+        time.sleep(0.2)
+    else:
+        print(f"新主进程没有在 {timeout} 秒内就绪，旧主进程继续服务")
+        return False
+
+    os.kill(old_pid, signal.SIGTERM)
+    print(f"新主进程 {new_pid} 已就绪，旧主进程 {old_pid} 正在平滑退出")
+
+    # 旧主进程退出后新主进程才改回pid文件，等到改回后返回，之后的restart、stop才会发给新主进程
+    deadline = time.time() + timeout
+    while read_pid(pidfile) != new_pid:
+        if time.time() > deadline:
+            print(f"旧主进程 {old_pid} 没有在 {timeout} 秒内退出")
+            return False
+        time.sleep(0.2)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='生产环境启动脚本')
+    parser.add_argument('command', nargs='?', default='start', choices=['start', 'reload', 'restart', 'stop'])
+    parser.add_argument('--bind', help='监听地址，默认SERVER_BIND')
+    parser.add_argument('--workers', type=int, help='worker进程数，默认SERVER_WORKERS或CPU核数*2+1')
+    parser.add_argument('--threads', type=int, help='每个worker的线程数，默认SERVER_THREADS')
+    parser.add_argument('--keepalive', type=int, help='keep-alive连接的空闲秒数，默认SERVER_KEEPALIVE')
+    parser.add_argument('--wait', type=int, default=60, help='reload时等待新主进程就绪的秒数')
+    args = parser.parse_args()
+
+    app = create_app()
+    pidfile = app.config['SERVER_PIDFILE']
+    if args.command == 'start':
+        BookingServer(app, server_options(app, args)).run()
+        return True
+    if args.command == 'reload':
+        return reload_code(pidfile, args.wait)
+
+    pid = read_pid(pidfile)
+    if pid is None:
+        print(f"未找到主进程(pid文件 {pidfile})")
+        return False
+    os.kill(pid, signal.SIGHUP if args.command == 'restart' else signal.SIGTERM)
+    return True
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,50 @@
+"""
+服务分类关联表
+Service.categories仍以JSON数组保存供前端显示，service_categories表按(服务, 分类)每行一条，
+创建或修改分类时在同一次flush中同步，按分类筛选时走(category, service_id)索引并且是精确匹配。
+"""
+
+from sqlalchemy import event, inspect, insert, delete
+
+from models import Service, ServiceCategory
+from search_index import parse_categories
+
+def parse_category_filter(values):
+    """解析分类筛选参数：可以重复传入，也可以用逗号分隔；'全部'表示不筛选"""
+    selected = []
+    for value in values:
+        for category in value.split(','):
+            category = category.strip()
+            if category and category != '全部' and category not in selected:
+                selected.append(category)
+    return selected
+
+def category_filter(categories):
+    """服务属于任意一个所选分类的SQL条件"""
+    return Service.id.in_(
+        ServiceCategory.query.with_entities(ServiceCategory.service_id).filter(ServiceCategory.category.in_(categories))
+    )
+
+def _sync_service_categories(session, flush_context):
+    """服务写入数据库后重写分类关联行；删除的服务由外键级联删除，这里也显式删除以兼容不检查外键的SQLite"""
+    table = ServiceCategory.__table__
+    changed = [obj for obj in session.new if isinstance(obj, Service)]
+    changed += [
+        obj for obj in session.dirty
+        if isinstance(obj, Service) and inspect(obj).attrs.categories.history.has_changes()
+    ]
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Service)]
+
+    stale = [obj.id for obj in changed] + removed
+    if stale:
+        session.execute(delete(table).where(table.c.service_id.in_(stale)))
+    rows = [
+        {'service_id': obj.id, 'category': category}
+        for obj in changed for category in parse_categories(obj.categories)
+    ]
+    if rows:
+        session.execute(insert(table), rows)
+
+def register_category_listeners(session):
+    """在会话上注册同步分类关联表的事件"""
+    event.listen(session, 'after_flush', _sync_service_categories)
@@ -0,0 +1,133 @@
+"""
+时间段占用
+slot_claims表以(provider_id, date, time)为主键，每个时间段同时只能被一个有效预约或一个未过期的保留占用。
+抢占通过条件UPDATE(接管过期保留)或INSERT完成，并发请求由主键冲突决出唯一的胜者，不需要锁表。
+预约被取消、拒绝、标记未出席或删除时，在同一次flush中释放占用。
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect, insert, update, delete
+
+from models import Booking, SlotClaim
+from availability import ACTIVE_BOOKING_STATUSES
+
+# 下单前保留时间段的有效期(秒)
+HOLD_SECONDS = 300
+
+def slot_filter(provider_id, date_obj, time_str):
+    return (
+        SlotClaim.provider_id == provider_id,
+        SlotClaim.date == date_obj,
+        SlotClaim.time == time_str
+    )
+
+def is_claimed(session, provider_id, date_obj, time_str, now=None):
+    """时间段是否已被有效预约或未过期的保留占用(不加锁，只用于快速拒绝)"""
+    now = now or datetime.utcnow()
+    claim = session.query(SlotClaim.booking_id, SlotClaim.expires_at).filter(
+        *slot_filter(provider_id, date_obj, time_str)
+    ).first()
+    return claim is not None and (claim.expires_at is None or claim.expires_at >= now)
+
+def claim_slot(session, provider_id, date_obj, time_str, user_id, booking_id=None, hold_seconds=None):
+    """
+    抢占时间段，booking_id和hold_seconds二选一：前者直接绑定预约，后者创建临时保留。
+    先用条件UPDATE接管已过期的保留，否则INSERT新的占用行。
+    时间段已被占用时INSERT抛出IntegrityError(is_slot_conflict为True)，调用方应回滚事务并返回409。
+    返回保留令牌(直接绑定预约时为None)
+    """
+    now = datetime.utcnow()
+    hold_token = None
+    expires_at = None
+    if hold_seconds:
+        hold_token = str(uuid.uuid4())
+        expires_at = now + timedelta(seconds=hold_seconds)
+    values = {
+        'user_id': user_id,
+        'booking_id': booking_id,
+        'hold_token': hold_token,
+        'expires_at': expires_at,
+        'created_at': now
+    }
+
+    result = session.execute(
+        update(SlotClaim)
+        .where(*slot_filter(provider_id, date_obj, time_str))
+        .where(SlotClaim.expires_at.isnot(None), SlotClaim.expires_at < now)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        session.execute(insert(SlotClaim).values(provider_id=provider_id, date=date_obj, time=time_str, **values))
+    return hold_token
+
+def is_duplicate_insert(error, table):
+    """
+    IntegrityError是否为向table插入时的主键或唯一键冲突
+    外键、非空等其他完整性错误以及其他表(如可用性索引)的冲突返回False
+    """
+    orig = error.orig
+    code = orig.args[0] if getattr(orig, 'args', None) else None
+    duplicate = (
+        code == 1062  # MySQL: Duplicate entry
+        or 'UNIQUE constraint failed' in str(orig)  # SQLite
+        or getattr(orig, 'pgcode', None) == '23505'  # PostgreSQL: unique_violation
+    )
+    statement = ' '.join((error.statement or '').split()).lower()
+    return duplicate and statement.startswith(f'insert into {table.name} ')
+
+def is_slot_conflict(error):
+    """IntegrityError是否由时间段已被占用(slot_claims主键冲突)引起"""
+    return is_duplicate_insert(error, SlotClaim.__table__)
+
+def convert_hold(session, hold_token, user_id, provider_id, date_obj, time_str, booking_id):
+    """将用户未过期的保留转为预约占用，成功返回True"""
+    result = session.execute(
+        update(SlotClaim)
+        .where(*slot_filter(provider_id, date_obj, time_str))
+        .where(
+            SlotClaim.hold_token == hold_token,
+            SlotClaim.user_id == user_id,
+            SlotClaim.booking_id.is_(None),
+            SlotClaim.expires_at >= datetime.utcnow()
+        )
+        .values(booking_id=booking_id, hold_token=None, expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def release_hold(session, hold_token, user_id):
+    """释放用户尚未下单的保留，成功返回True"""
+    result = session.execute(
+        delete(SlotClaim)
+        .where(
+            SlotClaim.hold_token == hold_token,
+            SlotClaim.user_id == user_id,
+            SlotClaim.booking_id.is_(None)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def _release_inactive(session, flush_context, instances):
+    """预约不再占用时间段(取消、拒绝、完成、未出席或删除)时释放对应的占用行"""
+    booking_ids = []
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        history = inspect(obj).attrs.status.history
+        if history.deleted and obj.status not in ACTIVE_BOOKING_STATUSES:
+            booking_ids.append(obj.id)
+    booking_ids.extend(obj.id for obj in session.deleted if isinstance(obj, Booking))
+    if booking_ids:
+        session.execute(
+            delete(SlotClaim)
+            .where(SlotClaim.booking_id.in_(booking_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+def register_slot_claim_listeners(session):
+    """在会话上注册释放时间段占用的事件"""
+    event.listen(session, 'before_flush', _release_inactive)
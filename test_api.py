@@ -1,15 +1,17 @@
 from flask import Flask, url_for
-import app as flask_app
+from app import create_app
 
-with flask_app.app.test_request_context():
+app = create_app()
+
+with app.test_request_context():
     print("Available endpoints:")
-    for rule in flask_app.app.url_map.iter_rules():
+    for rule in app.url_map.iter_rules():
         print(f"{rule.endpoint}: {rule}")
         
     # Test the provider endpoint specifically
     print("\nTesting provider endpoint:")
     try:
-        url = url_for('get_provider_available_timeslots', provider_id='prov1')
+        url = url_for('provider.get_provider_available_timeslots', provider_id='prov1')
         print(f"URL for provider endpoint: {url}")
     except Exception as e:
         print(f"Error generating URL: {e}") 
\ No newline at end of file
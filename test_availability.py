@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+可用性索引测试脚本
+检查时间与位图位置的换算(边界和无法识别的格式)、时间段和预约变化后open/closed/booked位图的内容、
+get_available_times对当天设置、当前周参考模式、默认营业时间和已过时间的处理，
+以及两个事务同时首次写入同一天时不会因主键冲突失败
+
+使用方法:
+    python test_availability.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import create_app
+from auth import hash_password
+from availability import time_to_bit, bit_to_time, times_to_mask, mask_to_times, parse_mask, format_mask, \
+    refresh_availability, get_available_times, DEFAULT_MASK, DEFAULT_TIMES
+from models import db, User, Provider, Service, Booking, TimeSlot, ProviderAvailability
+
+# 使用临时SQLite文件数据库，并发写入的测试需要第二个连接
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'availability.db')
+app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{DB_PATH}', 'TESTING': True})
+
+# 固定的当前时间：2030-01-09(周三) 10:02，当前周为01-07至01-13
+NOW = datetime(2030, 1, 9, 10, 2)
+TODAY = NOW.date()
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def seed():
+    """重建数据表，生成一个服务商、服务和用户，返回(服务商ID, 服务ID, 用户ID)；需在应用上下文中调用"""
+    db.drop_all()
+    db.create_all()
+    provider = Provider(username='availability_provider', email='availability_provider@example.com',
+                        password=hash_password('123456'), business_name='可用性测试商家')
+    user = User(username='availability_user', email='availability_user@example.com', password=hash_password('123456'))
+    db.session.add_all([provider, user])
+    db.session.flush()
+    service = Service(title='可用性测试服务', provider_id=provider.id, price=100, price_unit='元/次',
+                      duration=60, status='active', description='测试')
+    db.session.add(service)
+    db.session.commit()
+    ids = provider.id, service.id, user.id
+    db.session.remove()
+    return ids
+
+def add_slots(provider_id, date_obj, available=(), unavailable=()):
+    db.session.add_all([TimeSlot(provider_id=provider_id, date=date_obj, time=time_str, is_available=True)
+                        for time_str in available])
+    db.session.add_all([TimeSlot(provider_id=provider_id, date=date_obj, time=time_str, is_available=False)
+                        for time_str in unavailable])
+
+def row_times(provider_id, date_obj):
+    """读取可用性行，返回(可用, 不可用, 已预约)的时间列表"""
+    row = ProviderAvailability.query.get((provider_id, date_obj))
+    db.session.remove()
+    return tuple(mask_to_times(parse_mask(mask)) for mask in (row.open_mask, row.closed_mask, row.booked_mask))
+
+def test_time_to_bit():
+    """时间与位图位置的换算：一天的首尾、区间格式，越界、不是5分钟整数倍和无法识别的格式返回None"""
+    assert time_to_bit('00:00') == 0 and time_to_bit('23:55') == 287
+    assert time_to_bit('09:30') == 114 and time_to_bit('9:30') == 114
+    assert time_to_bit('09:30-10:00') == 114 and time_to_bit(' 09:30 - 10:00') == 114
+    for invalid in ('24:00', '23:60', '09:07', '-01:00', '10', 'abc', '', None):
+        assert time_to_bit(invalid) is None, f"{invalid!r} 应无法识别"
+    assert [bit_to_time(bit) for bit in (0, 114, 287)] == ['00:00', '09:30', '23:55']
+
+    mask = times_to_mask(['17:00', '09:00', '09:00', '24:00', 'abc'])
+    assert mask_to_times(mask) == ['09:00', '17:00'], "无效时间应被忽略，结果按时间排序"
+    assert parse_mask(format_mask(mask)) == mask and parse_mask('') == 0 and parse_mask(None) == 0
+    assert mask_to_times(DEFAULT_MASK) == DEFAULT_TIMES
+    assert len(format_mask(times_to_mask(['23:55']))) <= ProviderAvailability.open_mask.type.length
+
+def test_refresh_masks():
+    """时间段和预约提交后位图更新：可用、不可用分开记录，只有待确认和已确认的预约占用，改期后两天都刷新"""
+    with app.app_context():
+        provider_id, service_id, user_id = seed()
+        day = TODAY + timedelta(days=14)
+        add_slots(provider_id, day, available=['09:00', '10:00-10:30'], unavailable=['11:00'])
+        bookings = [Booking(user_id=user_id, provider_id=provider_id, service_id=service_id, date=day, time=time_str,
+                            status=status)
+                    for time_str, status in (('09:00', 'pending'), ('10:00', 'canceled'), ('12:00', 'confirmed'),
+                                             ('13:00', 'completed'))]
+        db.session.add_all(bookings)
+        db.session.commit()
+        booking_id = bookings[0].id
+        db.session.remove()
+        assert row_times(provider_id, day) == (['09:00', '10:00'], ['11:00'], ['09:00', '12:00'])
+
+        # 取消后释放，改期后原日期和新日期都刷新
+        Booking.query.get(booking_id).status = 'canceled'
+        db.session.commit()
+        assert row_times(provider_id, day)[2] == ['12:00']
+        booking = Booking.query.filter_by(time='12:00').one()
+        booking.date = day + timedelta(days=1)
+        db.session.commit()
+        db.session.remove()
+        assert row_times(provider_id, day)[2] == []
+        assert row_times(provider_id, day + timedelta(days=1)) == ([], [], ['12:00'])
+
+        # 删除时间段后位图清空，行仍然保留
+        TimeSlot.query.filter_by(provider_id=provider_id, date=day).delete()
+        db.session.commit()
+        db.session.remove()
+        refresh_availability(db.session, provider_id, [day])
+        db.session.commit()
+        assert row_times(provider_id, day) == ([], [], [])
+
+def test_available_times():
+    """可用时间：当天设置的时间段减去不可用和已预约的，没有设置的日期沿用当前周同一星期几或默认营业时间，过滤已过的时间"""
+    with app.app_context():
+        provider_id, service_id, user_id = seed()
+        monday = TODAY - timedelta(days=TODAY.weekday())
+        future = TODAY + timedelta(days=20)  # 周二，不在当前周
+        # 当前周周一的设置作为参考模式，20:00不在默认营业时间内
+        add_slots(provider_id, monday, available=['09:00', '09:30', '20:00'], unavailable=['10:00'])
+        add_slots(provider_id, TODAY, available=['09:00', '10:00', '10:05', '11:00'])
+        add_slots(provider_id, future, available=['08:00', '09:00', '09:30'], unavailable=['10:00'])
+        db.session.add_all([
+            Booking(user_id=user_id, provider_id=provider_id, service_id=service_id, date=future, time='09:00',
+                    status='confirmed'),
+            Booking(user_id=user_id, provider_id=provider_id, service_id=service_id, date=future + timedelta(days=2),
+                    time='09:00', status='pending'),
+        ])
+        db.session.commit()
+        db.session.remove()
+
+        times = dict(get_available_times(provider_id, TODAY - timedelta(days=1), future + timedelta(days=6), now=NOW))
+        assert times[future] == ['08:00', '09:30'], times[future]
+        assert times[TODAY] == ['10:05', '11:00'], "今天已过的时间(含当前所在的5分钟)应过滤"
+        assert times[TODAY - timedelta(days=1)] == [], "已过去且没有设置的日期不可预约"
+        # 周一、周三沿用当前周的参考模式，限定在默认营业时间内，不过滤今天已过的时间
+        next_monday = monday + timedelta(days=21)
+        assert times[next_monday] == ['09:00', '09:30'], times[next_monday]
+        assert times[future + timedelta(days=1)] == ['09:00', '10:00', '11:00']
+        # 周四没有参考模式，使用默认营业时间，已预约的时间段移除
+        assert times[future + timedelta(days=2)] == [t for t in DEFAULT_TIMES if t != '09:00']
+        assert len(times) == 28
+
+        # 没有任何设置时使用默认营业时间
+        db.session.remove()
+        assert dict(get_available_times(provider_id, future + timedelta(days=3), now=NOW)) == {
+            future + timedelta(days=3): DEFAULT_TIMES
+        }
+        db.session.remove()
+
+def test_first_write_race():
+    """两个事务同时首次写入同一天：另一个事务先插入了可用性行，本事务刷新时不会因主键冲突失败"""
+    with app.app_context():
+        provider_id, _, _ = seed()
+        day = TODAY + timedelta(days=30)
+        table = ProviderAvailability.__table__
+        engine = db.engine
+        raced = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            # 本事务插入可用性行之前，另一个连接插入同一天的行并提交
+            if statement.startswith('INSERT INTO provider_availability') and not raced:
+                raced.append(True)
+                with engine.begin() as other:
+                    other.execute(table.insert().values(provider_id=provider_id, date=day, open_mask='0',
+                                                        closed_mask='0', booked_mask='0'))
+
+        # 时间段直接插入并提交(不经过ORM事件)，再单独刷新，本事务在插入可用性行之前没有其他写入
+        db.session.execute(TimeSlot.__table__.insert().values(id='race-slot', provider_id=provider_id, date=day,
+                                                              time='09:00', is_available=True))
+        db.session.commit()
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            refresh_availability(db.session, provider_id, [day])
+            db.session.commit()
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+            db.session.remove()
+        assert raced, "没有模拟到并发插入"
+        assert row_times(provider_id, day) == (['09:00'], [], [])
+
+def main():
+    tests = [
+        test_time_to_bit,
+        test_refresh_masks,
+        test_available_times,
+        test_first_write_race,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except Exception as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {type(e).__name__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
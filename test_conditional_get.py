@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+条件请求测试脚本
+检查详情和轮询接口返回ETag和Cache-Control，带上If-None-Match重新请求时返回304且只执行版本查询，
+相关数据(预约状态、服务、服务商、评价、地址等)变化后ETag改变并返回完整响应，
+以及不同用户、不同查询参数的ETag不会混用
+
+使用方法:
+    python test_conditional_get.py
+"""
+
+import sys
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from app import create_app
+from auth import generate_token, hash_password
+from models import db, User, Provider, Service, Booking, Review, Address
+
+# 使用内存SQLite数据库，不依赖MySQL
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def seed():
+    """重建数据表，生成用户、服务商、服务、预约和地址，返回{名称: ID或令牌}"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='etag_user', email='etag_user@example.com', password=hash_password('123456'))
+        other = User(username='etag_other', email='etag_other@example.com', password=hash_password('123456'))
+        provider = Provider(username='etag_provider', email='etag_provider@example.com',
+                            password=hash_password('123456'), business_name='条件请求测试商家')
+        db.session.add_all([user, other, provider])
+        db.session.flush()
+        service = Service(title='条件请求测试服务', provider_id=provider.id, price=100, price_unit='元/次',
+                          duration=60, status='active', description='测试')
+        db.session.add(service)
+        db.session.flush()
+        booking = Booking(user_id=user.id, provider_id=provider.id, service_id=service.id,
+                          date=date.today() + timedelta(days=1), time='10:00', status='pending')
+        db.session.add_all([booking, Address(user_id=user.id, label='家', address='测试路1号')])
+        db.session.commit()
+        ids = {
+            'user': user.id, 'provider': provider.id, 'service': service.id, 'booking': booking.id,
+            'user_token': generate_token(user.id, 'user'),
+            'other_token': generate_token(other.id, 'user'),
+            'provider_token': generate_token(provider.id, 'provider'),
+        }
+        db.session.remove()
+    return ids
+
+def request(client, path, token=None, etag=None, method='get', json=None):
+    """发送请求，返回(执行的SQL语句数, 响应)"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    headers = {}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    if etag:
+        headers['If-None-Match'] = etag
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = getattr(client, method)(path, headers=headers, json=json)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), response
+
+def revalidate(client, path, token=None):
+    """请求两次，第二次带上ETag，断言返回304，返回(ETag, 完整响应的语句数, 304的语句数)"""
+    full, response = request(client, path, token)
+    assert response.status_code == 200, f"{path} 返回 {response.status_code}"
+    etag = response.headers.get('ETag')
+    assert etag and etag.startswith('W/"'), f"{path} 没有ETag"
+    assert 'no-cache' in response.headers['Cache-Control']
+    cached, response = request(client, path, token, etag)
+    assert response.status_code == 304 and not response.data, f"{path} 重新验证返回 {response.status_code}"
+    assert response.headers['ETag'] == etag
+    return etag, full, cached
+
+def test_dashboard_polling():
+    """仪表盘轮询：没有变化时返回304，只执行一次版本查询；预约状态变化后返回新数据"""
+    ids = seed()
+    client = app.test_client()
+    path = '/api/bookings/dashboard'
+    etag, full, cached = revalidate(client, path, ids['user_token'])
+    assert cached == 1 and cached < full, f"304应只执行版本查询: {full} -> {cached}"
+    assert request(client, path, ids['user_token'], f'"{etag[3:-1]}"')[1].status_code == 304, "强ETag形式也应匹配"
+
+    # 服务商确认预约后，用户的仪表盘、统计和预约详情都不再匹配旧ETag
+    stats_etag, _, _ = revalidate(client, '/api/bookings/stats', ids['user_token'])
+    detail_path = f"/api/bookings/{ids['booking']}"
+    detail_etag, _, _ = revalidate(client, detail_path, ids['user_token'])
+    _, response = request(client, f"{detail_path}/accept", ids['provider_token'], method='put')
+    assert response.status_code == 200, response.get_json()
+
+    _, response = request(client, path, ids['user_token'], etag)
+    assert response.status_code == 200 and response.get_json()['counts']['upcoming'] == 1
+    assert response.headers['ETag'] != etag
+    assert request(client, '/api/bookings/stats', ids['user_token'], stats_etag)[1].status_code == 200
+    _, response = request(client, detail_path, ids['user_token'], detail_etag)
+    assert response.status_code == 200 and response.get_json()['status'] == 'confirmed'
+
+def test_related_changes():
+    """服务修改后服务详情和仪表盘的ETag改变，新增评价后服务详情的ETag改变"""
+    ids = seed()
+    client = app.test_client()
+    detail = f"/api/services/public/{ids['service']}"
+    detail_etag, full, cached = revalidate(client, detail)
+    assert cached < full, f"{full} -> {cached}"
+    assert revalidate(client, detail)[0] == detail_etag
+    dashboard_etag, _, _ = revalidate(client, '/api/bookings/dashboard', ids['user_token'])
+
+    _, response = request(client, f"/api/services/{ids['service']}", ids['provider_token'], method='put',
+                          json={'title': '改名后的服务'})
+    assert response.status_code == 200, response.get_json()
+    _, response = request(client, detail, etag=detail_etag)
+    assert response.status_code == 200 and response.get_json()['title'] == '改名后的服务'
+    _, response = request(client, '/api/bookings/dashboard', ids['user_token'], dashboard_etag)
+    assert response.status_code == 200 and response.get_json()['pending'][0]['service']['title'] == '改名后的服务'
+
+    # 新增评价(不经过接口直接写入)也改变服务详情的版本
+    detail_etag = revalidate(client, detail)[0]
+    with app.app_context():
+        db.session.add(Review(user_id=ids['user'], provider_id=ids['provider'], service_id=ids['service'],
+                              booking_id=ids['booking'], rating=5, content='很好'))
+        db.session.commit()
+        db.session.remove()
+    _, response = request(client, detail, etag=detail_etag)
+    assert response.status_code == 200 and len(response.get_json()['reviews']) == 1
+
+def test_user_info():
+    """用户信息：修改地址后ETag改变；服务商业务信息修改后ETag改变"""
+    ids = seed()
+    client = app.test_client()
+    etag, _, _ = revalidate(client, '/api/user', ids['user_token'])
+    with app.app_context():
+        address_id = Address.query.filter_by(user_id=ids['user']).first().id
+        db.session.remove()
+    _, response = request(client, f'/api/user/addresses/{address_id}', ids['user_token'], method='put',
+                          json={'address': '测试路2号'})
+    assert response.status_code == 200, response.get_json()
+    _, response = request(client, '/api/user', ids['user_token'], etag)
+    assert response.status_code == 200 and response.get_json()['user']['addresses'][0]['address'] == '测试路2号'
+
+    etag, _, _ = revalidate(client, '/api/provider/business', ids['provider_token'])
+    _, response = request(client, '/api/provider/business', ids['provider_token'], method='put',
+                          json={'business_name': '新商家名'})
+    assert response.status_code == 200, response.get_json()
+    _, response = request(client, '/api/provider/business', ids['provider_token'], etag)
+    assert response.status_code == 200 and response.get_json()['business_info']['business_name'] == '新商家名'
+
+def test_etag_scope():
+    """ETag区分用户和查询参数；无权访问、不存在的资源不返回ETag"""
+    ids = seed()
+    client = app.test_client()
+    etag, _, _ = revalidate(client, '/api/bookings/dashboard', ids['user_token'])
+    _, response = request(client, '/api/bookings/dashboard', ids['other_token'], etag)
+    assert response.status_code == 200 and response.headers['ETag'] != etag, "其他用户匹配了ETag"
+    assert 'Authorization' in response.headers.get('Vary', '')
+    _, response = request(client, '/api/bookings/dashboard?section=pending', ids['user_token'], etag)
+    assert response.status_code == 200, "不同的查询参数匹配了ETag"
+
+    _, response = request(client, f"/api/bookings/{ids['booking']}", ids['other_token'])
+    assert response.status_code == 403 and 'ETag' not in response.headers
+    _, response = request(client, '/api/services/public/missing')
+    assert response.status_code == 404 and 'ETag' not in response.headers
+
+def test_unread_count():
+    """未读通知数量按响应内容生成ETag，数量不变时返回304"""
+    ids = seed()
+    client = app.test_client()
+    revalidate(client, '/api/user/notifications/unread-count', ids['user_token'])
+
+def main():
+    tests = [
+        test_dashboard_polling,
+        test_related_changes,
+        test_user_info,
+        test_etag_scope,
+        test_unread_count,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except AssertionError as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+数据库连接池测试脚本
+用临时SQLite文件数据库上的TimedQueuePool模拟连接池被占满的情况，检查借出连接数、
+等待时间和超时次数的统计，并确认DB_POOL_*配置会应用到非SQLite数据库的引擎上
+
+使用方法:
+    python test_db_pool.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app import create_app
+from db_pool import PoolMetrics, TimedQueuePool, pool_metrics
+from models import db
+
+app = create_app(blueprints=())
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def make_engine(path, **options):
+    engine = create_engine(f'sqlite:///{path}', poolclass=TimedQueuePool,
+                           connect_args={'check_same_thread': False}, **options)
+    event.listen(engine, 'checkout', pool_metrics.on_checkout)
+    event.listen(engine, 'checkin', pool_metrics.on_checkin)
+    return engine
+
+def test_pool_wait_metrics():
+    """连接池占满时，后来的请求等待连接归还，等待时间和借出连接数被记录"""
+    pool_metrics.reset()
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(os.path.join(directory, 'pool.db'), pool_size=1, max_overflow=0, pool_timeout=5)
+        holding = threading.Event()
+
+        def hold_connection():
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+                holding.set()
+                time.sleep(0.2)
+
+        worker = threading.Thread(target=hold_connection)
+        worker.start()
+        holding.wait()
+        assert pool_metrics.snapshot()['checked_out'] == 1
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        worker.join()
+
+        data = pool_metrics.snapshot(engine.pool)
+        engine.dispose()
+    assert data['checkouts'] == 2 and data['checked_out'] == 0 and data['max_checked_out'] == 1, data
+    assert data['wait_max_ms'] >= 100, f"没有记录等待时间: {data}"
+    assert data['pool_size'] == 1 and data['checked_in'] == 1 and data['timeouts'] == 0, data
+
+def test_pool_timeout():
+    """等待超过pool_timeout时抛出超时错误并计入timeouts"""
+    pool_metrics.reset()
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_engine(os.path.join(directory, 'pool.db'), pool_size=1, max_overflow=0, pool_timeout=0.1)
+        with engine.connect():
+            try:
+                engine.connect()
+                assert False, "连接池已满时没有超时"
+            except PoolTimeoutError:
+                pass
+        engine.dispose()
+    data = pool_metrics.snapshot()
+    assert data['timeouts'] == 1 and data['wait_max_ms'] >= 90, data
+
+def test_pool_options():
+    """非SQLite数据库的引擎使用DB_POOL_*配置，SQLite保持Flask-SQLAlchemy的默认连接池"""
+    options = {}
+    db.apply_driver_hacks(app, make_url('mysql+pymysql://root@localhost/booking'), options)
+    assert options['poolclass'] is TimedQueuePool
+    assert options['pool_size'] == app.config['DB_POOL_SIZE']
+    assert options['max_overflow'] == app.config['DB_MAX_OVERFLOW']
+    assert options['pool_recycle'] == app.config['DB_POOL_RECYCLE']
+    assert options['pool_pre_ping'] is app.config['DB_POOL_PRE_PING']
+
+    options = {}
+    db.apply_driver_hacks(app, make_url('sqlite://'), options)
+    assert 'poolclass' not in options or options['poolclass'] is not TimedQueuePool
+
+def test_metrics_snapshot():
+    """没有等待记录时平均等待时间为0，快照不依赖连接池类型"""
+    metrics = PoolMetrics()
+    assert metrics.snapshot()['wait_avg_ms'] == 0.0
+    metrics.record_wait(0.002)
+    metrics.record_wait(0.004, timed_out=True)
+    data = metrics.snapshot(object())
+    assert data['wait_avg_ms'] == 3.0 and data['wait_max_ms'] == 4.0 and data['timeouts'] == 1
+    assert 'pool_size' not in data
+
+def main():
+    tests = [
+        test_pool_wait_metrics,
+        test_pool_timeout,
+        test_pool_options,
+        test_metrics_snapshot,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except AssertionError as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+读写分离测试脚本
+用两个临时SQLite文件分别作为主库和从库，通过SQLite的备份接口把主库复制到从库来模拟同步，
+直接修改从库的心跳来模拟复制延迟，检查只读请求读从库、从库延迟过大或不可用时读主库、
+写请求之后同一客户端读主库，以及写语句、加锁读和请求之外的查询始终使用主库，会话写过之后不再读从库
+
+使用方法:
+    python test_db_replicas.py
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from flask import g
+from sqlalchemy import select, text, update
+
+from app import create_app
+from auth import generate_token, hash_password
+from db_pool import needs_primary
+from db_replicas import RECENT_WRITE_COOKIE, get_replica_router, now_ms
+from models import db, User, Provider, Service
+
+directory = tempfile.mkdtemp()
+PRIMARY = os.path.join(directory, 'primary.db')
+REPLICA = os.path.join(directory, 'replica.db')
+
+app = create_app({
+    'SQLALCHEMY_DATABASE_URI': f'sqlite:///{PRIMARY}',
+    'SQLALCHEMY_BINDS': {'replica': f'sqlite:///{REPLICA}'},
+    'DB_REPLICA_BINDS': ['replica'],
+    'DB_REPLICA_CHECK_INTERVAL': 0,  # 每个请求都检查延迟，便于测试
+    'TESTING': True,
+})
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def replicate():
+    """把主库完整复制到从库，相当于从库追上主库"""
+    db.get_engine(app, bind='replica').dispose()
+    source, target = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+    source.backup(target)
+    source.close()
+    target.close()
+
+def set_replica_lag(seconds):
+    """把从库的心跳改为seconds秒之前，主库的心跳在每次检查时更新为当前时间"""
+    with sqlite3.connect(REPLICA) as connection:
+        connection.execute('UPDATE replica_heartbeat SET beat_at = ?', (now_ms() - seconds * 1000,))
+
+def seed():
+    """重建主库并生成用户、服务商和一个服务，同步到从库后在主库上再加一个服务，返回(用户ID, 服务商ID)"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='replica_user', email='replica_user@example.com', password=hash_password('123456'))
+        provider = Provider(username='replica_provider', email='replica_provider@example.com',
+                            password=hash_password('123456'), business_name='读写分离测试商家')
+        db.session.add_all([user, provider])
+        db.session.commit()
+        db.session.add(Service(title='已同步的服务', provider_id=provider.id, price=100, price_unit='元/次',
+                               duration=60, status='active', description='测试'))
+        db.session.commit()
+        user_id, provider_id = user.id, provider.id
+        db.session.remove()
+
+    with app.test_client() as client:
+        client.get('/api/services/public')  # 写入第一条心跳
+    replicate()
+
+    with app.app_context():
+        db.session.add(Service(title='还没同步的服务', provider_id=provider_id, price=200, price_unit='元/次',
+                               duration=60, status='active', description='测试'))
+        db.session.commit()
+        db.session.remove()
+    return user_id, provider_id
+
+def public_titles(client):
+    response = client.get('/api/services/public')
+    return sorted(service['title'] for service in response.get_json()['services'])
+
+def test_reads_use_replica():
+    """从库延迟在DB_REPLICA_MAX_LAG以内时，只读请求读从库"""
+    seed()
+    set_replica_lag(1)
+    router = get_replica_router(app)
+    before = router.stats['replica']
+    with app.test_client() as client:
+        assert public_titles(client) == ['已同步的服务']
+    assert router.stats['replica'] == before + 1
+    assert router.lags['replica'] is not None and router.lags['replica'] < 5, router.snapshot()
+
+def test_lagging_replica_falls_back():
+    """从库延迟超过DB_REPLICA_MAX_LAG时读主库"""
+    seed()
+    set_replica_lag(60)
+    router = get_replica_router(app)
+    before = router.stats['primary_lag']
+    with app.test_client() as client:
+        assert public_titles(client) == ['已同步的服务', '还没同步的服务']
+    assert router.stats['primary_lag'] == before + 1
+    assert router.lags['replica'] >= 60, router.snapshot()
+
+    # 从库追上后恢复读从库
+    set_replica_lag(0)
+    with app.test_client() as client:
+        assert public_titles(client) == ['已同步的服务']
+
+def test_unavailable_replica_falls_back():
+    """从库没有心跳或无法查询时读主库，并记录错误"""
+    seed()
+    with sqlite3.connect(REPLICA) as connection:
+        connection.execute('DROP TABLE replica_heartbeat')
+    with app.test_client() as client:
+        assert public_titles(client) == ['已同步的服务', '还没同步的服务']
+    data = get_replica_router(app).snapshot()
+    assert data['replicas']['replica']['lag'] is None and data['replicas']['replica']['error'], data
+
+def test_read_your_writes():
+    """写请求成功后，同一客户端在DB_READ_YOUR_WRITES秒内读主库，其他客户端仍读从库"""
+    user_id, provider_id = seed()
+    day = (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+    with app.app_context():
+        service_id = Service.query.filter_by(title='已同步的服务').first().id
+        user_token = generate_token(user_id, 'user')
+        provider_token = generate_token(provider_id, 'provider')
+    with app.test_client() as client:
+        client.post('/api/timeslots', json=[{'date': day, 'time': '10:00'}],
+                    headers={'Authorization': f'Bearer {provider_token}'})
+    replicate()
+    set_replica_lag(0)
+
+    headers = {'Authorization': f'Bearer {user_token}'}
+    with app.test_client() as writer, app.test_client() as other:
+        response = writer.post('/api/bookings', json={'service_id': service_id, 'date': day, 'time': '10:00'},
+                               headers=headers)
+        assert response.status_code == 201, response.get_json()
+        cookie = response.headers['Set-Cookie']
+        assert cookie.startswith(f'{RECENT_WRITE_COOKIE}=') and 'Max-Age=5' in cookie, cookie
+
+        assert len(writer.get('/api/bookings', headers=headers).get_json()) == 1
+        assert len(other.get('/api/bookings', headers=headers).get_json()) == 0
+
+        # 失败的写请求不设置cookie
+        response = other.post('/api/bookings', json={'service_id': service_id, 'date': day, 'time': '10:00'},
+                              headers=headers)
+        assert response.status_code == 409 and 'Set-Cookie' not in response.headers
+
+def test_writes_use_primary():
+    """只读请求中的flush和写语句、请求之外的查询都使用主库"""
+    seed()
+    with app.test_request_context('/api/services/public'):
+        g.db_read_bind = 'replica'
+        assert Service.query.count() == 1
+        db.session.execute(update(Service.__table__).values(price=300))
+        db.session.execute(text("UPDATE services SET price_unit = '元/小时'"))
+        db.session.commit()
+        db.session.remove()
+
+    with app.app_context():
+        assert Service.query.count() == 2
+        assert {(s.price, s.price_unit) for s in Service.query.all()} == {(300, '元/小时')}
+        db.session.remove()
+    with sqlite3.connect(REPLICA) as connection:
+        assert connection.execute('SELECT price FROM services').fetchall() == [(100,)]
+
+def test_locking_reads_use_primary():
+    """只读请求中的SELECT ... FOR UPDATE读主库；会话flush或执行写语句之后，后续的普通查询也读主库"""
+    seed()
+    assert needs_primary(select(Service.id).with_for_update())
+    assert needs_primary(text('SELECT id FROM services WHERE id = :id FOR UPDATE'))
+    assert needs_primary(text('select id from services lock in share mode'))
+    assert not needs_primary(text('SELECT id FROM services')) and not needs_primary(select(Service.id))
+
+    with app.test_request_context('/api/services/public'):
+        g.db_read_bind = 'replica'
+        assert len(Service.query.with_for_update().all()) == 2, "加锁读发往了从库"
+        db.session.remove()
+
+        assert Service.query.count() == 1, "普通查询应读从库"
+        db.session.add(User(username='pinned_user', email='pinned_user@example.com', password='x'))
+        db.session.flush()
+        assert Service.query.count() == 2, "flush之后的查询读了从库"
+        db.session.rollback()
+        assert Service.query.count() == 2, "回滚之后会话仍应读主库"
+        db.session.remove()
+
+        assert Service.query.count() == 1, "关闭会话后恢复读从库"
+        db.session.execute(text("UPDATE services SET price_unit = '元/小时' WHERE 1 = 0"))
+        assert Service.query.count() == 2, "写语句之后的查询读了从库"
+        db.session.remove()
+
+def main():
+    tests = [
+        test_reads_use_replica,
+        test_lagging_replica_falls_back,
+        test_unavailable_replica_falls_back,
+        test_read_your_writes,
+        test_writes_use_primary,
+        test_locking_reads_use_primary,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except AssertionError as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
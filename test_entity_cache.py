@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+实体缓存测试脚本
+检查进程内LRU的过期和容量上限、SQLite共享层在多个实例(模拟多个worker)之间共享以及版本号防止旧数据写入，
+再通过Flask测试客户端确认：重复读取服务和服务商不再查询数据库，ORM修改和直接执行SQL的修改提交后缓存失效，
+回滚不影响缓存，刚提交过写请求的客户端读数据库
+
+使用方法:
+    python test_entity_cache.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from app import create_app
+from auth import generate_token, hash_password
+from entity_cache import LocalEntityCache, SQLiteEntityCache, EntityCache, get_entity_cache, load_entity, \
+    cache_key
+from db_replicas import RECENT_WRITE_COOKIE
+from models import db, User, Provider, Service, Booking
+from ratings import apply_rating_change
+
+# 使用内存SQLite数据库，不依赖MySQL；进程内缓存条目保留60秒，测试过程中不会过期；关闭条件请求，不计版本查询
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True, 'ENTITY_CACHE_LOCAL_TTL': 60,
+                  'HTTP_CONDITIONAL_ENABLED': False, 'DEBUG_ENDPOINTS_ENABLED': True})
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def temp_sqlite_path():
+    return os.path.join(tempfile.mkdtemp(), 'entity_cache.db')
+
+def seed():
+    """重建数据表并清空缓存，生成服务商、服务和一个用户，返回(服务ID, 服务商ID, 用户ID)；需在应用上下文中调用"""
+    db.drop_all()
+    db.create_all()
+    get_entity_cache().clear()
+    provider = Provider(username='cache_provider', email='cache_provider@example.com',
+                        password=hash_password('123456'), business_name='缓存测试商家')
+    user = User(username='cache_user', email='cache_user@example.com', password=hash_password('123456'))
+    db.session.add_all([provider, user])
+    db.session.flush()
+    service = Service(title='缓存测试服务', provider_id=provider.id, price=100, price_unit='元/次',
+                      duration=60, status='active', description='测试')
+    db.session.add(service)
+    db.session.commit()
+    ids = service.id, provider.id, user.id
+    db.session.remove()
+    return ids
+
+def count_statements(client, path):
+    """
+    请求接口，返回(执行的SQL语句数, 响应)
+    在应用上下文之外调用，每个请求使用新的会话，上一个请求加载的实体不会留在会话中
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return len(statements), response
+
+def test_local_lru():
+    """进程内缓存：条目按TTL过期，超过上限时淘汰最久未访问的条目"""
+    cache = LocalEntityCache(ttl=0.2, max_entries=3)
+    cache.set_many({'a': 1, 'b': 2, 'c': 3})
+    cache.get_many(['a'])
+    cache.set_many({'d': 4})
+    assert cache.get_many(['a', 'b', 'c', 'd']) == {'a': 1, 'c': 3, 'd': 4}
+    time.sleep(0.25)
+    assert cache.get_many(['a', 'c', 'd']) == {} and len(cache) == 0, "过期的条目仍然可以读取"
+
+    # 加载期间有失效时不写入
+    generation = cache.invalidations
+    cache.invalidate(['e'])
+    cache.set_many({'e': 'stale'}, generation)
+    assert cache.get_many(['e']) == {}
+
+def test_shared_tier():
+    """SQLite共享层：两个实例(模拟两个worker)共享同一文件，失效后对方也读不到"""
+    path = temp_sqlite_path()
+    first = EntityCache(LocalEntityCache(60), SQLiteEntityCache(path, ttl=60))
+    second = EntityCache(LocalEntityCache(60), SQLiteEntityCache(path, ttl=60))
+    first.fill({'services:1': {'id': '1', 'title': '服务'}}, first.begin_fill(['services:1']))
+    assert second.get_many(['services:1']) == {'services:1': {'id': '1', 'title': '服务'}}
+    assert second.get_many(['services:1']) and second.stats['local_hits'] == 1 and second.stats['shared_hits'] == 1
+
+    first.invalidate(['services:1'])
+    second.local.clear()  # 另一个worker的进程内条目到期
+    assert second.get_many(['services:1']) == {}
+    assert second.snapshot()['hit_ratio'] == round(2 / 3, 4), second.snapshot()
+
+def test_shared_version_race():
+    """SQLite共享层：加载期间被其他worker失效的实体不写入，避免旧数据覆盖"""
+    path = temp_sqlite_path()
+    reader = EntityCache(LocalEntityCache(60), SQLiteEntityCache(path, ttl=60))
+    writer = EntityCache(LocalEntityCache(60), SQLiteEntityCache(path, ttl=60))
+    token = reader.begin_fill(['providers:1'])
+    writer.invalidate(['providers:1'])  # 读取数据库之后、写入缓存之前另一个worker提交了修改
+    reader.fill({'providers:1': {'id': '1', 'business_name': '旧名称'}}, token)
+    assert writer.get_many(['providers:1']) == {}, "旧数据写入了共享层"
+
+    token = reader.begin_fill(['providers:1'])
+    reader.fill({'providers:1': {'id': '1', 'business_name': '新名称'}}, token)
+    assert writer.get_many(['providers:1']) == {'providers:1': {'id': '1', 'business_name': '新名称'}}
+
+def test_read_through():
+    """重复读取服务详情时服务和服务商来自缓存，查询次数减少，命中率计入统计"""
+    with app.app_context():
+        service_id, provider_id, _ = seed()
+        cache = get_entity_cache()
+        headers = {'Authorization': f"Bearer {generate_token(provider_id, 'provider')}"}
+    client = app.test_client()
+    first, response = count_statements(client, f'/api/services/public/{service_id}')
+    assert response.status_code == 200, response.get_json()
+    hits = cache.stats['local_hits']
+    second, response = count_statements(client, f'/api/services/public/{service_id}')
+    body = response.get_json()
+    assert body['title'] == '缓存测试服务' and body['provider']['business_name'] == '缓存测试商家'
+    assert second == first - 2, f"缓存命中后应少两次查询: {first} -> {second}"
+    assert cache.stats['local_hits'] == hits + 2
+
+    # 调试端点需要登录，关闭DEBUG_ENDPOINTS_ENABLED后不存在
+    assert client.get('/api/debug/entity-cache').status_code == 401
+    stats = client.get('/api/debug/entity-cache', headers=headers).get_json()
+    assert stats['backend'] == 'memory' and 0 < stats['hit_ratio'] < 1, stats
+    app.config['DEBUG_ENDPOINTS_ENABLED'] = False
+    try:
+        assert client.get('/api/debug/entity-cache', headers=headers).status_code == 404
+    finally:
+        app.config['DEBUG_ENDPOINTS_ENABLED'] = True
+
+def test_commit_invalidates():
+    """ORM修改服务和服务商并提交后缓存失效，回滚的修改不影响缓存"""
+    with app.app_context():
+        service_id, provider_id, _ = seed()
+        assert load_entity(Service, service_id).title == '缓存测试服务'
+        assert load_entity(Provider, provider_id).business_name == '缓存测试商家'
+        db.session.remove()
+
+        load_entity(Service, service_id).title = '回滚的标题'
+        db.session.flush()
+        db.session.rollback()
+        db.session.remove()
+        assert cache_key(Service, service_id) in get_entity_cache().local.get_many([cache_key(Service, service_id)])
+
+        Service.query.get(service_id).title = '新标题'
+        Provider.query.get(provider_id).business_name = '新商家名'
+        db.session.commit()
+        db.session.remove()
+
+        with app.test_client() as client:
+            body = client.get(f'/api/services/public/{service_id}').get_json()
+        assert body['title'] == '新标题' and body['provider']['business_name'] == '新商家名', body
+        db.session.remove()
+
+def test_raw_update_invalidates():
+    """直接执行SQL的修改(服务上下线、评分计数)提交后缓存失效，同一事务中读取的是数据库中的值"""
+    with app.app_context():
+        service_id, provider_id, _ = seed()
+        load_entity(Service, service_id)
+        load_entity(Provider, provider_id)
+        db.session.remove()
+
+        token = generate_token(provider_id, 'provider')
+        with app.test_client() as writer, app.test_client() as reader:
+            response = writer.put(f'/api/services/{service_id}/status', json={'status': 'inactive'},
+                                  headers={'Authorization': f'Bearer {token}'})
+            assert response.status_code == 200, response.get_json()
+            assert reader.get(f'/api/services/public/{service_id}').status_code == 403
+        db.session.remove()
+
+        apply_rating_change(Provider, provider_id, added=[5])
+        provider = load_entity(Provider, provider_id)
+        assert provider.rating_count == 1, "同一事务中读到了缓存的旧评分"
+        db.session.commit()
+        db.session.remove()
+        assert load_entity(Provider, provider_id).rating == 5
+        db.session.remove()
+
+def test_recent_write_bypasses_cache():
+    """刚提交过写请求的客户端查看预约详情时服务和服务商直接读数据库，其他客户端读缓存"""
+    with app.app_context():
+        service_id, provider_id, user_id = seed()
+        booking = Booking(user_id=user_id, provider_id=provider_id, service_id=service_id,
+                          date=date.today() + timedelta(days=1), time='10:00', status='confirmed')
+        db.session.add(booking)
+        db.session.commit()
+        path = f'/api/bookings/{booking.id}'
+        token = generate_token(user_id, 'user')
+        db.session.remove()
+
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    client.get(path)
+    warm, response = count_statements(client, path)
+    assert response.status_code == 200 and response.get_json()['service']['title'] == '缓存测试服务'
+    client.set_cookie('localhost', RECENT_WRITE_COOKIE, '1')
+    fresh, response = count_statements(client, path)
+    assert response.status_code == 200 and fresh == warm + 2, f"{warm} -> {fresh}"
+
+def main():
+    tests = [
+        test_local_lru,
+        test_shared_tier,
+        test_shared_version_race,
+        test_read_through,
+        test_commit_invalidates,
+        test_raw_update_invalidates,
+        test_recent_write_bypasses_cache,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except AssertionError as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+防重复请求存储测试脚本
+检查两种后端的过期、容量上限和线程安全，以及SQLite后端在多个实例(模拟多个worker)之间共享，
+最后通过Flask测试客户端确认重复请求返回缓存的响应
+
+使用方法:
+    python test_idempotency_store.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from idempotency import MemoryIdempotencyStore, SQLiteIdempotencyStore, serialize_response, deserialize_response
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def temp_sqlite_path():
+    return os.path.join(tempfile.mkdtemp(), 'idempotency.db')
+
+def check_expiry(store):
+    store.set('a', b'1')
+    assert store.get('a') == b'1'
+    time.sleep(store.ttl + 0.05)
+    assert store.get('a') is None, "过期的条目仍然可以读取"
+
+def check_capacity(store, inserts):
+    for i in range(inserts):
+        store.set(f'key{i}', b'x')
+    assert len(store) <= store.max_entries, f"条目数 {len(store)} 超过上限 {store.max_entries}"
+    assert store.get(f'key{inserts - 1}') == b'x', "最新写入的条目被淘汰"
+
+def test_memory_expiry():
+    """进程内存储：条目按TTL过期"""
+    check_expiry(MemoryIdempotencyStore(ttl=0.2))
+
+def test_memory_lru():
+    """进程内存储：超过上限时淘汰最久未访问的条目"""
+    store = MemoryIdempotencyStore(ttl=60, max_entries=3)
+    for key in ('a', 'b', 'c'):
+        store.set(key, key.encode())
+    store.get('a')
+    store.set('d', b'd')
+    assert store.get('b') is None, "最久未访问的条目没有被淘汰"
+    assert store.get('a') == b'a' and store.get('d') == b'd'
+    check_capacity(MemoryIdempotencyStore(ttl=60, max_entries=50), 500)
+
+def test_memory_threads():
+    """进程内存储：多线程并发读写"""
+    store = MemoryIdempotencyStore(ttl=60, max_entries=1000)
+
+    def worker(n):
+        for i in range(2000):
+            store.set(f'{n}-{i % 300}', b'v')
+            store.get(f'{(n + 1) % 8}-{i % 300}')
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store) <= 1000
+
+def test_sqlite_expiry():
+    """SQLite存储：条目按TTL过期"""
+    check_expiry(SQLiteIdempotencyStore(temp_sqlite_path(), ttl=0.2))
+
+def test_sqlite_capacity():
+    """SQLite存储：超过上限时淘汰最久未访问的条目"""
+    check_capacity(SQLiteIdempotencyStore(temp_sqlite_path(), ttl=60, max_entries=50), 500)
+
+def test_sqlite_shared():
+    """SQLite存储：两个实例(模拟两个worker)共享同一文件"""
+    path = temp_sqlite_path()
+    first = SQLiteIdempotencyStore(path, ttl=60)
+    second = SQLiteIdempotencyStore(path, ttl=60)
+    first.set('shared', b'response')
+    assert second.get('shared') == b'response', "另一个实例读不到写入的响应"
+
+def test_response_roundtrip():
+    """重复请求返回缓存的序列化响应"""
+    from flask import jsonify
+    from flask import Flask
+
+    app = Flask(__name__)
+    with app.test_request_context():
+        response = app.make_response((jsonify({'message': '成功'}), 201))
+        response.headers['X-Test'] = '1'
+        body, status, headers = deserialize_response(serialize_response(response))
+        replayed = app.make_response((body, status, headers))
+        assert replayed.status_code == 201
+        assert replayed.get_json() == {'message': '成功'}
+        assert replayed.headers['X-Test'] == '1'
+
+def main():
+    tests = [
+        test_memory_expiry,
+        test_memory_lru,
+        test_memory_threads,
+        test_sqlite_expiry,
+        test_sqlite_capacity,
+        test_sqlite_shared,
+        test_response_roundtrip,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except AssertionError as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
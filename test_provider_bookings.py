@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+服务商日历和预约列表测试脚本
+解析GET /api/bookings/calendar的响应(没有预约、一个预约、跨多天的多个预约，分多批读取)，
+与按原接口规则(按日期分组，补充用户和服务信息)由数据库计算的结果比较，普通用户只看到自己的预约；
+检查GET /api/bookings/provider的筛选、倒序排序和游标分页
+
+使用方法:
+    python test_provider_bookings.py
+"""
+
+import json
+import sys
+from datetime import date, timedelta
+
+from app import create_app
+from auth import generate_token, hash_password
+from models import db, User, Provider, Service, Booking
+import routes.bookings
+
+# 使用内存SQLite数据库，不依赖MySQL
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+
+# 窗口的第一天固定为周一，view=week的窗口与start_date/end_date相同
+START = date.today() - timedelta(days=date.today().weekday()) + timedelta(days=7)
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def seed(count):
+    """重建数据表，为一个服务商生成两个服务和count个预约(分布在一周内的不同日期和时间)，返回{名称: ID或令牌}"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = [User(username=f'calendar_user{i}', email=f'calendar_user{i}@example.com',
+                      password=hash_password('123456')) for i in range(3)]
+        provider = Provider(username='calendar_provider', email='calendar_provider@example.com',
+                            password=hash_password('123456'), business_name='日历测试商家')
+        other = Provider(username='calendar_other', email='calendar_other@example.com',
+                         password=hash_password('123456'), business_name='其他商家')
+        db.session.add_all(users + [provider, other])
+        db.session.flush()
+        services = [Service(title=f'日历测试服务{i}', provider_id=provider.id, price=100 + i, price_unit='元/次',
+                            duration=60, status='active', description='测试') for i in range(2)]
+        other_service = Service(title='其他服务', provider_id=other.id, price=50, price_unit='元/次',
+                                duration=30, status='active', description='测试')
+        db.session.add_all(services + [other_service])
+        db.session.flush()
+        statuses = ['pending', 'confirmed', 'completed', 'canceled']
+        db.session.add_all([
+            Booking(user_id=users[i % 3].id, provider_id=provider.id, service_id=services[i % 2].id,
+                    date=START + timedelta(days=i % 7), time=f'{9 + i % 9:02d}:{i % 4 * 15:02d}',
+                    status=statuses[i % 4])
+            for i in range(count)
+        ])
+        # 其他服务商的预约和窗口之外的预约不应出现
+        db.session.add_all([
+            Booking(user_id=users[0].id, provider_id=other.id, service_id=other_service.id,
+                    date=START, time='10:00', status='pending'),
+            Booking(user_id=users[0].id, provider_id=provider.id, service_id=services[0].id,
+                    date=START + timedelta(days=7), time='10:00', status='pending'),
+        ])
+        db.session.commit()
+        ids = {'service': services[0].id, 'token': generate_token(provider.id, 'provider'),
+               'user_token': generate_token(users[0].id, 'user'), 'provider': provider.id, 'user': users[0].id}
+        db.session.remove()
+    return ids
+
+def expected_calendar(provider_id, start, end, service_id=None, status=None, user_id=None):
+    """按原接口的规则计算日历：窗口内该服务商(给出user_id时为该用户)的预约按日期分组，补充用户和服务信息"""
+    with app.app_context():
+        result = {}
+        owner = {'user_id': user_id} if user_id else {'provider_id': provider_id}
+        bookings = Booking.query.filter_by(**owner).order_by(Booking.date, Booking.time, Booking.id).all()
+        for booking in bookings:
+            if not start <= booking.date <= end:
+                continue
+            if service_id and booking.service_id != service_id:
+                continue
+            if status and booking.status != status:
+                continue
+            data = booking.to_dict()
+            user, service = booking.user, booking.service
+            data['user'] = {'id': user.id, 'username': user.username, 'email': user.email}
+            data['service'] = {'id': service.id, 'title': service.title, 'price': service.price,
+                               'duration': service.duration}
+            result.setdefault(booking.date.isoformat(), []).append(data)
+        db.session.remove()
+    return result
+
+def get_json(client, path, token):
+    """请求接口，返回(状态码, json.loads解析的响应)"""
+    response = client.get(path, headers={'Authorization': f'Bearer {token}'})
+    return response.status_code, json.loads(response.get_data(as_text=True))
+
+def calendar_path(start=START, end=START + timedelta(days=6), **params):
+    query = '&'.join([f'start_date={start}', f'end_date={end}'] + [f'{k}={v}' for k, v in params.items()])
+    return f'/api/bookings/calendar?{query}'
+
+def test_calendar_empty():
+    """日历：窗口内没有预约时返回空对象"""
+    ids = seed(0)
+    status, body = get_json(app.test_client(), calendar_path(), ids['token'])
+    assert status == 200 and body == {}, body
+
+def test_calendar_single():
+    """日历：一个预约时返回一个日期分组，结构与原接口相同"""
+    ids = seed(1)
+    status, body = get_json(app.test_client(), calendar_path(), ids['token'])
+    assert status == 200 and list(body) == [START.isoformat()], body
+    booking = body[START.isoformat()][0]
+    assert set(booking['user']) == {'id', 'username', 'email'}
+    assert set(booking['service']) == {'id', 'title', 'price', 'duration'}
+    assert body == expected_calendar(ids['provider'], START, START + timedelta(days=6))
+
+def test_calendar_many_days():
+    """日历：跨多天的多个预约分多批读取，结果与一次计算的相同，按日期和时间排序"""
+    ids = seed(40)
+    original = routes.bookings.CALENDAR_CHUNK_SIZE
+    routes.bookings.CALENDAR_CHUNK_SIZE = 3  # 同一天的预约跨越批次边界
+    try:
+        client = app.test_client()
+        expected = expected_calendar(ids['provider'], START, START + timedelta(days=6))
+        status, body = get_json(client, calendar_path(), ids['token'])
+        assert status == 200 and body == expected, "日历与原接口的结果不同"
+        assert len(body) == 7 and sum(len(day) for day in body.values()) == 40
+        for day in body.values():
+            assert [b['time'] for b in day] == sorted(b['time'] for b in day)
+
+        # 筛选条件和view=week
+        _, body = get_json(client, calendar_path(service_id=ids['service'], status='completed'), ids['token'])
+        assert body == expected_calendar(ids['provider'], START, START + timedelta(days=6), ids['service'],
+                                         'completed') and body
+        _, body = get_json(client, f'/api/bookings/calendar?view=week&date={START + timedelta(days=3)}', ids['token'])
+        assert body == expected
+    finally:
+        routes.bookings.CALENDAR_CHUNK_SIZE = original
+
+def test_calendar_user():
+    """日历：普通用户看到窗口内自己在各服务商的预约，看不到其他用户的预约"""
+    ids = seed(12)
+    status, body = get_json(app.test_client(), calendar_path(), ids['user_token'])
+    expected = expected_calendar(None, START, START + timedelta(days=6), user_id=ids['user'])
+    assert status == 200 and body == expected, body
+    bookings = [b for day in body.values() for b in day]
+    assert len(bookings) == 5 and all(b['user_id'] == ids['user'] for b in bookings)
+    assert any(b['provider_id'] != ids['provider'] for b in bookings), "应包含在其他服务商的预约"
+
+def test_calendar_errors():
+    """日历：缺少日期或日期无效时400"""
+    ids = seed(1)
+    client = app.test_client()
+    assert get_json(client, '/api/bookings/calendar', ids['token'])[0] == 400
+    assert get_json(client, calendar_path(start='2025-13-01'), ids['token'])[0] == 400
+
+def test_provider_list():
+    """预约列表：按日期和时间倒序，筛选条件生效，游标分页不重复不遗漏"""
+    ids = seed(25)
+    client = app.test_client()
+    status, body = get_json(client, '/api/bookings/provider', ids['token'])
+    bookings = body['bookings']
+    assert status == 200 and len(bookings) == 26 and 'next_cursor' not in body
+    keys = [(b['date'], b['time']) for b in bookings]
+    assert keys == sorted(keys, reverse=True), "没有按预约时间倒序"
+    assert all(set(b['user']) == {'id', 'username', 'email'} and b['service']['title'] for b in bookings)
+
+    _, body = get_json(client, f"/api/bookings/provider?status=pending&service_id={ids['service']}", ids['token'])
+    assert body['bookings'] and all(b['status'] == 'pending' and b['service_id'] == ids['service']
+                                    for b in body['bookings'])
+    _, body = get_json(client, f'/api/bookings/provider?date={START}', ids['token'])
+    assert body['bookings'] and all(b['date'] == START.isoformat() for b in body['bookings'])
+
+    paged, cursor = [], None
+    while True:
+        path = '/api/bookings/provider?limit=7' + (f'&cursor={cursor}' if cursor else '')
+        _, body = get_json(client, path, ids['token'])
+        paged += body['bookings']
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    assert [b['id'] for b in paged] == [b['id'] for b in bookings], "分页结果与一次返回的不同"
+
+    assert get_json(client, '/api/bookings/provider', ids['user_token'])[0] == 403
+    assert get_json(client, '/api/bookings/provider?date=2025-1-32', ids['token'])[0] == 400
+
+def main():
+    tests = [
+        test_calendar_empty,
+        test_calendar_single,
+        test_calendar_many_days,
+        test_calendar_user,
+        test_calendar_errors,
+        test_provider_list,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except AssertionError as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
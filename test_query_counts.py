@@ -0,0 +1,937 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+列表接口SQL语句数量测试脚本
+使用SQLite临时数据库和Flask测试客户端，确保列表接口的查询次数
+不随预约数量增长（防止N+1查询回归）
+
+使用方法:
+    python test_query_counts.py
+"""
+
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import create_app
+from auth import generate_token, hash_password
+from models import db, User, Provider, Service, Booking, Review, TimeSlot, Notification
+
+# 使用内存SQLite数据库，不依赖MySQL；关闭实体缓存和条件请求，查询次数不受缓存是否命中和版本查询影响
+# (见test_entity_cache.py、test_conditional_get.py)
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True, 'ENTITY_CACHE_ENABLED': False,
+                  'HTTP_CONDITIONAL_ENABLED': False})
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def seed_bookings(count):
+    """重建数据表并生成指定数量的预约，返回(用户ID, 服务商ID)"""
+    db.drop_all()
+    db.create_all()
+
+    user = User(username='query_user', email='query_user@example.com', password=hash_password('123456'))
+    provider = Provider(username='query_provider', email='query_provider@example.com',
+                        password=hash_password('123456'), business_name='查询测试商家')
+    db.session.add_all([user, provider])
+    db.session.commit()
+
+    services = [
+        Service(title=f'测试服务{i}', provider_id=provider.id, price=100 + i, price_unit='元/次',
+                duration=60, status='active', description='测试')
+        for i in range(3)
+    ]
+    db.session.add_all(services)
+    db.session.commit()
+
+    statuses = ['pending', 'confirmed', 'completed', 'canceled']
+    today = datetime.now().date()
+    for i in range(count):
+        booking = Booking(
+            user_id=user.id,
+            provider_id=provider.id,
+            service_id=services[i % len(services)].id,
+            date=today + timedelta(days=i % 14),
+            time=f"{9 + i % 8:02d}:00",
+            status=statuses[i % len(statuses)]
+        )
+        db.session.add(booking)
+        if booking.status == 'completed':
+            db.session.flush()
+            db.session.add(Review(user_id=user.id, provider_id=provider.id, service_id=booking.service_id,
+                                  booking_id=booking.id, rating=5))
+    db.session.commit()
+
+    user_id, provider_id = user.id, provider.id
+    db.session.remove()
+    return user_id, provider_id
+
+def count_statements(client, path, token, method='get', json=None):
+    """请求接口并统计执行的SQL语句数量"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = getattr(client, method)(path, json=json, headers={'Authorization': f'Bearer {token}'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    assert response.status_code in (200, 201), f"{path} 返回 {response.status_code}"
+    return len(statements), response
+
+def assert_constant_queries(path, user_type, max_statements):
+    """在不同数据规模下请求同一接口，断言SQL语句数量恒定"""
+    counts = []
+    with app.app_context():
+        for size in (5, 60):
+            user_id, provider_id = seed_bookings(size)
+            token = generate_token(user_id if user_type == 'user' else provider_id, user_type)
+            with app.test_client() as client:
+                count, _ = count_statements(client, path, token)
+            counts.append(count)
+
+    assert counts[0] == counts[1], f"{path} 的查询次数随数据量增长: {counts}"
+    assert counts[0] <= max_statements, f"{path} 执行了 {counts[0]} 条SQL，超过上限 {max_statements}"
+    return counts[0]
+
+def test_bookings_list_user():
+    """用户预约列表：单条语句完成加载"""
+    assert_constant_queries('/api/bookings', 'user', 1)
+
+def test_bookings_list_provider():
+    """服务商预约列表：单条语句完成加载"""
+    assert_constant_queries('/api/bookings', 'provider', 1)
+
+def test_dashboard_bookings():
+    """仪表盘预约：三个分组加一次状态统计，共4条语句"""
+    assert_constant_queries('/api/bookings/dashboard', 'provider', 4)
+
+def test_dashboard_section_page():
+    """仪表盘分组翻页：按游标取下一页只查询该分组，不重复统计各状态总数"""
+    with app.app_context():
+        user_id, _ = seed_bookings(40)
+        token = generate_token(user_id, 'user')
+        with app.test_client() as client:
+            _, response = count_statements(client, '/api/bookings/dashboard?limit=4', token)
+            first = response.get_json()
+            assert first['counts'] == {'pending': 10, 'upcoming': 10, 'completed': 10}, first['counts']
+            cursor = first['next_cursors']['pending']
+            count, response = count_statements(client, f'/api/bookings/dashboard?section=pending&limit=4&cursor={cursor}',
+                                                token)
+            page = response.get_json()
+        assert count == 1, f"翻页执行了 {count} 条SQL"
+        assert 'counts' not in page and len(page['pending']) == 4
+        assert not {b['id'] for b in page['pending']} & {b['id'] for b in first['pending']}
+        db.session.remove()
+
+def test_booking_stats():
+    """预约统计：一次GROUP BY加一次用户信息查询"""
+    assert_constant_queries('/api/bookings/stats', 'user', 2)
+
+def test_bookings_list_pagination():
+    """预约列表游标分页：逐页遍历不重复、不遗漏"""
+    with app.app_context():
+        user_id, _ = seed_bookings(23)
+        token = generate_token(user_id, 'user')
+        seen = []
+        cursor = None
+        with app.test_client() as client:
+            while True:
+                path = '/api/bookings?limit=5' + (f'&cursor={cursor}' if cursor else '')
+                count, response = count_statements(client, path, token)
+                assert count == 1
+                seen.extend(booking['id'] for booking in response.get_json())
+                cursor = response.headers.get('X-Next-Cursor')
+                if not cursor:
+                    break
+        assert len(seen) == 23 and len(set(seen)) == 23, f"分页结果不完整: {len(seen)}"
+
+def test_apply_working_pattern():
+    """应用工作模式：预取加批量写入，语句数量不随日期范围增长"""
+    times = [f"{hour:02d}:{minute:02d}" for hour in range(9, 18) for minute in (0, 30)]
+    counts = []
+    with app.app_context():
+        _, provider_id = seed_bookings(0)
+        token = generate_token(provider_id, 'provider')
+        with app.test_client() as client:
+            for end_date in ('2030-01-07', '2030-02-04'):
+                pattern = {'pattern': 'weekdays', 'start_date': '2030-01-01', 'end_date': end_date,
+                           'time_slots': times, 'non_working_time_slots': ['18:00']}
+                count, response = count_statements(client, '/api/timeslots/pattern', token, 'post', pattern)
+                counts.append(count)
+            # 再次应用同一模式只更新已有时间段
+            count, response = count_statements(client, '/api/timeslots/pattern', token, 'post', pattern)
+            assert '创建 0 个时间段' in response.get_json()['message'], response.get_json()['message']
+        assert TimeSlot.query.count() == 35 * (len(times) + 1)
+
+    assert counts[0] == counts[1], f"应用工作模式的查询次数随日期范围增长: {counts}"
+    # 预取、写入时间段，加上可用性索引的读取和写入
+    assert counts[0] <= 6, f"应用工作模式执行了 {counts[0]} 条SQL"
+
+def test_available_timeslots():
+    """可用时间查询：读取可用性索引，单条语句，预约和取消后同步更新"""
+    day = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
+    with app.app_context():
+        user_id, provider_id = seed_bookings(0)
+        service_id = Service.query.filter_by(provider_id=provider_id).first().id
+        provider_token = generate_token(provider_id, 'provider')
+        user_token = generate_token(user_id, 'user')
+        path = f'/api/provider/{provider_id}/available-timeslots?date={day}'
+        with app.test_client() as client:
+            slots = [{'date': day, 'time': slot_time} for slot_time in ('10:00', '10:30', '11:00')]
+            client.post('/api/timeslots', json=slots, headers={'Authorization': f'Bearer {provider_token}'})
+
+            response = client.post('/api/bookings', json={'service_id': service_id, 'date': day, 'time': '10:30'},
+                                   headers={'Authorization': f'Bearer {user_token}'})
+            booking_id = response.get_json()['booking']['id']
+            count, response = count_statements(client, path, user_token)
+            assert count == 1, f"可用时间查询执行了 {count} 条SQL"
+            assert response.get_json()['available_times'] == ['10:00', '11:00'], response.get_json()
+
+            client.delete(f'/api/bookings/{booking_id}', headers={'Authorization': f'Bearer {user_token}'})
+            _, response = count_statements(client, path, user_token)
+            assert response.get_json()['available_times'] == ['10:00', '10:30', '11:00'], response.get_json()
+
+def test_create_review():
+    """提交评价：增量更新评分计数，语句数量不随已有评价数量增长"""
+    counts = []
+    with app.app_context():
+        for size in (5, 60):
+            user_id, provider_id = seed_bookings(size)
+            booking = Booking.query.filter_by(user_id=user_id, status='confirmed').first()
+            booking.status = 'completed'
+            db.session.commit()
+            review = {'service_id': booking.service_id, 'provider_id': provider_id, 'booking_id': booking.id, 'rating': 4}
+            with app.test_client() as client:
+                count, response = count_statements(client, '/api/reviews', generate_token(user_id, 'user'), 'post', review)
+            assert response.status_code == 201, response.get_json()
+            counts.append(count)
+
+    assert counts[0] == counts[1], f"提交评价的查询次数随评价数量增长: {counts}"
+
+def test_scheduler_run():
+    """定时任务：查询次数与预约数量无关，重复执行不会重复提醒"""
+    import scheduler
+
+    counts = []
+    with app.app_context():
+        for size in (40, 400):
+            seed_bookings(size)
+            # 以中间一个已确认预约开始前半小时为当前时间：更早的预约超时未出席，该预约收到提醒
+            confirmed = Booking.query.filter_by(status='confirmed').order_by(Booking.date, Booking.time).all()
+            target = confirmed[len(confirmed) // 2]
+            now = scheduler.booking_datetime(target.date, target.time) - timedelta(minutes=30)
+            statements = []
+
+            def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+            try:
+                no_shows, reminders = scheduler.run_once(now)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+            counts.append(len(statements))
+
+            assert no_shows > 0 and reminders > 0, f"未出席 {no_shows} 个，提醒 {reminders} 个"
+            assert Booking.query.filter(Booking.status == 'confirmed', scheduler.booking_before(now - timedelta(hours=1))).count() == 0
+            assert scheduler.run_once(now) == (0, 0), "重复执行产生了新的通知"
+            assert Notification.query.filter_by(subtype='reminder').count() == reminders
+            db.session.remove()
+
+    assert counts[0] == counts[1], f"定时任务的查询次数随预约数量增长: {counts}"
+
+def test_scheduler_no_show_race():
+    """未出席标记：查询之后被并发取消的预约不标记、不释放时间段占用、不发送未出席通知，也不计入数量"""
+    import scheduler
+    from models import SlotClaim
+
+    with app.app_context():
+        seed_bookings(40)
+        confirmed = Booking.query.filter_by(status='confirmed').order_by(Booking.date, Booking.time).all()
+        target = confirmed[len(confirmed) // 2]
+        now = scheduler.booking_datetime(target.date, target.time) - timedelta(minutes=30)
+        overdue = Booking.query.filter(Booking.status == 'confirmed',
+                                       scheduler.booking_before(now - scheduler.NO_SHOW_GRACE)).all()
+        victim = overdue[0]
+        db.session.add_all([SlotClaim(provider_id=booking.provider_id, date=booking.date, time=booking.time,
+                                      user_id=booking.user_id, booking_id=booking.id) for booking in overdue])
+        db.session.commit()
+        victim_id, expected = victim.id, len(overdue) - 1
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            # 标记未出席的UPDATE执行之前，用户取消了其中一个预约
+            if statement.startswith('UPDATE bookings SET status') and not cancelled:
+                cancelled.append(victim_id)
+                cursor.connection.execute("UPDATE bookings SET status = 'canceled' WHERE id = ?", (victim_id,))
+
+        cancelled = []
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            no_shows = scheduler.mark_no_shows(now)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        db.session.remove()
+
+        assert cancelled and no_shows == expected, f"标记了 {no_shows} 个，应为 {expected} 个"
+        assert db.session.get(Booking, victim_id).status == 'canceled'
+        assert SlotClaim.query.filter_by(booking_id=victim_id).count() == 1, "被取消预约的占用被删除"
+        assert SlotClaim.query.count() == 1
+        assert Notification.query.filter_by(subtype='no-show', related_id=victim_id).count() == 0
+        assert Notification.query.filter_by(subtype='no-show').count() == expected
+        db.session.remove()
+
+def test_scheduler_lease():
+    """定时任务租约：同一时间只有一个持有者执行，过期后由其他进程接管，接管后重复执行不会重复提醒，执行失败记录异常日志"""
+    import logging
+    import scheduler
+    from models import SchedulerLease
+
+    class Capture(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+
+        def emit(self, record):
+            self.records.append(record)
+
+    with app.app_context():
+        seed_bookings(40)
+        confirmed = Booking.query.filter_by(status='confirmed').order_by(Booking.date, Booking.time).all()
+        target = confirmed[len(confirmed) // 2]
+        now = scheduler.booking_datetime(target.date, target.time) - timedelta(minutes=30)
+
+        # 两个进程轮流检查租约，只有先抢到的一个执行
+        runs = []
+        for owner in ('worker-a', 'worker-b', 'worker-a', 'worker-b'):
+            if scheduler.acquire_lease(60, owner):
+                runs.append((owner, scheduler.run_once(now)))
+        assert [owner for owner, _ in runs] == ['worker-a', 'worker-a'], runs
+        reminders = runs[0][1][1]
+        assert reminders > 0 and runs[1][1] == (0, 0)
+
+        # 租约行已被其他进程插入时，INSERT的主键冲突返回False
+        db.session.query(SchedulerLease).delete()
+        db.session.add(SchedulerLease(name=scheduler.LEASE_NAME, owner='worker-b',
+                                      expires_at=datetime.utcnow() + timedelta(seconds=60)))
+        db.session.commit()
+        assert not scheduler.acquire_lease(60, 'worker-a')
+
+        # 过期后由其他进程接管，原持有者不再执行；同一批预约的提醒由dedup_key去重
+        db.session.query(SchedulerLease).update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+        assert scheduler.acquire_lease(60, 'worker-a') and not scheduler.acquire_lease(60, 'worker-b')
+        assert scheduler.run_once(now) == (0, 0)
+        assert Notification.query.filter_by(subtype='reminder').count() == reminders
+        reminder = Notification.query.filter_by(subtype='reminder').first()
+        assert scheduler.insert_notifications([{'user_id': reminder.user_id, 'subtype': 'reminder', 'title': '重复提醒',
+                                                'content': '测试', 'related_id': reminder.related_id,
+                                                'dedup_key': reminder.dedup_key}]) == 0
+        db.session.commit()
+        assert Notification.query.filter_by(subtype='reminder').count() == reminders
+
+        # 释放后其他进程无需等待过期
+        scheduler.release_lease('worker-a')
+        assert scheduler.acquire_lease(60, 'worker-b')
+
+        capture = Capture()
+        scheduler.logger.addHandler(capture)
+        original = scheduler.mark_no_shows
+        scheduler.mark_no_shows = lambda now: 1 / 0
+        failures = scheduler.metrics['failures']
+        try:
+            assert scheduler.run_once(now) == (0, 0)
+        finally:
+            scheduler.mark_no_shows = original
+            scheduler.logger.removeHandler(capture)
+        assert scheduler.metrics['failures'] == failures + 1
+        errors = [record for record in capture.records if record.levelno == logging.ERROR]
+        assert len(errors) == 1 and errors[0].exc_info, capture.records
+        db.session.remove()
+
+def seed_notifications(user_id):
+    """为用户的每个预约和评价各生成一条通知，返回通知数量"""
+    now = datetime.now()
+    notifications = [
+        Notification(user_id=user_id, type='booking', subtype='confirmation', title='预约已确认',
+                     content='测试', related_id=booking.id, created_at=now - timedelta(minutes=i))
+        for i, booking in enumerate(Booking.query.filter_by(user_id=user_id))
+    ] + [
+        Notification(user_id=user_id, type='review', subtype='reply', title='评价已回复',
+                     content='测试', related_id=review.id, created_at=now)
+        for review in Review.query.filter_by(user_id=user_id)
+    ]
+    db.session.add_all(notifications)
+    db.session.commit()
+    return len(notifications)
+
+def test_notifications_feed():
+    """通知列表：相关实体按类型批量加载，游标分页逐页遍历不重复、不遗漏"""
+    counts = []
+    with app.app_context():
+        for size in (5, 60):
+            user_id, _ = seed_bookings(size)
+            total = seed_notifications(user_id)
+            token = generate_token(user_id, 'user')
+            with app.test_client() as client:
+                count, response = count_statements(client, '/api/user/notifications', token)
+                assert all('related_entity' in n for n in response.get_json())
+                # 未提供limit时也只返回第一页
+                page = response.get_json()
+                assert len(page) == min(total, 20), f"未提供limit时返回了 {len(page)} 条"
+                assert response.headers['X-Has-More'] == ('true' if total > 20 else 'false')
+                assert ('X-Next-Cursor' in response.headers) == (total > 20)
+                counts.append(count)
+
+                seen = []
+                cursor = None
+                while True:
+                    path = '/api/user/notifications?limit=7' + (f'&cursor={cursor}' if cursor else '')
+                    _, response = count_statements(client, path, token)
+                    seen.extend(n['id'] for n in response.get_json())
+                    cursor = response.headers.get('X-Next-Cursor')
+                    if response.headers.get('X-Has-More') != 'true':
+                        break
+            assert len(seen) == len(set(seen)) == total, f"分页得到 {len(seen)} 条，共 {total} 条"
+            db.session.remove()
+
+    assert counts[0] == counts[1], f"通知列表的查询次数随通知数量增长: {counts}"
+    assert counts[0] <= 6, f"通知列表执行了 {counts[0]} 条SQL"
+
+def test_unread_counter():
+    """未读计数：随创建、已读、删除同步更新，全部已读只执行一条UPDATE，可从通知表对账"""
+    from notifications import reconcile_unread_counts
+    from models import NotificationCounter
+
+    with app.app_context():
+        user_id, _ = seed_bookings(20)
+        total = seed_notifications(user_id)
+        token = generate_token(user_id, 'user')
+        with app.test_client() as client:
+            def unread():
+                _, response = count_statements(client, '/api/user/notifications/unread-count', token)
+                return response.get_json()['unread_count']
+
+            assert unread() == total, f"未读数 {unread()}，应为 {total}"
+            first, second = Notification.query.filter_by(user_id=user_id).limit(2).all()
+            first_id, second_id = first.id, second.id
+            db.session.remove()
+            count_statements(client, f'/api/user/notifications/{first_id}/read', token, 'put')
+            count_statements(client, f'/api/user/notifications/{second_id}', token, 'delete')
+            assert unread() == total - 2, f"标记已读和删除后未读数为 {unread()}"
+
+            count, response = count_statements(client, '/api/user/notifications/read-all', token, 'put')
+            assert response.get_json()['count'] == total - 2
+            assert count <= 3, f"全部标记已读执行了 {count} 条SQL"
+            assert unread() == 0
+
+        NotificationCounter.query.filter_by(user_id=user_id).update({'unread_count': 99})
+        Notification.query.filter_by(user_id=user_id).limit(1).one().is_read = False
+        db.session.commit()
+        assert reconcile_unread_counts() == 1
+        db.session.commit()
+        assert NotificationCounter.query.get(user_id).unread_count == 1
+        db.session.remove()
+
+def test_notification_flusher():
+    """服务通知：后台批量写入通知表并增加未读计数，旧版通知文件可重复导入"""
+    import json
+    import os
+    import tempfile
+    from notifications import create_service_notification, get_notification_flusher
+    from notifications import get_unread_count
+    from migrate_legacy_notifications import import_notifications
+
+    with app.app_context():
+        user_id, provider_id = seed_bookings(5)
+        for i in range(30):
+            create_service_notification(user_id, f'通知{i}', '测试', 'service', data={'service_id': 'svc'})
+        # 服务商不在users表中，通知被跳过
+        create_service_notification(provider_id, '服务商通知', '测试', 'service')
+        get_notification_flusher().flush()
+        assert Notification.query.filter_by(user_id=user_id, type='service').count() == 30
+        assert get_unread_count(user_id) == 30
+
+        path = os.path.join(tempfile.mkdtemp(), 'notifications.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([
+                {'id': f'legacy-{i}', 'user_id': user_id, 'type': 'service', 'title': '旧通知',
+                 'content': '测试', 'read': i % 2 == 0, 'created_at': '2024-01-01T10:00:00'}
+                for i in range(10)
+            ] + [{'id': 'legacy-provider', 'user_id': provider_id, 'type': 'service', 'title': '旧通知'}], f)
+        db.session.remove()
+        assert import_notifications(path, app) and import_notifications(path, app)
+        assert Notification.query.filter(Notification.id.like('legacy-%')).count() == 10
+        assert get_unread_count(user_id) == 35
+        db.session.remove()
+
+def test_notification_flusher_durability():
+    """服务通知：critical通知随请求事务提交或回滚，不经过队列；关闭写入器超时时剩余的通知计入dropped并记录警告"""
+    import logging
+    import threading
+    import time
+    import notifications
+    from notifications import NotificationFlusher, create_service_notification, notification_row
+
+    with app.app_context():
+        user_id, _ = seed_bookings(0)
+        create_service_notification(user_id, '回滚的通知', '测试', 'service', critical=True)
+        db.session.rollback()
+        created = create_service_notification(user_id, '重要通知', '测试', 'service', critical=True)
+        db.session.commit()
+        titles = [n.title for n in Notification.query.filter_by(user_id=user_id, type='service')]
+        assert titles == ['重要通知'] and Notification.query.get(created['id']), titles
+        db.session.remove()
+
+    class Capture(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+
+        def emit(self, record):
+            self.records.append(record)
+
+    release = threading.Event()
+    original = notifications.write_notifications
+
+    def slow_write(rows, skip_existing=False):
+        release.wait(5)
+        return original(rows, skip_existing)
+
+    capture = Capture()
+    notifications.logger.addHandler(capture)
+    notifications.write_notifications = slow_write
+    flusher = NotificationFlusher(app, batch_size=1, interval=0.05)
+    try:
+        for i in range(3):
+            flusher.enqueue(notification_row(user_id, 'service', f'排队通知{i}', '测试'))
+        # 第一条正在写入时关闭，等待超时后剩余的两条计入dropped
+        while flusher._queue.qsize() > 2:
+            time.sleep(0.01)
+        flusher.close(timeout=0.1)
+        assert flusher.dropped == 2, flusher.dropped
+        assert [record.levelno for record in capture.records] == [logging.WARNING]
+    finally:
+        release.set()
+        notifications.write_notifications = original
+        notifications.logger.removeHandler(capture)
+        flusher._thread.join(5)
+
+def test_notification_flusher_failure():
+    """服务通知：一批写入失败时记录异常日志并计入failed，队列任务照常完成，flush不会卡住，后续批次继续写入"""
+    import logging
+    import threading
+    import notifications
+    from notifications import NotificationFlusher, notification_row
+
+    class Capture(logging.Handler):
+        def __init__(self):
+            super().__init__()
+            self.records = []
+
+        def emit(self, record):
+            self.records.append(record)
+
+    def fail(rows, skip_existing=False):
+        raise RuntimeError('数据库不可用')
+
+    with app.app_context():
+        user_id, _ = seed_bookings(0)
+        db.session.remove()
+    capture = Capture()
+    notifications.logger.addHandler(capture)
+    original = notifications.write_notifications
+    notifications.write_notifications = fail
+    flusher = NotificationFlusher(app, batch_size=10, interval=0.05)
+    try:
+        for i in range(3):
+            flusher.enqueue(notification_row(user_id, 'service', f'失败通知{i}', '测试'))
+        flushed = threading.Thread(target=flusher.flush, daemon=True)
+        flushed.start()
+        flushed.join(5)
+        assert not flushed.is_alive(), "写入失败后flush没有返回"
+        assert flusher.failed == 3 and flusher.written == 0
+        # 后台线程可能在后续通知入队前就取走第一条，失败的通知可能分成多批
+        assert capture.records and all(record.levelno == logging.ERROR and record.exc_info
+                                       for record in capture.records)
+        assert sum(record.args[0] for record in capture.records) == 3
+
+        notifications.write_notifications = original
+        flusher.enqueue(notification_row(user_id, 'service', '正常通知', '测试'))
+        flusher.flush()
+        assert flusher.written == 1 and flusher.failed == 3
+    finally:
+        notifications.write_notifications = original
+        notifications.logger.removeHandler(capture)
+        flusher.close()
+    with app.app_context():
+        assert Notification.query.filter_by(user_id=user_id, type='service').count() == 1
+        db.session.remove()
+
+def test_service_search():
+    """服务搜索：全文索引按相关度排序，分类精确多选并返回计数，服务变化后所有进程的索引同步更新"""
+    import json
+    from search_index import ServiceSearchIndex, service_index
+
+    with app.app_context():
+        _, provider_id = seed_bookings(0)
+        service_index.rebuild()
+        db.session.add_all([
+            Service(title='家庭深度保洁', provider_id=provider_id, price=300, price_unit='元/次', duration=180,
+                    status='active', description='全屋保洁，厨房油烟清洗', categories=json.dumps(['保洁'])),
+            Service(title='空调清洗', provider_id=provider_id, price=120, price_unit='元/台', duration=60,
+                    status='active', description='上门清洗空调，附带保洁', categories=json.dumps(['家电'])),
+            Service(title='钢琴课 Piano', provider_id=provider_id, price=200, price_unit='元/次', duration=60,
+                    status='draft', description='保洁无关', categories=json.dumps(['教育'])),
+        ])
+        db.session.commit()
+        # 另一个worker进程中的索引，先构建再通过变更日志增量同步
+        other_worker = ServiceSearchIndex()
+        other_worker.sync()
+        assert len(other_worker.search('空调')[0]) == 1
+
+        with app.test_client() as client:
+            def search(params):
+                response = client.get('/api/services/public', query_string=params)
+                assert response.status_code == 200
+                return [service['title'] for service in response.get_json()['services']]
+
+            assert search({'query': '保洁'}) == ['家庭深度保洁', '空调清洗'], search({'query': '保洁'})
+            assert search({'query': '保洁', 'sort_by': 'price_asc'}) == ['空调清洗', '家庭深度保洁']
+            assert search({'query': '洗'}) == ['空调清洗', '家庭深度保洁']
+            assert search({'query': '保洁', 'category': '家电'}) == ['空调清洗']
+
+            # 分类精确匹配、可多选，分类计数不受分类筛选影响
+            response = client.get('/api/services/public', query_string={'query': '保洁', 'category': '家电'})
+            assert response.get_json()['facets'] == {'保洁': 1, '家电': 1}, response.get_json()['facets']
+            assert sorted(search({'category': '保洁,家电'})) == ['家庭深度保洁', '空调清洗']
+            assert search({'category': ['家电', '教育']}) == ['空调清洗']
+            assert search({'category': '家'}) == [], "分类按子串匹配"
+            response = client.get('/api/services/public', query_string={'category': '家电'})
+            assert response.get_json()['facets'] == {'保洁': 1, '家电': 1}
+
+            piano = Service.query.filter_by(title='钢琴课 Piano').one()
+            piano.status = 'active'
+            Service.query.filter_by(title='空调清洗').one().status = 'inactive'
+            db.session.commit()
+            assert search({'query': 'piano'}) == ['钢琴课 Piano']
+            assert search({'query': '保洁'}) == ['家庭深度保洁', '钢琴课 Piano']
+            assert search({'category': '教育'}) == ['钢琴课 Piano']
+            piano.categories = json.dumps(['音乐'])
+            db.session.commit()
+            assert search({'category': '教育'}) == [] and search({'category': '音乐'}) == ['钢琴课 Piano']
+
+        other_worker.sync()
+        assert other_worker.search('空调')[0] == []
+        assert other_worker.search('piano')[0] == [piano.id]
+        db.session.remove()
+
+def test_search_rebuild_not_blocking():
+    """服务搜索：全量重建读取数据库时不持有索引锁，其他线程的同步和搜索不等待，继续使用旧索引；定时刷新按需重建"""
+    import json
+    import threading
+    from search_index import ServiceSearchIndex, REBUILD_AFTER
+
+    with app.app_context():
+        _, provider_id = seed_bookings(0)
+        db.session.add(Service(title='重建前的服务', provider_id=provider_id, price=100, price_unit='元/次',
+                               duration=60, status='active', description='测试', categories=json.dumps(['保洁'])))
+        db.session.commit()
+        index = ServiceSearchIndex()
+        index.refresh()
+        assert not index.built, "没有搜索过的进程不应构建索引"
+        index.sync()
+        before = index.search('服务')[1]
+        db.session.add(Service(title='重建后的服务', provider_id=provider_id, price=100, price_unit='元/次',
+                               duration=60, status='active', description='测试', categories=json.dumps(['保洁'])))
+        db.session.commit()
+
+        results = []
+
+        def search_during_rebuild():
+            index.sync()  # 正在重建，不等待
+            results.append(index.search('服务')[1])
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            # 重建读取服务表时，另一个线程同步并搜索
+            if 'FROM services' in statement and not results:
+                searcher = threading.Thread(target=search_during_rebuild)
+                searcher.start()
+                searcher.join(2)
+                results.append(not searcher.is_alive())
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            index.rebuild()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+        assert results == [before, True], f"重建期间搜索被阻塞或没有使用旧索引: {results}"
+        assert index.search('服务')[1] == before + 1
+
+        # 距上次全量构建超过REBUILD_AFTER时，定时刷新重建索引
+        built_at = index._built_at = index._built_at - REBUILD_AFTER
+        index.refresh()
+        assert index._built_at > built_at and index.search('服务')[1] == before + 1
+        db.session.remove()
+
+def test_search_concurrent_compaction():
+    """服务搜索：匹配之后、排序之前另一个线程删除服务触发压缩，排序仍使用匹配时的文档编号"""
+    import threading
+    from search_index import ServiceSearchIndex
+
+    index = ServiceSearchIndex()
+    for i in range(1200):
+        title = '填充服务' if i < 700 else '目标服务 target'
+        index.add(f'service-{i:04d}', title, '测试', ('保洁',), 100 + i, 4.0, None)
+    # 作废的编号接近一半，再删除少量服务就会压缩并重新编号
+    for i in range(590):
+        index.remove(f'service-{i:04d}')
+
+    match = index.match
+    compacted = threading.Event()
+
+    def remove_fillers():
+        for i in range(590, 610):
+            index.remove(f'service-{i:04d}')
+        compacted.set()
+
+    def match_then_compact(query):
+        scores = match(query)
+        worker = threading.Thread(target=remove_fillers)
+        worker.start()
+        # 搜索持有锁时压缩要等到排序结束，没有持有锁时压缩在这里完成
+        compacted.wait(0.5)
+        return scores
+
+    index.match = match_then_compact
+    service_ids, total, facets, _ = index.search('target', sort_by='price_asc', limit=1000)
+    assert compacted.wait(5), "删除服务的线程没有完成"
+    expected = [f'service-{i:04d}' for i in range(700, 1200)]
+    assert service_ids == expected and total == 500, service_ids[:3]
+    assert facets == {'保洁': 500}, facets
+    assert len(index._doc_ids) < 1200, "没有触发压缩"
+
+def test_public_services_pagination():
+    """公开服务列表：各排序方式下按游标逐页遍历不重复、不遗漏，每页的查询次数相同"""
+    import json
+    from search_index import service_index
+
+    with app.app_context():
+        user_id, provider_id = seed_bookings(0)
+        now = datetime.utcnow()
+        # 价格和评分大量重复，验证以id作为第二排序键时翻页不会跳过或重复
+        db.session.add_all([
+            Service(title=f'分页服务{i}', provider_id=provider_id, price=100 + i % 5 * 10, price_unit='元/次',
+                    duration=60, status='active', description='分页测试', rating=float(3 + i % 3),
+                    categories=json.dumps(['保洁' if i % 2 else '维修']), created_at=now - timedelta(minutes=i % 17))
+            for i in range(50)
+        ])
+        db.session.commit()
+        service_index.rebuild()
+        active = Service.query.filter_by(status='active').all()
+        token = generate_token(user_id, 'user')
+
+        with app.test_client() as client:
+            def walk(params):
+                seen, counts, cursor = [], [], None
+                while True:
+                    page = dict(params, limit=7, **({'cursor': cursor} if cursor else {}))
+                    path = '/api/services/public?' + '&'.join(f'{key}={value}' for key, value in page.items())
+                    count, response = count_statements(client, path, token)
+                    data = response.get_json()
+                    seen.extend(service['id'] for service in data['services'])
+                    counts.append(count)
+                    cursor = data['next_cursor']
+                    if not data['has_more']:
+                        return seen, counts, data['total']
+
+            expected_orders = {
+                'created_at': sorted(active, key=lambda s: (s.created_at, s.id), reverse=True),
+                'price_asc': sorted(active, key=lambda s: (s.price, s.id)),
+                'price_desc': sorted(active, key=lambda s: (s.price, s.id), reverse=True),
+                'rating': sorted(active, key=lambda s: (s.rating, s.id), reverse=True),
+            }
+            for sort_by, expected in expected_orders.items():
+                seen, counts, total = walk({'sort_by': sort_by})
+                assert seen == [s.id for s in expected], f"按{sort_by}翻页的顺序不正确"
+                assert total == len(active), f"按{sort_by}返回的总数为 {total}"
+                assert len(set(counts)) == 1, f"按{sort_by}翻页时各页的查询次数不同: {counts}"
+
+            # 关键词搜索和分类筛选同样可以按游标翻页
+            seen, _, total = walk({'query': '分页', 'sort_by': 'price_asc'})
+            assert len(seen) == len(set(seen)) == total == 50, f"搜索翻页得到 {len(seen)} 个，共 {total} 个"
+            # 有筛选条件时第一页执行COUNT并缓存，之后各页复用
+            seen, counts, total = walk({'category': '保洁'})
+            assert len(seen) == len(set(seen)) == total == 25, f"分类翻页得到 {len(seen)} 个，共 {total} 个"
+            assert len(set(counts[1:])) == 1 and counts[1] < counts[0], f"分类翻页时各页的查询次数: {counts}"
+
+            # 游标与排序方式不符时拒绝
+            first = client.get('/api/services/public?sort_by=price_asc&limit=7').get_json()
+            response = client.get(f"/api/services/public?sort_by=rating&cursor={first['next_cursor']}")
+            assert response.status_code == 400
+        db.session.remove()
+
+def test_public_services_rating_ties():
+    """公开服务列表：平均分相同(如13/3)的服务跨页分页不重复、不遗漏，评分为空的服务按0排在最后"""
+    from ratings import apply_rating_change
+
+    with app.app_context():
+        user_id, provider_id = seed_bookings(0)
+        services = [Service(title=f'评分服务{i}', provider_id=provider_id, price=100, price_unit='元/次',
+                            duration=60, status='active', description='评分测试') for i in range(15)]
+        db.session.add_all(services)
+        db.session.flush()
+        # 前10个服务的平均分都是13/3，另有两个4.5分，最后三个评分为空
+        for service in services[:10]:
+            apply_rating_change(Service, service.id, added=[5, 4, 4])
+        for service in services[10:12]:
+            apply_rating_change(Service, service.id, added=[5, 4])
+        db.session.execute(Service.__table__.update()
+                           .where(Service.id.in_([service.id for service in services[12:]])).values(rating=None))
+        db.session.commit()
+        db.session.expire_all()
+        active = Service.query.filter_by(status='active').all()
+        assert {service.rating for service in active if service.id == services[0].id} == {4.333}
+        expected = [s.id for s in sorted(active, key=lambda s: (s.rating or 0, s.id), reverse=True)]
+
+        with app.test_client() as client:
+            seen, cursor = [], None
+            while True:
+                path = '/api/services/public?sort_by=rating&limit=4' + (f'&cursor={cursor}' if cursor else '')
+                data = client.get(path).get_json()
+                seen.extend(service['id'] for service in data['services'])
+                cursor = data['next_cursor']
+                if not data['has_more']:
+                    break
+        assert seen == expected, f"按评分翻页得到 {len(seen)} 个(去重后 {len(set(seen))} 个)，应为 {len(expected)} 个"
+        db.session.remove()
+
+def test_list_serialization():
+    """列表序列化：fields参数裁剪返回字段，收藏列表的服务和服务商批量加载，查询次数与收藏数量无关"""
+    from models import Favorite
+
+    counts = []
+    with app.app_context():
+        for size in (2, 30):
+            user_id, _ = seed_bookings(0)
+            providers = [Provider(username=f'fav_provider{i}', email=f'fav{i}@example.com', password='x',
+                                  business_name=f'收藏商家{i}') for i in range(size)]
+            db.session.add_all(providers)
+            db.session.flush()
+            services = [Service(title=f'收藏服务{i}', provider_id=provider.id, price=100, price_unit='元/次',
+                                duration=60, status='active') for i, provider in enumerate(providers)]
+            db.session.add_all(services)
+            db.session.flush()
+            db.session.add_all([Favorite(user_id=user_id, service_id=service.id) for service in services])
+            db.session.commit()
+            token = generate_token(user_id, 'user')
+            with app.test_client() as client:
+                count, response = count_statements(client, '/api/favorites', token)
+                favorites = response.get_json()
+                assert len(favorites) == size
+                assert favorites[0]['provider']['business_name'].startswith('收藏商家')
+                assert 'email' not in favorites[0]['provider'], "收藏列表不应返回服务商的联系方式"
+                counts.append(count)
+
+                _, response = count_statements(client, '/api/services/public?fields=id,title,provider', token)
+                service = response.get_json()['services'][0]
+                assert set(service) == {'id', 'title', 'provider'}, service
+                assert service['provider'] == '查询测试商家' or service['provider'].startswith('收藏商家')
+                response = client.get('/api/services/public?fields=id,password')
+                assert response.status_code == 400
+            db.session.remove()
+
+    assert counts[0] == counts[1], f"收藏列表的查询次数随收藏数量增长: {counts}"
+
+def test_service_status_update():
+    """服务上下线：通过会话连接更新状态并记录变更，其他进程的搜索索引同步，通知计入未读数"""
+    from search_index import ServiceSearchIndex, service_index
+
+    with app.app_context():
+        _, provider_id = seed_bookings(0)
+        service = Service.query.filter_by(provider_id=provider_id).first()
+        service_id, title = service.id, service.title
+        # 服务商同时也是users表中的用户时才会收到通知
+        db.session.add(User(id=provider_id, username='status_owner', email='status_owner@example.com',
+                            password=hash_password('123456')))
+        db.session.commit()
+        service_index.rebuild()
+        other_worker = ServiceSearchIndex()
+        other_worker.sync()
+        assert service_id in other_worker.search(title)[0]
+
+        token = generate_token(provider_id, 'provider')
+        with app.test_client() as client:
+            response = client.put(f'/api/services/{service_id}/status', json={'status': 'inactive'},
+                                  headers={'Authorization': f'Bearer {token}'})
+            assert response.status_code == 200, response.get_json()
+            body = response.get_json()['service']
+            assert body['status'] == 'inactive' and isinstance(body['updated_at'], str)
+            response = client.put(f'/api/services/{service_id}/status', json={'status': 'active'},
+                                  headers={'Authorization': f'Bearer {generate_token("someone", "provider")}'})
+            assert response.status_code == 403
+
+        db.session.expire_all()
+        assert db.session.get(Service, service_id).status == 'inactive'
+        notifications = Notification.query.filter_by(user_id=provider_id, subtype='status_change').all()
+        assert len(notifications) == 1 and notifications[0].title == '服务下线通知'
+        from notifications import get_unread_count
+        assert get_unread_count(provider_id) == 1
+        other_worker.sync()
+        assert service_id not in other_worker.search(title)[0], "其他进程的索引没有同步下线"
+        db.session.remove()
+
+def main():
+    tests = [
+        test_bookings_list_user,
+        test_bookings_list_provider,
+        test_dashboard_bookings,
+        test_dashboard_section_page,
+        test_booking_stats,
+        test_bookings_list_pagination,
+        test_apply_working_pattern,
+        test_available_timeslots,
+        test_create_review,
+        test_scheduler_run,
+        test_scheduler_no_show_race,
+        test_scheduler_lease,
+        test_notifications_feed,
+        test_unread_counter,
+        test_notification_flusher,
+        test_notification_flusher_durability,
+        test_notification_flusher_failure,
+        test_service_search,
+        test_search_rebuild_not_blocking,
+        test_search_concurrent_compaction,
+        test_public_services_pagination,
+        test_public_services_rating_ties,
+        test_list_serialization,
+        test_service_status_update,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except AssertionError as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
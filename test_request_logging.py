@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+结构化日志测试脚本
+检查日志行为JSON且带有请求ID和端点、DEBUG日志按端点采样、级别过滤，
+队列满时丢弃日志而不阻塞请求，以及多次初始化(多次create_app)时不遗留写日志的线程和处理器
+
+使用方法:
+    python test_request_logging.py
+"""
+
+import io
+import json
+import sys
+import threading
+import time
+
+from flask import Flask
+
+from request_logging import logger, setup_logging
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def make_app(level='DEBUG', sampling=None, queue_size=1000, stream=None):
+    app = Flask(__name__)
+    app.config.update(LOG_LEVEL=level, LOG_QUEUE_SIZE=queue_size, LOG_DEBUG_SAMPLE_RATE=0.0,
+                      LOG_DEBUG_SAMPLING=sampling or {})
+
+    @app.route('/sampled')
+    def sampled():
+        logger.debug('调试信息')
+        logger.info('处理完成')
+        return 'ok'
+
+    @app.route('/unsampled')
+    def unsampled():
+        logger.debug('不应输出')
+        logger.warning('警告信息')
+        return 'ok'
+
+    handler = setup_logging(app, stream)
+    return app, handler
+
+def read_lines(handler, stream):
+    handler.queue.join()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_request_id():
+    """每行日志为JSON，带有请求头中的请求ID和端点名，响应头返回请求ID"""
+    stream = io.StringIO()
+    app, handler = make_app(level='INFO', stream=stream)
+    with app.test_client() as client:
+        response = client.get('/sampled', headers={'X-Request-ID': 'abc123'})
+        assert response.headers['X-Request-ID'] == 'abc123'
+        generated = client.get('/sampled').headers['X-Request-ID']
+        assert generated and generated != 'abc123'
+    lines = read_lines(handler, stream)
+    assert [line['request_id'] for line in lines] == ['abc123', generated], lines
+    assert lines[0]['endpoint'] == 'sampled' and lines[0]['message'] == '处理完成' and lines[0]['level'] == 'INFO'
+
+def test_sampling():
+    """DEBUG日志只在采样的端点输出，其他级别不受采样影响"""
+    stream = io.StringIO()
+    app, handler = make_app(sampling={'sampled': 1.0}, stream=stream)
+    with app.test_client() as client:
+        client.get('/sampled')
+        client.get('/unsampled')
+    messages = [line['message'] for line in read_lines(handler, stream)]
+    assert messages == ['调试信息', '处理完成', '警告信息'], messages
+
+def test_level():
+    """级别高于DEBUG时不做采样判断，DEBUG日志全部跳过"""
+    stream = io.StringIO()
+    app, handler = make_app(level='WARNING', sampling={'sampled': 1.0}, stream=stream)
+    with app.test_client() as client:
+        client.get('/sampled')
+        client.get('/unsampled')
+    messages = [line['message'] for line in read_lines(handler, stream)]
+    assert messages == ['警告信息'], messages
+
+class SlowStream(io.StringIO):
+    """模拟读取缓慢的终端或日志收集器"""
+    def write(self, text):
+        time.sleep(0.01)
+        return super().write(text)
+
+def test_nonblocking():
+    """输出缓慢时请求不被阻塞，队列满后丢弃日志并计数"""
+    app, handler = make_app(level='INFO', queue_size=10, stream=SlowStream())
+    started = time.perf_counter()
+    with app.test_client() as client:
+        for _ in range(200):
+            client.get('/sampled')
+    elapsed = time.perf_counter() - started
+    assert elapsed < 1.0, f"200个请求耗时 {elapsed:.2f} 秒，请求被日志输出阻塞"
+    assert handler.dropped > 0, "队列满时没有丢弃日志"
+    handler.queue.join()
+
+def test_repeated_setup():
+    """多次初始化：上一个写日志的线程写完已排队的日志后停止，只保留一个处理器和一个线程"""
+    first = io.StringIO()
+    app, handler = make_app(level='INFO', stream=first)
+    with app.test_client() as client:
+        client.get('/sampled')
+    threads = threading.active_count()
+
+    for _ in range(5):
+        second = io.StringIO()
+        app, handler = make_app(level='INFO', stream=second)
+    assert threading.active_count() == threads, f"线程数 {threads} -> {threading.active_count()}"
+    assert logger.handlers == [handler], logger.handlers
+    assert [json.loads(line)['message'] for line in first.getvalue().splitlines()] == ['处理完成']
+
+    with app.test_client() as client:
+        client.get('/sampled')
+    assert [line['message'] for line in read_lines(handler, second)] == ['处理完成']
+
+def main():
+    tests = [
+        test_request_id,
+        test_sampling,
+        test_level,
+        test_nonblocking,
+        test_repeated_setup,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except AssertionError as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
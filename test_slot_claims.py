@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+时间段占用测试脚本
+检查同一时间段的重复抢占返回409、保留后下单和释放保留、接管已过期的保留、
+同一Idempotency-Key的重试返回同一预约、与时间段无关的完整性错误不会报告为409，
+以及取消预约后在同一次flush中释放占用
+
+使用方法:
+    python test_slot_claims.py
+"""
+
+import sys
+from datetime import date, datetime, timedelta
+
+from app import create_app
+from auth import generate_token, hash_password
+from models import db, User, Provider, Service, Booking, SlotClaim
+import routes.bookings
+
+# 使用内存SQLite数据库，不依赖MySQL
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+
+# 没有设置时间段的日期使用默认营业时间
+DAY = date.today() + timedelta(days=10)
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+def seed():
+    """重建数据表，生成一个服务商、一个服务和两个用户，返回{名称: ID或令牌}"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = [User(username=f'claim_user{i}', email=f'claim_user{i}@example.com',
+                      password=hash_password('123456')) for i in range(2)]
+        provider = Provider(username='claim_provider', email='claim_provider@example.com',
+                            password=hash_password('123456'), business_name='占用测试商家')
+        db.session.add_all(users + [provider])
+        db.session.flush()
+        service = Service(title='占用测试服务', provider_id=provider.id, price=100, price_unit='元/次',
+                          duration=60, status='active', description='测试')
+        db.session.add(service)
+        db.session.commit()
+        ids = {'service': service.id, 'provider': provider.id,
+               'provider_token': generate_token(provider.id, 'provider'),
+               'user': users[0].id, 'token': generate_token(users[0].id, 'user'),
+               'other_token': generate_token(users[1].id, 'user')}
+        db.session.remove()
+    return ids
+
+def post(client, path, token, data=None, headers=None):
+    response = client.post(path, json=data or {}, headers=dict(headers or {}, Authorization=f'Bearer {token}'))
+    return response.status_code, response.get_json(), response.headers
+
+def slot(ids, time_str='09:00'):
+    return {'service_id': ids['service'], 'date': DAY.isoformat(), 'time': time_str}
+
+def claims():
+    """返回所有占用行的(时间, 预约ID, 保留令牌)"""
+    with app.app_context():
+        rows = [(c.time, c.booking_id, c.hold_token) for c in SlotClaim.query.order_by(SlotClaim.time)]
+        db.session.remove()
+    return rows
+
+def test_double_claim():
+    """重复抢占：快速检查拒绝已占用的时间段，绕过快速检查时主键冲突同样返回409"""
+    ids = seed()
+    client = app.test_client()
+    status, body, _ = post(client, '/api/bookings', ids['token'], slot(ids))
+    assert status == 201, body
+    assert post(client, '/api/bookings', ids['other_token'], slot(ids))[0] == 409
+
+    # 模拟两个请求同时通过快速检查，后INSERT的一方由主键冲突决出
+    original = routes.bookings.check_slot_open
+    routes.bookings.check_slot_open = lambda *args: None
+    try:
+        status, body, _ = post(client, '/api/bookings', ids['other_token'], slot(ids))
+        assert status == 409 and body['message'] == '该时间段已被预约', body
+        status, body, _ = post(client, '/api/bookings/holds', ids['other_token'], slot(ids))
+        assert status == 409 and body['message'] == '该时间段已被预约', body
+    finally:
+        routes.bookings.check_slot_open = original
+    with app.app_context():
+        assert Booking.query.count() == 1
+        db.session.remove()
+
+def test_hold_convert_release():
+    """保留：用保留令牌下单后占用转为预约；释放保留后时间段可被他人预约，重复释放返回404"""
+    ids = seed()
+    client = app.test_client()
+    status, body, _ = post(client, '/api/bookings/holds', ids['token'], slot(ids))
+    assert status == 201 and body['expires_in'] == routes.bookings.HOLD_SECONDS, body
+    hold_token = body['hold_token']
+    assert post(client, '/api/bookings', ids['other_token'], slot(ids))[0] == 409, "保留的时间段不应被他人预约"
+    status, body, _ = post(client, '/api/bookings', ids['token'], dict(slot(ids), hold_token=hold_token))
+    assert status == 201, body
+    assert claims() == [('09:00', body['booking']['id'], None)]
+
+    # 保留后释放
+    _, body, _ = post(client, '/api/bookings/holds', ids['token'], slot(ids, '10:00'))
+    headers = {'Authorization': f"Bearer {ids['token']}"}
+    assert client.delete(f"/api/bookings/holds/{body['hold_token']}", headers=headers).status_code == 200
+    assert client.delete(f"/api/bookings/holds/{body['hold_token']}", headers=headers).status_code == 404
+    assert [c[0] for c in claims()] == ['09:00']
+    assert post(client, '/api/bookings', ids['other_token'], slot(ids, '10:00'))[0] == 201
+
+def test_expired_hold_takeover():
+    """过期保留：他人可以接管已过期的保留，原保留令牌不能再下单"""
+    ids = seed()
+    client = app.test_client()
+    _, body, _ = post(client, '/api/bookings/holds', ids['token'], slot(ids))
+    hold_token = body['hold_token']
+    with app.app_context():
+        SlotClaim.query.filter_by(hold_token=hold_token).one().expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        db.session.remove()
+
+    status, body, _ = post(client, '/api/bookings', ids['other_token'], slot(ids))
+    assert status == 201, body
+    assert claims() == [('09:00', body['booking']['id'], None)], "过期保留应被原地接管"
+    status, body, _ = post(client, '/api/bookings', ids['token'], dict(slot(ids), hold_token=hold_token))
+    assert status == 409 and body['message'] == '时间段保留无效或已过期', body
+
+def test_idempotent_replay():
+    """幂等键：重试返回同一预约；并发重试在插入时遇到幂等键冲突也返回第一次创建的预约"""
+    ids = seed()
+    client = app.test_client()
+    headers = {'Idempotency-Key': 'retry-1'}
+    status, first, _ = post(client, '/api/bookings', ids['token'], slot(ids), headers)
+    assert status == 201, first
+    status, body, response_headers = post(client, '/api/bookings', ids['token'], slot(ids), headers)
+    assert status == 201 and body['booking']['id'] == first['booking']['id']
+    assert response_headers.get('Idempotent-Replayed') == 'true'
+
+    # 并发的重试在开头没有查到预约，插入时由幂等键的唯一约束拦截
+    original = routes.bookings.replay_booking
+    calls = []
+
+    def replay_after_conflict(user_id, idempotency_key):
+        calls.append(idempotency_key)
+        return original(user_id, idempotency_key) if len(calls) > 1 else None
+
+    routes.bookings.replay_booking = replay_after_conflict
+    try:
+        status, body, response_headers = post(client, '/api/bookings', ids['token'], slot(ids, '10:00'), headers)
+    finally:
+        routes.bookings.replay_booking = original
+    assert status == 201 and body['booking']['id'] == first['booking']['id'], body
+    assert response_headers.get('Idempotent-Replayed') == 'true' and len(calls) == 2
+    assert [c[0] for c in claims()] == ['09:00'], "冲突的请求不应留下占用"
+
+def test_other_integrity_error():
+    """其他完整性错误：不是时间段主键或幂等键的冲突时回滚并返回500，而不是409"""
+    ids = seed()
+    client = app.test_client()
+    original = routes.bookings.claim_slot
+
+    def claim_without_user(session, provider_id, date_obj, time_str, user_id, **kwargs):
+        return original(session, provider_id, date_obj, time_str, None, **kwargs)  # 违反非空约束
+
+    routes.bookings.claim_slot = claim_without_user
+    try:
+        status, body, _ = post(client, '/api/bookings', ids['token'], slot(ids), {'Idempotency-Key': 'other-1'})
+        assert status == 500 and body['message'] == '创建预约失败', body
+        status, body, _ = post(client, '/api/bookings/holds', ids['token'], slot(ids))
+        assert status == 500, body
+    finally:
+        routes.bookings.claim_slot = original
+    assert claims() == []
+    with app.app_context():
+        assert Booking.query.count() == 0
+        db.session.remove()
+
+def test_cancel_releases_claim():
+    """取消预约：同一次flush中释放占用，他人可以预约；被占用后原预约不能恢复为有效状态"""
+    ids = seed()
+    client = app.test_client()
+    _, body, _ = post(client, '/api/bookings', ids['token'], slot(ids))
+    booking_id = body['booking']['id']
+    headers = {'Authorization': f"Bearer {ids['token']}"}
+    response = client.put(f'/api/bookings/{booking_id}', json={'status': 'canceled'}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    assert claims() == [], "取消后占用未释放"
+
+    assert post(client, '/api/bookings', ids['other_token'], slot(ids))[0] == 201
+    response = client.put(f'/api/bookings/{booking_id}', json={'status': 'confirmed'},
+                          headers={'Authorization': f"Bearer {ids['provider_token']}"})
+    assert response.status_code == 409, response.get_json()
+    with app.app_context():
+        assert Booking.query.get(booking_id).status == 'canceled'
+        db.session.remove()
+
+def main():
+    tests = [
+        test_double_claim,
+        test_hold_convert_release,
+        test_expired_hold_takeover,
+        test_idempotent_replay,
+        test_other_integrity_error,
+        test_cancel_releases_claim,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except AssertionError as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+令牌验证缓存测试脚本
+检查已验证令牌缓存遵守令牌自身的exp、超过上限时按LRU淘汰，
+并通过Flask测试客户端确认认证装饰器注入user_id/user_type、拒绝伪造和过期的令牌
+
+使用方法:
+    python test_token_cache.py
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+
+import jwt
+
+from auth import TokenCache, auth_required, generate_token, get_token_cache, verify_token
+from app import create_app
+
+app = create_app(blueprints=())
+
+# 颜色代码
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+
+def print_colored(text, color):
+    """打印彩色文本"""
+    print(f"{color}{text}{Colors.ENDC}")
+
+@app.route('/api/test/whoami', methods=['GET'])
+@auth_required
+def whoami(user_id, user_type):
+    return {'user_id': user_id, 'user_type': user_type}
+
+def test_cache_expiry():
+    """缓存条目在令牌的exp之后不再命中"""
+    cache = TokenCache()
+    cache.set('a', {'user_id': '1', 'exp': time.time() + 0.2})
+    assert cache.get('a')['user_id'] == '1'
+    time.sleep(0.25)
+    assert cache.get('a') is None, "过期令牌仍然命中缓存"
+    cache.set('b', {'user_id': '2'})
+    assert cache.get('b') is None, "没有exp的令牌被缓存"
+
+def test_cache_lru():
+    """超过上限时淘汰最久未使用的令牌"""
+    cache = TokenCache(max_entries=3)
+    exp = time.time() + 60
+    for token in ('a', 'b', 'c'):
+        cache.set(token, {'exp': exp})
+    cache.get('a')
+    cache.set('d', {'exp': exp})
+    assert cache.get('b') is None, "最久未使用的令牌没有被淘汰"
+    assert cache.get('a') and cache.get('d') and len(cache) == 3
+
+def test_verify_token():
+    """验证通过的令牌只解码一次，伪造和过期的令牌不会进入缓存"""
+    with app.app_context():
+        cache = get_token_cache()
+        cache.clear()
+        token = generate_token('cache-user', 'user')
+        hits = cache.hits
+        assert verify_token(token)['user_id'] == 'cache-user'
+        assert verify_token(token)['user_id'] == 'cache-user'
+        assert cache.hits == hits + 1, "第二次验证没有命中缓存"
+
+        forged = jwt.encode({'user_id': 'x', 'user_type': 'user', 'exp': datetime.utcnow() + timedelta(hours=1)},
+                            'wrong-secret', algorithm='HS256')
+        expired = jwt.encode({'user_id': 'x', 'user_type': 'user', 'exp': datetime.utcnow() - timedelta(seconds=1)},
+                             app.config['SECRET_KEY'], algorithm='HS256')
+        assert verify_token(forged) is None and verify_token(expired) is None
+        assert verify_token('not-a-token') is None
+        assert len(cache) == 1
+
+def test_auth_decorator():
+    """认证装饰器注入user_id和user_type，缺少或无效令牌返回401"""
+    with app.app_context(), app.test_client() as client:
+        token = generate_token('decorated-user', 'provider')
+        response = client.get('/api/test/whoami', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
+        assert response.get_json() == {'user_id': 'decorated-user', 'user_type': 'provider'}
+        assert client.get('/api/test/whoami', headers={'Authorization': token}).status_code == 200
+        assert client.get('/api/test/whoami').status_code == 401
+        response = client.get('/api/test/whoami', headers={'Authorization': 'Bearer invalid'})
+        assert response.status_code == 401 and response.get_json()['message'] == '无效或过期的令牌'
+
+def main():
+    tests = [
+        test_cache_expiry,
+        test_cache_lru,
+        test_verify_token,
+        test_auth_decorator,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print_colored(f"✓ {test.__doc__}", Colors.GREEN)
+        except AssertionError as e:
+            failed += 1
+            print_colored(f"✗ {test.__doc__}: {e}", Colors.RED)
+
+    print_colored(f"\n共 {len(tests)} 项，失败 {failed} 项", Colors.BLUE)
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,11 @@
+"""
+上传文件的扩展名检查
+"""
+
+def allowed_file(filename, allowed_extensions=None):
+    """检查文件是否具有允许的扩展名"""
+    if allowed_extensions is None:
+        allowed_extensions = ['jpg', 'jpeg', 'png', 'gif', 'pdf', 'doc', 'docx']
+    
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in allowed_extensions
@@ -0,0 +1,10 @@
+"""
+WSGI入口，供其他WSGI服务器使用，例如:
+    gunicorn -k gthread --workers 3 --threads 4 --preload wsgi:application
+通过这个入口启动的进程从不启动定时任务，需另外运行一个python scheduler.py进程；
+用serve.py启动时每个worker会自动启动定时任务。
+"""
+
+from app import create_app
+
+application = create_app()